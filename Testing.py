@@ -2,67 +2,122 @@
 
 
 import cv2
-from ultralytics import YOLO
+import time
+from model_cache import MODELS
 import numpy as np # Still useful for general image handling if needed
+from detection_pipeline import DetectionPipeline, format_stats
+from ripeness import RipenessClassifier, draw_fruits
+from tracker import FruitTracker
+from adaptive_inference import AdaptiveDetector, yolo_detect
+from geotag import DetectionUploader
+import metrics
 
 # 2. Load your TRAINED YOLOv8 model
 # --- IMPORTANT: Replace with the ACTUAL path to your downloaded best.pt file ---
 model_path =r'C:\Users\mukun\OneDrive\Desktop\best.pt'
+# Optional second stage: MobileNetV2 ripeness classifier (see classification/README.md)
+# --- Replace with the path to best_mango_classifier.keras; boxes are drawn unclassified if it is missing ---
+classifier_path = r'C:\Users\mukun\OneDrive\Desktop\best_mango_classifier.keras'
+# Both load (ultralytics / tensorflow imports included) and run one warm-up inference
+# on background threads while the webcam opens below (see model_cache.py)
+MODELS.detector(model_path, wait=False)
+MODELS.classifier(classifier_path, wait=False)
+
+# 3. Initialize Webcam
+cap = cv2.VideoCapture(0) # 0 is usually the default webcam
+
+if not cap.isOpened():
+    print("Error: Could not open webcam.")
+    exit()
+
+# Keep only the newest frame in the driver's buffer; the pipeline does its own dropping
+cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+# The models started in step 2; the webcam's start-up time is already off the wait
 try:
-    model = YOLO(model_path)
-    print(f"Successfully loaded model from {model_path}")
+    # Uses the fastest exported backend (OpenVINO / ONNX Runtime, INT8 if exported)
+    # next to best.pt, falling back to PyTorch; see model_backends.py to export them
+    model, backend = MODELS.detector(model_path) # Waits for the background load
+    print(f"Successfully loaded model from {model_path} ({backend} backend)")
     # You can optionally set device here if needed, e.g., model = YOLO(model_path).to('cuda')
 except Exception as e:
     print(f"Error loading model: {e}")
     print("Make sure the path is correct and you have the .pt file.")
+    cap.release()
     exit() # Stop if model loading fails
 
-# 3. Initialize Webcam
-cap = cv2.VideoCapture(0) # 0 is usually the default webcam
+classifier = None
+try:
+    # All fruits of a frame are classified in one batched call (ripeness.py)
+    classifier = RipenessClassifier(MODELS.classifier(classifier_path))
+    print(f"Successfully loaded ripeness classifier from {classifier_path}")
+except Exception as e:
+    print(f"Ripeness classifier not loaded ({e}); showing detections only.")
 
-if not cap.isOpened():
-    print("Error: Could not open webcam.")
-    exit()
+# Each mango keeps a track ID across frames, so it is classified once (again only if
+# its detection confidence drops) and counted once (see tracker.py)
+fruit_tracker = FruitTracker(model, classifier)
+
+# Skip the detector while the view is static and only re-detect the parts of the frame
+# that changed (see adaptive_inference.py). Set budget_ms to cap the detector's average
+# cost per frame, e.g. budget_ms=40 on a slow CPU.
+adaptive = AdaptiveDetector(yolo_detect(model, conf=fruit_tracker.tracker.low_conf), budget_ms=None)
+
+# Detections are sent to the ground station (app.py), which geotags them with the
+# drone's telemetry at capture time for the orchard map; set to None to disable
+detections_url = 'http://127.0.0.1:5000/detections'
+uploader = DetectionUploader(detections_url).start() if detections_url else None
+
+# Per-stage timings and detector counts at http://<host>:<port>/metrics for Prometheus
+# (see metrics.py), e.g. metrics_port = 9100; None to disable
+metrics_port = None
+if metrics_port:
+    metrics.serve(metrics_port)
 
 print("Webcam opened successfully. Press 'q' to quit.")
 
-# 4. Processing Loop
-while True:
+# 4. Pipeline Stages
+# Capture, inference and display run concurrently (see detection_pipeline.py):
+# the camera is read on its own thread, the newest frame goes to the model on
+# a second thread, and this (main) thread only draws and shows results.
+def read_frame():
     # Read frame from webcam
     ret, frame = cap.read()
     if not ret:
         print("Error: Failed to grab frame.")
-        break
+        return None
+    return frame
 
-    # 5. Perform Inference using Ultralytics
-    # model.predict automatically handles resizing (to imgsz used during training),
-    # normalization, and returns results.
-    # You can adjust confidence threshold here.
-    results = model.predict(source=frame, conf=0.6, verbose=False) # Set verbose=False to reduce console output
+def infer(frame):
+    # 5. Perform Inference: detect and track mangoes, grading new tracks' ripeness in one batch
+    # model.predict automatically handles resizing (to imgsz used during training)
+    # and normalization; the classifier crops the boxes itself.
+    # Confidence thresholds are on the Tracker (high_conf=0.6 starts a track).
+    # Tiles under tracked mangoes are re-detected along with the ones that changed
+    boxes, confidences, mode = adaptive(frame, tracked=[track.box for track in fruit_tracker.tracker.tracks])
+    return fruit_tracker.update(frame, boxes, confidences)
 
+def render(packet):
     # 6. Process and Visualize Results
-    # results is a list (usually one element for a single image)
-    if results and len(results) > 0:
-        result = results[0] # Get the results for the first (and only) image
-
-        # Use the built-in plot() method to draw boxes, labels, and confidence scores
-        annotated_frame = result.plot(conf=True) # conf=True shows confidence scores on boxes
-
-        # If you need manual access to boxes (e.g., for custom logic):
-        # num_detections = len(result.boxes)
-        # print(f"Detected {num_detections} objects.")
-        # for box in result.boxes:
-        #     xyxy = box.xyxy[0].cpu().numpy().astype(int) # Get coordinates [x1, y1, x2, y2]
-        #     conf = box.conf[0].cpu().numpy()            # Get confidence score
-        #     cls_id = int(box.cls[0].cpu().numpy())      # Get class ID
-        #     label = model.names[cls_id]                 # Get class name
-        #     print(f"  Box: {xyxy}, Conf: {conf:.2f}, Class: {label} ({cls_id})")
-            # You could draw manually here if needed, but result.plot() is easier
-            # cv2.rectangle(frame, (xyxy[0], xyxy[1]), (xyxy[2], xyxy[3]), (0, 255, 0), 2)
-            # cv2.putText(frame, f"{label} {conf:.2f}", (xyxy[0], xyxy[1]-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,255,0), 2)
-    else:
-        # If no results object is returned (shouldn't usually happen for predict)
-        annotated_frame = frame # Show the original frame
+    # Boxes are coloured by ripeness: green Ripe, yellow UnRipe, red OverRipe
+    annotated_frame = draw_fruits(packet.frame, packet.result)
+    if uploader:
+        # captured_at is monotonic; the ground station matches wall-clock time
+        captured_at = time.time() - (time.monotonic() - packet.captured_at)
+        uploader.add(captured_at, packet.frame.shape[1], packet.frame.shape[0], packet.result)
+    # Unique fruit seen so far, not just this frame's
+    counts = fruit_tracker.counts()
+    summary = " ".join(f"{label}: {counts[label]}" for label in ("Ripe", "UnRipe", "OverRipe") if label in counts)
+    stats = adaptive.to_dict()
+    cv2.putText(annotated_frame, f"{sum(counts.values())} mangoes  {summary}  "
+                f"(detector skipped {stats['reuse'] * 100 // max(stats['frames'], 1)}%)", (10, 50),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+
+    # Overlay the pipeline rates
+    capture, inference, display = pipeline.stats()
+    cv2.putText(annotated_frame, f"cam {capture['fps']:.0f} | model {inference['fps']:.1f} FPS | "
+                f"latency {display['latency_p50_ms']:.0f} ms", (10, 25),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
 
     # 7. Display the frame
     cv2.imshow('YOLOv8 Webcam Detection', annotated_frame)
@@ -70,8 +125,20 @@ while True:
     # 8. Exit condition
     if cv2.waitKey(1) & 0xFF == ord('q'):
         print("Exiting...")
-        break
+        return False
+    return True
 
-# 9. Release resources
-cap.release()
-cv2.destroyAllWindows()
+def report(stats):
+    print("Pipeline stats:\n" + format_stats(stats))
+
+# 9. Run: blocks until 'q' is pressed or the camera stops
+pipeline = DetectionPipeline(read_frame, infer)
+try:
+    final_stats = pipeline.run(render, report=report)
+    print("Final pipeline stats:\n" + format_stats(final_stats))
+finally:
+    # 10. Release resources
+    if uploader:
+        uploader.stop()
+    cap.release()
+    cv2.destroyAllWindows()
@@ -0,0 +1,248 @@
+# Adaptive detection scheduling: only run the detector where, and as often
+# as, the picture actually changes.
+#
+# Each frame is compared with the picture the current detections came from
+# on a cheap strided downsample (a few thousand pixels, no OpenCV) split
+# into a grid of tiles:
+#
+#   - no tile changed      -> the previous detections are reused
+#   - a few tiles changed  -> the detector runs only on the changed regions
+#                             and the regions holding tracked objects (with a
+#                             one-tile margin), at the same pixel scale as a
+#                             full-frame pass, and their detections replace
+#                             the old ones there
+#   - most of the frame changed, or 'refresh' frames since the last full
+#     pass                 -> full-frame detection
+#
+# A frame with no changed tile reuses the detections even where objects are
+# tracked: the picture they were found in has not changed.
+#
+# With a latency budget the detector is also rate-limited so that its
+# average cost per frame stays within 'budget_ms': frames between runs reuse
+# the last result, and the stride shrinks again as inference gets cheaper.
+#
+#     detector = AdaptiveDetector(yolo_detect(model), budget_ms=40)
+#     boxes, confidences, mode = detector(frame, tracked=[t.box for t in tracker.tracks])
+
+import math
+import time
+import numpy as np
+from metrics import counter, histogram
+
+MODES = ("full", "roi", "reuse")
+
+# --- Metrics ---
+detect_seconds = histogram("detector_run_seconds", "One detector call (a full frame or one region)")
+frames_total = counter("detector_frames_total", "Frames by how they were detected: full, roi, reuse", ("mode",))
+
+
+def yolo_detect(model, conf=0.1):
+    """ detect(image, imgsz) -> (boxes, confidences) for an Ultralytics model. """
+    def detect(image, imgsz):
+        results = model.predict(source=image, conf=conf, imgsz=imgsz, verbose=False)
+        if not results or not len(results[0].boxes):
+            return np.empty((0, 4)), np.empty(0)
+        return results[0].boxes.xyxy.cpu().numpy(), results[0].boxes.conf.cpu().numpy()
+    return detect
+
+
+def thumbnail(frame, size=(96, 64)):
+    """ Strided grey downsample of a BGR frame to about 'size' (w, h), as int16 for differencing. """
+    h, w = frame.shape[:2]
+    step_x, step_y = max(1, w // size[0]), max(1, h // size[1])
+    small = frame[::step_y, ::step_x]
+    return small.sum(axis=2, dtype=np.int16) // 3 if small.ndim == 3 else small.astype(np.int16)
+
+
+def tile_changes(reference, small, grid):
+    """ Mean absolute grey difference per tile of a (rows, cols) grid. """
+    rows, cols = grid
+    h = small.shape[0] // rows * rows
+    w = small.shape[1] // cols * cols
+    diff = np.abs(small[:h, :w] - reference[:h, :w])
+    return diff.reshape(rows, h // rows, cols, w // cols).mean(axis=(1, 3))
+
+
+def box_tiles(boxes, shape, grid):
+    """ Bool (rows, cols) grid of the tiles of a frame of 'shape' that the (x1, y1, x2, y2) 'boxes' overlap. """
+    rows, cols = grid
+    h, w = shape[:2]
+    covered = np.zeros(grid, dtype=bool)
+    for x1, y1, x2, y2 in np.asarray(boxes, dtype=np.float64).reshape(-1, 4):
+        c0, r0 = max(0, int(x1 * cols // w)), max(0, int(y1 * rows // h))
+        c1, r1 = min(cols, int(math.ceil(x2 * cols / w))), min(rows, int(math.ceil(y2 * rows / h)))
+        covered[r0:r1, c0:c1] = True
+    return covered
+
+
+def changed_regions(changed):
+    """ Bounding (row0, col0, row1, col1) tile ranges (exclusive ends) of the 8-connected groups in a bool grid. """
+    rows, cols = changed.shape
+    seen = np.zeros_like(changed)
+    regions = []
+    for r, c in zip(*np.nonzero(changed)):
+        if seen[r, c]:
+            continue
+        seen[r, c] = True
+        stack, r0, c0, r1, c1 = [(r, c)], r, c, r, c
+        while stack:
+            y, x = stack.pop()
+            r0, c0, r1, c1 = min(r0, y), min(c0, x), max(r1, y), max(c1, x)
+            for ny in range(max(0, y - 1), min(rows, y + 2)):
+                for nx in range(max(0, x - 1), min(cols, x + 2)):
+                    if changed[ny, nx] and not seen[ny, nx]:
+                        seen[ny, nx] = True
+                        stack.append((ny, nx))
+        regions.append((int(r0), int(c0), int(r1) + 1, int(c1) + 1))
+    return regions
+
+
+def detect_regions(changed):
+    """
+    changed_regions of the bool grid grown by one tile, merged until no two
+    overlap, so no tile (and no object in it) is detected twice.
+    """
+    padded = np.pad(changed, 1)
+    rows, cols = changed.shape
+    grown = np.zeros_like(changed)
+    for dy in range(3):
+        for dx in range(3):
+            grown |= padded[dy:dy + rows, dx:dx + cols]
+    while True:
+        regions = changed_regions(grown)
+        filled = np.zeros_like(grown)
+        for r0, c0, r1, c1 in regions:
+            filled[r0:r1, c0:c1] = True
+        if (filled == grown).all():
+            return regions
+        grown = filled # Bounding boxes of separate groups overlapped: re-label them as one
+
+
+class AdaptiveDetector:
+    """
+    Args:
+        detect: Callable(image, imgsz) -> (boxes, confidences), e.g. yolo_detect(model)
+        imgsz: Detector input size for a full frame; regions use the same scale
+        grid: (rows, cols) tiles compared between frames
+        tile_threshold: Mean grey-level change that marks a tile as changed
+        roi_max_fraction: Above this fraction of the frame in changed regions, run full-frame
+        refresh: Full-frame pass at least this often (frames), to pick up anything missed
+        budget_ms: Average detector milliseconds per frame to stay within (None: no rate limit)
+    """
+
+    def __init__(self, detect, imgsz=640, grid=(6, 8), tile_threshold=8.0, roi_max_fraction=0.5,
+                 refresh=30, budget_ms=None):
+        self._detect = detect
+        self.imgsz = imgsz
+        self.grid = grid
+        self.tile_threshold = tile_threshold
+        self.roi_max_fraction = roi_max_fraction
+        self.refresh = refresh
+        self.budget_ms = budget_ms
+        self._reference = None # Thumbnail the current detections describe
+        self._boxes = np.empty((0, 4))
+        self._confidences = np.empty(0)
+        self._since_full = 0
+        self._since_run = 0
+        self._cost_ms = None # EWMA of detector ms per run
+        self.stride = 1 # Frames per detector run allowed by the budget
+        self.frames = 0
+        self.counts = dict.fromkeys(MODES, 0)
+        self.detect_seconds = 0.0
+        self.pixels = 0.0 # Frame-equivalents of pixels sent to the detector
+
+    def _run(self, image, imgsz):
+        start = time.perf_counter()
+        boxes, confidences = self._detect(image, imgsz)
+        elapsed = time.perf_counter() - start
+        self.detect_seconds += elapsed
+        detect_seconds.observe(elapsed)
+        return np.asarray(boxes, dtype=np.float64).reshape(-1, 4), np.asarray(confidences, dtype=np.float64), elapsed
+
+    def _update_stride(self, elapsed):
+        if self.budget_ms is None:
+            return
+        ms = elapsed * 1000
+        self._cost_ms = ms if self._cost_ms is None else 0.8 * self._cost_ms + 0.2 * ms
+        self.stride = max(1, math.ceil(self._cost_ms / self.budget_ms))
+
+    def _full(self, frame, small):
+        self._boxes, self._confidences, elapsed = self._run(frame, self.imgsz)
+        self._reference = small
+        self._since_full = 0
+        self.pixels += 1.0
+        return elapsed
+
+    def _regions(self, frame, small, regions):
+        """ Re-detects inside each (non-overlapping) tile region and keeps old detections elsewhere. """
+        h, w = frame.shape[:2]
+        rows, cols = self.grid
+        tile_h, tile_w = h / rows, w / cols
+        scale = self.imgsz / max(h, w)
+        keep = np.ones(len(self._boxes), dtype=bool)
+        new_boxes, new_conf = [], []
+        elapsed = 0.0
+        for r0, c0, r1, c1 in regions:
+            x0, y0, x1, y1 = int(c0 * tile_w), int(r0 * tile_h), int(math.ceil(c1 * tile_w)), int(math.ceil(r1 * tile_h))
+            # Same pixels-per-input-pixel as the full frame, rounded up to the detector's 32-px stride
+            imgsz = max(32, math.ceil(max(x1 - x0, y1 - y0) * scale / 32) * 32)
+            boxes, confidences, took = self._run(frame[y0:y1, x0:x1], imgsz)
+            elapsed += took
+            self.pixels += (x1 - x0) * (y1 - y0) / (w * h)
+            # Old boxes centred in the region are replaced by what the detector sees there now
+            cx = (self._boxes[:, 0] + self._boxes[:, 2]) / 2
+            cy = (self._boxes[:, 1] + self._boxes[:, 3]) / 2
+            keep &= ~((cx >= x0) & (cx < x1) & (cy >= y0) & (cy < y1))
+            new_boxes.append(boxes + [x0, y0, x0, y0])
+            new_conf.append(confidences)
+            # Only the re-detected tiles now describe the new picture
+            sy, sx = small.shape[0] / rows, small.shape[1] / cols
+            ty0, ty1, tx0, tx1 = int(r0 * sy), int(math.ceil(r1 * sy)), int(c0 * sx), int(math.ceil(c1 * sx))
+            self._reference[ty0:ty1, tx0:tx1] = small[ty0:ty1, tx0:tx1]
+        self._boxes = np.vstack([self._boxes[keep]] + new_boxes)
+        self._confidences = np.concatenate([self._confidences[keep]] + new_conf)
+        return elapsed
+
+    def __call__(self, frame, tracked=()):
+        """
+        Returns (boxes, confidences, mode) for 'frame', mode being 'full', 'roi'
+        or 'reuse'. 'tracked' are (x1, y1, x2, y2) boxes of objects being
+        tracked (e.g. tracker.Tracker's tracks); their tiles are re-detected
+        along with the changed ones.
+        """
+        self.frames += 1
+        self._since_full += 1
+        self._since_run += 1
+        small = thumbnail(frame)
+
+        if self._reference is None or self._reference.shape != small.shape or self._since_full >= self.refresh:
+            mode = "full"
+        elif self._since_run < self.stride:
+            mode = "reuse" # Over the latency budget
+        else:
+            changed = tile_changes(self._reference, small, self.grid) > self.tile_threshold
+            if changed.any() and len(tracked):
+                changed |= box_tiles(tracked, frame.shape, self.grid)
+            if not changed.any():
+                mode = "reuse"
+            elif changed.mean() > self.roi_max_fraction:
+                mode = "full"
+            else:
+                mode = "roi"
+
+        if mode == "full":
+            self._update_stride(self._full(frame, small))
+            self._since_run = 0
+        elif mode == "roi":
+            regions = detect_regions(changed)
+            self._update_stride(self._regions(frame, small, regions))
+            self._since_run = 0
+        self.counts[mode] += 1
+        frames_total.labels(mode).inc()
+        return self._boxes, self._confidences, mode
+
+    def to_dict(self):
+        frames = max(self.frames, 1)
+        return {"frames": self.frames, **self.counts, "stride": self.stride,
+                "detect_ms_per_frame": round(self.detect_seconds / frames * 1000, 2),
+                "pixel_fraction": round(self.pixels / frames, 3)}
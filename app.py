@@ -3,13 +3,22 @@ import eventlet
 eventlet.monkey_patch()
 
 # Now import other modules
+import argparse
 import time
-import math
-import threading
 # import eventlet # Already imported and patched above
-from dronekit import connect, VehicleMode, LocationGlobalRelative, APIException
-from flask import Flask, render_template, jsonify, request
-from flask_socketio import SocketIO, emit
+from flask import Flask, Response, g, render_template, jsonify, request
+from flask_socketio import SocketIO
+from broadcaster import Broadcaster
+from commands import CommandError, CommandRejected
+from fleet import Fleet, FleetError, VehicleLink, REPLAY_PREFIX
+from mission_executor import MissionExecutor, MissionError, SetModeStep
+from mission_compiler import AutoMissionStep, MissionCompileError, legs_to_guided_steps, items_to_guided_steps
+from mission_plans import PlanCompiler, parse_plan
+from coverage_planner import plan_coverage
+from geotag import TelemetryHistory, CameraModel, geotag_frames
+from detection_index import DetectionIndex
+from flight_recorder import FlightRecorder
+import metrics
 
 # --- Flask App Setup ---
 app = Flask(__name__)
@@ -19,104 +28,87 @@ app.config['SECRET_KEY'] = 'your_very_secret_key_change_me_too!'
 socketio = SocketIO(app, async_mode='eventlet')
 
 # --- Global Variables ---
-vehicle = None
-telemetry_data = {}
-update_interval = 1.0
+# Maximum dashboard push rate (Hz) per telemetry field group
+telemetry_rates = {"attitude": 20.0, "position": 5.0, "battery": 1.0, "status": 1.0}
+keyframe_interval = 10.0 # Seconds between full telemetry keyframes
 running = True # Flag to control background threads
+connection_string = 'tcp:127.0.0.1:5762' # Use the correct port identified earlier (see --connect)
+replay_source = None # 'synthetic' or a flight log directory to replay instead of connecting (see --replay)
+replay_speed = 1.0 # Replay speed multiplier; None is as fast as possible
+flight_id = time.strftime('%Y%m%d-%H%M%S') # This session; names its flight logs and groups its detections
+parameter_cache_dir = 'params' # Each vehicle's parameters from its last session (see connection.ParameterCache)
+# Vehicles by ID (see fleet.py). Routes without /vehicles/<id> act on the first one added.
+fleet = Fleet()
+# Stack sampling across every thread, switched on with --profile or POST /metrics/profile/start
+profiler = metrics.SamplingProfiler()
+
+# --- Metrics ---
+# Read when /metrics is scraped, so they cost nothing in between
+def socket_queues():
+    return [socket.queue.qsize() for socket in list(socketio.server.eio.sockets.values())]
+
+metrics.gauge("socketio_clients", "Connected Socket.IO clients", function=lambda: len(socketio.server.eio.sockets))
+metrics.gauge("socketio_queue_depth_max", "Longest client transport queue (packets)",
+              function=lambda: max(socket_queues(), default=0))
+metrics.gauge("socketio_queue_depth_total", "Packets waiting in all client transport queues",
+              function=lambda: sum(socket_queues()))
+metrics.gauge("fleet_vehicles", "Vehicles registered", function=lambda: len(fleet))
+request_seconds = metrics.histogram("http_request_seconds", "Flask request handling time", ("route",))
+
+# --- Vehicles ---
+
+def emit_telemetry(link, data):
+    """ Records a vehicle's latest telemetry and pushes the changed fields to its web clients. """
+    now = time.time()
+    link.history.record(now, data)
+    link.recorder.record_telemetry(data, now)
+    link.broadcaster.publish_telemetry(data)
+
+def record_connection(link, state, detail):
+    print(f"Vehicle {link.id}: {state}")
+    link.recorder.record_event("connection", state, detail)
+
+def add_vehicle(vehicle_id, connection):
+    """
+    Registers a vehicle with its own flight recorder, Socket.IO stream and
+    mission executor, and starts its connection supervisor.
+    """
+    if vehicle_id in fleet:
+        raise FleetError(f"Vehicle {vehicle_id} already exists")
+    link = VehicleLink(vehicle_id, connection, emit_telemetry, record_connection,
+                       group_rates=telemetry_rates, replay_speed=replay_speed, param_cache=parameter_cache_dir)
+    # The first vehicle keeps the single-vehicle names (flights/<flight_id>)
+    link.flight = flight_id if not len(fleet) else f"{flight_id}-{link.id}"
+    link.history = TelemetryHistory() # Vehicle pose over time, for geotagging detections
+    # Every telemetry sample and command/mission event, replayable with flight_recorder.FlightLog
+    link.recorder = FlightRecorder(f'flights/{link.flight}').start()
+    # Per-topic delta frames, subscription groups and per-client rates (see broadcaster.py)
+    link.broadcaster = Broadcaster(socketio, keyframe_interval=keyframe_interval, stream=link.id).start()
+    link.missions = MissionExecutor(lambda: link.vehicle, lambda mission: emit_mission_progress(link, mission),
+                                    get_commands=lambda: link.commands)
+    return fleet.add(link)
+
+def remove_vehicle(vehicle_id):
+    link = fleet.remove(vehicle_id)
+    link.broadcaster.stop()
+    link.recorder.close()
+    print(f"Vehicle {link.id} removed; flight log: {link.recorder.to_dict()}")
+    return link
+
+def vehicle_route(rule, **options):
+    """
+    Registers a view for the default vehicle at 'rule' and for any vehicle at
+    '/vehicles/<vehicle_id>' + rule; the view receives 'vehicle_id' (None for the default).
+    """
+    def decorator(view):
+        app.add_url_rule(rule, view.__name__, view, defaults={"vehicle_id": None}, **options)
+        app.add_url_rule('/vehicles/<vehicle_id>' + rule, view.__name__, view, **options)
+        return view
+    return decorator
 
-# --- DroneKit Functions ---
-
-def connect_vehicle():
-    """ Connects to the vehicle using DroneKit. Runs in a separate thread. """
-    global vehicle
-    connection_string = 'tcp:127.0.0.1:5762' # Use the correct port identified earlier
-    print(f"Attempting to connect to vehicle on: {connection_string}")
-
-    while running and vehicle is None: # Keep trying while running and not connected
-        try:
-            print(f"Connecting to vehicle on: {connection_string}")
-            vehicle = connect(connection_string, wait_ready=True, timeout=60, heartbeat_timeout=30)
-            print("Vehicle connected successfully.")
-
-            if not any(t.name == 'TelemetryThread' for t in threading.enumerate()):
-                telemetry_thread = threading.Thread(target=telemetry_update_loop, name='TelemetryThread', daemon=True)
-                telemetry_thread.start()
-
-            break # Exit loop on successful connection
-        except APIException as api_error:
-            print(f"DroneKit API Error connecting to vehicle: {api_error}")
-            vehicle = None # Ensure vehicle is None on failure
-        except Exception as e:
-            print(f"Error connecting to vehicle: {e}")
-            vehicle = None # Ensure vehicle is None on failure
-
-        if vehicle is None and running:
-            print("Connection failed, retrying in 5 seconds...")
-            time.sleep(5) # Wait before retrying
-
-    if not running:
-        print("Connection attempt aborted.")
-
-def get_telemetry():
-    """ Fetches telemetry data from the connected vehicle. """
-    # Check if vehicle object exists and seems valid before accessing attributes
-    if not vehicle:
-         return {}
-    # Basic check for essential attributes existence
-    if not vehicle.location or not vehicle.location.global_relative_frame or \
-       not vehicle.attitude or not vehicle.battery or not vehicle.gps_0 or \
-       not vehicle.mode or not vehicle.system_status:
-        print("Warning: Vehicle object present but some essential attributes are None.")
-        return {}
-
-    telemetry = {}
-    try:
-        loc = vehicle.location.global_relative_frame
-        att = vehicle.attitude
-        bat = vehicle.battery
-        gps = vehicle.gps_0
-
-        telemetry = {
-            "latitude": loc.lat, "longitude": loc.lon, "altitude": loc.alt,
-            "groundspeed": vehicle.groundspeed, "airspeed": vehicle.airspeed,
-            "heading": vehicle.heading, "roll": math.degrees(att.roll),
-            "pitch": math.degrees(att.pitch), "yaw": math.degrees(att.yaw),
-            "battery_voltage": bat.voltage, "battery_current": bat.current,
-            "battery_level": bat.level, "mode": vehicle.mode.name,
-            "armed": vehicle.armed, "is_armable": vehicle.is_armable,
-            "system_status": vehicle.system_status.state,
-            "gps_fix": gps.fix_type, "gps_satellites": gps.satellites_visible,
-        }
-    except Exception as e:
-        # Catch potential errors if attributes become invalid mid-access (e.g., during disconnect)
-        print(f"Error accessing vehicle attributes for telemetry: {e}")
-        return {} # Return empty on error
-
-    return telemetry
-
-def telemetry_update_loop():
-    """ Periodically fetches telemetry and emits it via WebSocket. """
-    global telemetry_data
-    print("Telemetry loop started.")
-    while running:
-        # Use simplified check - rely on vehicle object existing
-        if vehicle:
-            try:
-                current_telemetry = get_telemetry()
-                if current_telemetry: # Only update if we got valid data
-                    telemetry_data = current_telemetry
-                    # print("Emitting telemetry update") # Debugging
-                    socketio.emit('telemetry_update', telemetry_data)
-                # else:
-                    # print("Got empty telemetry data.") # Debugging
-            except Exception as e:
-                print(f"Error in telemetry loop getting/emitting data: {e}")
-        else:
-             # Vehicle object is None, connection likely lost or never established
-             pass # connect_vehicle handles reconnection attempts
-
-        eventlet.sleep(update_interval)
-    print("Telemetry loop stopped.")
+@app.errorhandler(FleetError)
+def fleet_error(e):
+    return jsonify({"status": "error", "message": str(e)}), 404
 
 
 # --- Flask Routes ---
@@ -126,27 +118,112 @@ def index():
     """ Serves the main HTML page. """
     return render_template('index.html') # Assumes index.html is in 'templates' folder
 
-@app.route('/command/arm', methods=['POST'])
-def command_arm():
-    """ Handles the ARM command from the web interface. """
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    started = g.get('request_started')
+    if started is not None:
+        rule = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        request_seconds.labels(rule).observe(time.perf_counter() - started)
+    return response
+
+@app.after_request
+def record_command(response):
+    """ Logs every command and mission request with its HTTP status to that vehicle's flight recorder. """
+    path = request.path
+    vehicle_id = (request.view_args or {}).get('vehicle_id')
+    if path.startswith('/vehicles/'):
+        path = '/' + path.split('/', 3)[-1] # /vehicles/<id>/command/arm -> /command/arm
+    if request.method == 'POST' and path.startswith(('/command/', '/mission/')):
+        try:
+            fleet.get(vehicle_id).recorder.record_event("command", path, request.query_string.decode() or None,
+                                                        value=response.status_code)
+        except FleetError:
+            pass
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """ Every counter, gauge and histogram in the Prometheus text format. """
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/metrics/profile', methods=['GET'])
+def get_profile():
+    """ Sampling profiler state and its hottest stacks; ?format=folded for flamegraph.pl / speedscope. """
+    if request.args.get('format') == 'folded':
+        return Response(profiler.folded(), mimetype='text/plain')
+    return jsonify(dict(profiler.to_dict(top=request.args.get('top', 10, type=int)), status="success"))
+
+@app.route('/metrics/profile/<action>', methods=['POST'])
+def control_profile(action):
+    """ 'start', 'stop' or 'reset' the sampling profiler. """
+    if action not in ('start', 'stop', 'reset'):
+        return jsonify({"status": "error", "message": f"Unknown action '{action}'"}), 400
+    getattr(profiler, action)()
+    return jsonify(dict(profiler.to_dict(top=0), status="success"))
+
+# --- Fleet ---
+
+@app.route('/vehicles', methods=['GET'])
+def list_vehicles():
+    """ Every vehicle with its connection state and latest position. """
+    return jsonify(dict(fleet.to_dict(), status="success"))
+
+@app.route('/vehicles', methods=['POST'])
+def create_vehicle():
+    """ Adds a vehicle: {"id": "3", "connection": "tcp:10.0.0.13:5760"} (or 'replay:synthetic'). """
+    body = request.get_json(silent=True) or {}
+    if not body.get("id") or not body.get("connection"):
+        return jsonify({"status": "error", "message": "Give the vehicle's 'id' and 'connection'"}), 400
+    try:
+        link = add_vehicle(str(body["id"]), body["connection"])
+    except FleetError as e:
+        return jsonify({"status": "error", "message": str(e)}), 409
+    return jsonify(dict(link.to_dict(), status="success"))
+
+@app.route('/vehicles/<vehicle_id>', methods=['GET'])
+def get_vehicle(vehicle_id):
+    return jsonify(dict(fleet.get(vehicle_id).to_dict(), status="success"))
+
+@app.route('/vehicles/<vehicle_id>', methods=['DELETE'])
+def delete_vehicle(vehicle_id):
+    """ Disconnects a vehicle and closes its flight log. """
+    remove_vehicle(vehicle_id)
+    return jsonify({"status": "success", "message": f"Vehicle {vehicle_id} removed"})
+
+@vehicle_route('/parameters/<name>', methods=['GET'])
+def get_parameter(vehicle_id, name):
+    """ One autopilot parameter: live, from the parameter cache until the download completes, or fetched. """
+    try:
+        value, source = fleet.get(vehicle_id).parameters.get(name.upper())
+    except KeyError:
+        return jsonify({"status": "error", "message": f"Unknown parameter {name}"}), 404
+    return jsonify({"status": "success", "name": name.upper(), "value": value, "source": source})
+
+# --- Commands ---
+
+@vehicle_route('/command/arm', methods=['POST'])
+def command_arm(vehicle_id):
+    """ Handles the ARM command from the web interface; returns once the autopilot acknowledges it. """
+    link = fleet.get(vehicle_id)
+    vehicle = link.vehicle
     if vehicle:
         if not vehicle.armed:
             # Re-check armability right before arming
             if vehicle.is_armable:
                 try:
                     print("Received ARM command from web")
-                    vehicle.mode = VehicleMode("GUIDED")
-                    time.sleep(0.5) # Short pause
-                    vehicle.armed = True
-                    start_time = time.time()
-                    while not vehicle.armed:
-                        if time.time() - start_time > 5:
-                             print("Arming timed out.")
-                             return jsonify({"status": "error", "message": "Arming timed out"}), 500
-                        time.sleep(0.2)
-                    print("Vehicle armed successfully via web command.")
+                    link.commands.set_mode("GUIDED").result()
+                    result = link.commands.arm().result()
+                    print(f"Vehicle armed successfully via web command ({result.rtt * 1000:.0f} ms).")
                     return jsonify({"status": "success", "message": "Vehicle armed"})
-                except Exception as e:
+                except CommandRejected as e:
+                    print(f"Arming rejected: {e}")
+                    return jsonify({"status": "error", "message": f"Arming failed: {e}"}), 400
+                except CommandError as e:
                     print(f"Error during arming: {e}")
                     return jsonify({"status": "error", "message": f"Arming failed: {e}"}), 500
             else:
@@ -159,10 +236,40 @@ def command_arm():
         print("Arm command received, but vehicle not connected.")
         return jsonify({"status": "error", "message": "Vehicle not connected"}), 500
 
-# --- MODIFIED: Renamed route and function ---
-@app.route('/command/start_mission', methods=['POST'])
-def command_start_mission():
-    """ Handles the START MISSION command with the specified flight plan """
+def emit_mission_progress(link, mission):
+    """ Streams a vehicle's mission state changes to all web clients. """
+    link.recorder.record_event("mission", mission["state"], mission["step_description"] or mission["message"],
+                               mission=mission["mission_id"], value=mission["step"])
+    socketio.emit('mission_progress', dict(mission, vehicle=link.id))
+
+# --- Default Mission ---
+# Takeoff, fly 30 m, turn left 30 degrees, fly 20 m climbing to 15 m
+default_mission_legs = [
+    {"type": "takeoff", "altitude": 10.0},
+    {"type": "forward", "distance": 30.0},
+    {"type": "turn", "angle": 30.0, "direction": -1}, # Degrees left
+    {"type": "forward", "distance": 20.0, "altitude": 15.0},
+]
+default_groundspeed = 5 # m/s, adjust as needed
+default_survey_altitude = 15.0 # m, coverage surveys
+default_camera_fov = 62.2 # degrees, horizontal FOV of the survey camera
+
+def build_mission_steps(legs, groundspeed, execution="auto"):
+    """
+    Builds executor steps for 'legs'. 'auto' uploads the whole mission to the
+    autopilot and flies it in AUTO; 'guided' sends one goto per leg.
+    """
+    if execution == "guided":
+        return [SetModeStep("GUIDED")] + legs_to_guided_steps(legs, groundspeed)
+    if execution == "auto":
+        return [AutoMissionStep(legs, groundspeed)]
+    raise MissionCompileError(f"Unknown execution mode {execution!r}")
+
+@vehicle_route('/command/start_mission', methods=['POST'])
+def command_start_mission(vehicle_id):
+    """ Starts the default flight plan in the background and returns its mission ID. """
+    link = fleet.get(vehicle_id)
+    vehicle = link.vehicle
     if not vehicle:
         print("Start Mission command received, but vehicle not connected.")
         return jsonify({"status": "error", "message": "Vehicle not connected"}), 500
@@ -171,138 +278,157 @@ def command_start_mission():
         print("Start Mission command received, but vehicle not armed.")
         return jsonify({"status": "error", "message": "Vehicle not armed"}), 400
 
-    print("Received START MISSION command from web")
+    options = request.get_json(silent=True) or {}
+    execution = options.get("execution", "auto")
+    print(f"Received START MISSION command from web ({execution})")
+    try:
+        steps = build_mission_steps(default_mission_legs, default_groundspeed, execution)
+        mission = link.missions.start(steps, name="default")
+    except MissionCompileError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except MissionError as e:
+        print(f"Cannot start mission: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 409
+    return jsonify({"status": "success", "message": f"Mission {mission.id} started",
+                    "mission_id": mission.id})
+
+plan_compiler = PlanCompiler()
+
+def plan_origin(vehicle):
+    """ (home, heading) to compile plans against, or None until the vehicle has reported both after connecting. """
+    home = vehicle.location.global_relative_frame
+    if home is None or None in (home.lat, home.lon, home.alt, vehicle.heading):
+        return None
+    return home, vehicle.heading
+
+@vehicle_route('/mission/plan', methods=['POST'])
+def mission_plan(vehicle_id):
+    """
+    Accepts a JSON or YAML mission plan, compiles it against the vehicle's
+    current position (cached per plan and home) and starts it.
+    Add '?dry_run=1' to only compile and return the waypoints.
+    """
+    link = fleet.get(vehicle_id)
+    vehicle = link.vehicle
+    if not vehicle:
+        print("Mission plan received, but vehicle not connected.")
+        return jsonify({"status": "error", "message": "Vehicle not connected"}), 500
+    origin = plan_origin(vehicle)
+    if origin is None:
+        return jsonify({"status": "error", "message": "Vehicle position not ready yet"}), 503
 
-    # --- Mission Parameters ---
-    takeoff_alt = 10.0
-    first_leg_dist = 30.0
-    turn_angle_deg = 30.0 # Degrees left
-    second_leg_dist = 20.0
-    final_alt = 15.0
-    groundspeed = 5 # m/s, adjust as needed
+    dry_run = request.args.get('dry_run', '0') not in ('0', 'false', '')
+    try:
+        plan = parse_plan(request.get_data(as_text=True), request.content_type)
+        compiled, cached = plan_compiler.compile(plan, *origin)
+    except MissionCompileError as e:
+        print(f"Rejected mission plan: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    print(f"Compiled plan '{compiled.name}' ({len(compiled.items)} items, "
+          f"{'cached' if cached else f'{compiled.compile_time * 1000:.2f} ms'})")
+    result = dict(compiled.to_dict(include_waypoints=dry_run), cached=cached)
+    if dry_run:
+        return jsonify(dict(result, status="success", message="Plan compiled"))
+
+    return start_compiled_plan(link, compiled, result)
+
+def start_compiled_plan(link, compiled, result, timeout=None):
+    """ Starts a compiled plan on the vehicle's executor; 'result' is merged into the JSON response. """
+    if not link.vehicle.armed:
+        return jsonify(dict(result, status="error", message="Vehicle not armed")), 400
+    if compiled.execution == "guided":
+        steps = [SetModeStep("GUIDED")] + items_to_guided_steps(compiled.items, compiled.groundspeed)
+    else:
+        steps = [AutoMissionStep(items=compiled.items, groundspeed=compiled.groundspeed)]
+        if timeout is not None:
+            steps[0].timeout = max(steps[0].timeout, timeout)
+    try:
+        mission = link.missions.start(steps, name=compiled.name or compiled.hash[:8])
+    except MissionError as e:
+        return jsonify(dict(result, status="error", message=str(e))), 409
+    return jsonify(dict(result, status="success", message=f"Mission {mission.id} started",
+                        mission_id=mission.id))
+
+@vehicle_route('/mission/coverage', methods=['POST'])
+def mission_coverage(vehicle_id):
+    """
+    Plans a lawnmower survey over a field and flies it. JSON body:
+    'field' ([[lat, lon], ...]), optional 'keep_out' (list of polygons),
+    'altitude', 'fov' (camera degrees across track), 'overlap', 'heading'
+    (row direction; default is the field's narrowest direction), 'groundspeed'
+    and 'execution'. Add '?dry_run=1' to only plan and return the waypoints.
+    """
+    link = fleet.get(vehicle_id)
+    vehicle = link.vehicle
+    if not vehicle:
+        print("Coverage request received, but vehicle not connected.")
+        return jsonify({"status": "error", "message": "Vehicle not connected"}), 500
+    origin = plan_origin(vehicle)
+    if origin is None:
+        return jsonify({"status": "error", "message": "Vehicle position not ready yet"}), 503
 
+    dry_run = request.args.get('dry_run', '0') not in ('0', 'false', '')
+    options = request.get_json(silent=True) or {}
+    home, heading = origin
     try:
-        # 1. Set Mode to GUIDED
-        if vehicle.mode.name != "GUIDED":
-            print("Setting mode to GUIDED...")
-            vehicle.mode = VehicleMode("GUIDED")
-            time.sleep(1) # Wait for mode change
-            if vehicle.mode.name != "GUIDED":
-                raise Exception("Failed to set GUIDED mode.")
-        print("Mode set to GUIDED.")
-
-        # 2. Takeoff to 10 meters
-        print(f"Taking off to {takeoff_alt}m...")
-        vehicle.simple_takeoff(takeoff_alt)
-        while True:
-            current_altitude = vehicle.location.global_relative_frame.alt
-            print(f"  Altitude: {current_altitude:.2f}m")
-            if current_altitude >= takeoff_alt * 0.95:
-                print("Reached target takeoff altitude.")
-                break
-            time.sleep(1)
-
-        # 3. Fly straight 30 meters
-        print(f"Flying forward {first_leg_dist}m...")
-        start_location = vehicle.location.global_relative_frame
-        current_heading_rad = math.radians(vehicle.heading)
-        dNorth = math.cos(current_heading_rad) * first_leg_dist
-        dEast = math.sin(current_heading_rad) * first_leg_dist
-        target_location1 = get_location_metres(start_location, dNorth, dEast)
-        # Maintain takeoff altitude for this leg
-        target_location1.alt = takeoff_alt
-        print(f"  Target Location 1: Lat={target_location1.lat}, Lon={target_location1.lon}, Alt={target_location1.alt}")
-        vehicle.simple_goto(target_location1, groundspeed=groundspeed)
-
-        # Wait to reach the first target
-        while True:
-            current_location = vehicle.location.global_relative_frame
-            remaining_distance = get_distance_metres(current_location, target_location1)
-            print(f"  Distance to target 1: {remaining_distance:.2f}m")
-            if remaining_distance <= 2.0: # Allow some tolerance
-                print("Reached target location 1.")
-                break
-            time.sleep(1)
-
-        # 4. Turn left 30 degrees
-        # 4. Turn left 30 degrees
-        print(f"Turning left by {turn_angle_deg} degrees...")
-        # --- REMOVE THIS LINE ---
-        # vehicle.condition_yaw(turn_angle_deg, relative=True, direction=-1)
-
-        # --- ADD THESE LINES ---
-        # Import mavutil if you haven't already at the top of the file
-        from pymavlink import mavutil # Add this import at the top
-
-        # Create the MAV_CMD_CONDITION_YAW command
-        msg = vehicle.message_factory.command_long_encode(
-            0, 0,       # target system, target component
-            mavutil.mavlink.MAV_CMD_CONDITION_YAW, #command
-            0,          #confirmation
-            turn_angle_deg, # param 1: target angle in degrees
-            0,          # param 2: yaw speed (ignored by ArduPilot, use 0)
-            -1,         # param 3: direction (-1: ccw, 1: cw)
-            1,          # param 4: relative offset (1 for relative, 0 for absolute)
-            0, 0, 0)    # param 5 ~ 7 not used
-        # Send command to vehicle
-        vehicle.send_mavlink(msg)
-        # --- END OF ADDED LINES ---
-
-        time.sleep(5) # Increase sleep time slightly to ensure turn completes
-        print(f"  New heading: {vehicle.heading:.2f} degrees")
-
-
-        # 5. Fly straight 20 meters and change altitude to 15 meters
-        print(f"Flying forward {second_leg_dist}m to {final_alt}m altitude...")
-        start_location2 = vehicle.location.global_relative_frame
-        current_heading_rad = math.radians(vehicle.heading) # Use the new heading
-        dNorth = math.cos(current_heading_rad) * second_leg_dist
-        dEast = math.sin(current_heading_rad) * second_leg_dist
-
-        # Calculate the location part first (altitude will be set directly)
-        target_location2_intermediate = get_location_metres(start_location2, dNorth, dEast)
-
-        # Create the final target location with the desired altitude
-        target_location2 = LocationGlobalRelative(
-            target_location2_intermediate.lat,
-            target_location2_intermediate.lon,
-            final_alt # Set the target altitude here
-        )
-
-        print(f"  Target Location 2: Lat={target_location2.lat}, Lon={target_location2.lon}, Alt={target_location2.alt}")
-        vehicle.simple_goto(target_location2, groundspeed=groundspeed)
-
-        # Wait to reach the final target location and altitude
-        while True:
-            current_location = vehicle.location.global_relative_frame
-            remaining_distance = get_distance_metres(current_location, target_location2)
-            altitude_diff = abs(current_location.alt - final_alt)
-            print(f"  Distance to target 2: {remaining_distance:.2f}m, Altitude difference: {altitude_diff:.2f}m")
-            # Check both distance and altitude are close
-            if remaining_distance <= 2.0 and altitude_diff <= 1.0: # Allow tolerance
-                print("Reached final target location and altitude.")
-                break
-            time.sleep(1)
-
-        print("Mission completed successfully.")
-        return jsonify({"status": "success", "message": "Mission completed successfully"})
-
-    except APIException as api_error:
-        print(f"DroneKit API Error during mission: {api_error}")
-        return jsonify({"status": "error", "message": f"DroneKit API Error: {api_error}"}), 500
-    except Exception as e:
-        print(f"Error during mission execution: {e}")
-        return jsonify({"status": "error", "message": f"Mission failed: {e}"}), 500
-
-@app.route('/command/rtl', methods=['POST'])
-def command_rtl():
-    """ Handles the RTL command """
-    if vehicle:
+        altitude = float(options.get("altitude", default_survey_altitude))
+        groundspeed = options.get("groundspeed", default_groundspeed)
+        path = plan_coverage(options.get("field"), altitude, float(options.get("fov", default_camera_fov)),
+                             overlap=float(options.get("overlap", 0.2)), heading=options.get("heading"),
+                             keep_out=options.get("keep_out") or [], start=(home.lat, home.lon))
+        plan = path.to_plan(altitude, name=options.get("name", "coverage"), groundspeed=groundspeed,
+                            execution=options.get("execution", "auto"))
+        compiled, cached = plan_compiler.compile(plan, home, heading)
+    except (TypeError, ValueError) as e: # Includes MissionCompileError
+        print(f"Rejected coverage request: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    print(f"Planned coverage: {path.rows} rows, {path.turns} turns, {path.length:.0f} m "
+          f"in {path.plan_time * 1000:.1f} ms")
+    result = dict(compiled.to_dict(), coverage=path.to_dict(include_waypoints=dry_run), cached=cached)
+    if dry_run:
+        return jsonify(dict(result, status="success", message="Coverage planned"))
+    # Allow three times the nominal flight time before the executor gives up
+    return start_compiled_plan(link, compiled, result, timeout=3 * path.length / (groundspeed or default_groundspeed))
+
+@vehicle_route('/mission/<int:mission_id>', methods=['GET'])
+def mission_status(vehicle_id, mission_id):
+    """ Returns the current state of a mission. """
+    try:
+        return jsonify(fleet.get(vehicle_id).missions.get(mission_id).to_dict())
+    except MissionError as e:
+        return jsonify({"status": "error", "message": str(e)}), 404
+
+@vehicle_route('/mission/<int:mission_id>/<action>', methods=['POST'])
+def mission_control(vehicle_id, mission_id, action):
+    """ Pauses, resumes or aborts a running mission. """
+    mission_executor = fleet.get(vehicle_id).missions
+    handlers = {"pause": mission_executor.pause, "resume": mission_executor.resume,
+                "abort": mission_executor.abort}
+    if action not in handlers:
+        return jsonify({"status": "error", "message": f"Unknown mission action '{action}'"}), 404
+    try:
+        mission_executor.get(mission_id)
+    except MissionError as e:
+        return jsonify({"status": "error", "message": str(e)}), 404
+    try:
+        print(f"Received mission {action.upper()} command for mission {mission_id}")
+        handlers[action](mission_id)
+    except MissionError as e:
+        return jsonify({"status": "error", "message": str(e)}), 409
+    return jsonify({"status": "success", "message": f"Mission {mission_id} {action} requested"})
+
+@vehicle_route('/command/rtl', methods=['POST'])
+def command_rtl(vehicle_id):
+    """ Handles the RTL command; returns once the autopilot acknowledges it. """
+    link = fleet.get(vehicle_id)
+    if link.vehicle:
         try:
              print("Received RTL command from web")
-             vehicle.mode = VehicleMode("RTL")
+             link.commands.rtl().result()
              return jsonify({"status": "success", "message": "RTL mode initiated"})
-        except Exception as e:
+        except CommandError as e:
              print(f"Error setting RTL: {e}")
              return jsonify({"status": "error", "message": f"Failed to set RTL: {e}"}), 500
     else:
@@ -310,86 +436,157 @@ def command_rtl():
          return jsonify({"status": "error", "message": "Vehicle not connected"}), 500
 
 
-# --- WebSocket Events ---
-@socketio.on('connect')
-def handle_connect():
-    """ Handles new WebSocket connections from web clients. """
-    print('Web client connected:', request.sid)
-    if telemetry_data: emit('telemetry_update', telemetry_data)
+# --- Geotagged Detections ---
+detection_db_path = 'detections.db'
+detection_index = None # DetectionIndex, opened at startup (importing app does no I/O)
+camera_model = CameraModel(default_camera_fov)
 
-@socketio.on('disconnect')
-def handle_disconnect():
-    """ Handles WebSocket disconnections. """
-    print('Web client disconnected:', request.sid)
+def parse_bbox(text):
+    """ 'south,west,north,east' -> tuple of floats. """
+    values = [float(v) for v in text.split(',')]
+    if len(values) != 4 or values[0] > values[2] or values[1] > values[3]:
+        raise ValueError("bbox must be 'south,west,north,east'")
+    return tuple(values)
 
-def get_location_metres(original_location, dNorth, dEast):
+@app.route('/detections', methods=['POST'])
+def add_detections():
     """
-    Returns a LocationGlobalRelative object containing the latitude/longitude
-    'dNorth' and 'dEast' metres from the specified 'original_location'.
-    The returned LocationGlobalRelative has the same altitude as the original location.
-
-    Args:
-        original_location: LocationGlobalRelative object
-        dNorth: Distance north in meters
-        dEast: Distance east in meters
-
-    Returns:
-        LocationGlobalRelative object
+    Geotags and stores detections. JSON body: {"frames": [...]} or one frame,
+    each with 'captured_at' (unix seconds), 'width', 'height', 'boxes'
+    ([[x1, y1, x2, y2], ...]) and optional 'confidences', 'ripeness' and
+    'track_ids'. Frames are matched to the telemetry the vehicle ('vehicle',
+    default the first one) recorded at that time.
     """
-    earth_radius = 6378137.0 # Radius of "spherical" earth
-    # Coordinate offsets in radians
-    dLat = dNorth / earth_radius
-    dLon = dEast / (earth_radius * math.cos(math.pi * original_location.lat / 180))
-
-    # New position in decimal degrees
-    newlat = original_location.lat + (dLat * 180 / math.pi)
-    newlon = original_location.lon + (dLon * 180 / math.pi)
-    return LocationGlobalRelative(newlat, newlon, original_location.alt)
+    body = request.get_json(silent=True) or {}
+    frames = body.get("frames", [body] if "boxes" in body else [])
+    link = fleet.get(body.get("vehicle"))
+    try:
+        detections = geotag_frames(frames, link.history, camera_model)
+        stored = detection_index.add(detections, flight=body.get("flight", link.flight))
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": f"Invalid detections: {e}"}), 400
+    if stored:
+        link.broadcaster.publish("detections", detection_index.to_dict())
+    return jsonify({"status": "success", "stored": stored, "dropped": detections["dropped"]})
+
+@app.route('/detections', methods=['GET'])
+def get_detections():
+    """ Detections in '?bbox=s,w,n,e' or within '?lat=&lon=&radius=' metres; optional 'flight' and 'limit'. """
+    try:
+        limit = int(request.args.get('limit', 5000))
+        flight = request.args.get('flight')
+        if 'bbox' in request.args:
+            rows = detection_index.query_bbox(*parse_bbox(request.args['bbox']), flight=flight, limit=limit)
+        else:
+            rows = detection_index.query_radius(float(request.args['lat']), float(request.args['lon']),
+                                                float(request.args.get('radius', 10.0)), flight=flight, limit=limit)
+    except (KeyError, ValueError) as e:
+        return jsonify({"status": "error", "message": f"Give bbox=s,w,n,e or lat, lon and radius ({e})"}), 400
+    return jsonify({"status": "success", "count": len(rows), "detections": rows})
+
+@app.route('/detections/trees', methods=['GET'])
+def get_detection_trees():
+    """ Per-tree detection and fruit counts in '?bbox=s,w,n,e'. """
+    try:
+        trees = detection_index.trees(*parse_bbox(request.args.get('bbox', '')))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify({"status": "success", "count": len(trees), "trees": trees})
 
-def get_distance_metres(aLocation1, aLocation2):
-    """
-    Returns the ground distance in metres between two LocationGlobal objects.
+@app.route('/detections/heatmap/<int:z>/<int:x>/<int:y>.png', methods=['GET'])
+def get_detection_heatmap(z, x, y):
+    """ Slippy-map heat-map tile of detection density (transparent PNG). """
+    if not 0 <= z <= 24 or not 0 <= x < 2 ** z or not 0 <= y < 2 ** z:
+        return jsonify({"status": "error", "message": "Tile out of range"}), 404
+    response = Response(detection_index.heatmap_tile(z, x, y), mimetype='image/png')
+    response.headers['Cache-Control'] = 'max-age=10'
+    return response
 
-    This method is an approximation, and will not be accurate over large distances and close to the
-    earth's poles. It comes from the ArduPilot test code:
-    https://github.com/diydrones/ardupilot/blob/master/Tools/autotest/common.py
 
-    Args:
-        aLocation1: LocationGlobal or LocationGlobalRelative object
-        aLocation2: LocationGlobal or LocationGlobalRelative object
+# --- WebSocket Events ---
+@socketio.on('connect')
+def handle_connect():
+    """ Handles new WebSocket connections from web clients. """
+    print('Web client connected:', request.sid)
+    if len(fleet):
+        fleet.get().broadcaster.add_client(request.sid) # Default vehicle, every topic at full rate, until it subscribes
 
-    Returns:
-        Ground distance in meters
+@socketio.on('subscribe')
+def handle_subscribe(data):
+    """
+    Sets the client's topics and rates for a vehicle (default the first one), e.g.
+    {"vehicle": "2", "topics": {"attitude": 10, "position": 2}}; acks the result.
     """
-    dlat = aLocation2.lat - aLocation1.lat
-    dlong = aLocation2.lon - aLocation1.lon
-    return math.sqrt((dlat*dlat) + (dlong*dlong)) * 1.113195e5 # Distance in meters
+    data = data or {}
+    try:
+        broadcaster = fleet.get(data.get("vehicle")).broadcaster
+    except FleetError as e:
+        return {"error": str(e)}
+    if request.sid not in broadcaster:
+        return broadcaster.add_client(request.sid, data.get("topics"))
+    return broadcaster.subscribe(request.sid, data.get("topics"))
+
+@socketio.on('unsubscribe')
+def handle_unsubscribe(data):
+    """ Stops a vehicle's stream for this client: {"vehicle": "2"}. """
+    try:
+        fleet.get((data or {}).get("vehicle")).broadcaster.remove_client(request.sid)
+    except FleetError as e:
+        return {"error": str(e)}
+    return {}
 
+@socketio.on('disconnect')
+def handle_disconnect():
+    """ Handles WebSocket disconnections. """
+    print('Web client disconnected:', request.sid)
+    for link in fleet:
+        link.broadcaster.remove_client(request.sid)
 
 
 # --- Main Execution ---
 if __name__ == '__main__':
-    connect_thread = threading.Thread(target=connect_vehicle, name='DroneConnectThread', daemon=True)
-    connect_thread.start()
-
-    print("Starting web server on http://127.0.0.1:5000")
+    parser = argparse.ArgumentParser(description="Drone ground station web server")
+    parser.add_argument('--connect', default=connection_string, help="DroneKit connection string")
+    parser.add_argument('--port', type=int, default=5000, help="web server port")
+    parser.add_argument('--replay', metavar='SOURCE',
+                        help="replay 'synthetic' or a recorded flight directory (flights/<id>) instead of the vehicle")
+    parser.add_argument('--speed', default='1', help="replay speed: 1, 10, ... or 'max'")
+    parser.add_argument('--vehicle', action='append', default=[], metavar='ID=CONNECTION',
+                        help="add a vehicle, e.g. 2=tcp:10.0.0.12:5760 or 3=replay:synthetic (repeatable); "
+                             "without any, one vehicle '1' uses --connect / --replay")
+    parser.add_argument('--profile', action='store_true',
+                        help="start the sampling profiler (GET /metrics/profile?format=folded)")
+    cli_args = parser.parse_args()
+    connection_string = cli_args.connect
+    replay_source = cli_args.replay
+    replay_speed = None if cli_args.speed == 'max' else float(cli_args.speed)
+
+    vehicles = [spec.split('=', 1) for spec in cli_args.vehicle]
+    if any(len(spec) != 2 for spec in vehicles):
+        parser.error("--vehicle takes ID=CONNECTION")
+    if not vehicles:
+        if replay_source:
+            print(f"Replaying {replay_source} at {f'{replay_speed:g}x' if replay_speed else 'maximum'} speed")
+        vehicles = [("1", REPLAY_PREFIX + replay_source if replay_source else connection_string)]
+    detection_index = DetectionIndex(detection_db_path)
+    for vehicle_id, connection in vehicles:
+        add_vehicle(vehicle_id, connection)
+    if cli_args.profile:
+        profiler.start()
+
+    print(f"Starting web server on http://127.0.0.1:{cli_args.port}")
     try:
-        socketio.run(app, host='0.0.0.0', port=5000, debug=False)
+        socketio.run(app, host='0.0.0.0', port=cli_args.port, debug=False)
     except KeyboardInterrupt:
         print("Ctrl+C detected. Shutting down server...")
     finally:
         print("Stopping background threads...")
         running = False
-        if vehicle:
-            print("Closing vehicle connection (if open)...")
-            try: vehicle.close()
-            except Exception as e: print(f"Exception while closing vehicle: {e}")
-            print("Vehicle connection closed.")
-        # Wait briefly for threads to notice 'running' flag
-        time.sleep(0.5)
-        connect_thread.join(timeout=2.0)
-        for t in threading.enumerate():
-            if t.name == 'TelemetryThread':
-                 t.join(timeout=2.0)
-                 break
+        detection_index.close()
+        for link in fleet:
+            print(f"Closing vehicle {link.id} connection (if open)...")
+            link.stop()
+            link.broadcaster.stop()
+            link.recorder.close()
+            print(f"Flight log: {link.recorder.to_dict()}")
         print("Server stopped.")
\ No newline at end of file
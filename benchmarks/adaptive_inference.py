@@ -0,0 +1,167 @@
+# Benchmark: detector CPU time and recall of AdaptiveDetector against
+# full-frame detection on every frame. Recall is measured against the
+# full-frame detections of the same frame (IoU >= 0.5), so it is the recall
+# kept by skipping, not the model's own recall.
+#
+# With --model and --video the YOLOv8 weights run over a recorded flight.
+# Without them a flight is simulated: a textured tree canopy with coloured
+# fruit, filmed while hovering (sensor noise only), panning, and hovering with
+# one branch swaying in the wind; the simulated detector finds the fruit by
+# colour and costs --call-ms + --full-ms * (imgsz / 640)^2 per call.
+#
+# Tracked boxes (tracker.Tracker) are passed to the detector as Testing.py
+# does. Duplicates counts detections returned twice for the same object; a
+# last case changes two regions one tile apart on either side of a fruit,
+# where overlapping regions would detect it twice.
+#
+# Usage: python benchmarks/adaptive_inference.py [--model best.pt --video flight.mp4] [--budget-ms 40]
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adaptive_inference import AdaptiveDetector, yolo_detect
+from tracker import Tracker, iou_matrix
+
+WIDTH, HEIGHT, FPS = 640, 480, 30
+# (start s, end s, camera velocity px/s, swaying fruit)
+SCHEDULE = [(0, 5, (0, 0), False), (5, 7, (120, 0), False), (7, 12, (0, 0), True),
+            (12, 14, (-60, 40), False), (14, 20, (0, 0), False)]
+
+
+def simulated_flight(seed=0):
+    """ Yields BGR frames of the simulated flight. """
+    rng = np.random.default_rng(seed)
+    canvas = np.repeat(np.repeat(rng.integers(20, 150, (120, 180, 3), dtype=np.uint8), 8, 0), 8, 1)
+    for k in range(40):
+        x, y, s = rng.integers(20, 1400), rng.integers(20, 900), rng.integers(18, 36)
+        canvas[y:y + s, x:x + s] = (6 * k, 200, 250) # Blue channel encodes the fruit
+    noise = rng.integers(-2, 3, (8, HEIGHT, WIDTH, 3), dtype=np.int16)
+    offset = np.array([300.0, 200.0])
+    sway_x, sway_y = 600, 420 # Canvas position of the fruit on the swaying branch (in view after the first pan)
+    frame_index = 0
+    for start, end, velocity, swaying in SCHEDULE:
+        for _ in range(int((end - start) * FPS)):
+            offset += np.array(velocity) / FPS
+            ox, oy = int(offset[0]), int(offset[1])
+            view = canvas[oy:oy + HEIGHT, ox:ox + WIDTH].astype(np.int16)
+            fx = sway_x - ox + (int(30 * np.sin(frame_index / 5)) if swaying else 0)
+            fy = sway_y - oy
+            if 0 <= fy and fy + 30 < HEIGHT and 0 <= fx and fx + 30 < WIDTH:
+                view[fy:fy + 30, fx:fx + 30] = (6 * 40, 200, 250)
+            view += noise[frame_index % len(noise)]
+            frame_index += 1
+            yield np.clip(view, 0, 255).astype(np.uint8)
+
+
+def adjacent_regions(tile=80):
+    """ A still frame with one fruit, then two frames changed one tile to its left and right. """
+    frame = np.full((HEIGHT, WIDTH, 3), 100, dtype=np.uint8)
+    frame[200:220, 3 * tile + 10:3 * tile + 30] = (0, 200, 250)
+    yield frame
+    changed = frame.copy()
+    changed[2 * tile:3 * tile, 2 * tile:3 * tile] = 30
+    changed[2 * tile:3 * tile, 4 * tile:5 * tile] = 30
+    yield changed
+    yield changed
+
+
+def duplicates(boxes, threshold=0.9):
+    """ Detections overlapping an earlier one in the same result almost exactly. """
+    if len(boxes) < 2:
+        return 0
+    iou = np.triu(iou_matrix(boxes, boxes), k=1)
+    return int((iou.max(axis=0) >= threshold).sum())
+
+
+def simulated_detect(call_ms, full_ms):
+    def detect(image, imgsz):
+        time.sleep((call_ms + full_ms * (imgsz / 640) ** 2) / 1000)
+        ys, xs = np.nonzero(image[:, :, 2] > 230)
+        if not len(ys):
+            return np.empty((0, 4)), np.empty(0)
+        ids = (image[ys, xs, 0].astype(np.int32) + 3) // 6
+        boxes = []
+        for k in np.unique(ids):
+            mask = ids == k
+            boxes.append((xs[mask].min(), ys[mask].min(), xs[mask].max() + 1, ys[mask].max() + 1))
+        return np.array(boxes, dtype=np.float64), np.full(len(boxes), 0.9)
+    return detect
+
+
+def video_frames(path):
+    import cv2
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        sys.exit(f"Could not open video {path}")
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        yield frame
+    cap.release()
+
+
+def recall(reference, boxes, threshold=0.5):
+    if not len(reference):
+        return 1.0
+    if not len(boxes):
+        return 0.0
+    return float((iou_matrix(reference, boxes).max(axis=1) >= threshold).mean())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', help="YOLOv8 weights (best.pt); simulated flight if omitted")
+    parser.add_argument('--video', help="recorded flight video, required with --model")
+    parser.add_argument('--budget-ms', type=float, help="detector ms per frame to stay within")
+    parser.add_argument('--call-ms', type=float, default=5.0)
+    parser.add_argument('--full-ms', type=float, default=60.0)
+    args = parser.parse_args()
+
+    if args.model:
+        from model_backends import load_detector
+        detect = yolo_detect(load_detector(args.model)[0], conf=0.25)
+        frames = video_frames(args.video)
+    else:
+        detect = simulated_detect(args.call_ms, args.full_ms)
+        frames = simulated_flight()
+
+    adaptive = AdaptiveDetector(detect, imgsz=640, budget_ms=args.budget_ms)
+    tracker = Tracker()
+    full_seconds = overhead = 0.0
+    recalls = []
+    duplicated = 0
+    for frame in frames:
+        start = time.perf_counter()
+        reference, _ = detect(frame, 640)
+        full_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        detect_before = adaptive.detect_seconds
+        boxes, confidences, mode = adaptive(frame, tracked=[track.box for track in tracker.tracks])
+        overhead += time.perf_counter() - start - (adaptive.detect_seconds - detect_before)
+        tracker.update(boxes, confidences)
+        recalls.append(recall(reference, boxes))
+        duplicated += duplicates(boxes)
+
+    stats = adaptive.to_dict()
+    n = stats["frames"]
+    saved = 1 - (adaptive.detect_seconds + overhead) / full_seconds
+    print(f"{n} frames: {stats['full']} full, {stats['roi']} region, {stats['reuse']} reused "
+          f"(final stride {stats['stride']})")
+    print(f"Every frame, full:  {full_seconds / n * 1000:6.1f} ms/frame detector")
+    print(f"Adaptive:           {adaptive.detect_seconds / n * 1000:6.1f} ms/frame detector "
+          f"+ {overhead / n * 1000:.2f} ms/frame scheduling, {stats['pixel_fraction'] * 100:.0f}% of pixels")
+    print(f"Detector CPU saved: {saved * 100:.0f}%")
+    print(f"Recall kept:        {np.mean(recalls) * 100:.1f}% mean, {np.percentile(recalls, 5) * 100:.1f}% 5th percentile")
+    print(f"Duplicates:         {duplicated} detections in {n} frames")
+
+    regions = AdaptiveDetector(simulated_detect(0, 0), imgsz=640)
+    results = [regions(frame) for frame in adjacent_regions()]
+    print(f"Regions 1 tile apart: {' '.join(mode for _, _, mode in results)}, "
+          f"{sum(duplicates(boxes) for boxes, _, _ in results)} duplicate detections")
@@ -0,0 +1,129 @@
+# Benchmark: command round trip, app.py's old sleep-and-poll arming and mode
+# changes versus the acknowledgement-driven CommandSender, against the local
+# mock autopilot over DroneKit.
+#
+# 'arm' is the whole /command/arm sequence (GUIDED, then arm) until the vehicle
+# is known to be armed; 'mode' is one mode change until it is known to have
+# taken effect. The old path sleeps 0.5 s between the two and polls the DroneKit
+# attribute every 0.2 s. Also fires a burst of commands at once from one thread
+# and reports how long it takes until every one of them is acknowledged.
+#
+# Usage: python benchmarks/command_latency.py [--rounds 20] [--burst 50]
+
+import argparse
+import os
+import socket
+import sys
+import time
+from concurrent.futures import wait
+from dronekit import connect, VehicleMode
+from pymavlink import mavutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from commands import CommandSender
+from mock_autopilot import MockAutopilot
+
+MODES = ("LOITER", "GUIDED")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentiles(values):
+    """ 'p50 / p99 ms (n)' for seconds. """
+    if not values:
+        return "no samples"
+    ordered = sorted(values)
+    pick = lambda pct: ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))] * 1000
+    return f"p50 {pick(50):7.1f} ms   p99 {pick(99):7.1f} ms   (n={len(ordered)})"
+
+
+def wait_for(condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            raise RuntimeError("timed out")
+        time.sleep(0.01)
+
+
+def legacy_arm(vehicle):
+    """ app.py's previous command_arm. """
+    vehicle.mode = VehicleMode("GUIDED")
+    time.sleep(0.5) # Short pause
+    vehicle.armed = True
+    start_time = time.time()
+    while not vehicle.armed:
+        if time.time() - start_time > 5:
+            raise RuntimeError("Arming timed out")
+        time.sleep(0.2)
+
+
+def legacy_mode(vehicle, name):
+    vehicle.mode = VehicleMode(name)
+    while vehicle.mode.name != name:
+        time.sleep(0.2)
+
+
+def ack_arm(commands):
+    commands.set_mode("GUIDED").result()
+    commands.arm().result()
+
+
+def timed(function, *args):
+    start = time.monotonic()
+    function(*args)
+    return time.monotonic() - start
+
+
+def disarm(vehicle):
+    vehicle.armed = False
+    wait_for(lambda: not vehicle.armed)
+    vehicle.mode = VehicleMode("STABILIZE")
+    wait_for(lambda: vehicle.mode.name == "STABILIZE")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--burst', type=int, default=50, help="commands fired at once")
+    args = parser.parse_args()
+
+    port = free_port()
+    autopilot = MockAutopilot(port).start()
+    vehicle = connect(f"tcp:127.0.0.1:{port}", wait_ready=True, timeout=60)
+    commands = CommandSender().attach(vehicle)
+    try:
+        results = {"arm": ([], []), "mode": ([], [])}
+        for i in range(args.rounds):
+            results["arm"][0].append(timed(legacy_arm, vehicle))
+            disarm(vehicle)
+            results["arm"][1].append(timed(ack_arm, commands))
+            disarm(vehicle)
+            for name in MODES:
+                results["mode"][0].append(timed(legacy_mode, vehicle, name))
+            for name in MODES:
+                results["mode"][1].append(timed(lambda: commands.set_mode(name).result()))
+
+        for what, (legacy, acked) in results.items():
+            print(f"{what:>5}   sleep and poll     {percentiles(legacy)}")
+            print(f"{'':>5}   CommandSender      {percentiles(acked)}")
+
+        # Burst: every command in flight at once, from this one thread
+        start = time.monotonic()
+        futures = [commands.send(mavutil.mavlink.MAV_CMD_DO_CHANGE_SPEED, (1, 5 + i % 5, -1))
+                   if i % 2 else commands.send(mavutil.mavlink.MAV_CMD_CONDITION_YAW, (i % 360, 0, 1, 0))
+                   for i in range(args.burst)]
+        done, not_done = wait(futures, timeout=30)
+        elapsed = time.monotonic() - start
+        failed = sum(1 for f in done if f.exception()) + len(not_done)
+        print(f"\nburst   {args.burst} commands in flight: all resolved in {elapsed * 1000:.0f} ms, "
+              f"{failed} failed   round trips {percentiles([f.result().rtt for f in done if not f.exception()])}")
+        print(f"        {commands.to_dict()}")
+    finally:
+        commands.detach()
+        vehicle.close()
+        autopilot.stop()
@@ -0,0 +1,142 @@
+# Benchmark: time to first telemetry and to a lost link being noticed, the old
+# connect(wait_ready=True) path versus connection.py, against the local mock
+# autopilot streaming its parameters at telemetry-radio speed.
+#
+# Time to first telemetry runs from the connect call to the TelemetryEngine's
+# first flush with position, attitude, battery and mode in it, which is when
+# the dashboard has something to show. The mock carries --params parameters
+# sent at --param-rate per second (a 57600 baud radio manages roughly 100).
+# Parameter reads are timed right after connecting, with no cache and with the
+# cache the first run saved. Link loss mutes the mock mid-flight and times
+# how long the old health check (DroneKit's last_heartbeat under 10 s) and a
+# fleet VehicleLink take to notice, and how long the link takes to come back
+# once the mock is heard again.
+#
+# Usage: python benchmarks/connect_time.py [--rounds 3] [--params 900] [--param-rate 100]
+
+import argparse
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from dronekit import connect
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection import ParameterCache, ParameterStore, open_vehicle
+from fleet import VehicleLink, CONNECTED, RECONNECTING
+from mock_autopilot import MockAutopilot
+from telemetry import TelemetryEngine
+
+FIRST_FIELDS = ("latitude", "roll", "battery_level", "mode")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_autopilot(params, param_rate):
+    autopilot = MockAutopilot(free_port(), param_rate=param_rate)
+    autopilot.params.update({f"BENCH_P{i:04d}": float(i) for i in range(params)})
+    return autopilot.start()
+
+
+def first_telemetry(open_function, autopilot):
+    """ Seconds from connecting to the first complete telemetry flush, and the vehicle. """
+    first = threading.Event()
+    engine = TelemetryEngine(lambda data: all(data.get(f) is not None for f in FIRST_FIELDS) and first.set())
+    start = time.monotonic()
+    vehicle = open_function(f"tcp:127.0.0.1:{autopilot.port}")
+    engine.attach(vehicle)
+    thread = threading.Thread(target=engine.run, args=(lambda: not first.is_set(),), daemon=True)
+    thread.start()
+    first.wait(60)
+    elapsed = time.monotonic() - start
+    engine.detach()
+    thread.join()
+    return elapsed, vehicle
+
+
+def wait_for(condition, timeout=60.0):
+    start = time.monotonic()
+    while not condition():
+        if time.monotonic() - start > timeout:
+            return None
+        time.sleep(0.01)
+    return time.monotonic() - start
+
+
+def timed_get(store, name):
+    start = time.monotonic()
+    value, source = store.get(name)
+    return (time.monotonic() - start) * 1000, source
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--params', type=int, default=900, help="extra parameters on the mock")
+    parser.add_argument('--param-rate', type=float, default=100.0, help="PARAM_VALUEs per second")
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp()
+    legacy_open = lambda url: connect(url, wait_ready=True, timeout=60, heartbeat_timeout=30)
+    try:
+        print(f"Mock autopilot: {args.params + 12} parameters at {args.param_rate:g}/s\n")
+        for name, open_function in (("connect(wait_ready=True)", legacy_open), ("open_vehicle", open_vehicle)):
+            times = []
+            for _ in range(args.rounds):
+                autopilot = start_autopilot(args.params, args.param_rate)
+                elapsed, vehicle = first_telemetry(open_function, autopilot)
+                times.append(elapsed)
+                vehicle.close()
+                autopilot.stop()
+            print(f"{name:>26}   time to first telemetry   "
+                  + "   ".join(f"{t:5.2f} s" for t in times))
+
+        # Parameter reads straight after connecting: no cache, then the cache that run saved
+        print()
+        for label in ("no cache", "warm cache"):
+            autopilot = start_autopilot(args.params, args.param_rate)
+            vehicle = open_vehicle(f"tcp:127.0.0.1:{autopilot.port}")
+            store = ParameterStore(ParameterCache(cache_dir, "bench")).attach(vehicle)
+            ms, source = timed_get(store, "WPNAV_SPEED")
+            ms_late, source_late = timed_get(store, f"BENCH_P{args.params - 1:04d}")
+            print(f"{label:>26}   WPNAV_SPEED {ms:6.1f} ms ({source})   last parameter {ms_late:6.1f} ms ({source_late})")
+            if label == "no cache":
+                wait_for(lambda: store.complete) # Full download: saves the cache for the next run
+            store.detach()
+            vehicle.close()
+            autopilot.stop()
+
+        # Link loss and recovery
+        print()
+        autopilot = start_autopilot(0, None)
+        vehicle = legacy_open(f"tcp:127.0.0.1:{autopilot.port}")
+        autopilot.mute()
+        lost = wait_for(lambda: vehicle.last_heartbeat >= 10.0)
+        print(f"{'last_heartbeat < 10 s':>26}   link loss noticed after {lost:5.2f} s")
+        vehicle.close()
+        autopilot.stop()
+
+        autopilot = start_autopilot(0, None)
+        link = VehicleLink("bench", f"tcp:127.0.0.1:{autopilot.port}", lambda link, data: None).start()
+        wait_for(lambda: link.state == CONNECTED and link.healthy())
+        time.sleep(2.0)
+        autopilot.mute()
+        lost = wait_for(lambda: link.state == RECONNECTING)
+        autopilot.mute(False)
+        back = wait_for(lambda: link.state == CONNECTED and link.healthy())
+        print(f"{'VehicleLink':>26}   link loss noticed after {lost:5.2f} s, "
+              f"telemetry back {back:5.2f} s after the link returned")
+        time.sleep(6.0) # Past one full message rate window
+        print(f"{'':>26}   {link.monitor.to_dict()}")
+        link.stop()
+        autopilot.stop()
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
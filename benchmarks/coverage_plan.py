@@ -0,0 +1,79 @@
+# Benchmark: coverage planning time over synthetic orchard fields of increasing
+# size and vertex count, with and without keep-out zones, plus the compile
+# time of the resulting plan through PlanCompiler.
+#
+# Usage: python benchmarks/coverage_plan.py
+
+import math
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dronekit import LocationGlobalRelative
+from geodesy import offset_to_latlon
+from coverage_planner import plan_coverage
+from mission_plans import PlanCompiler
+
+HOME = (17.385, 78.4867)
+ALTITUDE = 15.0
+FOV = 62.2
+OVERLAP = 0.3
+
+
+def blob(radius, vertices, center=(0.0, 0.0), seed=0):
+    """ Irregular star-shaped polygon of 'vertices' points, 'radius' metres across-ish, as (lat, lon). """
+    phase = np.random.default_rng(seed).uniform(0, 2 * math.pi, 3)
+    theta = np.linspace(0, 2 * math.pi, vertices, endpoint=False)
+    r = radius * (1 + 0.15 * np.sin(5 * theta + phase[0]) + 0.05 * np.sin(23 * theta + phase[1]) +
+                  0.005 * np.sin(211 * theta + phase[2]))
+    lat, lon = offset_to_latlon(HOME[0], HOME[1], center[0] + 0.7 * r * np.cos(theta), center[1] + r * np.sin(theta))
+    return np.column_stack((lat, lon))
+
+
+def keep_outs(radius, count, size=25.0, vertices=48):
+    """ 'count' roughly circular 'size' m keep-outs (ponds, sheds) scattered inside the field. """
+    rng = np.random.default_rng(1)
+    centers, zones = [], []
+    while len(zones) < count:
+        center = rng.uniform(-0.4, 0.4, 2) * radius
+        # Keep zones apart so there is room to fly between them
+        if all(np.hypot(*(center - other)) > 2.5 * size + 20 for other in centers):
+            centers.append(center)
+            zones.append(blob(size, vertices, center=tuple(center), seed=len(zones)))
+    return zones
+
+
+def best_of(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+if __name__ == '__main__':
+    home = LocationGlobalRelative(HOME[0], HOME[1], 0.0)
+    print(f"{'radius':>7} {'vertices':>9} {'keep-outs':>9} {'rows':>5} {'cells':>5} {'turns':>6} "
+          f"{'length':>9} {'plan':>9} {'compile':>9}")
+    for radius, vertices, zones in ((100, 100, 0), (300, 1000, 0), (300, 1000, 5),
+                                    (600, 5000, 10), (1000, 10000, 20), (2000, 20000, 40)):
+        field = blob(radius, vertices)
+        obstacles = keep_outs(radius, zones)
+        plan_time, path = best_of(lambda: plan_coverage(field, ALTITUDE, FOV, OVERLAP, keep_out=obstacles,
+                                                        start=HOME))
+        plan = path.to_plan(ALTITUDE)
+        compile_time, _ = best_of(lambda: PlanCompiler().compile(plan, home, 0.0))
+        print(f"{radius:5d} m {vertices:9d} {zones:9d} {path.rows:5d} {path.cells:5d} {path.turns:6d} "
+              f"{path.length / 1000:7.2f} km {plan_time * 1000:6.1f} ms {compile_time * 1000:6.1f} ms")
+
+    # Row direction: minimum-width heading versus fixed north-south rows
+    field = blob(300, 1000)
+    print("\nRow heading on a 300 m field (1000 vertices):")
+    for label, heading in (("planner choice", None), ("north-south", 0.0), ("east-west", 90.0)):
+        path = plan_coverage(field, ALTITUDE, FOV, OVERLAP, heading=heading, start=HOME)
+        print(f"  {label:>14} ({path.heading:6.1f} deg): {path.rows:3d} rows, {path.turns:3d} turns, "
+              f"{path.length / 1000:.2f} km")
@@ -0,0 +1,108 @@
+# Benchmark: insert rate and query latency of the geotagged DetectionIndex
+# over a season's worth of detections.
+#
+# An orchard of --trees trees on a 6 m grid is filled with --detections
+# detections clustered around the trees (each fruit seen by ~10 frames, so
+# tracked), inserted in batches like /detections posts. Then random bbox,
+# radius, per-tree aggregation and heat-map tile queries are timed. Raw
+# detection queries cost roughly in proportion to the rows they return; at
+# this density (~500 detections per tree) a 10 m box holds a few thousand.
+#
+# Usage: python benchmarks/detection_index.py [--detections 2000000] [--db /tmp/detections.db]
+
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detection_index import DetectionIndex, mercator_pixels
+from geodesy import offset_to_latlon
+
+ORIGIN = (12.9716, 77.5946)
+LABELS = ("Ripe", "UnRipe", "OverRipe", None)
+
+
+def orchard(trees, spacing=6.0):
+    side = math.ceil(math.sqrt(trees))
+    north, east = np.divmod(np.arange(trees), side)
+    return offset_to_latlon(ORIGIN[0], ORIGIN[1], north * spacing, east * spacing), side * spacing
+
+
+def batches(tree_lat, tree_lon, total, batch, seed=0):
+    """ Yields detection dicts: fruits scattered 1 m around trees, each detected 10 times with 0.2 m noise. """
+    rng = np.random.default_rng(seed)
+    track = 0
+    for start in range(0, total, batch):
+        n = min(batch, total - start)
+        fruits = n // 10
+        tree = rng.integers(0, len(tree_lat), fruits)
+        lat, lon = offset_to_latlon(tree_lat[tree], tree_lon[tree], rng.normal(0, 1.0, fruits), rng.normal(0, 1.0, fruits))
+        lat = np.repeat(lat, 10)[:n]
+        lon = np.repeat(lon, 10)[:n]
+        lat, lon = offset_to_latlon(lat, lon, rng.normal(0, 0.2, n), rng.normal(0, 0.2, n))
+        labels = [LABELS[i] for i in rng.integers(0, len(LABELS), fruits)]
+        yield {"t": np.full(n, time.time()), "lat": lat, "lon": lon, "confidence": rng.uniform(0.5, 1.0, n),
+               "ripeness": [labels[i // 10] for i in range(n)],
+               "track_id": [track + i // 10 for i in range(n)]}
+        track += fruits
+
+
+def timed(fn, queries):
+    times = []
+    for args in queries:
+        start = time.perf_counter()
+        result = fn(*args)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times[len(times) // 2] * 1000, times[int(len(times) * 0.99)] * 1000, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--detections', type=int, default=1000000)
+    parser.add_argument('--trees', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=2000, help="detections per insert (one /detections post)")
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--db', help="database file (default: a temporary file)")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "detections.db")
+    (tree_lat, tree_lon), size = orchard(args.trees)
+    index = DetectionIndex(path)
+    start = time.perf_counter()
+    for detections in batches(tree_lat, tree_lon, args.detections, args.batch):
+        index.add(detections, flight="bench")
+    elapsed = time.perf_counter() - start
+    stats = index.to_dict()
+    print(f"Inserted {stats['detections']} detections ({stats['trees']} trees found, {args.trees} planted) "
+          f"in {elapsed:.1f} s: {stats['detections'] / elapsed:,.0f}/s, {os.path.getsize(path) / 1e6:.0f} MB")
+
+    rng = np.random.default_rng(1)
+    centres = offset_to_latlon(ORIGIN[0], ORIGIN[1], rng.uniform(0, size, args.queries), rng.uniform(0, size, args.queries))
+    centres = list(zip(centres[0].tolist(), centres[1].tolist()))
+
+    def box(lat, lon, metres):
+        (s, n), (w, e) = offset_to_latlon(lat, lon, [-metres / 2, metres / 2], [-metres / 2, metres / 2])
+        return s, w, n, e
+
+    print(f"{'query':>26} {'p50':>8} {'p99':>8}   last result")
+    p50, p99, r = timed(index.query_bbox, [box(lat, lon, 10) for lat, lon in centres])
+    print(f"{'bbox 10x10 m':>26} {p50:6.2f}ms {p99:6.2f}ms   {len(r)} detections")
+    p50, p99, r = timed(index.query_radius, [(lat, lon, 3.0) for lat, lon in centres])
+    print(f"{'radius 3 m':>26} {p50:6.2f}ms {p99:6.2f}ms   {len(r)} detections")
+    p50, p99, r = timed(index.trees, [box(lat, lon, 50) for lat, lon in centres])
+    print(f"{'trees in 50x50 m':>26} {p50:6.2f}ms {p99:6.2f}ms   {len(r)} trees")
+    for z in (14, 17, 19, 21):
+        tiles = []
+        for lat, lon in centres:
+            px, py = mercator_pixels(lat, lon, z)
+            tiles.append((z, int(px) // 256, int(py) // 256))
+        index.heatmap_tile(*tiles[0]) # Level maximum is computed once and cached
+        p50, p99, r = timed(index.heatmap_tile, tiles)
+        print(f"{f'heat-map tile z{z} (PNG)':>26} {p50:6.2f}ms {p99:6.2f}ms   {len(r)} bytes")
+    index.close()
@@ -0,0 +1,135 @@
+# Benchmark: the old one-thread capture -> predict -> draw loop from Testing.py
+# versus the threaded DetectionPipeline, against the pure inference rate.
+#
+# With --model the real YOLOv8 weights are used on frames from --source (camera
+# index or video file, paced to the camera/file frame rate). Without it the
+# stages are simulated with sleeps: a 30 FPS camera, 'inference' of --infer-ms
+# and drawing/display of --render-ms.
+#
+# Usage: python benchmarks/detection_pipeline.py [--model best.pt --source 0] [--seconds 10]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detection_pipeline import DetectionPipeline, StageStats, format_stats
+
+
+def simulated_stages(args):
+    """ Camera at 'camera_fps', inference and render of fixed duration; sleeps release the GIL like cv2/torch do. """
+    next_frame = [time.monotonic()]
+
+    def read_frame():
+        next_frame[0] += 1.0 / args.camera_fps
+        time.sleep(max(0.0, next_frame[0] - time.monotonic()))
+        return object()
+
+    def infer(frame):
+        time.sleep(args.infer_ms / 1000)
+        return frame
+
+    def draw(frame, result):
+        time.sleep(args.render_ms / 1000)
+
+    return read_frame, infer, draw, object
+
+
+def model_stages(args):
+    import cv2
+    from ultralytics import YOLO
+
+    model = YOLO(args.model)
+    source = int(args.source) if args.source.isdigit() else args.source
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        sys.exit(f"Could not open source {args.source!r}")
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    period = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 30.0)
+    next_frame = [time.monotonic()]
+
+    def read_frame():
+        # Video files are paced to their frame rate so they behave like a camera
+        if not isinstance(source, int):
+            next_frame[0] += period
+            time.sleep(max(0.0, next_frame[0] - time.monotonic()))
+        ret, frame = cap.read()
+        if not ret:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = cap.read()
+        return frame if ret else None
+
+    def infer(frame):
+        return model.predict(source=frame, conf=0.6, verbose=False)[0]
+
+    def draw(frame, result):
+        annotated = result.plot(conf=True)
+        cv2.imshow('benchmark', annotated)
+        cv2.waitKey(1)
+
+    def sample():
+        ret, frame = cap.read()
+        return frame
+
+    return read_frame, infer, draw, sample
+
+
+def pure_inference(infer, frame, seconds):
+    stats = StageStats("inference")
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        started = time.monotonic()
+        infer(frame)
+        now = time.monotonic()
+        stats.record(started, now, started)
+    return stats.to_dict()
+
+
+def sequential(read_frame, infer, draw, seconds):
+    """ The original Testing.py loop: everything one after another on one thread. """
+    stats = StageStats("render")
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        frame = read_frame()
+        captured_at = time.monotonic()
+        result = infer(frame)
+        started = time.monotonic()
+        draw(frame, result)
+        stats.record(started, time.monotonic(), captured_at)
+    return stats.to_dict()
+
+
+def pipelined(read_frame, infer, draw, seconds):
+    end = time.monotonic() + seconds
+
+    def render(packet):
+        draw(packet.frame, packet.result)
+        return time.monotonic() < end
+
+    return DetectionPipeline(read_frame, infer).run(render)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', help="YOLOv8 weights (best.pt); simulated stages if omitted")
+    parser.add_argument('--source', default='0', help="camera index or video file")
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--camera-fps', type=float, default=30.0)
+    parser.add_argument('--infer-ms', type=float, default=45.0)
+    parser.add_argument('--render-ms', type=float, default=8.0)
+    args = parser.parse_args()
+
+    read_frame, infer, draw, sample = model_stages(args) if args.model else simulated_stages(args)
+    infer(sample()) # Warm-up
+
+    pure = pure_inference(infer, sample(), args.seconds / 2)
+    print(f"Pure inference: {pure['fps']:.1f} FPS ({pure['busy_ms']:.1f} ms/frame)")
+    old = sequential(read_frame, infer, draw, args.seconds)
+    print(f"Sequential loop: {old['fps']:.1f} FPS displayed, latency p50 {old['latency_p50_ms']:.1f} ms "
+          f"p95 {old['latency_p95_ms']:.1f} ms (capture to displayed)")
+    stats = pipelined(read_frame, infer, draw, args.seconds)
+    print("Pipeline:\n" + format_stats(stats))
+    print(f"Pipeline displays {stats[2]['fps'] / pure['fps'] * 100:.0f}% of the pure inference rate "
+          f"(sequential: {old['fps'] / pure['fps'] * 100:.0f}%)")
@@ -0,0 +1,227 @@
+# End-to-end benchmark: app.py running against the local mock autopilot.
+#
+# Starts MockAutopilot in this process and app.py as a subprocess connected to
+# it (DroneKit over TCP, eventlet web server), then measures what a user sees:
+#
+#   HTTP commands      POST /command/arm and /command/rtl: response time, and
+#                      click -> command received by the autopilot
+#   telemetry push     autopilot sends an ATTITUDE with a marker roll -> a
+#                      Socket.IO client receives the 'telemetry_update' with it,
+#                      with 1, 10 and 100 clients connected (all clients timed)
+#   throughput         'telemetry_update' messages delivered per second, in
+#                      total and per client, at each client count
+#   mission            POST /command/start_mission -> 'mission_progress' reports
+#                      it completed (at the mock's --speedup)
+#
+# Everything is reported as p50/p99 so regressions stand out.
+#
+# Usage: python benchmarks/e2e_latency.py [--clients 1,10,100] [--runs 20] [--missions 3] [--speedup 4]
+
+import argparse
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import requests
+import socketio
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mock_autopilot import MockAutopilot
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentiles(values):
+    """ 'p50 / p99 ms (n)' for seconds. """
+    if not values:
+        return "no samples"
+    ordered = sorted(values)
+    pick = lambda pct: ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))] * 1000
+    return f"p50 {pick(50):8.1f} ms   p99 {pick(99):8.1f} ms   (n={len(ordered)})"
+
+
+class DashboardClient:
+    """ Socket.IO client that keeps the telemetry state and timestamps what it receives. """
+
+    def __init__(self, url):
+        self.sio = socketio.Client(reconnection=False)
+        self.state = {}
+        self.updates = 0
+        self.roll_seen = {} # Roll (radians, rounded) -> monotonic receive time
+        self.missions = []
+        self.sio.on('telemetry_update', self._on_telemetry)
+        self.sio.on('mission_progress', self.missions.append)
+        self.sio.connect(url, transports=['websocket'])
+
+    def _on_telemetry(self, frames):
+        now = time.monotonic()
+        self.updates += 1
+        for frame in frames:
+            fields = frame.get("fields", {})
+            self.state.update(fields)
+            if "roll" in fields:
+                self.roll_seen.setdefault(round(math.radians(fields["roll"]), 3), now)
+
+    def wait_for(self, predicate, timeout=30.0):
+        end = time.monotonic() + timeout
+        while time.monotonic() < end:
+            if predicate(self.state):
+                return True
+            time.sleep(0.01)
+        return False
+
+    def close(self):
+        self.sio.disconnect()
+
+
+def start_app(connect, port, workdir):
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "app.py"), "--connect", connect, "--port", str(port)],
+                               cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{port}"
+    end = time.monotonic() + 60
+    while time.monotonic() < end:
+        if process.poll() is not None:
+            sys.exit(f"app.py exited with code {process.returncode}")
+        try:
+            requests.get(url + "/", timeout=1)
+            return process, url
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    process.kill()
+    sys.exit("app.py did not start within 60 s")
+
+
+def reset_vehicle(autopilot, client):
+    autopilot.reset()
+    if not client.wait_for(lambda s: s.get("armed") is False and s.get("mode") == "STABILIZE"
+                           and (s.get("altitude") or 0) < 0.5):
+        sys.exit("The dashboard never saw the vehicle reset")
+
+
+def command_received(autopilot, name, after, timeout=10.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        for at, logged in list(autopilot.command_log):
+            if logged == name and at >= after:
+                return at
+        time.sleep(0.002)
+    return None
+
+
+def bench_command(url, autopilot, client, path, expected, runs):
+    responses, received = [], []
+    for _ in range(runs):
+        reset_vehicle(autopilot, client)
+        start = time.monotonic()
+        reply = requests.post(url + path, timeout=30)
+        responses.append(time.monotonic() - start)
+        if reply.status_code != 200:
+            print(f"  {path} returned {reply.status_code}: {reply.text.strip()}")
+        at = command_received(autopilot, expected, start)
+        if at is not None:
+            received.append(at - start)
+    print(f"{'POST ' + path:>28}   response        {percentiles(responses)}")
+    print(f"{'':>28}   -> autopilot    {percentiles(received)}")
+
+
+def bench_fanout(url, autopilot, count, seconds, marker_hz=4.0):
+    clients = [DashboardClient(url) for _ in range(count)]
+    time.sleep(1.0) # Let the keyframes settle
+    before = [c.updates for c in clients]
+    start = time.monotonic()
+    markers = []
+    i = 0
+    while time.monotonic() - start < seconds:
+        i += 1
+        roll = round((0.1 + (i % 50) * 0.01) * (1 if i % 2 else -1), 3) # Distinct, > the 0.1 degree threshold
+        for c in clients:
+            c.roll_seen.pop(roll, None)
+        autopilot.mark_attitude(roll)
+        markers.append(roll)
+        time.sleep(1.0 / marker_hz)
+    elapsed = time.monotonic() - start
+    time.sleep(0.5)
+    latencies = []
+    for roll in markers[-int(seconds * marker_hz) + 2:]:
+        sent = autopilot.markers_sent.get(roll)
+        if sent is None:
+            continue
+        latencies.extend(c.roll_seen[roll] - sent for c in clients if c.roll_seen.get(roll, 0) >= sent)
+    delivered = sum(c.updates - b for c, b in zip(clients, before))
+    for c in clients:
+        c.close()
+    print(f"{f'{count} client(s)':>28}   push latency    {percentiles(latencies)}")
+    print(f"{'':>28}   throughput      {delivered / elapsed:8.0f} msg/s total, "
+          f"{delivered / elapsed / count:6.1f} msg/s per client")
+
+
+def bench_missions(url, autopilot, client, runs):
+    durations, states = [], []
+    for _ in range(runs):
+        reset_vehicle(autopilot, client)
+        requests.post(url + "/command/arm", timeout=30)
+        client.missions.clear()
+        start = time.monotonic()
+        reply = requests.post(url + "/command/start_mission", json={"execution": "auto"}, timeout=30).json()
+        mission_id = reply.get("mission_id")
+        if mission_id is None:
+            print(f"  start_mission failed: {reply}")
+            continue
+        end = time.monotonic() + 300
+        state = None
+        while time.monotonic() < end and state not in ("completed", "aborted", "failed"):
+            for progress in list(client.missions):
+                if progress.get("mission_id") == mission_id:
+                    state = progress.get("state")
+            time.sleep(0.02)
+        durations.append(time.monotonic() - start)
+        states.append(state)
+    print(f"{'default mission':>28}   completion      {percentiles(durations)}   states: {', '.join(map(str, states))}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', default="1,10,100", help="Socket.IO client counts")
+    parser.add_argument('--runs', type=int, default=20, help="repetitions of each HTTP command")
+    parser.add_argument('--seconds', type=float, default=10.0, help="telemetry measurement window per client count")
+    parser.add_argument('--missions', type=int, default=3)
+    parser.add_argument('--speedup', type=float, default=4.0, help="mock autopilot simulation speed")
+    parser.add_argument('--rate', type=float, default=20.0, help="mock autopilot attitude/position rate (Hz)")
+    args = parser.parse_args()
+
+    mav_port, http_port = free_port(), free_port()
+    autopilot = MockAutopilot(mav_port, rate_hz=args.rate, speedup=args.speedup).start()
+    workdir = tempfile.mkdtemp() # app.py's detection database and flight logs
+    process, url = start_app(f"tcp:127.0.0.1:{mav_port}", http_port, workdir)
+    try:
+        client = DashboardClient(url)
+        if not client.wait_for(lambda s: "mode" in s and "latitude" in s, timeout=90):
+            sys.exit("app.py did not connect to the mock autopilot")
+        print(f"app.py on {url}, mock autopilot on tcp:127.0.0.1:{mav_port} "
+              f"({args.rate:g} Hz, speedup {args.speedup:g})\n")
+        bench_command(url, autopilot, client, "/command/arm", "ARM", args.runs)
+        bench_command(url, autopilot, client, "/command/rtl", "MODE RTL", args.runs)
+        client.close()
+        for count in (int(n) for n in args.clients.split(",")):
+            bench_fanout(url, autopilot, count, args.seconds)
+        if args.missions:
+            client = DashboardClient(url)
+            bench_missions(url, autopilot, client, args.missions)
+            client.close()
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        autopilot.stop()
@@ -0,0 +1,223 @@
+# Benchmark: telemetry lag and server CPU as the fleet grows.
+#
+# For each fleet size N, starts N MockAutopilots in a separate load-generator
+# process (at a lower priority, --nice) and one app.py subprocess with
+# '--vehicle i=tcp:...' for each, waits until every vehicle is connected, then
+# subscribes one Socket.IO client to every vehicle's attitude stream. Every
+# vehicle sends marker ATTITUDE messages (mark_attitude) several times a
+# second; push latency is autopilot send -> client receive of the marker, over
+# all vehicles. Server CPU is the app.py process's user + system time over the
+# window.
+#
+# Push latency also includes the load generator and the client, which share the
+# machine with the server. The server's own cost is read from its /metrics
+# over the same window: telemetry_emit_seconds (one vehicle's flush through
+# emit) and socketio_send_seconds (one pass of a vehicle's Broadcaster). The
+# criterion is that lag does not grow linearly with the fleet: it holds when a
+# p99 grows by less than half the fleet-size ratio between the smallest and
+# largest fleet. It is checked for both server-side histograms and for push
+# latency; histogram p99s are bucket upper bounds (0.5 ms resolution).
+#
+# Usage: python benchmarks/fleet_scaling.py [--vehicles 1,5,10,20] [--seconds 10] [--rate 10] [--nice 10]
+
+import argparse
+import math
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import requests
+import socketio
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mock_autopilot import MockAutopilot
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentiles(values):
+    """ 'p50 / p99 ms (n)' for seconds. """
+    if not values:
+        return "no samples"
+    ordered = sorted(values)
+    pick = lambda pct: ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))] * 1000
+    return f"p50 {pick(50):7.1f} ms   p99 {pick(99):7.1f} ms   (n={len(ordered)})"
+
+
+def histogram(text, name):
+    """ {'le' bound: cumulative count} plus '_count' of an unlabelled histogram in Prometheus text. """
+    values = {}
+    for line in text.splitlines():
+        prefix = name + '_bucket{le="'
+        if line.startswith(prefix):
+            bound, count = line[len(prefix):].split('"} ')
+            values[float(bound)] = float(count)
+        elif line.startswith(name + '_count '):
+            values['_count'] = float(line.split()[1])
+    return values
+
+
+def bucket_percentiles(before, after):
+    """ 'p50 / p99 ms (n)' from two scrapes of a histogram (bucket upper bounds). """
+    n = after.get('_count', 0) - before.get('_count', 0)
+    if n <= 0:
+        return "no samples", None
+    bounds = sorted(bound for bound in after if bound != '_count')
+    pick = lambda pct: next((bound for bound in bounds
+                             if after[bound] - before.get(bound, 0) >= n * pct / 100.0), math.inf) * 1000
+    return f"p50 <= {pick(50):5.1f} ms   p99 <= {pick(99):5.1f} ms   (n={n:.0f})", pick(99)
+
+
+def run_autopilots(connection, count, rate, niceness):
+    """ Load-generator process: N MockAutopilots driven over 'connection'. """
+    os.nice(niceness)
+    autopilots = [MockAutopilot(free_port(), lat=17.385 + i * 1e-3, sysid=1, rate_hz=rate).start()
+                  for i in range(count)]
+    connection.send([autopilot.port for autopilot in autopilots])
+    while True:
+        command, roll = connection.recv()
+        if command == "mark":
+            for autopilot in autopilots:
+                autopilot.mark_attitude(roll)
+        elif command == "markers":
+            connection.send([dict(autopilot.markers_sent) for autopilot in autopilots])
+        else:
+            break
+    for autopilot in autopilots:
+        autopilot.stop()
+
+
+def cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK") # utime + stime
+
+
+def start_fleet(count, rate, niceness, workdir):
+    connection, child = multiprocessing.Pipe()
+    generator = multiprocessing.Process(target=run_autopilots, args=(child, count, rate, niceness), daemon=True)
+    generator.start()
+    specs = []
+    for i, port in enumerate(connection.recv()):
+        specs += ['--vehicle', f"{i + 1}=tcp:127.0.0.1:{port}"]
+    http_port = free_port()
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "app.py"), "--port", str(http_port)] + specs,
+                               cwd=workdir, env=dict(os.environ, PYTHONUNBUFFERED="1"),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{http_port}"
+    end = time.monotonic() + 60 + 5 * count
+    while time.monotonic() < end:
+        if process.poll() is not None:
+            sys.exit(f"app.py exited with code {process.returncode}")
+        try:
+            vehicles = requests.get(url + "/vehicles", timeout=2).json()["vehicles"]
+            if len(vehicles) == count and all(v["state"] == "connected" and v["mode"] for v in vehicles):
+                return (connection, generator), process, url
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.5)
+    process.kill()
+    sys.exit(f"Not all {count} vehicles connected in time")
+
+
+def measure(count, seconds, rate, niceness, marker_hz=4.0):
+    workdir = tempfile.mkdtemp() # app.py's detection database and flight logs
+    (autopilots, generator), process, url = start_fleet(count, rate, niceness, workdir)
+    seen = {} # (vehicle, roll) -> monotonic receive time
+    received = [0]
+
+    def on_telemetry(frames):
+        now = time.monotonic()
+        received[0] += 1
+        for frame in frames:
+            if "roll" in frame.get("fields", {}):
+                seen.setdefault((frame.get("vehicle"), round(math.radians(frame["fields"]["roll"]), 3)), now)
+
+    client = socketio.Client(reconnection=False)
+    client.on('telemetry_update', on_telemetry)
+    client.connect(url, transports=['websocket'])
+    for i in range(count):
+        client.call('subscribe', {"vehicle": str(i + 1), "topics": {"attitude": 0}}, timeout=10)
+    try:
+        time.sleep(1.0) # Let the keyframes settle
+        scrape = requests.get(url + "/metrics", timeout=5).text
+        cpu_start, start = cpu_seconds(process.pid), time.monotonic()
+        before = received[0]
+        markers, n = [], 0
+        while time.monotonic() - start < seconds:
+            n += 1
+            roll = round((0.1 + (n % 50) * 0.01) * (1 if n % 2 else -1), 3) # Distinct, > the 0.1 degree threshold
+            for i in range(count):
+                seen.pop((str(i + 1), roll), None)
+            autopilots.send(("mark", roll))
+            markers.append(roll)
+            time.sleep(1.0 / marker_hz)
+        elapsed = time.monotonic() - start
+        cpu = cpu_seconds(process.pid) - cpu_start
+        messages = received[0] - before
+        after = requests.get(url + "/metrics", timeout=5).text
+        time.sleep(0.5)
+        autopilots.send(("markers", None))
+        sent_at = autopilots.recv() # monotonic() is system-wide, so comparable across processes
+        latencies = []
+        for roll in markers[-int(seconds * marker_hz) + 2:]:
+            for i in range(count):
+                sent, got = sent_at[i].get(roll), seen.get((str(i + 1), roll))
+                if sent is not None and got is not None and got >= sent:
+                    latencies.append(got - sent)
+        server = {name: bucket_percentiles(histogram(scrape, name), histogram(after, name))
+                  for name in ("telemetry_emit_seconds", "socketio_send_seconds")}
+        return latencies, server, cpu / elapsed, messages / elapsed
+    finally:
+        client.disconnect()
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        autopilots.send(("stop", None))
+        generator.join(5)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--vehicles', default="1,5,10,20", help="fleet sizes")
+    parser.add_argument('--seconds', type=float, default=10.0, help="measurement window per fleet size")
+    parser.add_argument('--rate', type=float, default=10.0, help="mock autopilot attitude/position rate (Hz)")
+    parser.add_argument('--nice', type=int, default=10, help="niceness of the mock autopilot process")
+    args = parser.parse_args()
+
+    print(f"Mock autopilots at {args.rate:g} Hz (nice {args.nice}), markers at 4 Hz per vehicle, "
+          f"{os.cpu_count()} CPU(s)\n")
+    p99s = {}
+    for count in (int(n) for n in args.vehicles.split(",")):
+        latencies, server, cpu, rate = measure(count, args.seconds, args.rate, args.nice)
+        print(f"{f'{count} vehicle(s)':>14}   push latency {percentiles(latencies)}   "
+              f"server CPU {cpu * 100:5.1f}%   {rate:6.0f} msg/s", flush=True)
+        for name, (text, p99) in server.items():
+            print(f"{name:>38}   {text}", flush=True)
+        p99s[count] = {name: p99 for name, (_, p99) in server.items()}
+        p99s[count]["push latency"] = sorted(latencies)[int(len(latencies) * 0.99)] * 1000 if latencies else None
+
+    smallest, largest = min(p99s), max(p99s)
+    if largest > smallest:
+        size_ratio = largest / smallest
+        print(f"\nCriterion: lag grows by less than half the fleet-size ratio "
+              f"({size_ratio:g}x vehicles -> under {size_ratio / 2:g}x)")
+        for name in ("telemetry_emit_seconds", "socketio_send_seconds", "push latency"):
+            low, high = p99s[smallest][name], p99s[largest][name]
+            if not low or not high or math.isinf(high):
+                print(f"{name:>38}   not measurable")
+                continue
+            growth = high / low
+            print(f"{name:>38}   p99 {low:.1f} -> {high:.1f} ms, {growth:.1f}x: "
+                  f"{'holds' if growth < size_ratio / 2 else 'DOES NOT HOLD'}")
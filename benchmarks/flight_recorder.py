@@ -0,0 +1,84 @@
+# Benchmark: cost of FlightRecorder on the telemetry path, and replay time of
+# a recorded flight.
+#
+# Records --minutes of 20 Hz telemetry (plus a mission event every few
+# seconds) through record_telemetry, timing each call as app.py's
+# emit_telemetry would see it, with the writer thread running. Then the log is
+# reopened with FlightLog and a few typical analyses are timed.
+#
+# Usage: python benchmarks/flight_recorder.py [--minutes 60] [--dir /tmp/flight]
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flight_recorder import FlightRecorder, FlightLog
+
+RATE = 20 # Hz
+
+
+def sample(i, t):
+    return {"latitude": 12.9716 + 1e-5 * np.sin(t / 60), "longitude": 77.5946 + 1e-5 * np.cos(t / 60),
+            "altitude": 15.0 + np.sin(t), "groundspeed": 5.0, "airspeed": 5.2, "heading": i % 360,
+            "roll": 1.5, "pitch": -2.0, "yaw": float(i % 360), "battery_voltage": 12.6 - t / 3600,
+            "battery_current": 14.2, "battery_level": 100 - int(t / 36), "mode": "AUTO" if i % 2000 else "GUIDED",
+            "armed": True, "is_armable": True, "system_status": "ACTIVE", "gps_fix": 3, "gps_satellites": 12}
+
+
+def timed(fn, repeat=20):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return np.median(times) * 1000, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--minutes', type=float, default=60)
+    parser.add_argument('--dir', help="flight directory (default: a temporary one, removed afterwards)")
+    args = parser.parse_args()
+
+    directory = args.dir or os.path.join(tempfile.mkdtemp(), "bench-flight")
+    n = int(args.minutes * 60 * RATE)
+    t0 = time.time() - n / RATE
+    samples = [sample(i, i / RATE) for i in range(n)]
+
+    recorder = FlightRecorder(directory).start()
+    calls = np.empty(n)
+    for i, data in enumerate(samples):
+        start = time.perf_counter()
+        recorder.record_telemetry(data, t=t0 + i / RATE)
+        calls[i] = time.perf_counter() - start
+        if i % (5 * RATE) == 0:
+            recorder.record_event("mission", "running", f"Goto waypoint {i // (5 * RATE)}", mission=1,
+                                  value=i / n, t=t0 + i / RATE)
+    start = time.perf_counter()
+    recorder.close()
+    print(f"Recorded {n} samples ({args.minutes:g} min at {RATE} Hz): "
+          f"record_telemetry p50 {np.percentile(calls, 50) * 1e6:.2f} us, p99 {np.percentile(calls, 99) * 1e6:.2f} us; "
+          f"writer {recorder.write_seconds * 1000:.0f} ms total, close {1000 * (time.perf_counter() - start):.0f} ms")
+    size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    print(f"Log size {size / 1e6:.1f} MB ({size / n:.0f} bytes/sample)")
+
+    print(f"{'replay step':>34} {'median':>9}")
+    ms, log = timed(lambda: FlightLog(directory))
+    print(f"{'open (memory map)':>34} {ms:7.2f}ms   {log.to_dict()}")
+    ms, _ = timed(lambda: log.telemetry['altitude'].max())
+    print(f"{'max altitude (full column scan)':>34} {ms:7.2f}ms")
+    ms, _ = timed(lambda: log.between(t0 + 600, t0 + 660)['battery_voltage'].mean())
+    print(f"{'one minute slice + mean':>34} {ms:7.2f}ms")
+    ms, modes = timed(lambda: log.decode(log.telemetry['mode']))
+    print(f"{'decode every mode string':>34} {ms:7.2f}ms")
+    ms, events = timed(lambda: log.event_list("mission"))
+    print(f"{'mission events as dicts':>34} {ms:7.2f}ms   {len(events)} events")
+    log.close()
+    if not args.dir:
+        shutil.rmtree(os.path.dirname(directory))
@@ -0,0 +1,134 @@
+# Benchmark: ripeness classifier work per frame without tracking (every box
+# of every frame classified) versus with FruitTracker (only new or degraded
+# tracks), plus unique fruit counted.
+#
+# With --model and --video the detector runs on every frame of the recorded
+# video and both paths see the same detections; add --classifier for real
+# classification timings (otherwise crops are counted and classification is
+# simulated at --call-ms + --crop-ms per crop). Without --model a hovering
+# drone filming a tree is simulated: --fruits fruit under slow camera drift,
+# with detection jitter, misses and low-confidence false positives, and the
+# true fruit count is known.
+#
+# Usage: python benchmarks/fruit_tracking.py [--model best.pt --video flight.mp4 [--classifier best_mango_classifier.keras]]
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracker import FruitTracker, Tracker, iou_matrix
+
+
+class SimulatedClassifier:
+    """ Stands in for RipenessClassifier.classify: one call per batch, cost per call plus per crop. """
+
+    def __init__(self, call_ms, crop_ms):
+        self.call_ms = call_ms
+        self.crop_ms = crop_ms
+
+    def classify(self, frame, boxes):
+        time.sleep((self.call_ms + self.crop_ms * len(boxes)) / 1000)
+        return [("Ripe", 0.9)] * len(boxes)
+
+
+def simulated_detections(args, seed=0):
+    """ Yields (frame, boxes, confidences, truth boxes) for a drifting view of a tree. """
+    rng = np.random.default_rng(seed)
+    frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+    centres = rng.uniform([100, 100], [1700, 620], (args.fruits, 2)) # Tree wider than the view
+    sizes = rng.uniform(40, 90, args.fruits)
+    base_conf = rng.uniform(0.55, 0.95, args.fruits)
+    for i in range(args.frames):
+        t = i / 30.0
+        offset = np.array([250 * np.sin(t / 8) + 250, 10 * np.sin(t * 1.3)]) # Slow pan + hover wobble
+        c = centres - offset
+        truth = np.column_stack([c - sizes[:, None] / 2, c + sizes[:, None] / 2])
+        visible = np.flatnonzero((truth[:, 0] > 0) & (truth[:, 2] < 1280) & (truth[:, 1] > 0) & (truth[:, 3] < 720))
+        seen = visible[rng.random(len(visible)) > args.miss_rate]
+        boxes = truth[seen] + rng.normal(0, 2.0, (len(seen), 4))
+        conf = np.clip(base_conf[seen] + rng.normal(0, 0.08, len(seen)), 0.1, 1.0)
+        false = rng.uniform([0, 0], [1200, 650], (rng.poisson(1.0), 2))
+        boxes = np.vstack([boxes, np.column_stack([false, false + 50])])
+        conf = np.concatenate([conf, rng.uniform(0.1, 0.4, len(false))])
+        yield frame, boxes, conf, truth[visible], visible
+
+
+def video_detections(args):
+    import cv2
+    from model_backends import load_detector
+    detector, backend = load_detector(args.model)
+    cap = cv2.VideoCapture(args.video)
+    if not cap.isOpened():
+        sys.exit(f"Could not open video {args.video}")
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        result = detector.predict(source=frame, conf=0.1, verbose=False)[0]
+        yield frame, result.boxes.xyxy.cpu().numpy(), result.boxes.conf.cpu().numpy(), None, None
+    cap.release()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', help="YOLOv8 weights (best.pt); simulated detections if omitted")
+    parser.add_argument('--video', help="recorded flight video, required with --model")
+    parser.add_argument('--classifier', help="Keras ripeness model; simulated classification if omitted")
+    parser.add_argument('--frames', type=int, default=900, help="simulated frames (30 FPS)")
+    parser.add_argument('--fruits', type=int, default=80, help="simulated fruit on the tree")
+    parser.add_argument('--miss-rate', type=float, default=0.1, help="simulated missed detections")
+    parser.add_argument('--call-ms', type=float, default=25.0)
+    parser.add_argument('--crop-ms', type=float, default=3.0)
+    args = parser.parse_args()
+
+    if args.classifier:
+        from ripeness import RipenessClassifier, load_classifier
+        classifier = RipenessClassifier(load_classifier(args.classifier))
+    else:
+        classifier = SimulatedClassifier(args.call_ms, args.crop_ms)
+    fruit_tracker = FruitTracker(None, classifier, Tracker())
+    source = video_detections(args) if args.model else simulated_detections(args)
+
+    frames = plain_crops = 0
+    plain_time = tracked_time = 0.0
+    identities = {} # true fruit -> track ids it was given (simulation only)
+    truth_seen = set()
+    for frame, boxes, conf, truth, truth_ids in source:
+        frames += 1
+        # Without tracking: classify every confident box, every frame
+        confident = boxes[conf >= fruit_tracker.tracker.high_conf]
+        start = time.perf_counter()
+        if len(confident):
+            classifier.classify(frame, confident)
+        plain_time += time.perf_counter() - start
+        plain_crops += len(confident)
+        # With tracking
+        start = time.perf_counter()
+        fruits = fruit_tracker.update(frame, boxes, conf)
+        tracked_time += time.perf_counter() - start
+
+        if truth is not None and fruits:
+            truth_seen.update(truth_ids.tolist())
+            iou = iou_matrix([fruit.box for fruit in fruits], truth)
+            for fruit, row in zip(fruits, iou):
+                if len(row) and row.max() > 0.5 and fruit.track_id in fruit_tracker.tracker.confirmed:
+                    identities.setdefault(int(truth_ids[row.argmax()]), set()).add(fruit.track_id)
+
+    stats = fruit_tracker.to_dict()
+    print(f"{frames} frames")
+    print(f"Per-frame classification: {plain_crops} crops ({plain_crops / frames:.1f}/frame), "
+          f"{plain_time / frames * 1000:.1f} ms/frame")
+    print(f"Tracked classification:   {stats['classified']} crops ({stats['classified'] / frames:.2f}/frame), "
+          f"{tracked_time / frames * 1000:.1f} ms/frame (tracking included)")
+    print(f"Classifier work cut {plain_crops / max(stats['classified'], 1):.0f}x, "
+          f"time {plain_time / max(tracked_time, 1e-9):.1f}x")
+    print(f"Unique fruit counted: {stats['unique_fruit']}", end="")
+    if identities or truth_seen:
+        switches = sum(len(ids) - 1 for ids in identities.values())
+        print(f" (true: {len(truth_seen)}, ID switches: {switches})")
+    else:
+        print()
@@ -0,0 +1,101 @@
+# Accuracy and throughput of the batched geodesy module.
+#
+# Accuracy: vincenty_distance against the published Flinders Peak -> Buninyong
+# geodesic, haversine and the old flat-earth get_distance_metres against
+# Vincenty at increasing distances, and offset_to_latlon / ned_offsets round trips.
+# Throughput: points per second for each batched function.
+#
+# Usage: python benchmarks/geodesy_bench.py [points]
+
+import math
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import geodesy
+
+# Geoscience Australia's worked example of Vincenty's inverse formula
+FLINDERS_PEAK = (-37.95103341666667, 144.42486788888889)
+BUNINYONG = (-37.65282113888889, 143.92649552777778)
+FLINDERS_BUNINYONG_M = 54972.271
+
+
+def flat_earth_distance(lat1, lon1, lat2, lon2):
+    """ The pre-geodesy get_distance_metres approximation. """
+    return math.sqrt((lat2 - lat1) ** 2 + (lon2 - lon1) ** 2) * 1.113195e5
+
+
+def check_accuracy():
+    ok = True
+    d = float(geodesy.vincenty_distance(*FLINDERS_PEAK, *BUNINYONG))
+    err_mm = abs(d - FLINDERS_BUNINYONG_M) * 1000
+    ok &= err_mm < 1.0
+    print(f"Vincenty Flinders Peak -> Buninyong: {d:.3f} m (reference {FLINDERS_BUNINYONG_M} m, error {err_mm:.3f} mm)")
+
+    print(f"\n{'distance':>10} {'haversine err':>14} {'flat-earth err':>15}   (vs Vincenty, at lat 17.4N, bearing 60)")
+    lat0, lon0 = 17.385, 78.4867
+    for metres in (10, 100, 1000, 10000, 100000):
+        lat, lon = geodesy.offset_to_latlon(lat0, lon0, metres * math.cos(math.radians(60)),
+                                            metres * math.sin(math.radians(60)))
+        reference = float(geodesy.vincenty_distance(lat0, lon0, lat, lon))
+        hav = float(geodesy.haversine_distance(lat0, lon0, lat, lon))
+        flat = flat_earth_distance(lat0, lon0, float(lat), float(lon))
+        ok &= abs(hav - reference) / reference < 0.005
+        print(f"{metres:>8} m {100 * (hav - reference) / reference:+13.3f}% {100 * (flat - reference) / reference:+14.3f}%")
+
+    rng = np.random.default_rng(0)
+    lat = rng.uniform(-60, 60, 10000)
+    lon = rng.uniform(-179, 179, 10000)
+    north, east = rng.uniform(-5000, 5000, (2, 10000))
+    lat2, lon2 = geodesy.offset_to_latlon(lat, lon, north, east)
+    back_north, back_east = geodesy.ned_offsets(lat, lon, lat2, lon2)
+    round_trip = np.max(np.hypot(back_north - north, back_east - east))
+    ok &= round_trip < 1e-3
+    print(f"\noffset_to_latlon -> ned_offsets round trip, 10k points within 5 km: max error {round_trip * 1000:.4f} mm")
+
+    # Point 10 m right of a northbound track
+    xt = float(geodesy.cross_track_distance(*geodesy.offset_to_latlon(lat0, lon0, 50, 10), lat0, lon0,
+                                            *geodesy.offset_to_latlon(lat0, lon0, 100, 0)))
+    ok &= abs(xt - 10.0) < 1e-3
+    print(f"cross_track_distance of a point 10 m right of track: {xt:.4f} m")
+    return ok
+
+
+def throughput(points):
+    rng = np.random.default_rng(1)
+    lat1, lat2 = rng.uniform(-60, 60, (2, points))
+    lon1, lon2 = rng.uniform(-179, 179, (2, points))
+    north, east = rng.uniform(-1000, 1000, (2, points))
+    cases = [
+        ("haversine_distance", lambda: geodesy.haversine_distance(lat1, lon1, lat2, lon2)),
+        ("vincenty_distance", lambda: geodesy.vincenty_distance(lat1, lon1, lat2, lon2)),
+        ("bearing", lambda: geodesy.bearing(lat1, lon1, lat2, lon2)),
+        ("offset_to_latlon", lambda: geodesy.offset_to_latlon(lat1, lon1, north, east)),
+        ("cross_track_distance", lambda: geodesy.cross_track_distance(lat1, lon1, lat2, lon2, lat2 + 0.01, lon2)),
+    ]
+    print(f"\nThroughput over {points} points:")
+    for name, fn in cases:
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        print(f"  {name:>22}: {points / elapsed / 1e6:8.2f} M points/s")
+
+    from dronekit import LocationGlobalRelative
+    loc = LocationGlobalRelative(17.385, 78.4867, 10)
+    calls = 20000
+    start = time.perf_counter()
+    for i in range(calls):
+        geodesy.get_location_metres(loc, i * 0.01, 5.0)
+    elapsed = time.perf_counter() - start
+    print(f"  {'get_location_metres':>22}: {calls / elapsed / 1e3:8.1f} k calls/s (scalar wrapper)")
+
+
+if __name__ == '__main__':
+    points = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    accurate = check_accuracy()
+    throughput(points)
+    print("\nAccuracy checks", "passed" if accurate else "FAILED")
+    sys.exit(0 if accurate else 1)
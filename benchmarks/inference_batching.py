@@ -0,0 +1,69 @@
+# Benchmark: images/s and per-image latency of the InferenceServer at
+# max batch sizes 1, 4, 8 and 16 with several sources feeding it.
+#
+# With --model the YOLOv8 weights run on CPU over the images in --images (each
+# source replays the folder). Without it, predict is simulated as a fixed
+# per-call overhead plus a per-image cost (--call-ms, --image-ms), which is
+# the shape that makes batching pay off on CPU.
+#
+# Usage: python benchmarks/inference_batching.py [--model best.pt --images dataset/valid/images] [--sources 4]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference_server import InferenceServer, serve_sources, yolo_predict_batch, folder_frames
+
+BATCH_SIZES = (1, 4, 8, 16)
+
+
+def simulated_predict(args):
+    def predict_batch(frames):
+        time.sleep((args.call_ms + args.image_ms * len(frames)) / 1000)
+        return [None] * len(frames)
+    return predict_batch, lambda: [object()] * args.frames
+
+
+def model_predict(args):
+    from ultralytics import YOLO
+    model = YOLO(args.model)
+    images = list(folder_frames(args.images))[:args.frames]
+    if not images:
+        sys.exit(f"No images in {args.images}")
+    predict_batch = yolo_predict_batch(model)
+    predict_batch(images[:1]) # Warm-up
+    return predict_batch, lambda: list(images)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', help="YOLOv8 weights (best.pt); simulated predict if omitted")
+    parser.add_argument('--images', help="folder of test images, required with --model")
+    parser.add_argument('--sources', type=int, default=4, help="concurrent sources")
+    parser.add_argument('--frames', type=int, default=96, help="frames per source")
+    parser.add_argument('--max-wait-ms', type=float, default=10.0)
+    parser.add_argument('--call-ms', type=float, default=30.0)
+    parser.add_argument('--image-ms', type=float, default=12.0)
+    args = parser.parse_args()
+
+    predict_batch, frames = model_predict(args) if args.model else simulated_predict(args)
+    print(f"{args.sources} sources x {args.frames} frames, max wait {args.max_wait_ms} ms")
+    print(f"{'max batch':>10} {'mean batch':>11} {'images/s':>9} {'p50 latency':>12} {'p95 latency':>12}")
+    baseline = None
+    for batch_size in BATCH_SIZES:
+        server = InferenceServer(predict_batch, batch_size, args.max_wait_ms / 1000).start()
+        # Recorded footage: enough frames in flight per source to fill a batch between them
+        in_flight = max(1, -(-2 * batch_size // args.sources))
+        sources = [(f"source-{i}", iter(frames()), in_flight) for i in range(args.sources)]
+        start_time = time.monotonic()
+        serve_sources(server, sources, lambda *result: None)
+        elapsed = time.monotonic() - start_time
+        server.stop()
+        stats = server.to_dict()
+        rate = stats["images"] / elapsed
+        baseline = baseline or rate
+        print(f"{batch_size:10d} {stats['mean_batch']:11.2f} {rate:9.1f} {stats['latency_p50_ms']:9.1f} ms "
+              f"{stats['latency_p95_ms']:9.1f} ms   ({rate / baseline:.1f}x)")
@@ -0,0 +1,138 @@
+# Benchmark: what the instrumentation costs.
+#
+# 1. Per operation: Counter.inc, Histogram.observe, a labelled observe that
+#    looks its child up every time, and the full timing pattern used in the hot
+#    paths (two perf_counter calls and an observe).
+# 2. In the loop: a maximum-speed synthetic replay through TelemetryEngine and
+#    a DeltaEncoder (the path every DroneKit attribute update takes), with the
+#    telemetry metrics live versus replaced by no-op stand-ins, alternating runs.
+#    Also the same replay with the sampling profiler running. On a busy machine
+#    the A/B difference is within run-to-run noise, so the overhead is also
+#    estimated from the per-operation costs and the number of operations.
+# 3. Scrape: render() time for the registry that replay leaves behind.
+#
+# Usage: python benchmarks/metrics_overhead.py [--rounds 5]
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+import telemetry
+from replay_vehicle import ReplayVehicle, synthetic_flight
+from telemetry import TelemetryEngine, DeltaEncoder
+
+
+class _Off:
+    """ Stand-in for a histogram: the call remains, the work does not. """
+
+    def observe(self, value):
+        pass
+
+
+class _Sampler:
+    def __init__(self):
+        self.updates = 0
+
+    def check(self):
+        self.updates += 1
+        return time.perf_counter() if not self.updates & 15 else None
+
+
+def per_operation(number=1000000):
+    sampler = _Sampler()
+    registry = metrics.Registry()
+    count = registry.counter("bench_total", "")
+    hist = registry.histogram("bench_seconds", "")
+    family = registry.histogram("bench_labelled_seconds", "", ("stage",))
+    perf_counter = time.perf_counter
+    cases = {
+        "empty call": (lambda: None),
+        "Counter.inc()": count.inc,
+        "Histogram.observe()": lambda: hist.observe(0.003),
+        "labels(..).observe()": lambda: family.labels("inference").observe(0.003),
+        "2x perf_counter + observe": lambda: hist.observe(perf_counter() - perf_counter()),
+        "1-in-16 sampling check": sampler.check,
+    }
+    costs = {}
+    for name, fn in cases.items():
+        costs[name] = min(timeit.repeat(fn, number=number, repeat=3)) / number
+    return costs
+
+
+def replay(source, instrumented, profile=False):
+    encoder = DeltaEncoder(keyframe_interval=10.0)
+    emitted = [0]
+
+    def emit(data):
+        encoder.encode(data)
+        emitted[0] += 1
+
+    saved = telemetry.update_seconds, telemetry.emit_seconds
+    if not instrumented:
+        telemetry.update_seconds = telemetry.emit_seconds = _Off()
+    profiler = metrics.SamplingProfiler().start() if profile else None
+    try:
+        vehicle = ReplayVehicle(source, speed=None)
+        engine = TelemetryEngine(emit)
+        engine.attach(vehicle)
+        state = {"running": True}
+        loop = threading.Thread(target=engine.run, args=(lambda: state["running"],), daemon=True)
+        loop.start()
+        start = time.perf_counter()
+        vehicle.start()
+        vehicle.finished.wait()
+        elapsed = time.perf_counter() - start
+        state["running"] = False
+        loop.join()
+        engine.detach()
+    finally:
+        telemetry.update_seconds, telemetry.emit_seconds = saved
+        if profiler is not None:
+            profiler.stop()
+    return elapsed, vehicle.samples, emitted[0]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=5, help="alternating runs per variant")
+    args = parser.parse_args()
+
+    costs = per_operation()
+    print("Per operation")
+    for name, seconds in costs.items():
+        print(f"{name:>28}   {seconds * 1e9:6.0f} ns")
+
+    source = synthetic_flight()
+    replay(source, True) # Warm up
+    times = {"metrics off": [], "metrics on": [], "metrics on + profiler": []}
+    for _ in range(args.rounds):
+        times["metrics off"].append(replay(source, False)[0])
+        before = telemetry.update_seconds.count, telemetry.emit_seconds.count
+        elapsed, samples, emitted = replay(source, True)
+        observations = telemetry.update_seconds.count + telemetry.emit_seconds.count - sum(before)
+        updates = (telemetry.update_seconds.count - before[0]) * telemetry.UPDATE_SAMPLE_EVERY
+        times["metrics on"].append(elapsed)
+        times["metrics on + profiler"].append(replay(source, True, profile=True)[0])
+
+    print(f"\nMax-speed replay, {samples} samples, ~{updates} attribute updates and {observations} "
+          f"observations per run (median of {args.rounds})")
+    base = statistics.median(times["metrics off"])
+    for name, values in times.items():
+        elapsed = statistics.median(values)
+        print(f"{name:>28}   {elapsed * 1000:7.1f} ms   {samples / elapsed:9,.0f} samples/s   "
+              f"{(elapsed / base - 1) * 100:+5.2f}%")
+    estimate = (observations * (costs["2x perf_counter + observe"] - costs["empty call"])
+                + updates * (costs["1-in-16 sampling check"] - costs["empty call"])) / base
+    print(f"{'estimated metric share':>28}   {estimate * 100:5.2f}% of loop time")
+
+    start, n = time.perf_counter(), 100
+    for _ in range(n):
+        text = metrics.render()
+    print(f"\nrender(): {(time.perf_counter() - start) / n * 1000:.2f} ms for {len(text.splitlines())} lines")
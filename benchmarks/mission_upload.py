@@ -0,0 +1,99 @@
+# Benchmark: the default mission flown goto-by-goto with 1 s ground-station
+# polling (the old /command/start_mission) versus compiled, uploaded in one
+# transfer and flown in AUTO, both against the local mock autopilot.
+#
+# Usage: python benchmarks/mission_upload.py [--speedup 1.0]
+
+import argparse
+import math
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dronekit import connect, VehicleMode, LocationGlobalRelative
+from pymavlink import mavutil
+from geodesy import get_location_metres, get_distance_metres
+from mission_compiler import compile_legs, to_commands, upload_mission, NAV_COMMANDS
+from mock_autopilot import MockAutopilot
+
+LEGS = [
+    {"type": "takeoff", "altitude": 10.0},
+    {"type": "forward", "distance": 30.0},
+    {"type": "turn", "angle": 30.0, "direction": -1},
+    {"type": "forward", "distance": 20.0, "altitude": 15.0},
+]
+GROUNDSPEED = 5
+
+
+def arm(vehicle):
+    vehicle.mode = VehicleMode("GUIDED")
+    while vehicle.mode.name != "GUIDED":
+        time.sleep(0.05)
+    vehicle.armed = True
+    while not vehicle.armed:
+        time.sleep(0.05)
+
+
+def fly_polling(vehicle):
+    """ The pre-executor mission: one simple_goto per leg, 1 s polling, 5 s yaw sleep. """
+    vehicle.simple_takeoff(10.0)
+    while vehicle.location.global_relative_frame.alt < 10.0 * 0.95:
+        time.sleep(1)
+    for leg_dist, alt, turn_first in ((30.0, 10.0, False), (20.0, 15.0, True)):
+        if turn_first:
+            msg = vehicle.message_factory.command_long_encode(
+                0, 0, mavutil.mavlink.MAV_CMD_CONDITION_YAW, 0, 30.0, 0, -1, 1, 0, 0, 0)
+            vehicle.send_mavlink(msg)
+            time.sleep(5)
+        start = vehicle.location.global_relative_frame
+        heading_rad = math.radians(vehicle.heading)
+        target = get_location_metres(start, math.cos(heading_rad) * leg_dist, math.sin(heading_rad) * leg_dist)
+        target = LocationGlobalRelative(target.lat, target.lon, alt)
+        vehicle.simple_goto(target, groundspeed=GROUNDSPEED)
+        while True:
+            loc = vehicle.location.global_relative_frame
+            if get_distance_metres(loc, target) <= 2.0 and abs(loc.alt - alt) <= 1.0:
+                break
+            time.sleep(1)
+    return None
+
+
+def fly_uploaded(vehicle):
+    """ Compile, upload in one transfer, fly in AUTO, wait for the last item reached. """
+    items = compile_legs(LEGS, vehicle.location.global_relative_frame, vehicle.heading, GROUNDSPEED)
+    last_nav = max(seq for seq, item in enumerate(items, start=1) if item.command in NAV_COMMANDS)
+    reached = threading.Event()
+
+    def on_reached(self, name, message):
+        if message.seq >= last_nav:
+            reached.set()
+
+    vehicle.add_message_listener('MISSION_ITEM_REACHED', on_reached)
+    upload_time = upload_mission(vehicle, to_commands(items))
+    vehicle.commands.next = 1
+    vehicle.mode = VehicleMode("AUTO")
+    vehicle.send_mavlink(vehicle.message_factory.command_long_encode(
+        0, 0, mavutil.mavlink.MAV_CMD_MISSION_START, 0, 0, 0, 0, 0, 0, 0, 0))
+    reached.wait(300)
+    return upload_time
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--speedup', type=float, default=1.0, help="mock autopilot time multiplier")
+    args = parser.parse_args()
+
+    for port, name, fly in ((5790, "goto + 1 s polling", fly_polling), (5791, "uploaded AUTO mission", fly_uploaded)):
+        autopilot = MockAutopilot(port=port, speedup=args.speedup).start()
+        vehicle = connect(f'tcp:127.0.0.1:{port}', wait_ready=True, timeout=60, heartbeat_timeout=30)
+        arm(vehicle)
+        start_time = time.monotonic()
+        upload_time = fly(vehicle)
+        total = time.monotonic() - start_time
+        upload = f"upload {upload_time * 1000:6.1f} ms" if upload_time is not None else "no upload"
+        print(f"{name:>22}: mission time {total:6.2f} s ({upload})")
+        vehicle.close()
+        autopilot.stop()
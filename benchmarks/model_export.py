@@ -0,0 +1,82 @@
+# Benchmark: CPU latency, throughput and mAP of every exported backend of
+# best.pt against the PyTorch model, with the mAP drop measured relative to
+# the best epoch recorded in detection/training_metrics.csv.
+#
+# Export first (python model_backends.py export best.pt --openvino --int8
+# --calibration dataset1/), then:
+#
+# Usage: python benchmarks/model_export.py best.pt --data mango_yolo_dataset/data.yaml [--images dir]
+
+import argparse
+import csv
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_backends import available_backends, artifact_path, calibration_images
+
+METRICS_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "detection", "training_metrics.csv")
+
+
+def training_baseline(path=METRICS_CSV):
+    """
+    The epoch Ultralytics saved as best.pt: highest fitness, 0.1 * mAP50 + 0.9 * mAP50-95.
+    Returns (epoch, mAP50, mAP50-95).
+    """
+    with open(path, newline='') as f:
+        rows = [{key.strip(): value for key, value in row.items()} for row in csv.DictReader(f)]
+    best = max(rows, key=lambda r: 0.1 * float(r["metrics/mAP50(B)"]) + 0.9 * float(r["metrics/mAP50-95(B)"]))
+    return int(best["epoch"]), float(best["metrics/mAP50(B)"]), float(best["metrics/mAP50-95(B)"])
+
+
+def speed(model, images, warmup=3):
+    """ (p50 latency s, p95 latency s, images/s) of one-image predict() calls over 'images'. """
+    import cv2
+    frames = [cv2.imread(path) for path in images]
+    for frame in frames[:warmup]:
+        model.predict(source=frame, verbose=False)
+    times = []
+    start_time = time.perf_counter()
+    for frame in frames:
+        start = time.perf_counter()
+        model.predict(source=frame, verbose=False)
+        times.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - start_time
+    times.sort()
+    return times[len(times) // 2], times[int(len(times) * 0.95)], len(frames) / elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('model', help="path to best.pt (exports are found next to it)")
+    parser.add_argument('--data', help="YOLO data.yaml for mAP; speed only if omitted")
+    parser.add_argument('--images', help="folder of images for timing (default: the data.yaml val folder)")
+    parser.add_argument('--count', type=int, default=100, help="images timed per backend")
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+
+    epoch, base_map50, base_map = training_baseline()
+    print(f"Training baseline (epoch {epoch}): mAP50 {base_map50:.4f}, mAP50-95 {base_map:.4f}")
+
+    folder = args.images
+    if folder is None and args.data:
+        from ultralytics.data.utils import check_det_dataset
+        folder = check_det_dataset(args.data)["val"]
+    if folder is None:
+        sys.exit("Pass --images or --data")
+    images = calibration_images(folder, args.count, seed=1)
+
+    print(f"{'backend':>14} {'p50':>8} {'p95':>8} {'img/s':>7} {'mAP50':>7} {'drop':>7} {'mAP50-95':>9} {'drop':>7}")
+    for backend in reversed(available_backends(args.model)): # PyTorch first
+        model = YOLO(artifact_path(args.model, backend), task="detect")
+        p50, p95, rate = speed(model, images)
+        line = f"{backend:>14} {p50 * 1000:6.1f}ms {p95 * 1000:6.1f}ms {rate:7.1f}"
+        if args.data:
+            metrics = model.val(data=args.data, batch=1, verbose=False, plots=False).box
+            line += (f" {metrics.map50:7.4f} {metrics.map50 - base_map50:+7.4f}"
+                     f" {metrics.map:9.4f} {metrics.map - base_map:+7.4f}")
+        print(line)
@@ -0,0 +1,52 @@
+# Benchmark: validation + compilation time of mission plans with hundreds of
+# waypoints, and the cost of a cache hit when the same plan is re-flown.
+#
+# Usage: python benchmarks/plan_compile.py
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dronekit import LocationGlobalRelative
+from mission_plans import PlanCompiler
+
+HOME = LocationGlobalRelative(17.385, 78.4867, 0.0)
+
+
+def lawnmower_plan(rows, row_length=100.0):
+    """ Serpentine plan of 'rows' rows: forward legs joined by 90 degree turn pairs. """
+    legs = [{"type": "takeoff", "altitude": 10}]
+    for row in range(rows):
+        direction = 1 if row % 2 == 0 else -1
+        legs.append({"type": "forward", "distance": row_length})
+        legs.append({"type": "turn", "angle": 90, "direction": direction})
+        legs.append({"type": "forward", "distance": 5.0})
+        legs.append({"type": "turn", "angle": 90, "direction": direction})
+    return {"name": f"rows-{rows}", "groundspeed": 5, "legs": legs}
+
+
+def best_of(fn, repeat=20):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == '__main__':
+    print(f"{'legs':>6} {'waypoints':>10} {'compile (miss)':>15} {'cache hit':>10}")
+    for rows in (25, 100, 250, 500):
+        plan = lawnmower_plan(rows)
+        compiler = PlanCompiler()
+
+        def miss():
+            compiler.clear()
+            compiler.compile(plan, HOME, 0.0)
+
+        miss_time = best_of(miss)
+        compiled, _ = compiler.compile(plan, HOME, 0.0)
+        hit_time = best_of(lambda: compiler.compile(plan, HOME, 0.0))
+        print(f"{len(plan['legs']):6d} {len(compiled.lats):10d} {miss_time * 1000:12.2f} ms {hit_time * 1000:7.3f} ms")
@@ -0,0 +1,78 @@
+# Benchmark: telemetry fan-out driven by the replay vehicle, without SITL.
+#
+# A synthetic survey flight (or a recorded one with --log) is replayed through
+# the same path app.py uses: TelemetryEngine listeners -> rate-limited flush ->
+# DeltaEncoder frame + TelemetryHistory + FlightRecorder. Reports replay
+# throughput, how closely paced replays keep to the requested speed, and the
+# frames/bytes a dashboard client would receive.
+#
+# Usage: python benchmarks/replay_telemetry.py [--log flights/<id>] [--speeds max,10]
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flight_recorder import FlightRecorder, FlightLog
+from geotag import TelemetryHistory
+from replay_vehicle import ReplayVehicle, synthetic_flight
+from telemetry import TelemetryEngine, DeltaEncoder
+
+
+def run(source, speed):
+    encoder = DeltaEncoder(keyframe_interval=10.0)
+    history = TelemetryHistory()
+    recorder = FlightRecorder(os.path.join(tempfile.mkdtemp(), "replay")).start()
+    sent = {"frames": 0, "bytes": 0}
+
+    def emit(data):
+        now = time.time()
+        history.record(now, data)
+        recorder.record_telemetry(data, now)
+        frame = encoder.encode(data)
+        if frame:
+            sent["frames"] += 1
+            sent["bytes"] += len(json.dumps(frame))
+
+    vehicle = ReplayVehicle(source, speed=speed)
+    engine = TelemetryEngine(emit)
+    engine.attach(vehicle)
+    state = {"running": True}
+    loop = threading.Thread(target=engine.run, args=(lambda: state["running"],), daemon=True)
+    loop.start()
+    start = time.perf_counter()
+    vehicle.start()
+    vehicle.finished.wait()
+    elapsed = time.perf_counter() - start
+    state["running"] = False
+    loop.join()
+    recorder.close()
+    return vehicle, elapsed, sent, FlightLog(recorder.directory)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--log', help="recorded flight directory (default: synthetic survey)")
+    parser.add_argument('--speeds', default="max,10")
+    args = parser.parse_args()
+
+    if args.log:
+        log = FlightLog(args.log)
+        source = (log.telemetry, log.strings)
+    else:
+        source = synthetic_flight()
+    records = source[0]
+    duration = float(records["t"][-1] - records["t"][0])
+    print(f"Flight: {len(records)} samples, {duration:.0f} s")
+    for name in args.speeds.split(","):
+        speed = None if name == "max" else float(name)
+        vehicle, elapsed, sent, recorded = run(source, speed)
+        pacing = f", {elapsed / (duration / speed) * 100:.1f}% of the nominal {duration / speed:.1f} s" if speed else ""
+        print(f"{name + 'x' if speed else name:>5}: {vehicle.samples} samples in {elapsed:.2f} s "
+              f"({vehicle.samples / elapsed:,.0f} samples/s{pacing}); "
+              f"{sent['frames']} dashboard frames, {sent['bytes'] / 1e3:.0f} kB; {len(recorded.telemetry)} recorded")
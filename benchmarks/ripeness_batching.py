@@ -0,0 +1,69 @@
+# Benchmark: crops/s of the ripeness classifier at batch size 1 (one predict
+# call per fruit) and 64 (every fruit of a dense frame in one call), including
+# cropping, resizing and preprocessing.
+#
+# With --classifier the Keras model runs on CPU. Without it predict is
+# simulated as a fixed per-call overhead plus a per-crop cost (--call-ms,
+# --crop-ms); the crop/resize/preprocess work is always real.
+#
+# Usage: python benchmarks/ripeness_batching.py [--classifier best_mango_classifier.keras] [--fruits 64]
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ripeness import RipenessClassifier, load_classifier, RIPENESS_CLASSES
+
+BATCH_SIZES = (1, 64)
+
+
+class SimulatedModel:
+    def __init__(self, call_ms, crop_ms):
+        self.call_ms = call_ms
+        self.crop_ms = crop_ms
+
+    def predict_on_batch(self, batch):
+        time.sleep((self.call_ms + self.crop_ms * len(batch)) / 1000)
+        return np.full((len(batch), len(RIPENESS_CLASSES)), 1.0 / len(RIPENESS_CLASSES), dtype=np.float32)
+
+
+def dense_frame(fruits, width=1280, height=720, seed=0):
+    """ A noise frame and 'fruits' random boxes of 40-160 px, like a close-up of a loaded tree. """
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    sizes = rng.uniform(40, 160, (fruits, 2))
+    x1 = rng.uniform(0, width - sizes[:, 0])
+    y1 = rng.uniform(0, height - sizes[:, 1])
+    return frame, np.column_stack([x1, y1, x1 + sizes[:, 0], y1 + sizes[:, 1]])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--classifier', help="Keras ripeness model; simulated predict if omitted")
+    parser.add_argument('--fruits', type=int, default=64, help="boxes per frame")
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--call-ms', type=float, default=25.0)
+    parser.add_argument('--crop-ms', type=float, default=3.0)
+    args = parser.parse_args()
+
+    model = load_classifier(args.classifier) if args.classifier else SimulatedModel(args.call_ms, args.crop_ms)
+    frame, boxes = dense_frame(args.fruits)
+    print(f"{args.fruits} fruits per frame, {args.frames} frames")
+    print(f"{'batch':>6} {'calls/frame':>12} {'ms/frame':>9} {'crops/s':>9}")
+    baseline = None
+    for batch_size in BATCH_SIZES:
+        classifier = RipenessClassifier(model, max_batch=batch_size)
+        classifier.classify(frame, boxes[:batch_size]) # Warm-up
+        classifier.calls = classifier.crops = 0
+        start_time = time.perf_counter()
+        for _ in range(args.frames):
+            classifier.classify(frame, boxes)
+        elapsed = time.perf_counter() - start_time
+        rate = classifier.crops / elapsed
+        baseline = baseline or rate
+        print(f"{batch_size:6d} {classifier.calls / args.frames:12.1f} {elapsed / args.frames * 1000:9.1f} "
+              f"{rate:9.1f}   ({rate / baseline:.1f}x)")
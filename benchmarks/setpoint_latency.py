@@ -0,0 +1,153 @@
+# Benchmark: keyboard input -> velocity command latency for main.py, the old
+# blocking send_ned_velocity (one setpoint, sleep a second, stop) versus the
+# SetpointStreamer, against the local mock autopilot over DroneKit.
+#
+# A scripted pilot holds a sequence of movement keys for 0.3-1.5 s each, polled
+# at 20 Hz like main.py's keyboard loop. Latency is the time from the key
+# changing to the autopilot receiving a setpoint that moved towards it. Also
+# reports how long the streamer's watchdog takes to stop the vehicle when input
+# stops while a key is held.
+#
+# Usage: python benchmarks/setpoint_latency.py [--presses 30] [--rate 20]
+
+import argparse
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from dronekit import connect, VehicleMode
+from pymavlink import mavutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_autopilot import MockAutopilot
+from setpoint_streamer import SetpointStreamer
+
+SPEED = 2.0
+KEYS = [(SPEED, 0, 0), (-SPEED, 0, 0), (0, SPEED, 0), (0, -SPEED, 0)]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentiles(values):
+    """ 'p50 / p99 ms (n)' for seconds. """
+    if not values:
+        return "no samples"
+    ordered = sorted(values)
+    pick = lambda pct: ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))] * 1000
+    return f"p50 {pick(50):8.1f} ms   p99 {pick(99):8.1f} ms   (n={len(ordered)})"
+
+
+def legacy_send_ned_velocity(vehicle, velocity_x, velocity_y, velocity_z, duration=1):
+    """ main.py's previous implementation. """
+    msg = vehicle.message_factory.set_position_target_local_ned_encode(
+        0, 0, 0, mavutil.mavlink.MAV_FRAME_LOCAL_NED, 0b0000111111000111,
+        0, 0, 0, velocity_x, velocity_y, velocity_z, 0, 0, 0, 0, 0)
+    for _ in range(0, int(duration)):
+        vehicle.send_mavlink(msg)
+        time.sleep(1)
+    stop_msg = vehicle.message_factory.set_position_target_local_ned_encode(
+        0, 0, 0, mavutil.mavlink.MAV_FRAME_LOCAL_NED, 0b0000111111000111, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+    vehicle.send_mavlink(stop_msg)
+
+
+def run_pilot(autopilot, presses, handle_key, seed=1):
+    """
+    Holds random keys while a keyboard loop polls them every 50 ms and calls
+    handle_key(key), as main.py does. Returns key change -> autopilot latencies:
+    the first setpoint received that moved from the previous command towards
+    the new key (with ramping, the first step of the ramp counts).
+    """
+    rng = random.Random(seed)
+    held = {"key": None, "since": None, "from": None}
+    latencies = []
+    done = threading.Event()
+
+    def poll():
+        while not done.is_set():
+            if held["key"] is not None:
+                handle_key(held["key"])
+            time.sleep(0.05)
+
+    def watch():
+        seen = None
+        while not done.is_set():
+            key, since, previous = held["key"], held["since"], held["from"]
+            cmd = autopilot.velocity_cmd
+            if key is not None and since != seen and cmd is not None:
+                towards = sum((c - p) * (k - p) for c, p, k in zip(cmd[:3], previous, key))
+                if towards > 0:
+                    latencies.append(time.monotonic() - since)
+                    seen = since
+            time.sleep(0.001)
+
+    threads = [threading.Thread(target=poll, daemon=True), threading.Thread(target=watch, daemon=True)]
+    for thread in threads:
+        thread.start()
+    key = None
+    for _ in range(presses):
+        key = rng.choice([k for k in KEYS if k != key])
+        cmd = autopilot.velocity_cmd
+        held["from"] = cmd[:3] if cmd is not None else (0.0, 0.0, 0.0)
+        held["key"], held["since"] = key, time.monotonic()
+        time.sleep(rng.uniform(0.3, 1.5))
+    done.set()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def watchdog_stop(autopilot, streamer):
+    """ Holds a key, then input stops: seconds until the autopilot is sent zero velocity. """
+    for _ in range(20):
+        streamer.set(*KEYS[0])
+        time.sleep(0.05)
+    start = time.monotonic()
+    while time.monotonic() - start < 5:
+        cmd = autopilot.velocity_cmd
+        if cmd is not None and cmd[:3] == (0.0, 0.0, 0.0):
+            return time.monotonic() - start
+        time.sleep(0.001)
+    return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--presses', type=int, default=30)
+    parser.add_argument('--rate', type=float, default=20.0, help="streamer rate (Hz)")
+    args = parser.parse_args()
+
+    port = free_port()
+    autopilot = MockAutopilot(port, speedup=4.0).start()
+    vehicle = connect(f"tcp:127.0.0.1:{port}", wait_ready=True, timeout=60)
+    try:
+        vehicle.mode = VehicleMode("GUIDED")
+        vehicle.armed = True
+        while not vehicle.armed:
+            time.sleep(0.1)
+        vehicle.simple_takeoff(5)
+        while vehicle.location.global_relative_frame.alt < 4.5:
+            time.sleep(0.1)
+
+        # Old loop: each poll that sees a key blocks in send_ned_velocity for a second
+        legacy = run_pilot(autopilot, args.presses, lambda key: legacy_send_ned_velocity(vehicle, *key))
+        print(f"{'blocking send_ned_velocity':>28}   key -> autopilot   {percentiles(legacy)}")
+
+        streamer = SetpointStreamer(vehicle, rate=args.rate).start()
+        streamed = run_pilot(autopilot, args.presses, lambda key: streamer.set(*key))
+        print(f"{f'SetpointStreamer {args.rate:g} Hz':>28}   key -> autopilot   {percentiles(streamed)}")
+        stop = watchdog_stop(autopilot, streamer)
+        print(f"{'watchdog':>28}   input lost -> zero velocity sent: "
+              f"{'never' if stop is None else f'{stop * 1000:.0f} ms'} "
+              f"(timeout {streamer.input_timeout * 1000:.0f} ms, ramp at {streamer.max_accel:g} m/s^2)")
+        print(f"{'':>28}   setpoints sent: {streamer.sent}, watchdog stops: {streamer.watchdog_stops}")
+        streamer.close()
+    finally:
+        vehicle.close()
+        autopilot.stop()
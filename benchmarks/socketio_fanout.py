@@ -0,0 +1,263 @@
+# Benchmark: telemetry lag with hundreds of dashboard clients, the old
+# broadcast of every field to every client versus the Broadcaster (topic rooms,
+# per-client rates, latest-only queues).
+#
+# A Flask-SocketIO (eventlet) server publishes 20 Hz telemetry, stamped with
+# its publish time. Client processes connect --clients Socket.IO clients
+# (websocket); --phones of them subscribe to slow rates (attitude and position
+# at 1 Hz, battery at 0.2 Hz) the way a phone would, the rest take attitude at
+# full rate like a wall display. Lag is receive time minus publish time of the
+# attitude frames, over every client.
+#
+# The client processes run at a lower priority (--client-nice) so that, on a
+# machine they share with the server, the server is scheduled first; their
+# receive lag then includes their own queueing once they saturate the CPU.
+# The server's own cost is reported separately per client count: the time of
+# each send pass (Broadcaster.send_due, or the broadcast emit for legacy),
+# the CPU share spent in them, and how late the 20 Hz publish ticks ran.
+#
+# Usage: python benchmarks/socketio_fanout.py [--clients 1,100,500] [--phones 0.5] [--seconds 10] [--client-nice 10]
+
+import sys
+
+if '--serve' in sys.argv:
+    import eventlet
+    eventlet.monkey_patch()
+
+import argparse
+import json
+import math
+import os
+import socket
+import subprocess
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RATE = 20.0 # Hz
+PHONE_TOPICS = {"attitude": 1, "position": 1, "battery": 0.2, "status": 0}
+DISPLAY_TOPICS = {"attitude": 0, "position": 0, "battery": 0, "status": 0}
+CLIENTS_PER_PROCESS = 100
+
+
+def telemetry(i, t):
+    return {"roll": 5 * math.sin(i / 7), "pitch": 3 * math.cos(i / 5), "yaw": (i * 3) % 360 - 180,
+            "heading": (i * 3) % 360, "latitude": 17.385 + i * 1e-6, "longitude": 78.4867 + i * 1e-6,
+            "altitude": 15 + math.sin(i / 20), "groundspeed": 5.0 + 0.2 * math.sin(i / 3), "airspeed": 5.1,
+            "battery_voltage": 12.6 - i * 1e-4, "battery_current": 14 + math.sin(i / 9), "battery_level": 90,
+            "mode": "AUTO", "armed": True, "is_armable": True, "system_status": "ACTIVE", "gps_fix": 3,
+            "gps_satellites": 12}
+
+
+def serve(port, mode):
+    from flask import Flask, jsonify, request
+    from flask_socketio import SocketIO
+    from broadcaster import Broadcaster, TOPIC_FIELDS
+    from telemetry import DeltaEncoder
+
+    app = Flask(__name__)
+    socketio = SocketIO(app, async_mode='eventlet')
+    broadcaster = Broadcaster(socketio)
+    encoder = DeltaEncoder()
+    stats = {"ticks": 0, "late": [], "send": []}
+
+    def timed(send):
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return send(*args, **kwargs)
+            finally:
+                stats["send"].append(time.perf_counter() - started)
+        return wrapper
+
+    @socketio.on('connect')
+    def on_connect():
+        if mode == "broadcaster":
+            broadcaster.add_client(request.sid)
+        else:
+            socketio.emit('telemetry_update', encoder.keyframe(), to=request.sid)
+
+    @socketio.on('disconnect')
+    def on_disconnect():
+        broadcaster.remove_client(request.sid)
+
+    @socketio.on('subscribe')
+    def on_subscribe(data):
+        return broadcaster.subscribe(request.sid, data.get("topics"))
+
+    @app.route('/stats')
+    def get_stats():
+        if request.args.get("reset"):
+            stats["late"], stats["send"] = [], []
+        late, send = stats["late"], stats["send"]
+        queues = [s.queue.qsize() for s in list(socketio.server.eio.sockets.values())]
+        return jsonify({"ticks": stats["ticks"], "late_p50_ms": percentile(late, 50) * 1000,
+                        "late_p99_ms": percentile(late, 99) * 1000, "sends": len(send),
+                        "send_p50_ms": percentile(send, 50) * 1000, "send_p99_ms": percentile(send, 99) * 1000,
+                        "send_total_s": sum(send), "max_queue": max(queues or [0]), **broadcaster.to_dict()})
+
+    def publisher():
+        # The telemetry thread: what each publish costs it is what the vehicle loop would see
+        start = time.monotonic()
+        i = 0
+        while True:
+            i += 1
+            due = start + i / RATE
+            time.sleep(max(0.0, due - time.monotonic()))
+            late = time.monotonic() - due
+            stats["late"] = stats["late"][-2000:] + [late]
+            if late > 1.0: # Fell behind (e.g. while hundreds of clients connected): start over, do not burst
+                start, i = time.monotonic(), 0
+            state = telemetry(i, time.time())
+            stamp = time.time()
+            if mode == "broadcaster":
+                # The publish stamp rides in the attitude topic, which every client takes
+                attitude = {field: state.pop(field) for field in TOPIC_FIELDS["attitude"]}
+                broadcaster.publish("attitude", dict(attitude, ts=stamp))
+                broadcaster.publish_telemetry(state)
+            else:
+                frame = encoder.encode(dict(state, ts=stamp))
+                if frame:
+                    emit('telemetry_update', frame)
+            stats["ticks"] += 1
+
+    emit = timed(socketio.emit) # Legacy: the broadcast is the send pass
+    broadcaster.send_due = timed(broadcaster.send_due)
+    if mode == "broadcaster":
+        broadcaster.start()
+    socketio.start_background_task(publisher)
+    socketio.run(app, host='127.0.0.1', port=port, log_output=False)
+
+
+def run_clients(url, count, phones, seconds, settle, subscribe, niceness):
+    """ Client process: connects 'count' clients, measures for 'seconds', prints a JSON summary. """
+    import socketio
+
+    os.nice(niceness)
+    lags, received = [], [0]
+    lock = threading.Lock()
+    measuring = threading.Event()
+
+    def on_update(frames):
+        if not measuring.is_set():
+            return
+        now = time.time()
+        with lock:
+            received[0] += 1
+            for frame in frames if isinstance(frames, list) else [frames]: # Legacy: one frame
+                if "ts" in frame.get("fields", {}):
+                    lags.append(now - frame["fields"]["ts"])
+
+    clients = []
+    for k in range(count):
+        sio = socketio.Client(reconnection=False)
+        sio.on('telemetry_update', on_update)
+        for attempt in range(5): # A loaded server can drop a handshake; later clients still need to join
+            try:
+                sio.connect(url, transports=['websocket'])
+                break
+            except socketio.exceptions.ConnectionError:
+                if attempt == 4:
+                    raise
+                time.sleep(1.0)
+        if subscribe:
+            sio.call('subscribe', {"topics": PHONE_TOPICS if k < phones else DISPLAY_TOPICS}, timeout=30)
+        clients.append(sio)
+    print("connected", flush=True)
+    time.sleep(settle)
+    measuring.set()
+    time.sleep(seconds)
+    measuring.clear()
+    for sio in clients:
+        sio.disconnect()
+    print(json.dumps({"lags": lags, "received": received[0]}), flush=True)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))] if ordered else float('nan')
+
+
+def measure(mode, clients, phones, seconds, niceness):
+    import requests
+
+    port = free_port()
+    server = subprocess.Popen([sys.executable, __file__, '--serve', mode, '--port', str(port)],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                requests.get(url + "/stats", timeout=1)
+                break
+            except requests.ConnectionError:
+                time.sleep(0.1)
+        procs = []
+        for start in range(0, clients, CLIENTS_PER_PROCESS):
+            count = min(CLIENTS_PER_PROCESS, clients - start)
+            phone_count = max(0, min(count, int(clients * phones) - start))
+            procs.append(subprocess.Popen(
+                [sys.executable, __file__, '--client', url, '--count', str(count), '--phone-count', str(phone_count),
+                 '--seconds', str(seconds), '--subscribe', '1' if mode == "broadcaster" else '0',
+                 '--client-nice', str(niceness)],
+                stdout=subprocess.PIPE, text=True))
+        # Every process measures the same window once all of them are connected
+        for proc in procs:
+            proc.stdout.readline()
+        requests.get(url + "/stats?reset=1", timeout=10) # Only the measured window counts
+        started = time.monotonic()
+        lags, received = [], 0
+        for proc in procs:
+            result = json.loads(proc.stdout.readline())
+            proc.wait()
+            lags.extend(result["lags"])
+            received += result["received"]
+        stats = requests.get(url + "/stats", timeout=10).json()
+        stats["window_s"] = time.monotonic() - started
+    finally:
+        server.terminate()
+        server.wait()
+    return lags, received, stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', default="1,100,500")
+    parser.add_argument('--phones', type=float, default=0.5, help="fraction of clients on phone rates")
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--modes', default="legacy,broadcaster")
+    parser.add_argument('--client-nice', type=int, default=10, help="niceness of the client processes")
+    # Internal: server and client processes
+    parser.add_argument('--serve')
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--client')
+    parser.add_argument('--count', type=int)
+    parser.add_argument('--phone-count', type=int, default=0)
+    parser.add_argument('--subscribe', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, args.serve)
+    elif args.client:
+        # Later processes connect while earlier ones wait; give everyone time to connect
+        run_clients(args.client, args.count, args.phone_count, args.seconds, settle=2.0 + args.count / 50,
+                    subscribe=args.subscribe, niceness=args.client_nice)
+    else:
+        print(f"{os.cpu_count()} CPU(s), clients at nice {args.client_nice}\n")
+        print(f"{'':>21} {'client receive lag':>19} {'':>8}   {'server':^49}")
+        print(f"{'mode':>12} {'clients':>8} {'p50':>9} {'p99':>9} {'msg/s':>8}   {'send p50':>9} {'send p99':>9} "
+              f"{'send CPU':>9} {'tick late p50':>14} {'p99':>7} {'max queue':>10}")
+        for mode in args.modes.split(","):
+            for clients in (int(n) for n in args.clients.split(",")):
+                lags, received, stats = measure(mode, clients, args.phones, args.seconds, args.client_nice)
+                print(f"{mode:>12} {clients:>8} {percentile(lags, 50) * 1000:7.1f}ms {percentile(lags, 99) * 1000:7.1f}ms "
+                      f"{received / args.seconds:8.0f}   {stats['send_p50_ms']:7.2f}ms {stats['send_p99_ms']:7.2f}ms "
+                      f"{stats['send_total_s'] / stats['window_s'] * 100:8.1f}% {stats['late_p50_ms']:12.1f}ms "
+                      f"{stats['late_p99_ms']:5.1f}ms {stats['max_queue']:10d}", flush=True)
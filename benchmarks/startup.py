@@ -0,0 +1,128 @@
+# Benchmark: start-up cost, from a fresh interpreter every time.
+#
+# Import time: app.py (after eventlet's monkey patching, as it runs), the
+# modules Testing.py imports, and each heavy library on its own where it is
+# installed.
+#
+# Time to first inference (with --model): process start until the first
+# detection on a frame, for Testing.py's old order (load the detector, then
+# open the camera, then the cold first inference) versus ModelCache (load and
+# warm up on a background thread while the camera opens). The camera open is
+# simulated with --camera-seconds of sleep, or real with --camera 0.
+#
+# Usage: python benchmarks/startup.py [--runs 5] [--model best.pt [--camera-seconds 1.5 | --camera 0]]
+
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORTS = {
+    "app.py": "import eventlet; eventlet.monkey_patch(); import app",
+    "Testing.py modules": "import model_cache, detection_pipeline, tracker, adaptive_inference, geotag, metrics",
+}
+LIBRARIES = ("cv2", "ultralytics", "torch", "tensorflow", "onnxruntime", "openvino")
+
+
+def run_child(code, workdir):
+    """ Runs 'code' in a new interpreter with the repo importable; returns what it prints, parsed as JSON. """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    result = subprocess.run([sys.executable, "-c", code], cwd=workdir, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "child failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def import_seconds(statement, workdir):
+    return run_child(f"import time, json\nstart = time.perf_counter()\n{statement}\n"
+                     f"print(json.dumps(time.perf_counter() - start))", workdir)
+
+
+FIRST_INFERENCE = """
+import time
+start = time.perf_counter()
+import json
+import numpy as np
+frame = np.random.default_rng(0).integers(0, 255, ({imgsz}, {imgsz}, 3), dtype=np.uint8)
+camera = {camera!r}
+
+def open_camera():
+    if camera is None:
+        time.sleep({camera_seconds})
+        return None
+    import cv2
+    cap = cv2.VideoCapture(camera)
+    cap.read()
+    return cap
+
+if {prewarm}:
+    from model_cache import MODELS
+    MODELS.detector({model!r}, wait=False)
+    open_camera()
+    camera_at = time.perf_counter()
+    model, backend = MODELS.detector({model!r})
+else:
+    from model_backends import load_detector
+    model, backend = load_detector({model!r})
+    open_camera()
+    camera_at = time.perf_counter()
+ready_at = time.perf_counter()
+model.predict(source=frame, verbose=False)
+first_at = time.perf_counter()
+model.predict(source=frame, verbose=False)
+second = time.perf_counter() - first_at
+print(json.dumps({{"camera": camera_at - start, "ready": ready_at - start, "first": first_at - start,
+                  "first_ms": (first_at - ready_at) * 1000, "steady_ms": second * 1000, "backend": backend}}))
+"""
+
+
+def median_of(runs, key):
+    return statistics.median(run[key] for run in runs)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--model', help="best.pt, to measure time to first inference")
+    parser.add_argument('--camera', type=int, help="open this camera index instead of simulating it")
+    parser.add_argument('--camera-seconds', type=float, default=1.5, help="simulated camera open time")
+    parser.add_argument('--imgsz', type=int, default=640)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp() # app.py creates its detection database in the working directory
+
+    print(f"Import time, fresh interpreter (median of {args.runs})")
+    targets = dict(IMPORTS)
+    targets.update({name: f"import {name}" for name in LIBRARIES})
+    for name, statement in targets.items():
+        if name in LIBRARIES and importlib.util.find_spec(name) is None:
+            print(f"{name:>20}   not installed")
+            continue
+        try:
+            import_seconds(statement, workdir) # Untimed: byte-compiles, so timed runs read .pyc files
+            times = [import_seconds(statement, workdir) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{name:>20}   failed: {e}")
+            continue
+        print(f"{name:>20}   {statistics.median(times) * 1000:7.0f} ms")
+
+    if not args.model:
+        print("\nTime to first inference: pass --model best.pt")
+        sys.exit()
+
+    camera = f"camera {args.camera}" if args.camera is not None else f"{args.camera_seconds:g} s simulated camera"
+    print(f"\nTime to first inference, {camera} (median of {args.runs})")
+    for name, prewarm in (("load, then camera", False), ("ModelCache prewarm", True)):
+        code = FIRST_INFERENCE.format(model=os.path.abspath(args.model), prewarm=prewarm, camera=args.camera,
+                                      camera_seconds=args.camera_seconds, imgsz=args.imgsz)
+        runs = [run_child(code, workdir) for _ in range(args.runs)]
+        print(f"{name:>20}   model ready {median_of(runs, 'ready'):6.2f} s   "
+              f"first result {median_of(runs, 'first'):6.2f} s   "
+              f"first inference {median_of(runs, 'first_ms'):7.1f} ms   "
+              f"then {median_of(runs, 'steady_ms'):6.1f} ms   ({runs[0]['backend']})")
@@ -0,0 +1,55 @@
+# Benchmark: bytes sent per 'telemetry_update' client with full-dict emits versus
+# delta-encoded frames, over a synthetic hover-then-cruise flight.
+#
+# Usage: python benchmarks/telemetry_bandwidth.py [seconds]
+
+import json
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telemetry import DeltaEncoder
+
+
+def synthetic_states(seconds, rate_hz=20.0, seed=1):
+    """ Yields (time, telemetry dict) at the attitude flush rate with sensor noise. """
+    rng = random.Random(seed)
+    lat, lon, alt = 17.3850, 78.4867, 10.0
+    for i in range(int(seconds * rate_hz)):
+        t = i / rate_hz
+        cruising = t > seconds / 2
+        speed = 5.0 if cruising else 0.0
+        lat += speed / rate_hz / 111319.5
+        yield t, {
+            "latitude": lat + rng.gauss(0, 2e-8), "longitude": lon + rng.gauss(0, 2e-8),
+            "altitude": alt + rng.gauss(0, 0.02),
+            "groundspeed": speed + abs(rng.gauss(0, 0.02)), "airspeed": speed + abs(rng.gauss(0, 0.02)),
+            "heading": 0, "roll": rng.gauss(0, 0.05) + (2.0 * math.sin(t) if cruising else 0.0),
+            "pitch": rng.gauss(0, 0.05) - (5.0 if cruising else 0.0), "yaw": rng.gauss(0, 0.05),
+            "battery_voltage": round(12.6 - t * 0.001, 2), "battery_current": round(8.0 + rng.gauss(0, 0.003), 2),
+            "battery_level": 100 - int(t / 60), "mode": "GUIDED", "armed": True, "is_armable": True,
+            "system_status": "ACTIVE", "gps_fix": 3, "gps_satellites": 12,
+        }
+
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 120.0
+    encoder = DeltaEncoder()
+    full_bytes = delta_bytes = full_frames = delta_frames = keyframes = 0
+    for t, state in synthetic_states(seconds):
+        full_bytes += len(json.dumps(state))
+        full_frames += 1
+        frame = encoder.encode(state, now=t)
+        if frame:
+            delta_bytes += len(json.dumps(frame))
+            delta_frames += 1
+            keyframes += frame["key"]
+
+    print(f"{seconds:.0f} s of telemetry at 20 Hz")
+    print(f"  full dict : {full_frames:6d} frames {full_bytes / 1024:9.1f} KiB  ({full_bytes / seconds:8.0f} B/s per client)")
+    print(f"  delta     : {delta_frames:6d} frames {delta_bytes / 1024:9.1f} KiB  ({delta_bytes / seconds:8.0f} B/s per client, "
+          f"{keyframes} keyframes)")
+    print(f"  reduction : {100.0 * (1 - delta_bytes / full_bytes):.1f}%")
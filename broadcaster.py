@@ -0,0 +1,285 @@
+# Socket.IO fan-out for the dashboard: topic rooms, per-client rates and
+# latest-only outbound queues.
+#
+# Telemetry is split into topics (TOPIC_FIELDS) with one DeltaEncoder each, so
+# a client only receives the topics it subscribed to:
+#
+#     socket.emit('subscribe', {topics: {attitude: 10, position: 2, battery: 0.2}})
+#
+# (rates in Hz; 0 or null is every frame; topics left out are not sent). New
+# clients get every topic at full rate until they subscribe, as before.
+#
+# publish() only merges the frame into a per-topic slot and wakes the sender
+# thread, so the telemetry thread never waits on clients. Clients with the
+# same subscription share a room and a schedule: the sender merges each
+# topic's frames until the group's rate lets it through, then emits all of the
+# group's due topics as one message, serialized once for every member. A
+# client whose transport already has more than 'max_queue' packets waiting is
+# skipped and gets the frames merged into its own pending slots instead, sent
+# directly once it has caught up. The slots hold only the latest value of each
+# field, so a slow phone or a stalled browser costs a bounded amount of memory
+# and catches up with one merged frame per topic.
+#
+# Every 'telemetry_update' carries a list of frames:
+#     [{"topic": "attitude", "seq": 42, "key": false, "fields": {...}}, ...]
+# with sequence numbers per topic. With several vehicles (fleet.py) each has
+# its own Broadcaster with a 'stream' ID, added to its frames as "vehicle".
+
+import threading
+import time
+from metrics import counter, histogram
+from telemetry import DeltaEncoder
+
+TOPIC_FIELDS = {
+    "attitude": ("roll", "pitch", "yaw", "heading"),
+    "position": ("latitude", "longitude", "altitude", "groundspeed", "airspeed"),
+    "battery": ("battery_voltage", "battery_current", "battery_level"),
+    "status": ("mode", "armed", "is_armable", "system_status", "gps_fix", "gps_satellites"),
+    "detections": (), # Published directly (see app.py's /detections)
+}
+EVENT = 'telemetry_update'
+
+# --- Metrics ---
+send_seconds = histogram("socketio_send_seconds", "One Broadcaster pass: merge, backlog checks and emits")
+messages_total = counter("socketio_messages_total", "Telemetry messages emitted: room or direct", ("target",))
+room_messages, direct_messages = messages_total.labels("room"), messages_total.labels("direct")
+
+
+def _merge(pending, frame):
+    """ Folds 'frame' into a not-yet-sent frame of the same topic (keyframes replace it). """
+    if pending is None or frame["key"]:
+        return dict(frame, fields=dict(frame["fields"]))
+    pending["seq"] = frame["seq"]
+    pending["fields"].update(frame["fields"])
+    return pending
+
+
+class _Group:
+    """ Clients with the same subscription: one room, one schedule. """
+    __slots__ = ("room", "intervals", "members", "pending", "next_due")
+
+    def __init__(self, room, intervals):
+        self.room = room
+        self.intervals = intervals # Topic -> minimum seconds between frames (0: every frame)
+        self.members = set()
+        self.pending = {} # Topic -> merged frame waiting until it is due
+        self.next_due = dict.fromkeys(intervals, 0.0)
+
+
+class _Client:
+    __slots__ = ("sid", "group", "pending", "merged")
+
+    def __init__(self, sid):
+        self.sid = sid
+        self.group = None
+        self.pending = {} # Topic -> merged frame held back while the client's transport is backed up
+        self.merged = 0 # Frames folded into a pending one instead of sent
+
+
+class Broadcaster:
+    """
+    Args:
+        socketio: The app's flask_socketio.SocketIO
+        keyframe_interval: Seconds between full keyframes per topic
+        max_queue: Packets a client's transport may hold before frames for it are merged instead
+        stream: Vehicle ID tagged on frames and prefixed to room names (None: single vehicle)
+    """
+
+    def __init__(self, socketio, keyframe_interval=10.0, max_queue=2, namespace='/', stream=None):
+        self.socketio = socketio
+        self.stream = stream
+        self.namespace = namespace
+        self.max_queue = max_queue
+        self._encoders = {topic: DeltaEncoder(keyframe_interval=keyframe_interval) for topic in TOPIC_FIELDS}
+        self._field_topic = {field: topic for topic, fields in TOPIC_FIELDS.items() for field in fields}
+        self._incoming = {} # Topic -> frame published since the sender last ran
+        self._clients = {}
+        self._groups = {} # Room -> _Group
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = False
+        self.messages = 0 # Messages emitted to group rooms
+        self.direct = 0 # Messages sent to one client (keyframes and catch-ups)
+        self.send_seconds = 0.0
+
+    # --- Publishing (any thread) ---
+
+    def publish_telemetry(self, state):
+        """ Splits a full telemetry dict into topics and publishes what changed. """
+        by_topic = {}
+        for field, value in state.items():
+            by_topic.setdefault(self._field_topic.get(field, "status"), {})[field] = value
+        for topic, fields in by_topic.items():
+            self.publish(topic, fields)
+
+    def publish(self, topic, fields):
+        """ Publishes the current values of 'fields' under 'topic' (only changes are sent). """
+        frame = self._encoders[topic].encode(fields)
+        if frame is None:
+            return
+        frame["topic"] = topic
+        if self.stream is not None:
+            frame["vehicle"] = self.stream
+        with self._lock:
+            self._incoming[topic] = _merge(self._incoming.get(topic), frame)
+        self._wake.set()
+
+    # --- Clients (Socket.IO handlers) ---
+
+    def add_client(self, sid, topics=None):
+        """
+        Registers a connected client with 'topics' (default: every topic at
+        full rate) and sends it keyframes. Returns the subscription as applied.
+        """
+        with self._lock:
+            self._clients[sid] = _Client(sid)
+        return self.subscribe(sid, dict.fromkeys(TOPIC_FIELDS, 0) if topics is None else topics)
+
+    def __contains__(self, sid):
+        return sid in self._clients
+
+    def remove_client(self, sid):
+        with self._lock:
+            client = self._clients.pop(sid, None)
+            if client is not None:
+                self._leave(client)
+
+    def subscribe(self, sid, topics):
+        """
+        Sets a client's topics: {topic: rate Hz, 0/None for every frame}.
+        Returns the subscription as applied; unknown topics are ignored.
+        """
+        intervals = {topic: (1.0 / float(rate) if rate else 0.0)
+                     for topic, rate in (topics or {}).items() if topic in TOPIC_FIELDS}
+        room = (f"{self.stream}:" if self.stream is not None else "") + "telemetry:" + \
+            ",".join(f"{topic}@{intervals[topic]:g}" for topic in sorted(intervals))
+        with self._lock:
+            client = self._clients.get(sid)
+            if client is None:
+                return {}
+            if client.group is None or client.group.room != room:
+                self._leave(client)
+                group = self._groups.get(room)
+                if group is None:
+                    group = self._groups[room] = _Group(room, intervals)
+                self.socketio.server.enter_room(sid, room, namespace=self.namespace)
+                group.members.add(sid)
+                client.group = group
+            client.pending = {topic: frame for topic, frame in client.pending.items() if topic in intervals}
+        # Fresh keyframes, since the client may not hold the topics' fields yet
+        frames = [dict(self._encoders[topic].keyframe(), topic=topic) for topic in intervals]
+        if self.stream is not None:
+            for frame in frames:
+                frame["vehicle"] = self.stream
+        self._send_direct(sid, [frame for frame in frames if frame["fields"]])
+        return {topic: (1.0 / interval if interval else 0) for topic, interval in intervals.items()}
+
+    def _leave(self, client):
+        """ Takes the client out of its group, dropping the group once empty (lock held). """
+        group = client.group
+        if group is None:
+            return
+        self.socketio.server.leave_room(client.sid, group.room, namespace=self.namespace)
+        group.members.discard(client.sid)
+        if not group.members:
+            del self._groups[group.room]
+        client.group = None
+
+    # --- Sender thread ---
+
+    def start(self):
+        self._running = True
+        self.socketio.start_background_task(self._run)
+        return self
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+
+    def _backlog(self, sid):
+        """ Packets waiting in the client's transport queue. """
+        try:
+            server = self.socketio.server
+            socket = server.eio.sockets.get(server.manager.eio_sid_from_sid(sid, self.namespace))
+            return socket.queue.qsize() if socket is not None else 0
+        except Exception:
+            return 0
+
+    def _send_direct(self, sid, frames):
+        if frames:
+            self.socketio.emit(EVENT, frames, to=sid, namespace=self.namespace)
+            self.direct += 1
+            direct_messages.inc()
+
+    def _run(self):
+        timeout = None
+        while self._running:
+            self._wake.wait(timeout)
+            self._wake.clear()
+            started = time.perf_counter()
+            try:
+                timeout = self.send_due(time.monotonic())
+            except Exception as e:
+                print(f"Broadcaster: send failed: {e}")
+                timeout = 1.0
+            elapsed = time.perf_counter() - started
+            self.send_seconds += elapsed
+            send_seconds.observe(elapsed)
+
+    def send_due(self, now):
+        """
+        Sends the frames published since the last call that are due for each
+        group, and catches up clients that were backed up. Returns seconds
+        until something held back becomes due, or None when nothing is.
+        """
+        with self._lock:
+            incoming, self._incoming = self._incoming, {}
+            groups = list(self._groups.values())
+            clients = {sid: client for sid, client in self._clients.items()}
+
+        next_due = None
+        for group in groups:
+            for topic, frame in incoming.items():
+                if topic in group.intervals:
+                    group.pending[topic] = _merge(group.pending.get(topic), frame)
+            frames = []
+            for topic in list(group.pending):
+                if now >= group.next_due[topic]:
+                    frames.append(group.pending.pop(topic))
+                    group.next_due[topic] = now + group.intervals[topic]
+                else:
+                    wait = group.next_due[topic] - now
+                    next_due = wait if next_due is None else min(next_due, wait)
+            if not frames:
+                continue
+            # Clients still catching up, or whose transport is backed up, get the frames merged instead
+            skip = []
+            for sid in list(group.members):
+                client = clients.get(sid)
+                if client is not None and (client.pending or self._backlog(sid) > self.max_queue):
+                    for frame in frames:
+                        client.pending[frame["topic"]] = _merge(client.pending.get(frame["topic"]), frame)
+                        client.merged += 1
+                    skip.append(sid)
+            if len(skip) < len(group.members):
+                self.socketio.emit(EVENT, frames, to=group.room, skip_sid=skip, namespace=self.namespace)
+                self.messages += 1
+                room_messages.inc()
+
+        for client in clients.values():
+            if not client.pending:
+                continue
+            if self._backlog(client.sid) > self.max_queue:
+                next_due = 0.05 if next_due is None else min(next_due, 0.05) # Retried every 50 ms
+                continue
+            frames, client.pending = list(client.pending.values()), {}
+            self._send_direct(client.sid, frames)
+        return next_due
+
+    def to_dict(self):
+        with self._lock:
+            clients = list(self._clients.values())
+            groups = len(self._groups)
+        return {"clients": len(clients), "groups": groups, "room_messages": self.messages,
+                "direct_messages": self.direct, "merged": sum(c.merged for c in clients),
+                "pending": sum(len(c.pending) for c in clients), "send_ms": round(self.send_seconds * 1000, 1)}
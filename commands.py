@@ -0,0 +1,297 @@
+# Acknowledgement-driven MAVLink commands.
+#
+# Assigning 'vehicle.mode' or 'vehicle.armed' in DroneKit sends a message and
+# returns; callers then sleep and poll the attribute. CommandSender sends each
+# COMMAND_LONG once and returns a Future that resolves the moment the
+# autopilot confirms it: a COMMAND_ACK for the command, or, for arming and mode
+# changes, a HEARTBEAT already showing the requested state, whichever arrives
+# first. A rejecting ACK fails the future with CommandRejected.
+#
+# One timer thread per vehicle retransmits unconfirmed commands (incrementing
+# the 'confirmation' field, as the MAVLink command protocol asks) and fails them
+# with CommandTimeout after the last retry, so any number of commands can be in
+# flight without a thread blocked on each.
+#
+#     commands = CommandSender().attach(vehicle)
+#     commands.set_mode("GUIDED").result()      # Round trip, not sleep granularity
+#     commands.arm().result()                   # Raises CommandRejected / CommandTimeout
+#     commands.rtl().add_done_callback(report)  # Or don't wait at all
+#     commands.detach()
+
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import Future
+from pymavlink import mavutil
+from metrics import counter, histogram
+
+mavlink = mavutil.mavlink
+
+# --- Metrics ---
+command_seconds = histogram("command_seconds", "First send to confirmation of a command", ("command",))
+command_results = counter("commands_total", "Commands by outcome: ack, state, rejected, timeout, error", ("result",))
+
+# How a command was confirmed: via 'ack' (COMMAND_ACK) or 'state' (HEARTBEAT), after 'attempts' sends
+CommandResult = namedtuple("CommandResult", "command via attempts rtt")
+
+
+def command_name(command):
+    entry = mavlink.enums["MAV_CMD"].get(command)
+    return entry.name if entry else str(command)
+
+
+class CommandError(Exception):
+    """ Raised for commands that could not be sent or were never confirmed. """
+
+
+class CommandRejected(CommandError):
+    """ The autopilot answered with a COMMAND_ACK other than ACCEPTED. """
+
+    def __init__(self, command, result):
+        self.command = command
+        self.result = result
+        entry = mavlink.enums["MAV_RESULT"].get(result)
+        super().__init__(f"{command_name(command)} rejected ({entry.name if entry else result})")
+
+
+class CommandTimeout(CommandError):
+    """ No COMMAND_ACK or confirming HEARTBEAT after every retry. """
+
+
+class _Pending:
+    """ One command in flight. """
+
+    def __init__(self, command, params, confirm, timeout, retries):
+        self.command = command
+        self.params = params
+        self.confirm = confirm
+        self.timeout = timeout
+        self.retries = retries
+        self.future = Future()
+        self.attempts = 0
+        self.sent_at = None # First transmission
+        self.deadline = None
+
+
+class CommandSender:
+    """
+    Sends COMMAND_LONGs to one vehicle and resolves them on acknowledgement.
+
+    Args:
+        timeout: Seconds to wait for confirmation before retransmitting
+        retries: Retransmissions before the command fails with CommandTimeout
+    """
+
+    def __init__(self, timeout=1.0, retries=2):
+        self.timeout = timeout
+        self.retries = retries
+        self.vehicle = None
+        self._pending = {} # MAV_CMD -> [_Pending], oldest first; COMMAND_ACK carries only the command
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self.sent = 0
+        self.retransmits = 0
+        self.acked = 0
+        self.confirmed = 0 # By HEARTBEAT before the ACK arrived
+        self.rejected = 0
+        self.timeouts = 0
+        self.rtts = deque(maxlen=1000)
+
+    # --- Vehicle ---
+
+    def attach(self, vehicle):
+        self.detach()
+        self.vehicle = vehicle
+        vehicle.add_message_listener('COMMAND_ACK', self._on_ack)
+        vehicle.add_message_listener('HEARTBEAT', self._on_heartbeat)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='CommandSender', daemon=True)
+        self._thread.start()
+        return self
+
+    def detach(self, reason="vehicle disconnected"):
+        """ Stops listening; commands still in flight fail with CommandError. """
+        vehicle, self.vehicle = self.vehicle, None
+        if vehicle is None:
+            return
+        for name, listener in (('COMMAND_ACK', self._on_ack), ('HEARTBEAT', self._on_heartbeat)):
+            try:
+                vehicle.remove_message_listener(name, listener)
+            except Exception:
+                pass
+        with self._cond:
+            self._running = False
+            pending = [p for queue in self._pending.values() for p in queue]
+            self._pending.clear()
+            self._cond.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(2.0)
+        self._thread = None
+        for p in pending:
+            if not p.future.done():
+                p.future.set_exception(CommandError(f"{command_name(p.command)}: {reason}"))
+
+    def _mode_number(self, name):
+        # DroneKit learns the mapping for the vehicle type from its first HEARTBEAT
+        mapping = getattr(self.vehicle, "_mode_mapping", None) or \
+            mavutil.mode_mapping_byname(mavlink.MAV_TYPE_QUADROTOR)
+        if name not in mapping:
+            raise CommandError(f"Unknown mode {name}")
+        return mapping[name]
+
+    # --- Commands ---
+
+    def send(self, command, params=(), confirm=None, timeout=None, retries=None):
+        """
+        Sends COMMAND_LONG 'command' with up to seven params and returns a
+        Future of CommandResult. 'confirm(heartbeat)' optionally recognises
+        the requested state in a HEARTBEAT, for when the ACK is lost.
+        """
+        if self.vehicle is None:
+            raise CommandError("Vehicle not connected")
+        pending = _Pending(command, tuple(params) + (0,) * (7 - len(params)), confirm,
+                           self.timeout if timeout is None else timeout, self.retries if retries is None else retries)
+        # Registered before sending, so an immediate ACK finds it
+        with self._cond:
+            self._pending.setdefault(command, []).append(pending)
+            pending.sent_at = time.monotonic()
+            pending.deadline = pending.sent_at + pending.timeout
+            pending.attempts = 1
+            self._cond.notify()
+        try:
+            self._transmit(pending)
+        except Exception as e:
+            self._discard(pending)
+            command_results.labels("error").inc()
+            pending.future.set_exception(CommandError(f"{command_name(command)}: {e}"))
+        return pending.future
+
+    def arm(self, arm=True, **options):
+        """ Arms (or disarms) the motors. """
+        return self.send(mavlink.MAV_CMD_COMPONENT_ARM_DISARM, (1 if arm else 0,),
+                         confirm=lambda hb: bool(hb.base_mode & mavlink.MAV_MODE_FLAG_SAFETY_ARMED) == arm,
+                         **options)
+
+    def set_mode(self, name, **options):
+        """ Switches to flight mode 'name' (e.g. "GUIDED"). """
+        number = self._mode_number(name)
+        return self.send(mavlink.MAV_CMD_DO_SET_MODE, (mavlink.MAV_MODE_FLAG_CUSTOM_MODE_ENABLED, number),
+                         confirm=lambda hb: hb.custom_mode == number, **options)
+
+    def rtl(self, **options):
+        """ Returns to launch. """
+        number = self._mode_number("RTL")
+        return self.send(mavlink.MAV_CMD_NAV_RETURN_TO_LAUNCH, confirm=lambda hb: hb.custom_mode == number,
+                         **options)
+
+    def _transmit(self, pending):
+        vehicle = self.vehicle
+        if vehicle is None:
+            raise CommandError("Vehicle not connected")
+        msg = vehicle.message_factory.command_long_encode(
+            0, 0,                 # target system, target component
+            pending.command,
+            pending.attempts - 1, # confirmation: 0 first, +1 per retransmission
+            *pending.params)
+        vehicle.send_mavlink(msg)
+        self.sent += 1
+
+    def _discard(self, pending):
+        with self._cond:
+            queue = self._pending.get(pending.command, [])
+            if pending in queue:
+                queue.remove(pending)
+            if not queue:
+                self._pending.pop(pending.command, None)
+
+    # --- Confirmation ---
+
+    def _resolve(self, pending, via):
+        if pending.future.done():
+            return
+        rtt = time.monotonic() - pending.sent_at
+        self.rtts.append(rtt)
+        command_seconds.labels(command_name(pending.command)).observe(rtt)
+        command_results.labels(via).inc()
+        pending.future.set_result(CommandResult(pending.command, via, pending.attempts, rtt))
+
+    def _on_ack(self, vehicle, name, msg):
+        with self._cond:
+            queue = self._pending.get(msg.command)
+            if not queue:
+                return
+            if msg.result == mavlink.MAV_RESULT_IN_PROGRESS:
+                queue[0].deadline = time.monotonic() + queue[0].timeout # Long-running: keep waiting
+                return
+            pending = queue.pop(0)
+            if not queue:
+                del self._pending[msg.command]
+        if pending.future.done():
+            return # Already confirmed by HEARTBEAT; this is its ACK
+        if msg.result == mavlink.MAV_RESULT_ACCEPTED:
+            self.acked += 1
+            self._resolve(pending, "ack")
+        else:
+            self.rejected += 1
+            command_results.labels("rejected").inc()
+            pending.future.set_exception(CommandRejected(msg.command, msg.result))
+
+    def _on_heartbeat(self, vehicle, name, msg):
+        if msg.autopilot == mavlink.MAV_AUTOPILOT_INVALID: # A GCS or companion computer
+            return
+        with self._cond:
+            matched = [p for queue in self._pending.values() for p in queue
+                       if p.confirm is not None and not p.future.done() and p.confirm(msg)]
+        # Left queued until the ACK (or deadline) so a late ACK is not taken for a newer command
+        for pending in matched:
+            self.confirmed += 1
+            self._resolve(pending, "state")
+
+    def _run(self):
+        """ Retransmits and expires commands as their deadlines pass. """
+        while True:
+            resend, expired = [], []
+            with self._cond:
+                if not self._running:
+                    return
+                now = time.monotonic()
+                next_deadline = None
+                for command, queue in list(self._pending.items()):
+                    for p in list(queue):
+                        if p.deadline > now:
+                            next_deadline = min(next_deadline or p.deadline, p.deadline)
+                        elif p.future.done() or p.attempts > p.retries:
+                            queue.remove(p)
+                            if not p.future.done():
+                                expired.append(p)
+                        else:
+                            p.attempts += 1
+                            p.deadline = now + p.timeout
+                            resend.append(p)
+                    if not queue:
+                        del self._pending[command]
+                if not resend and not expired:
+                    self._cond.wait(None if next_deadline is None else next_deadline - now)
+                    continue
+            for p in expired:
+                self.timeouts += 1
+                command_results.labels("timeout").inc()
+                p.future.set_exception(CommandTimeout(
+                    f"{command_name(p.command)} not acknowledged after {p.attempts} attempt(s)"))
+            for p in resend:
+                self.retransmits += 1
+                try:
+                    self._transmit(p)
+                except Exception as e:
+                    self._discard(p)
+                    command_results.labels("error").inc()
+                    p.future.set_exception(CommandError(f"{command_name(p.command)}: {e}"))
+
+    def to_dict(self):
+        with self._cond:
+            in_flight = sum(1 for queue in self._pending.values() for p in queue if not p.future.done())
+        rtts = sorted(self.rtts)
+        return {"in_flight": in_flight, "sent": self.sent, "retransmits": self.retransmits, "acked": self.acked,
+                "confirmed_by_state": self.confirmed, "rejected": self.rejected, "timeouts": self.timeouts,
+                "rtt_p50_ms": rtts[len(rtts) // 2] * 1000 if rtts else None}
@@ -0,0 +1,263 @@
+# Vehicle connections: fast connect, lazy parameters, link health and backoff.
+#
+# DroneKit's connect(wait_ready=True) returns only once every parameter has
+# downloaded (several hundred PARAM_VALUEs, 10-30 s over a telemetry radio),
+# although telemetry flows from the first second. open_vehicle() waits only for
+# the attributes the caller needs (by default what the dashboard shows) and
+# leaves the parameter download to DroneKit's background loop.
+#
+# ParameterStore answers parameter reads without waiting for that download:
+# the live value once it has arrived, otherwise the value cached on disk from
+# this vehicle's previous session, otherwise a single PARAM_REQUEST_READ. The
+# cache is rewritten whenever a download completes.
+#
+# LinkMonitor watches every message: heartbeat interval, packet loss from the
+# MAVLink sequence numbers, and message rates. A link with no HEARTBEAT for a
+# few seconds is lost, instead of DroneKit's 30 s. Backoff spaces out the
+# reconnect attempts.
+#
+#     vehicle = open_vehicle("tcp:127.0.0.1:5762")     # Returns once telemetry is flowing
+#     monitor = LinkMonitor().attach(vehicle)
+#     params = ParameterStore(ParameterCache("params", "1")).attach(vehicle)
+#     params.get("WPNAV_SPEED")                        # Live, cached or fetched
+#     monitor.healthy(3.0), monitor.to_dict()
+
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from dronekit import connect
+from pymavlink import mavutil
+
+mavlink = mavutil.mavlink
+
+# DroneKit attributes TelemetryEngine reads (see telemetry.ATTRIBUTE_FIELDS)
+TELEMETRY_ATTRIBUTES = ("attitude", "location.global_relative_frame", "battery", "gps_0", "mode", "armed",
+                        "system_status")
+
+
+def open_vehicle(connection, wait_for=TELEMETRY_ATTRIBUTES, timeout=30, heartbeat_timeout=15, **options):
+    """
+    Connects without waiting for the parameter download and returns once the
+    attributes in 'wait_for' have been received (DroneKit's wait_ready with a
+    chosen set). Extra options go to dronekit.connect.
+    """
+    vehicle = connect(connection, wait_ready=False, heartbeat_timeout=heartbeat_timeout, **options)
+    try:
+        if wait_for:
+            vehicle.wait_ready(*wait_for, timeout=timeout)
+    except BaseException:
+        vehicle.close()
+        raise
+    return vehicle
+
+
+class Backoff:
+    """ Reconnect delays: 'initial' seconds, multiplied by 'factor' per failure up to 'maximum', with jitter. """
+
+    def __init__(self, initial=0.5, maximum=30.0, factor=2.0, jitter=0.2):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.failures = 0
+
+    def next(self):
+        delay = min(self.maximum, self.initial * self.factor ** self.failures)
+        self.failures += 1
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def reset(self):
+        self.failures = 0
+
+
+# --- Parameters ---
+
+class ParameterCache:
+    """ Last known parameter values of one vehicle, as JSON in '<directory>/<vehicle_id>.json'. """
+
+    def __init__(self, directory, vehicle_id):
+        self.path = os.path.join(directory, f"{vehicle_id}.json")
+        self.values = {}
+        self.saved_at = None # Wall clock time the values were downloaded
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self.values, self.saved_at = dict(data["parameters"]), data["saved_at"]
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Parameter cache {self.path} unreadable, ignoring it: {e}")
+
+    def save(self, values):
+        self.values, self.saved_at = dict(values), time.time()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"saved_at": self.saved_at, "parameters": self.values}, f, sort_keys=True)
+        os.replace(tmp, self.path) # A crash mid-write keeps the previous cache
+
+
+class ParameterStore:
+    """
+    Parameter reads that never wait for the full download.
+
+    Args:
+        cache: Optional ParameterCache, read for values not received yet and
+            rewritten when a download completes
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.vehicle = None
+        self.live = {} # Received from the vehicle this session
+        self.complete = False # The full download finished
+        self.fetched = 0 # Single parameters requested by get()
+        self._cond = threading.Condition()
+
+    def attach(self, vehicle):
+        self.detach()
+        with self._cond:
+            self.live, self.complete = {}, False
+        self.vehicle = vehicle
+        vehicle.add_message_listener('PARAM_VALUE', self._on_param)
+        vehicle.add_attribute_listener('parameters', self._on_download)
+        # A fast link can deliver some or all of them while connecting, before this attach
+        with self._cond:
+            self.live.update(getattr(vehicle, "_params_map", {}))
+        if 'parameters' in getattr(vehicle, "_ready_attrs", ()):
+            self._on_download(vehicle, 'parameters', None)
+        return self
+
+    def detach(self):
+        vehicle, self.vehicle = self.vehicle, None
+        if vehicle is None:
+            return
+        try:
+            vehicle.remove_message_listener('PARAM_VALUE', self._on_param)
+            vehicle.remove_attribute_listener('parameters', self._on_download)
+        except Exception:
+            pass
+
+    def _on_param(self, vehicle, name, msg):
+        with self._cond:
+            self.live[msg.param_id] = msg.param_value
+            self._cond.notify_all()
+
+    def _on_download(self, vehicle, attr_name, value):
+        """ DroneKit has every parameter: the cache is brought up to date for the next session. """
+        self.complete = True
+        if self.cache is not None:
+            with self._cond:
+                values = dict(self.live)
+            try:
+                self.cache.save(values)
+            except OSError as e:
+                print(f"Could not save parameter cache {self.cache.path}: {e}")
+
+    def get(self, name, timeout=2.0):
+        """ (value, source): 'live', 'cache' or 'fetched'. Raises KeyError if the vehicle has no such parameter. """
+        with self._cond:
+            if name in self.live:
+                return self.live[name], "live"
+        if self.cache is not None and name in self.cache.values:
+            return self.cache.values[name], "cache"
+        vehicle = self.vehicle
+        if vehicle is None:
+            raise KeyError(name)
+        self.fetched += 1
+        vehicle.send_mavlink(vehicle.message_factory.param_request_read_encode(0, 0, name.encode(), -1))
+        with self._cond:
+            if not self._cond.wait_for(lambda: name in self.live, timeout):
+                raise KeyError(name)
+            return self.live[name], "fetched"
+
+    def to_dict(self):
+        cache = self.cache
+        return {"received": len(self.live), "complete": self.complete, "fetched": self.fetched,
+                "cached": len(cache.values) if cache else 0,
+                "cache_age_s": time.time() - cache.saved_at if cache and cache.saved_at else None}
+
+
+# --- Link Health ---
+
+class LinkMonitor:
+    """
+    Heartbeat interval, packet loss and per-message rates of one vehicle link.
+
+    Args:
+        window: Seconds over which message rates are counted
+    """
+
+    def __init__(self, window=5.0):
+        self.window = window
+        self.vehicle = None
+        self._reset()
+
+    def _reset(self):
+        self.attached_at = time.monotonic()
+        self.last_heartbeat = None # Monotonic time of the vehicle's last HEARTBEAT
+        self.intervals = deque(maxlen=10)
+        self.received = 0
+        self.lost = 0
+        self._seq = {} # (system, component) -> last sequence number
+        self._counts = {}
+        self._window_start = self.attached_at
+        self.rates = {} # Message type -> Hz over the last complete window
+
+    def attach(self, vehicle):
+        self.detach()
+        self._reset()
+        self.vehicle = vehicle
+        vehicle.add_message_listener('*', self._on_message)
+        return self
+
+    def detach(self):
+        vehicle, self.vehicle = self.vehicle, None
+        if vehicle is not None:
+            try:
+                vehicle.remove_message_listener('*', self._on_message)
+            except Exception:
+                pass
+
+    def _on_message(self, vehicle, name, msg):
+        """ Runs for every message on the MAVLink receive thread; keep it cheap. """
+        now = time.monotonic()
+        source = (msg.get_srcSystem(), msg.get_srcComponent())
+        seq = msg.get_seq()
+        last = self._seq.get(source)
+        if last is not None:
+            self.lost += (seq - last - 1) % 256 # Sequence numbers wrap at 256
+        self._seq[source] = seq
+        self.received += 1
+        self._counts[name] = self._counts.get(name, 0) + 1
+        if now - self._window_start >= self.window:
+            elapsed = now - self._window_start
+            self.rates = {n: count / elapsed for n, count in self._counts.items()}
+            self._counts, self._window_start = {}, now
+        if name == 'HEARTBEAT' and msg.autopilot != mavlink.MAV_AUTOPILOT_INVALID:
+            if self.last_heartbeat is not None:
+                self.intervals.append(now - self.last_heartbeat)
+            self.last_heartbeat = now
+
+    def heartbeat_age(self):
+        """ Seconds since the last HEARTBEAT (since attaching if there has been none). """
+        return time.monotonic() - (self.last_heartbeat or self.attached_at)
+
+    def healthy(self, timeout):
+        return self.vehicle is not None and self.heartbeat_age() < timeout
+
+    def to_dict(self):
+        intervals = list(self.intervals)
+        total = self.received + self.lost
+        return {"heartbeat_age_s": round(self.heartbeat_age(), 3),
+                "heartbeat_interval_s": round(sum(intervals) / len(intervals), 3) if intervals else None,
+                "received": self.received, "lost": self.lost,
+                "loss_percent": round(100.0 * self.lost / total, 2) if total else 0.0,
+                "message_rate": round(sum(self.rates.values()), 1),
+                "rates": {name: round(hz, 1) for name, hz in sorted(self.rates.items())}}
@@ -0,0 +1,516 @@
+# Coverage path planner for orchard surveys.
+#
+# Plans a boustrophedon ("lawnmower") path over a field polygon: parallel rows
+# spaced so that neighbouring camera swaths overlap by 'overlap', flown back
+# and forth. By default the row direction is the one that splits the field
+# into the fewest row pieces, i.e. the fewest turns, out of the field's
+# minimum-width direction and every 5 degrees.
+# Keep-outs are taken as their convex hull grown by a clearance margin; they
+# split rows, split rows are grouped into cells, each cell is flown as its own
+# serpentine, and cells are chained nearest-first with transits routed around
+# the keep-outs.
+#
+# The geometry runs in a local metric frame on NumPy arrays. Row/edge
+# intersections for the whole field are computed in one batch, so fields with
+# thousands of vertices plan in milliseconds. CoveragePath.to_plan() returns a
+# mission plan of 'waypoint' legs for mission_plans.PlanCompiler.
+
+import heapq
+import math
+import time
+import numpy as np
+from geodesy import ned_offsets, offset_to_latlon
+from mission_compiler import MissionCompileError
+
+MIN_SEGMENT = 0.5 # m, shorter row pieces are dropped
+
+
+class CoverageError(MissionCompileError):
+    """ Raised when a field, keep-out or camera description can't be planned. """
+
+
+def swath_width(altitude, fov):
+    """ Ground width in metres imaged across track from 'altitude' with a 'fov' degree camera. """
+    return 2.0 * altitude * math.tan(math.radians(fov) / 2.0)
+
+
+def row_spacing(altitude, fov, overlap):
+    """ Distance between rows so that adjacent swaths share 'overlap' of their width. """
+    if not 0 < fov < 180:
+        raise CoverageError("'fov' must be between 0 and 180 degrees")
+    if altitude <= 0:
+        raise CoverageError("'altitude' must be positive")
+    if not 0 <= overlap < 1:
+        raise CoverageError("'overlap' must be in [0, 1)")
+    return swath_width(altitude, fov) * (1.0 - overlap)
+
+
+def _ring(points, name):
+    """ (n, 2) float array of (lat, lon) vertices without the closing duplicate. """
+    try:
+        ring = np.asarray(points, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise CoverageError(f"{name} must be a list of [lat, lon] pairs")
+    if ring.ndim != 2 or ring.shape[1] != 2:
+        raise CoverageError(f"{name} must be a list of [lat, lon] pairs")
+    if len(ring) > 1 and np.array_equal(ring[0], ring[-1]):
+        ring = ring[:-1]
+    if len(ring) < 3:
+        raise CoverageError(f"{name} needs at least 3 vertices")
+    if not (np.all(np.abs(ring[:, 0]) <= 90) and np.all(np.abs(ring[:, 1]) <= 180)):
+        raise CoverageError(f"{name} has an invalid lat/lon")
+    return ring
+
+
+def _convex_hull(points):
+    """ Monotone chain convex hull of (n, 2) points, counter-clockwise. """
+    pts = np.unique(points, axis=0)
+    if len(pts) < 3:
+        return pts
+    if len(pts) > 64:
+        # Akl-Toussaint: drop points strictly inside the octagon of extremes
+        # along the axes and diagonals
+        x, y = pts[:, 0], pts[:, 1]
+        octagon = pts[[x.argmin(), (x + y).argmin(), y.argmin(), (x - y).argmax(),
+                       x.argmax(), (x + y).argmax(), y.argmax(), (y - x).argmax()]]
+        edge = np.roll(octagon, -1, axis=0) - octagon
+        rel = pts[:, None, :] - octagon[None, :, :]
+        inside = ((edge[None, :, 0] * rel[:, :, 1] - edge[None, :, 1] * rel[:, :, 0]) > 0).all(axis=1)
+        pts = pts[~inside]
+
+    def half(sequence):
+        hull = []
+        for p in sequence:
+            while len(hull) >= 2 and ((hull[-1][0] - hull[-2][0]) * (p[1] - hull[-2][1]) -
+                                      (hull[-1][1] - hull[-2][1]) * (p[0] - hull[-2][0])) <= 0:
+                hull.pop()
+            hull.append(p)
+        return hull
+
+    pts = pts.tolist()
+    lower, upper = half(pts), half(reversed(pts))
+    return np.array(lower[:-1] + upper[:-1])
+
+
+def _grow(ring, clearance):
+    """ Convex hull of 'ring' grown outwards by about 'clearance' metres (octagonal buffer). """
+    angles = np.arange(8) * (math.pi / 4)
+    ring = np.asarray(ring)
+    if clearance > 0:
+        offsets = clearance * np.column_stack((np.cos(angles), np.sin(angles)))
+        ring = (ring[:, None, :] + offsets[None, :, :]).reshape(-1, 2)
+    return _convex_hull(ring)
+
+
+def min_width_heading(points):
+    """
+    Row heading in degrees [0, 180) that minimises the width of 'points' (local
+    north/east metres) across the rows. The minimum is always attained parallel
+    to a convex hull edge, so only those directions are tried.
+    """
+    hull = _convex_hull(points)
+    d = np.roll(hull, -1, axis=0) - hull
+    angles = np.degrees(np.arctan2(d[:, 1], d[:, 0])) % 180.0
+    _, first = np.unique(np.round(angles * 2), return_index=True) # 0.5 degree buckets
+    candidates = np.radians(angles[first])
+    across = np.outer(np.cos(candidates), hull[:, 1]) - np.outer(np.sin(candidates), hull[:, 0])
+    widths = across.max(axis=1) - across.min(axis=1)
+    return float(np.degrees(candidates[np.argmin(widths)]))
+
+
+def _rows(ring, spacing):
+    """ First row offset and row count centring the rows across 'ring' (rotated frame). """
+    lo, hi = ring[:, 1].min(), ring[:, 1].max()
+    row_count = max(1, math.ceil((hi - lo) / spacing))
+    return lo + ((hi - lo) - (row_count - 1) * spacing) / 2.0, row_count
+
+
+def best_heading(points, spacing, step=5.0):
+    """
+    Row heading in degrees [0, 180) over 'points' (local north/east field
+    polygon) giving the fewest row pieces, ties going to fewer rows.
+    """
+    best = None
+    for heading in [min_width_heading(points)] + np.arange(0.0, 180.0, step).tolist():
+        ring = np.column_stack(_rotate(points[:, 0], points[:, 1], heading))
+        across0, row_count = _rows(ring, spacing)
+        score = (len(_row_segments(ring, [], across0, spacing)[0]), row_count)
+        if best is None or score < best[0]:
+            best = (score, heading)
+    return best[1]
+
+
+def _rotate(north, east, heading):
+    """ Local north/east to (along, across) the rows running at 'heading'. """
+    h = math.radians(heading)
+    return north * math.cos(h) + east * math.sin(h), east * math.cos(h) - north * math.sin(h)
+
+
+def _unrotate(along, across, heading):
+    h = math.radians(heading)
+    return along * math.cos(h) - across * math.sin(h), along * math.sin(h) + across * math.cos(h)
+
+
+class _KeepOuts:
+    """ Convex keep-outs in the rotated frame with vectorised blocking tests and a transit router. """
+
+    def __init__(self, rings, margin=1.0, eps=1e-6):
+        self.count = len(rings)
+        self.eps = eps
+        if rings:
+            sizes = np.array([len(ring) for ring in rings])
+            self.first_edge = np.cumsum(sizes) - sizes
+            self.edge_count = sizes
+            self.a = np.concatenate(rings)
+            self.e = np.concatenate([np.roll(ring, -1, axis=0) for ring in rings]) - self.a
+            self.e_len = np.hypot(self.e[:, 0], self.e[:, 1])
+            self.lo = np.array([ring.min(axis=0) for ring in rings])
+            self.hi = np.array([ring.max(axis=0) for ring in rings])
+            lo, hi = self.lo - margin, self.hi + margin
+            self.nodes = np.stack([lo, np.column_stack((hi[:, 0], lo[:, 1])), hi,
+                                   np.column_stack((lo[:, 0], hi[:, 1]))], axis=1).reshape(-1, 2)
+        self._inside = None
+        self._visibility = None
+
+    def _hits(self, p, q):
+        """ (segment, keep-out) index arrays of segments p[i] -> q[i] entering a keep-out's interior. """
+        none = np.zeros(0, dtype=np.int64)
+        if not self.count:
+            return none, none
+
+        # Only segment/keep-out pairs whose bounding boxes overlap
+        seg_lo, seg_hi = np.minimum(p, q), np.maximum(p, q)
+        seg, poly = np.nonzero((seg_lo[:, None, :] < self.hi[None]).all(axis=2) &
+                               (seg_hi[:, None, :] > self.lo[None]).all(axis=2))
+        if not len(seg):
+            return none, none
+        counts = self.edge_count[poly]
+        pair = np.repeat(np.arange(len(seg)), counts)
+        edge = self.first_edge[poly][pair] + np.arange(len(pair)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        # Cyrus-Beck: clip t in [0, 1] of p + t (q - p) against each edge's
+        # inner half-plane (keep-outs are counter-clockwise convex hulls)
+        e, e_len = self.e[edge], self.e_len[edge]
+        start, d = p[seg][pair], (q - p)[seg][pair]
+        offset = start - self.a[edge]
+        dist0 = (e[:, 0] * offset[:, 1] - e[:, 1] * offset[:, 0]) / e_len - self.eps
+        rate = (e[:, 0] * d[:, 1] - e[:, 1] * d[:, 0]) / e_len
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = -dist0 / rate
+        t_lower = np.where(rate > 0, t, np.where((rate == 0) & (dist0 <= 0), np.inf, -np.inf))
+        t_upper = np.where(rate < 0, t, np.inf)
+        groups = np.cumsum(counts) - counts
+        t_in = np.maximum(np.maximum.reduceat(t_lower, groups), 0.0)
+        t_out = np.minimum(np.minimum.reduceat(t_upper, groups), 1.0)
+        hit = t_out > t_in
+        return seg[hit], poly[hit]
+
+    def blocked(self, p, q):
+        """
+        Boolean per segment p[i] -> q[i]: passes through the interior of a
+        keep-out (touching or running along its boundary is allowed).
+        """
+        p, q = np.atleast_2d(p), np.atleast_2d(q)
+        result = np.zeros(len(p), dtype=bool)
+        result[self._hits(p, q)[0]] = True
+        return result
+
+    def contains(self, points):
+        """ Boolean per point: strictly inside a keep-out. """
+        return self.blocked(points, points)
+
+    def _graph(self, ids):
+        """ Visibility lists between the corner nodes 'ids' (indices into self.nodes). """
+        nodes = self.nodes[ids]
+        inside = self._inside[ids]
+        i, j = np.triu_indices(len(ids), 1)
+        open_ = ~self.blocked(nodes[i], nodes[j]) & ~inside[i] & ~inside[j]
+        lengths = np.hypot(*(nodes[i] - nodes[j]).T)
+        graph = [[] for _ in range(len(ids))]
+        for a, b, length in zip(i[open_].tolist(), j[open_].tolist(), lengths[open_].tolist()):
+            graph[a].append((b, length))
+            graph[b].append((a, length))
+        return graph
+
+    def _shortest(self, p, q, ids, graph):
+        """ Dijkstra p -> q over the corner nodes 'ids'; None when q can't be reached. """
+        nodes = self.nodes[ids]
+        n = len(ids)
+        inside = self._inside[ids]
+        from_p = ~self.blocked(np.repeat(p[None], n, axis=0), nodes) & ~inside
+        to_q = ~self.blocked(nodes, np.repeat(q[None], n, axis=0)) & ~inside
+        dist_p = np.hypot(*(nodes - p).T)
+        dist_q = np.hypot(*(nodes - q).T)
+
+        # Node n is the goal
+        best = {i: d for i, d in enumerate(dist_p.tolist()) if from_p[i]}
+        queue = [(d, i) for i, d in best.items()]
+        heapq.heapify(queue)
+        previous = {}
+        while queue:
+            d, node = heapq.heappop(queue)
+            if node == n:
+                break
+            if d > best.get(node, math.inf):
+                continue
+            edges = list(graph[node])
+            if to_q[node]:
+                edges.append((n, dist_q[node]))
+            for other, length in edges:
+                if d + length < best.get(other, math.inf):
+                    best[other] = d + length
+                    previous[other] = node
+                    heapq.heappush(queue, (d + length, other))
+        if n not in best:
+            return None
+        path, node = [], previous[n]
+        while node is not None:
+            path.append(node)
+            node = previous.get(node)
+        return nodes[path[::-1]]
+
+    def route(self, p, q):
+        """
+        Shortest path p -> q over the keep-out bounding-box corners. As the
+        keep-outs are convex, a row end on one always sees some corner. The
+        corners of the keep-outs in the way are tried first, then all of them.
+        Returns the intermediate corners as an (n, 2) array.
+        """
+        if self._inside is None:
+            self._inside = self.contains(self.nodes)
+        _, poly = self._hits(p[None], q[None])
+        ids = (np.unique(poly)[:, None] * 4 + np.arange(4)).ravel()
+        path = self._shortest(p, q, ids, self._graph(ids))
+        if path is None:
+            everything = np.arange(len(self.nodes))
+            if self._visibility is None:
+                self._visibility = self._graph(everything)
+            path = self._shortest(p, q, everything, self._visibility)
+        if path is None:
+            raise CoverageError("No transit around the keep-out zones; check that they don't enclose part of the field")
+        return path
+
+
+def _row_segments(rings, keep_out, across0, spacing):
+    """
+    Intersects every row (across = across0 + k * spacing) with every polygon
+    edge at once. Returns (row, start, end) arrays of the row pieces that are
+    inside the field and outside all keep-outs, sorted by row then 'along'.
+    """
+    all_rings = [rings] + keep_out
+    a = np.concatenate(all_rings)
+    b = np.concatenate([np.roll(ring, -1, axis=0) for ring in all_rings])
+    poly = np.repeat(np.arange(len(all_rings)), [len(ring) for ring in all_rings])
+
+    # Half-open [lo, hi) across-span per edge so vertices on a row count once
+    lo, hi = np.minimum(a[:, 1], b[:, 1]), np.maximum(a[:, 1], b[:, 1])
+    k_start = np.ceil((lo - across0) / spacing).astype(np.int64)
+    counts = np.maximum(np.ceil((hi - across0) / spacing).astype(np.int64) - k_start, 0)
+    edge = np.repeat(np.arange(len(a)), counts)
+    offsets = np.arange(len(edge)) - np.repeat(np.cumsum(counts) - counts, counts)
+    row = k_start[edge] + offsets
+    across = across0 + row * spacing
+    t = (across - a[edge, 1]) / (b[edge, 1] - a[edge, 1])
+    along = a[edge, 0] + t * (b[edge, 0] - a[edge, 0])
+    poly = poly[edge]
+
+    # Even-odd parity per (row, polygon): entering the field adds 1, entering a
+    # keep-out subtracts 1, so the running level is 1 exactly on free row pieces
+    order = np.lexsort((along, poly, row))
+    row, along, poly = row[order], along[order], poly[order]
+    index = np.arange(len(row))
+    group_start = np.r_[True, (row[1:] != row[:-1]) | (poly[1:] != poly[:-1])]
+    rank = index - np.maximum.accumulate(np.where(group_start, index, 0))
+    delta = np.where(rank % 2 == 0, 1, -1) * np.where(poly == 0, 1, -1)
+
+    order = np.lexsort((along, row))
+    row, along, level = row[order], along[order], np.cumsum(delta[order])
+    free = ((level[:-1] == 1) & (row[1:] == row[:-1]) & (along[1:] - along[:-1] >= MIN_SEGMENT))
+    return row[:-1][free], along[:-1][free], along[1:][free]
+
+
+def _cells(row, start, end):
+    """
+    Groups row pieces into cells: runs of consecutive rows where each piece
+    overlaps exactly one piece in the next row and vice versa (no split/merge).
+    Returns lists of piece indices, bottom row first.
+    """
+    first = {}
+    for i, r in enumerate(row.tolist()):
+        first.setdefault(r, i)
+    row_l, start_l, end_l = row.tolist(), start.tolist(), end.tolist()
+
+    def overlapping(r, lo, hi):
+        i = first.get(r)
+        found = []
+        while i is not None and i < len(row_l) and row_l[i] == r:
+            if start_l[i] < hi and end_l[i] > lo:
+                found.append(i)
+            i += 1
+        return found
+
+    used = [False] * len(row_l)
+    cells = []
+    for i in range(len(row_l)):
+        if used[i]:
+            continue
+        cell, current = [i], i
+        used[i] = True
+        while True:
+            above = overlapping(row_l[current] + 1, start_l[current], end_l[current])
+            if len(above) != 1 or used[above[0]]:
+                break
+            if len(overlapping(row_l[current], start_l[above[0]], end_l[above[0]])) != 1:
+                break
+            current = above[0]
+            cell.append(current)
+            used[current] = True
+        cells.append(cell)
+    return cells
+
+
+def _serpentine(cell, row_across, start, end, reverse_rows, start_left):
+    """ (n, 2) along/across waypoints flying 'cell' back and forth. """
+    pieces = cell[::-1] if reverse_rows else cell
+    points = []
+    left = start_left
+    for i in pieces:
+        a, b = (start[i], end[i]) if left else (end[i], start[i])
+        points.append((a, row_across[i]))
+        points.append((b, row_across[i]))
+        left = not left
+    return np.array(points)
+
+
+class CoveragePath:
+    """ A planned coverage path: waypoints plus summary statistics. """
+
+    def __init__(self, lats, lons, heading, spacing, rows, cells, length, plan_time):
+        self.lats = lats
+        self.lons = lons
+        self.heading = heading
+        self.spacing = spacing
+        self.rows = rows
+        self.cells = cells
+        self.length = length
+        self.plan_time = plan_time
+
+    @property
+    def turns(self):
+        return max(len(self.lats) - 2, 0)
+
+    def to_legs(self, altitude):
+        """ Takeoff followed by one 'waypoint' leg per path point. """
+        legs = [{"type": "takeoff", "altitude": altitude}]
+        legs.extend({"type": "waypoint", "lat": lat, "lon": lon, "altitude": altitude}
+                    for lat, lon in zip(self.lats.tolist(), self.lons.tolist()))
+        return legs
+
+    def to_plan(self, altitude, name="coverage", groundspeed=None, execution="auto"):
+        """ A mission plan document (see mission_plans) flying the path at 'altitude'. """
+        plan = {"name": name, "execution": execution, "legs": self.to_legs(altitude)}
+        if groundspeed is not None:
+            plan["groundspeed"] = groundspeed
+        return plan
+
+    def to_dict(self, include_waypoints=False):
+        data = {"heading": round(self.heading, 2), "row_spacing": round(self.spacing, 3),
+                "rows": self.rows, "cells": self.cells, "waypoint_count": len(self.lats),
+                "turns": self.turns, "length_m": round(self.length, 1),
+                "plan_ms": round(self.plan_time * 1000, 3)}
+        if include_waypoints:
+            data["waypoints"] = [list(point) for point in zip(self.lats.tolist(), self.lons.tolist())]
+        return data
+
+
+def plan_coverage(field, altitude, fov, overlap=0.2, heading=None, keep_out=(), start=None, clearance=5.0):
+    """
+    Plans a lawnmower path covering 'field'.
+
+    Args:
+        field: Sequence of (lat, lon) vertices of the field boundary
+        altitude: Survey altitude in metres above home
+        fov: Camera field of view across the rows, in degrees
+        overlap: Fraction of the swath shared by adjacent rows, 0 <= overlap < 1
+        heading: Row direction in degrees; None picks the direction with the fewest turns
+        keep_out: Sequence of (lat, lon) polygons that must not be overflown
+        start: Optional (lat, lon) to start nearest to, e.g. the home position
+        clearance: Metres kept between the path and each keep-out
+
+    Returns:
+        CoveragePath
+    """
+    start_time = time.perf_counter()
+    spacing = row_spacing(altitude, fov, overlap)
+    field = _ring(field, "Field")
+    keep_out = [_ring(ring, f"Keep-out {index}") for index, ring in enumerate(keep_out)]
+
+    # Local frame around the field's mean position
+    lat0, lon0 = float(field[:, 0].mean()), float(field[:, 1].mean())
+
+    def local(ring):
+        north, east = ned_offsets(lat0, lon0, ring[:, 0], ring[:, 1])
+        return np.column_stack((north, east))
+
+    field_ne = local(field)
+    keep_out_ne = [local(ring) for ring in keep_out]
+    if heading is None:
+        heading = best_heading(field_ne, spacing)
+    heading = float(heading) % 180.0
+
+    def rotated(ring):
+        return np.column_stack(_rotate(ring[:, 0], ring[:, 1], heading))
+
+    field_r = rotated(field_ne)
+    keep_out_r = [_grow(rotated(ring), clearance) for ring in keep_out_ne]
+
+    across0, _ = _rows(field_r, spacing)
+    row, seg_start, seg_end = _row_segments(field_r, keep_out_r, across0, spacing)
+    if not len(row):
+        raise CoverageError("Field is smaller than one camera swath or fully covered by keep-outs")
+    row_across = across0 + row * spacing
+    cells = _cells(row, seg_start, seg_end)
+
+    # Chain cells nearest-first; each cell can be entered at any of its four
+    # corners (bottom or top row, left or right end)
+    variants = [(False, True), (False, False), (True, True), (True, False)]
+    entries = np.empty((len(cells), 4, 2))
+    for c, cell in enumerate(cells):
+        for v, (reverse_rows, start_left) in enumerate(variants):
+            i = cell[-1] if reverse_rows else cell[0]
+            entries[c, v] = (seg_start[i] if start_left else seg_end[i], row_across[i])
+    if start is not None:
+        north, east = ned_offsets(lat0, lon0, start[0], start[1])
+        position = np.array(_rotate(float(north), float(east), heading))
+    else:
+        position = entries[0, 0]
+    remaining = np.ones(len(cells), dtype=bool)
+    pieces = []
+    for _ in range(len(cells)):
+        cost = np.hypot(*(entries - position).transpose(2, 0, 1))
+        cost[~remaining] = np.inf
+        c, v = np.unravel_index(np.argmin(cost), cost.shape)
+        remaining[c] = False
+        points = _serpentine(cells[c], row_across, seg_start, seg_end, *variants[v])
+        pieces.append(points)
+        position = points[-1]
+
+    # Row pieces are free by construction; reroute links that cross a keep-out
+    keep_outs = _KeepOuts(keep_out_r)
+    path = np.concatenate(pieces)
+    links = np.arange(1, len(path) - 1, 2) # path[i] -> path[i + 1] joins two rows
+    blocked = links[keep_outs.blocked(path[links], path[links + 1])]
+    if len(blocked):
+        parts, previous = [], 0
+        for i in blocked.tolist():
+            parts.append(path[previous:i + 1])
+            parts.append(keep_outs.route(path[i], path[i + 1]))
+            previous = i + 1
+        parts.append(path[previous:])
+        path = np.concatenate(parts)
+
+    north, east = _unrotate(path[:, 0], path[:, 1], heading)
+    lats, lons = offset_to_latlon(lat0, lon0, north, east)
+    length = float(np.hypot(*np.diff(path, axis=0).T).sum())
+    return CoveragePath(lats, lons, heading, spacing, int(len(np.unique(row))), len(cells),
+                        length, time.perf_counter() - start_time)
@@ -0,0 +1,442 @@
+# On-disk spatial index of geotagged fruit detections (SQLite).
+#
+# A season of flights is millions of detections, so nothing here scans them:
+#
+#   detections + detections_rtree  every detection, R-tree on integer
+#                                  1e-7 degree coordinates (exact to ~1 cm),
+#                                  for bbox and radius queries
+#   trees + trees_rtree            detections clustered into trees: each
+#                                  detection joins the nearest tree within
+#                                  'tree_radius' metres or starts a new one;
+#                                  discovered trees move to the mean of their
+#                                  detections, mapped ones (add_trees) stay put
+#   tree_counts, tree_fruit        per-tree counters kept up to date on
+#                                  insert: detections per ripeness label, and
+#                                  unique fruit per ripeness label (fruits has
+#                                  one row per flight/track ID)
+#   heat_tiles                     detection counts per web-mercator pixel at
+#                                  every zoom level 0..HEAT_MAX_LEVEL, stored
+#                                  sparse as one blob per 256x256 tile, so
+#                                  serving a heat-map tile reads one row
+#
+#     index = DetectionIndex("detections.db")
+#     index.add(geotag_frames(frames, history, camera), flight="2026-03-02")
+#     index.query_radius(lat, lon, 10.0)
+#     png = index.heatmap_tile(18, x, y)
+
+import math
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+import numpy as np
+from geodesy import EARTH_RADIUS, ned_offsets
+
+E7 = 1e7 # Fixed-point degrees in the R-trees
+HEAT_MAX_LEVEL = 18 # Finest heat level: zoom 18 tile pixels, ~0.6 m at the equator
+TILE_SIZE = 256
+DEFAULT_LIMIT = 5000
+CLUSTER_CHUNK = 1024 # Points clustered at once when a batch starts new trees
+DETECTION_FIELDS = ("id", "t", "flight", "lat", "lon", "confidence", "ripeness", "track_id", "tree_id")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY, t REAL, flight TEXT, lat REAL, lon REAL,
+    confidence REAL, ripeness TEXT, track_id INTEGER, tree_id INTEGER);
+CREATE VIRTUAL TABLE IF NOT EXISTS detections_rtree USING rtree_i32(id, min_lat, max_lat, min_lon, max_lon);
+CREATE TABLE IF NOT EXISTS trees (
+    id INTEGER PRIMARY KEY, lat REAL, lon REAL, detections INTEGER DEFAULT 0, fixed INTEGER DEFAULT 0);
+CREATE VIRTUAL TABLE IF NOT EXISTS trees_rtree USING rtree_i32(id, min_lat, max_lat, min_lon, max_lon);
+CREATE TABLE IF NOT EXISTS tree_counts (
+    tree_id INTEGER, ripeness TEXT, detections INTEGER, PRIMARY KEY (tree_id, ripeness)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS fruits (
+    flight TEXT, track_id INTEGER, tree_id INTEGER, ripeness TEXT, detections INTEGER,
+    PRIMARY KEY (flight, track_id)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS tree_fruit (
+    tree_id INTEGER, ripeness TEXT, fruit INTEGER, PRIMARY KEY (tree_id, ripeness)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS heat_tiles (
+    level INTEGER, x INTEGER, y INTEGER, cells BLOB, PRIMARY KEY (level, x, y)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS heat_levels (level INTEGER PRIMARY KEY, max_count INTEGER);
+"""
+
+# Heat-map colour ramp: (position, R, G, B, A), sampled into a 256-entry lookup table
+HEAT_RAMP = np.array([(0.0, 0, 0, 255, 0), (0.15, 0, 128, 255, 120), (0.4, 0, 220, 90, 170),
+                      (0.7, 255, 220, 0, 200), (1.0, 230, 20, 0, 230)], dtype=np.float64)
+HEAT_LUT = np.stack([np.interp(np.linspace(0, 1, 256), HEAT_RAMP[:, 0], HEAT_RAMP[:, i]) for i in range(1, 5)],
+                    axis=-1).astype(np.uint8)
+
+
+def mercator_pixels(lat, lon, level):
+    """ Global web-mercator pixel coordinates (x, y) of points at tile zoom 'level'. """
+    world = TILE_SIZE * 2.0 ** level
+    lat = np.radians(np.clip(np.asarray(lat, dtype=np.float64), -85.05112878, 85.05112878))
+    x = (np.asarray(lon, dtype=np.float64) + 180.0) / 360.0 * world
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0 * world
+    return np.floor(x).astype(np.int64), np.floor(y).astype(np.int64)
+
+
+def encode_png(rgba):
+    """ Minimal PNG encoder for an (H, W, 4) uint8 array. """
+    h, w = rgba.shape[:2]
+    raw = np.zeros((h, w * 4 + 1), dtype=np.uint8) # Filter byte 0 per row
+    raw[:, 1:] = rgba.reshape(h, w * 4)
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 6, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw.tobytes(), 1)) + chunk(b"IEND", b""))
+
+
+def _decode_cells(blob):
+    """ Dense (65536,) counts of one heat tile from its sparse blob (uint16 pixel indices, then uint32 counts). """
+    dense = np.zeros(TILE_SIZE * TILE_SIZE, dtype=np.uint32)
+    if blob:
+        n = len(blob) // 6
+        dense[np.frombuffer(blob, dtype=np.uint16, count=n)] = np.frombuffer(blob, dtype=np.uint32, offset=2 * n)
+    return dense
+
+
+def _encode_cells(dense):
+    nonzero = np.flatnonzero(dense)
+    return nonzero.astype(np.uint16).tobytes() + dense[nonzero].astype(np.uint32).tobytes()
+
+
+def colorize(counts, vmax):
+    """ Log-scaled heat colours (RGBA uint8) for a grid of counts; zero stays transparent. """
+    rgba = np.zeros(counts.shape + (4,), dtype=np.uint8)
+    nonzero = counts > 0
+    level = np.log1p(counts[nonzero]) * (255 / math.log1p(max(vmax, 1)))
+    rgba[nonzero] = HEAT_LUT[np.clip(level, 1, 255).astype(np.uint8)]
+    return rgba
+
+
+def _bbox_e7(south, west, north, east):
+    return (math.floor(south * E7), math.ceil(north * E7), math.floor(west * E7), math.ceil(east * E7))
+
+
+def radius_degrees(lat, radius):
+    """ (latitude, longitude) degrees spanned by 'radius' metres at latitude 'lat'. """
+    d_lat = math.degrees(radius / EARTH_RADIUS)
+    return d_lat, d_lat / max(math.cos(math.radians(min(abs(lat) + d_lat, 89.9))), 1e-6)
+
+
+def radius_bbox(lat, lon, radius):
+    """ (south, west, north, east) degrees enclosing a circle of 'radius' metres. """
+    d_lat, d_lon = radius_degrees(lat, radius)
+    return lat - d_lat, lon - d_lon, lat + d_lat, lon + d_lon
+
+
+def nearest_within(north, east, ref_north, ref_east, radius):
+    """
+    Index of the nearest reference point within 'radius' metres of each point,
+    or -1. Reference points are bucketed into radius-sized grid cells, so each
+    point only checks the 3x3 cells around it.
+    """
+    result = np.full(len(north), -1, dtype=np.int64)
+    if not len(ref_north) or not len(north):
+        return result
+    ref_cells = np.floor(np.stack([ref_north, ref_east]) / radius).astype(np.int64)
+    keys = (ref_cells[0] << 32) + ref_cells[1]
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    per_cell = int(np.unique(keys, return_counts=True)[1].max())
+    cells = np.floor(np.stack([north, east]) / radius).astype(np.int64)
+    best = np.full(len(north), radius ** 2)
+    for dn in (-1, 0, 1):
+        for de in (-1, 0, 1):
+            wanted = ((cells[0] + dn) << 32) + cells[1] + de
+            start = np.searchsorted(keys, wanted, side="left")
+            stop = np.searchsorted(keys, wanted, side="right")
+            for k in range(per_cell):
+                slot = start + k
+                ok = slot < stop
+                candidate = order[np.minimum(slot, len(order) - 1)]
+                d2 = (ref_north[candidate] - north) ** 2 + (ref_east[candidate] - east) ** 2
+                better = ok & (d2 <= best)
+                best[better] = d2[better]
+                result[better] = candidate[better]
+    return result
+
+
+class DetectionIndex:
+    """
+    Args:
+        path: SQLite database file (':memory:' for a throwaway index)
+        tree_radius: Metres within which a detection joins an existing tree
+    """
+
+    def __init__(self, path="detections.db", tree_radius=3.0):
+        self.path = path
+        self.tree_radius = tree_radius
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._heat_max = dict(self._db.execute("SELECT level, max_count FROM heat_levels").fetchall())
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # --- Writing ---
+
+    def add_trees(self, lats, lons):
+        """ Registers known tree positions (e.g. from an orchard map), which never move; returns their IDs. """
+        with self._lock, self._db:
+            return self._create_trees(np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64), fixed=True)
+
+    def _create_trees(self, lats, lons, fixed=False):
+        ids = []
+        for lat, lon in zip(lats.tolist(), lons.tolist()):
+            tree_id = self._db.execute("INSERT INTO trees (lat, lon, fixed) VALUES (?, ?, ?)",
+                                       (lat, lon, int(fixed))).lastrowid
+            lat7, lon7 = round(lat * E7), round(lon * E7)
+            self._db.execute("INSERT INTO trees_rtree VALUES (?, ?, ?, ?, ?)", (tree_id, lat7, lat7, lon7, lon7))
+            ids.append(tree_id)
+        return ids
+
+    def _assign_trees(self, lats, lons):
+        """ Tree ID for each detection: nearest tree within tree_radius, else a new tree. """
+        lat0, lon0 = float(lats.mean()), float(lons.mean())
+        d_lat, d_lon = radius_degrees(float(np.abs(lats).max()), self.tree_radius)
+        rows = self._db.execute(
+            "SELECT t.id, t.lat, t.lon FROM trees_rtree r JOIN trees t ON t.id = r.id "
+            "WHERE r.min_lat >= ? AND r.max_lat <= ? AND r.min_lon >= ? AND r.max_lon <= ?",
+            _bbox_e7(lats.min() - d_lat, lons.min() - d_lon, lats.max() + d_lat, lons.max() + d_lon)).fetchall()
+        tree_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        north, east = ned_offsets(lat0, lon0, lats, lons)
+        assigned = np.zeros(len(lats), dtype=np.int64)
+        if rows:
+            t_north, t_east = ned_offsets(lat0, lon0, np.array([r[1] for r in rows]), np.array([r[2] for r in rows]))
+            nearest = nearest_within(north, east, t_north, t_east, self.tree_radius)
+            assigned[nearest >= 0] = tree_ids[nearest[nearest >= 0]]
+        # The rest are clustered, densest point first: each leader takes every unassigned point
+        # within tree_radius with it, and the cluster's mean becomes a new tree
+        rest = np.flatnonzero(assigned == 0)
+        for chunk in range(0, len(rest), CLUSTER_CHUNK):
+            points = rest[chunk:chunk + CLUSTER_CHUNK]
+            pn, pe = north[points], east[points]
+            if chunk:
+                # Points of earlier chunks now belong to trees; join one of those if close
+                done = rest[:chunk]
+                nearest = nearest_within(pn, pe, north[done], east[done], self.tree_radius)
+                assigned[points[nearest >= 0]] = assigned[done[nearest[nearest >= 0]]]
+            near = (pn[:, None] - pn[None, :]) ** 2 + (pe[:, None] - pe[None, :]) ** 2 <= self.tree_radius ** 2
+            free = assigned[points] == 0
+            members = []
+            for i in np.argsort(-near.sum(axis=1), kind="stable").tolist():
+                if free[i]:
+                    member = np.flatnonzero(near[i] & free)
+                    free[member] = False
+                    members.append(member)
+            if members:
+                ids = self._create_trees(np.array([lats[points[m]].mean() for m in members]),
+                                         np.array([lons[points[m]].mean() for m in members]))
+                for tree_id, member in zip(ids, members):
+                    assigned[points[member]] = tree_id
+        return assigned
+
+    def _add_fruits(self, flight, fruits):
+        """ Upserts tracked fruit {track_id: (tree, label, detections)} and keeps tree_fruit in step. """
+        if not fruits:
+            return
+        tracks = list(fruits)
+        known = {}
+        for start in range(0, len(tracks), 500): # Stay under SQLite's bound-parameter limit
+            part = tracks[start:start + 500]
+            known.update((track, (tree, label)) for track, tree, label in self._db.execute(
+                f"SELECT track_id, tree_id, ripeness FROM fruits WHERE flight = ? AND track_id IN "
+                f"({','.join('?' * len(part))})", [flight] + part))
+        changes = {}
+        rows = []
+        for track, (tree, label, count) in fruits.items():
+            if track in known:
+                tree, old_label = known[track]
+                label = label or old_label
+                if label == old_label:
+                    rows.append((flight, track, tree, label, count))
+                    continue
+                changes[(tree, old_label or "")] = changes.get((tree, old_label or ""), 0) - 1
+            changes[(tree, label or "")] = changes.get((tree, label or ""), 0) + 1
+            rows.append((flight, track, tree, label, count))
+        self._db.executemany(
+            "INSERT INTO fruits VALUES (?, ?, ?, ?, ?) ON CONFLICT (flight, track_id) DO UPDATE SET "
+            "detections = detections + excluded.detections, ripeness = excluded.ripeness", rows)
+        self._db.executemany(
+            "INSERT INTO tree_fruit VALUES (?, ?, ?) ON CONFLICT (tree_id, ripeness) "
+            "DO UPDATE SET fruit = fruit + excluded.fruit",
+            [(tree, label, change) for (tree, label), change in changes.items() if change])
+
+    def _update_trees(self, trees, lats, lons):
+        """ Adds the batch to each tree's detection count and moves discovered trees to their running mean. """
+        ids, inverse, counts = np.unique(trees, return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+        lat_sum = np.bincount(inverse, weights=lats)
+        lon_sum = np.bincount(inverse, weights=lons)
+        placeholders = ",".join("?" * len(ids))
+        current = {row[0]: row[1:] for row in self._db.execute(
+            f"SELECT id, lat, lon, detections, fixed FROM trees WHERE id IN ({placeholders})", ids.tolist())}
+        updates, moves = [], []
+        for tree_id, count, lat_total, lon_total in zip(ids.tolist(), counts.tolist(), lat_sum.tolist(), lon_sum.tolist()):
+            lat, lon, seen, fixed = current[tree_id]
+            if not fixed:
+                lat = (lat * seen + lat_total) / (seen + count)
+                lon = (lon * seen + lon_total) / (seen + count)
+                lat7, lon7 = round(lat * E7), round(lon * E7)
+                moves.append((lat7, lat7, lon7, lon7, tree_id))
+            updates.append((lat, lon, seen + count, tree_id))
+        self._db.executemany("UPDATE trees SET lat = ?, lon = ?, detections = ? WHERE id = ?", updates)
+        self._db.executemany("UPDATE trees_rtree SET min_lat = ?, max_lat = ?, min_lon = ?, max_lon = ? WHERE id = ?",
+                             moves)
+
+    def _add_heat(self, lats, lons):
+        """ Adds the detections to the heat tiles of every level (read-modify-write of the touched tiles). """
+        for level in range(HEAT_MAX_LEVEL + 1):
+            x, y = mercator_pixels(lats, lons, level)
+            keys, inverse = np.unique(((x >> 8) << 32) | (y >> 8), return_inverse=True)
+            inverse = inverse.reshape(-1)
+            pixels = (y & 255) * TILE_SIZE + (x & 255)
+            updates = []
+            peak = self._heat_max.get(level, 0)
+            for i, key in enumerate(keys.tolist()):
+                tx, ty = key >> 32, key & 0xFFFFFFFF
+                row = self._db.execute("SELECT cells FROM heat_tiles WHERE level = ? AND x = ? AND y = ?",
+                                       (level, tx, ty)).fetchone()
+                dense = _decode_cells(row[0] if row else None)
+                dense += np.bincount(pixels[inverse == i], minlength=dense.size).astype(np.uint32)
+                peak = max(peak, int(dense.max()))
+                updates.append((level, tx, ty, _encode_cells(dense)))
+            self._db.executemany("INSERT OR REPLACE INTO heat_tiles VALUES (?, ?, ?, ?)", updates)
+            self._heat_max[level] = peak
+        self._db.executemany("INSERT OR REPLACE INTO heat_levels VALUES (?, ?)", self._heat_max.items())
+
+    def add(self, detections, flight=""):
+        """
+        Stores geotagged detections (the dict returned by geotag.geotag_frames).
+
+        Returns:
+            Number of detections stored
+        """
+        lats, lons = np.asarray(detections["lat"], dtype=np.float64), np.asarray(detections["lon"], dtype=np.float64)
+        n = len(lats)
+        if not n:
+            return 0
+        times = np.asarray(detections.get("t", np.full(n, time.time())), dtype=np.float64)
+        confidences = np.asarray(detections.get("confidence", np.zeros(n)), dtype=np.float64)
+        ripeness = list(detections.get("ripeness") or [None] * n)
+        track_ids = list(detections.get("track_id") or [None] * n)
+
+        with self._lock, self._db:
+            trees = self._assign_trees(lats, lons)
+            first = self._db.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM detections").fetchone()[0]
+            ids = range(first, first + n)
+            self._db.executemany(
+                "INSERT INTO detections VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                zip(ids, times.tolist(), [flight] * n, lats.tolist(), lons.tolist(), confidences.tolist(),
+                    ripeness, track_ids, trees.tolist()))
+            lat7, lon7 = np.rint(lats * E7).astype(np.int64).tolist(), np.rint(lons * E7).astype(np.int64).tolist()
+            self._db.executemany("INSERT INTO detections_rtree VALUES (?, ?, ?, ?, ?)",
+                                 zip(ids, lat7, lat7, lon7, lon7))
+
+            # Per-tree counters
+            tree_counts, fruits = {}, {}
+            for tree, label, track in zip(trees.tolist(), ripeness, track_ids):
+                key = (tree, label or "")
+                tree_counts[key] = tree_counts.get(key, 0) + 1
+                if track is not None:
+                    tree_id, last_label, count = fruits.get(track, (tree, None, 0))
+                    fruits[track] = (tree_id, label or last_label, count + 1)
+            self._db.executemany(
+                "INSERT INTO tree_counts VALUES (?, ?, ?) ON CONFLICT (tree_id, ripeness) "
+                "DO UPDATE SET detections = detections + excluded.detections",
+                [(tree, label, count) for (tree, label), count in tree_counts.items()])
+            self._update_trees(trees, lats, lons)
+            self._add_fruits(flight, fruits)
+
+            self._add_heat(lats, lons)
+        return n
+
+    # --- Queries ---
+
+    def _bbox_rows(self, south, west, north, east, flight, limit):
+        sql = ("SELECT d.id, d.t, d.flight, d.lat, d.lon, d.confidence, d.ripeness, d.track_id, d.tree_id "
+               "FROM detections_rtree r JOIN detections d ON d.id = r.id "
+               "WHERE r.min_lat >= ? AND r.max_lat <= ? AND r.min_lon >= ? AND r.max_lon <= ?")
+        args = list(_bbox_e7(south, west, north, east))
+        if flight is not None:
+            sql += " AND d.flight = ?"
+            args.append(flight)
+        sql += " LIMIT ?"
+        args.append(-1 if limit is None else limit)
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        return [row for row in rows if south <= row[3] <= north and west <= row[4] <= east]
+
+    def query_bbox(self, south, west, north, east, flight=None, limit=DEFAULT_LIMIT):
+        """ Detections inside the box, as a list of dicts (at most 'limit'; None for all). """
+        return [dict(zip(DETECTION_FIELDS, row)) for row in self._bbox_rows(south, west, north, east, flight, limit)]
+
+    def query_radius(self, lat, lon, radius, flight=None, limit=DEFAULT_LIMIT):
+        """ Detections within 'radius' metres of (lat, lon), nearest first, each with its 'distance'. """
+        rows = self._bbox_rows(*radius_bbox(lat, lon, radius), flight=flight, limit=None)
+        if not rows:
+            return []
+        north, east = ned_offsets(lat, lon, np.array([row[3] for row in rows]), np.array([row[4] for row in rows]))
+        distance = np.hypot(north, east)
+        order = np.argsort(distance)
+        order = order[distance[order] <= radius][:limit].tolist()
+        return [dict(zip(DETECTION_FIELDS, rows[i]), distance=round(float(distance[i]), 3)) for i in order]
+
+    def trees(self, south, west, north, east):
+        """
+        Trees inside the box with their counts: total detections, detections per
+        ripeness label and unique (tracked) fruit per ripeness label.
+        """
+        box = _bbox_e7(south, west, north, east)
+        inside = "SELECT id FROM trees_rtree WHERE min_lat >= ? AND max_lat <= ? AND min_lon >= ? AND max_lon <= ?"
+        with self._lock:
+            trees = self._db.execute(f"SELECT id, lat, lon, detections FROM trees WHERE id IN ({inside})", box).fetchall()
+            counts = self._db.execute(f"SELECT tree_id, ripeness, detections FROM tree_counts "
+                                      f"WHERE tree_id IN ({inside})", box).fetchall()
+            fruits = self._db.execute(f"SELECT tree_id, ripeness, fruit FROM tree_fruit "
+                                      f"WHERE tree_id IN ({inside}) AND fruit > 0", box).fetchall()
+        result = {tree_id: {"id": tree_id, "lat": lat, "lon": lon, "detections": total,
+                            "by_ripeness": {}, "fruit": 0, "fruit_by_ripeness": {}}
+                  for tree_id, lat, lon, total in trees}
+        for tree_id, label, count in counts:
+            result[tree_id]["by_ripeness"][label or "unclassified"] = count
+        for tree_id, label, count in fruits:
+            result[tree_id]["fruit"] += count
+            result[tree_id]["fruit_by_ripeness"][label or "unclassified"] = count
+        return list(result.values())
+
+    # --- Heat-map tiles ---
+
+    def heatmap_counts(self, z, x, y):
+        """ (256, 256) detection counts for slippy-map tile z/x/y. """
+        level = min(z, HEAT_MAX_LEVEL)
+        shift = z - level # Beyond the finest level, cut the parent tile and enlarge it
+        with self._lock:
+            row = self._db.execute("SELECT cells FROM heat_tiles WHERE level = ? AND x = ? AND y = ?",
+                                   (level, x >> shift, y >> shift)).fetchone()
+        grid = _decode_cells(row[0] if row else None).reshape(TILE_SIZE, TILE_SIZE)
+        if shift:
+            zoom = 2 ** shift
+            span = TILE_SIZE // zoom
+            sx, sy = (x & (zoom - 1)) * span, (y & (zoom - 1)) * span
+            grid = np.repeat(np.repeat(grid[sy:sy + span, sx:sx + span], zoom, axis=0), zoom, axis=1)
+        return grid
+
+    def heatmap_tile(self, z, x, y, vmax=None):
+        """ PNG heat-map tile z/x/y; colours are log-scaled to 'vmax' (default: busiest cell at this zoom). """
+        counts = self.heatmap_counts(z, x, y)
+        return encode_png(colorize(counts, vmax or self._heat_max.get(min(z, HEAT_MAX_LEVEL), 1)))
+
+    def to_dict(self):
+        with self._lock:
+            detections = self._db.execute("SELECT COALESCE(MAX(id), 0) FROM detections").fetchone()[0]
+            trees = self._db.execute("SELECT COUNT(*) FROM trees").fetchone()[0]
+        return {"detections": detections, "trees": trees}
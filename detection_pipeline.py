@@ -0,0 +1,218 @@
+# Streaming detection pipeline.
+#
+# Capture, inference and render run as separate stages so that the camera
+# never waits for the model and the model never waits for the display:
+#
+#     capture thread --LatestQueue--> inference thread --LatestQueue--> render (caller's thread)
+#
+# Each LatestQueue is bounded and drops its oldest item when full, so a slow
+# stage always picks up the newest frame instead of working through a backlog
+# of stale ones. Rendering stays on the caller's thread because cv2.imshow /
+# cv2.waitKey must run on the main thread on most platforms.
+#
+# The stages are plain callables (read a frame, run the model, draw/show), so
+# the same pipeline drives Testing.py's webcam detector and the benchmarks.
+
+import threading
+import time
+from collections import deque, namedtuple
+from metrics import histogram
+
+# --- Metrics ---
+stage_seconds = histogram("pipeline_stage_seconds", "Time a stage spends on one item", ("stage",))
+stage_latency_seconds = histogram("pipeline_latency_seconds", "Capture to the end of a stage", ("stage",))
+
+# One frame moving through the pipeline; 'result' / 'inferred_at' are filled in by inference
+Packet = namedtuple('Packet', 'seq frame captured_at result inferred_at')
+
+
+class LatestQueue:
+    """
+    Bounded FIFO that never blocks the producer: putting into a full queue
+    drops the oldest item. get() blocks until an item arrives or the queue closes.
+    """
+
+    def __init__(self, maxsize=1):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """ Returns the oldest item, or None on timeout or once closed and drained. """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self._closed, timeout):
+                return None
+            return self._items.popleft() if self._items else None
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class StageStats:
+    """ Rolling FPS and latency figures for one pipeline stage over the last 'window' items. """
+
+    def __init__(self, name, window=120):
+        self.name = name
+        self.count = 0
+        self._done = deque(maxlen=window) # Completion times
+        self._busy = deque(maxlen=window) # Seconds spent per item
+        self._latency = deque(maxlen=window) # Seconds since capture
+        self._lock = threading.Lock()
+        self._busy_metric = stage_seconds.labels(name)
+        self._latency_metric = stage_latency_seconds.labels(name)
+
+    def record(self, started, finished, captured_at):
+        with self._lock:
+            self.count += 1
+            self._done.append(finished)
+            self._busy.append(finished - started)
+            self._latency.append(finished - captured_at)
+        self._busy_metric.observe(finished - started)
+        self._latency_metric.observe(finished - captured_at)
+
+    def to_dict(self):
+        with self._lock:
+            done, busy, latency = list(self._done), sorted(self._busy), sorted(self._latency)
+        data = {"stage": self.name, "frames": self.count, "fps": 0.0,
+                "busy_ms": 0.0, "latency_p50_ms": 0.0, "latency_p95_ms": 0.0}
+        if len(done) > 1 and done[-1] > done[0]:
+            data["fps"] = round((len(done) - 1) / (done[-1] - done[0]), 2)
+        if busy:
+            data["busy_ms"] = round(1000 * sum(busy) / len(busy), 2)
+            data["latency_p50_ms"] = round(1000 * latency[len(latency) // 2], 2)
+            data["latency_p95_ms"] = round(1000 * latency[min(len(latency) - 1, int(len(latency) * 0.95))], 2)
+        return data
+
+
+class DetectionPipeline:
+    """
+    Runs 'read_frame' and 'infer' on background threads and the render stage
+    on the thread calling run().
+
+    Args:
+        read_frame: Callable returning the next frame, or None at end of stream
+        infer: Callable(frame) returning the detection result
+        queue_size: Capacity of each inter-stage LatestQueue (1 = always newest)
+    """
+
+    def __init__(self, read_frame, infer, queue_size=1):
+        self._read_frame = read_frame
+        self._infer = infer
+        self._frames = LatestQueue(queue_size)
+        self._results = LatestQueue(queue_size)
+        self._running = threading.Event()
+        self._threads = []
+        self.capture_stats = StageStats("capture")
+        self.inference_stats = StageStats("inference")
+        self.render_stats = StageStats("render")
+        self.error = None
+
+    def start(self):
+        self._running.set()
+        self._threads = [threading.Thread(target=self._capture_loop, name="pipeline-capture", daemon=True),
+                         threading.Thread(target=self._inference_loop, name="pipeline-inference", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._running.clear()
+        self._frames.close()
+        self._results.close()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+
+    def _capture_loop(self):
+        seq = 0
+        try:
+            while self._running.is_set():
+                started = time.monotonic()
+                frame = self._read_frame()
+                if frame is None:
+                    break
+                now = time.monotonic()
+                self.capture_stats.record(started, now, now)
+                self._frames.put(Packet(seq, frame, now, None, None))
+                seq += 1
+        except Exception as e:
+            self.error = e
+        finally:
+            self._frames.close()
+
+    def _inference_loop(self):
+        try:
+            while self._running.is_set():
+                packet = self._frames.get(timeout=0.5)
+                if packet is None:
+                    if self._frames.closed:
+                        break
+                    continue
+                started = time.monotonic()
+                result = self._infer(packet.frame)
+                now = time.monotonic()
+                self.inference_stats.record(started, now, packet.captured_at)
+                self._results.put(packet._replace(result=result, inferred_at=now))
+        except Exception as e:
+            self.error = e
+        finally:
+            self._results.close()
+
+    def run(self, render, report=None, report_interval=5.0):
+        """
+        Starts the pipeline (if needed) and renders results on this thread
+        until 'render(packet)' returns False or the stream ends.
+        'report(stats)' is called every 'report_interval' seconds.
+        """
+        if not self._threads:
+            self.start()
+        next_report = time.monotonic() + report_interval
+        try:
+            while True:
+                packet = self._results.get(timeout=0.5)
+                if packet is None:
+                    if self._results.closed:
+                        break
+                    continue
+                started = time.monotonic()
+                keep_going = render(packet)
+                self.render_stats.record(started, time.monotonic(), packet.captured_at)
+                if keep_going is False:
+                    break
+                if report is not None and time.monotonic() >= next_report:
+                    report(self.stats())
+                    next_report += report_interval
+        finally:
+            self.stop()
+        if self.error is not None:
+            raise self.error
+        return self.stats()
+
+    def stats(self):
+        """ Per-stage FPS/latency; the render stage's latency is end-to-end (capture to displayed). """
+        stages = [self.capture_stats.to_dict(), self.inference_stats.to_dict(), self.render_stats.to_dict()]
+        stages[0]["dropped"] = self._frames.dropped
+        stages[1]["dropped"] = self._results.dropped
+        return stages
+
+
+def format_stats(stats):
+    """ One line per stage, for console reports. """
+    return "\n".join(f"  {s['stage']:>9}: {s['fps']:6.1f} FPS, {s['busy_ms']:7.1f} ms/frame, "
+                     f"latency p50 {s['latency_p50_ms']:7.1f} ms p95 {s['latency_p95_ms']:7.1f} ms"
+                     + (f", dropped {s['dropped']}" if 'dropped' in s else "")
+                     for s in stats)
@@ -0,0 +1,240 @@
+# Fleet registry: several vehicles served by one app.py process.
+#
+# Each VehicleLink owns one MAVLink connection (DroneKit, or a replay vehicle)
+# and its own supervisor thread: it connects (waiting only for the telemetry
+# attributes, see connection.py), attaches a TelemetryEngine, runs the engine
+# until the link goes quiet (no HEARTBEAT for 'heartbeat_timeout' seconds) and
+# then closes the connection and connects again, backing off while attempts
+# fail. Links share nothing, so a slow or lost vehicle never holds up the
+# others, and with eventlet every supervisor and telemetry loop is a green
+# thread: twenty vehicles cost twenty idle green threads, not twenty polling
+# loops.
+#
+# Each link also has a CommandSender (commands.py), a LinkMonitor and a
+# ParameterStore, attached to the vehicle while it is connected:
+# 'link.commands.arm()' and friends return futures that resolve on the
+# autopilot's acknowledgement, 'link.monitor' reports link health and
+# 'link.parameters.get(name)' answers from the on-disk cache until the
+# vehicle's own parameters arrive.
+#
+# The app hangs its per-vehicle services on the link (flight recorder,
+# broadcaster, mission executor, telemetry history; see app.add_vehicle) and
+# looks links up by ID from routes such as /vehicles/<id>/command/arm.
+#
+#     fleet = Fleet()
+#     link = fleet.add(VehicleLink("orchard-2", "tcp:10.0.0.12:5760", on_telemetry))
+#     fleet.get("orchard-2").vehicle   # None until connected
+#     fleet.get()                      # The default (first added) vehicle
+
+import threading
+import time
+from commands import CommandSender
+from connection import Backoff, LinkMonitor, ParameterCache, ParameterStore, open_vehicle
+from telemetry import TelemetryEngine
+from replay_vehicle import open_replay
+
+# --- Link States ---
+CONNECTING = "connecting"
+CONNECTED = "connected"
+RECONNECTING = "reconnecting"
+STOPPED = "stopped"
+
+REPLAY_PREFIX = "replay:" # Connection strings 'replay:synthetic' / 'replay:flights/<id>' play a log back
+
+
+class FleetError(Exception):
+    """ Raised for unknown or duplicate vehicle IDs. """
+
+
+class VehicleLink:
+    """
+    One vehicle's connection, supervisor thread and telemetry state.
+
+    Args:
+        vehicle_id: Name used in routes and in Socket.IO frames
+        connection: DroneKit connection string, or 'replay:<synthetic | flight log directory>'
+        on_telemetry: Called as on_telemetry(link, data) with every telemetry flush
+        on_event: Optional on_event(link, state, detail) on connection changes
+        group_rates: TelemetryEngine flush rates (Hz) per field group
+        replay_speed: Speed for 'replay:' connections (None: as fast as possible)
+        heartbeat_timeout: Seconds without a HEARTBEAT before the link is reconnected
+        backoff: Backoff for failed connection attempts (default 0.5 s doubling to 30 s)
+        param_cache: Directory for this vehicle's parameter cache (None: no cache)
+    """
+
+    def __init__(self, vehicle_id, connection, on_telemetry, on_event=None, group_rates=None, replay_speed=1.0,
+                 heartbeat_timeout=3.0, backoff=None, param_cache=None):
+        self.id = str(vehicle_id)
+        self.connection = connection
+        self.vehicle = None
+        self.state = STOPPED
+        self.telemetry = {} # Latest flushed telemetry
+        self.connects = 0
+        self.replay_speed = replay_speed
+        self.heartbeat_timeout = heartbeat_timeout
+        self.backoff = backoff or Backoff()
+        self._on_telemetry = on_telemetry
+        self._on_event = on_event
+        self.engine = TelemetryEngine(self._emit, group_rates=group_rates)
+        self.commands = CommandSender()
+        self.monitor = LinkMonitor()
+        self.parameters = ParameterStore(ParameterCache(param_cache, self.id) if param_cache else None)
+        self.connect_time = None # Seconds the last successful connection took
+        self._running = False
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _emit(self, data):
+        self.telemetry = data
+        self._on_telemetry(self, data)
+
+    def _set_state(self, state, detail=None):
+        self.state = state
+        if self._on_event:
+            try:
+                self._on_event(self, state, detail)
+            except Exception as e:
+                print(f"Vehicle {self.id}: error in event handler: {e}")
+
+    # --- Supervisor ---
+
+    def start(self):
+        self._running = True
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._supervise, name=f'VehicleLink-{self.id}', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._running = False
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+        self._close()
+        self._set_state(STOPPED)
+
+    @property
+    def replay(self):
+        return self.connection.startswith(REPLAY_PREFIX)
+
+    def _connect(self):
+        if self.replay:
+            return open_replay(self.connection[len(REPLAY_PREFIX):], speed=self.replay_speed)
+        return open_vehicle(self.connection)
+
+    def _attach(self, vehicle):
+        self.commands.attach(vehicle)
+        self.parameters.attach(vehicle)
+        if not self.replay: # Replays send no HEARTBEATs
+            self.monitor.attach(vehicle)
+        self.engine.attach(vehicle)
+
+    def _close(self):
+        self.engine.detach()
+        self.commands.detach()
+        self.parameters.detach()
+        self.monitor.detach()
+        vehicle, self.vehicle = self.vehicle, None
+        if vehicle is not None:
+            try:
+                vehicle.close()
+            except Exception as e:
+                print(f"Vehicle {self.id}: exception while closing: {e}")
+
+    def healthy(self):
+        """ True while the vehicle has sent a HEARTBEAT within heartbeat_timeout (replays always are). """
+        if self.vehicle is None:
+            return False
+        return self.replay or self.monitor.healthy(self.heartbeat_timeout)
+
+    def _supervise(self):
+        self._set_state(CONNECTING, self.connection)
+        while self._running:
+            try:
+                print(f"Vehicle {self.id}: connecting to {self.connection}")
+                start = time.monotonic()
+                self.vehicle = self._connect()
+                self.connect_time = time.monotonic() - start
+            except Exception as e:
+                delay = self.backoff.next()
+                print(f"Vehicle {self.id}: connection failed ({e}), retrying in {delay:.1f} s")
+                self.vehicle = None
+                self._stopped.wait(delay)
+                continue
+
+            self.backoff.reset()
+            self.connects += 1
+            self._set_state(CONNECTED, self.connection)
+            try:
+                self._attach(self.vehicle)
+                self.engine.run(lambda: self._running and self.healthy())
+            except Exception as e:
+                print(f"Vehicle {self.id}: error in telemetry loop: {e}")
+            if not self._running:
+                break
+            print(f"Vehicle {self.id}: link lost, reconnecting")
+            self._close()
+            self._set_state(RECONNECTING, self.connection)
+
+    def to_dict(self):
+        telemetry = self.telemetry
+        return {"id": self.id, "connection": self.connection, "state": self.state, "connects": self.connects,
+                "mode": telemetry.get("mode"), "armed": telemetry.get("armed"),
+                "latitude": telemetry.get("latitude"), "longitude": telemetry.get("longitude"),
+                "altitude": telemetry.get("altitude"), "battery_level": telemetry.get("battery_level"),
+                "connect_time_s": round(self.connect_time, 3) if self.connect_time is not None else None,
+                "link": self.monitor.to_dict() if self.monitor.vehicle is not None else None,
+                "parameters": self.parameters.to_dict(), "commands": self.commands.to_dict()}
+
+
+class Fleet:
+    """ Registry of VehicleLinks by ID; the first vehicle added is the default. """
+
+    def __init__(self):
+        self._links = {}
+        self._lock = threading.Lock()
+
+    def add(self, link, start=True):
+        with self._lock:
+            if link.id in self._links:
+                raise FleetError(f"Vehicle {link.id} already exists")
+            self._links[link.id] = link
+        return link.start() if start else link
+
+    def get(self, vehicle_id=None):
+        """ The link for 'vehicle_id', or the default vehicle for None. """
+        with self._lock:
+            if vehicle_id is None:
+                if not self._links:
+                    raise FleetError("No vehicles configured")
+                return next(iter(self._links.values()))
+            link = self._links.get(str(vehicle_id))
+        if link is None:
+            raise FleetError(f"Unknown vehicle {vehicle_id}")
+        return link
+
+    def remove(self, vehicle_id):
+        with self._lock:
+            link = self._links.pop(str(vehicle_id), None)
+        if link is None:
+            raise FleetError(f"Unknown vehicle {vehicle_id}")
+        link.stop()
+        return link
+
+    def stop(self):
+        for link in list(self):
+            link.stop()
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._links.values()))
+
+    def __len__(self):
+        return len(self._links)
+
+    def __contains__(self, vehicle_id):
+        return str(vehicle_id) in self._links
+
+    def to_dict(self):
+        return {"vehicles": [link.to_dict() for link in self]}
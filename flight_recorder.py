@@ -0,0 +1,304 @@
+# Flight recorder: every telemetry sample and mission/command event of a
+# flight, in a compact binary log for plots and post-flight analysis.
+#
+# A flight is a directory of append-only files:
+#
+#   meta.json       flight ID, start time and the record layouts
+#   telemetry.rec   fixed-width TELEMETRY_DTYPE records (~114 bytes per sample)
+#   events.rec      fixed-width EVENT_DTYPE records
+#   chunks.rec      index: one CHUNK_DTYPE row per chunk written (stream,
+#                   first record, record count, first and last time)
+#   strings.txt     string table (one JSON string per line); text fields such as
+#                   the flight mode are stored as indices into it
+#
+# The telemetry path only appends the sample to a list; a writer thread packs
+# what has accumulated into one chunk every 'flush_interval' seconds (or
+# 'chunk_records' samples) and writes it with a single call per file. The
+# index row is written after its records, so records beyond the last indexed
+# chunk (a write cut short by a crash) are ignored on replay.
+#
+# Replay memory-maps the record files: columns are NumPy views of the file,
+# nothing is parsed or copied up front.
+#
+#     log = FlightLog('flights/20250101-120000')
+#     t, alt = log.telemetry['t'], log.telemetry['altitude']
+#     modes = log.decode(log.telemetry['mode'])
+
+import json
+import os
+import threading
+import time
+from collections import deque
+import numpy as np
+
+TELEMETRY_FLOATS = ("latitude", "longitude", "altitude", "groundspeed", "airspeed", "heading", "roll", "pitch",
+                    "yaw", "battery_voltage", "battery_current", "battery_level")
+TELEMETRY_INTS = ("gps_fix", "gps_satellites", "armed", "is_armable") # -1 when unknown
+TELEMETRY_STRINGS = ("mode", "system_status") # String table indices, -1 when unknown
+TELEMETRY_DTYPE = np.dtype([("t", "<f8")] + [(name, "<f8") for name in TELEMETRY_FLOATS] +
+                           [("gps_fix", "<i2"), ("gps_satellites", "<i2"), ("armed", "i1"), ("is_armable", "i1")] +
+                           [(name, "<i4") for name in TELEMETRY_STRINGS])
+# kind: 'command', 'mission', 'connection', ...; text/detail: e.g. mission state and step;
+# value: e.g. step index or HTTP status
+EVENT_DTYPE = np.dtype([("t", "<f8"), ("kind", "<i4"), ("mission", "<i4"), ("text", "<i4"), ("detail", "<i4"),
+                        ("value", "<f8")])
+CHUNK_DTYPE = np.dtype([("stream", "u1"), ("first", "<u8"), ("count", "<u4"), ("t0", "<f8"), ("t1", "<f8")])
+STREAMS = {"telemetry": (0, TELEMETRY_DTYPE), "events": (1, EVENT_DTYPE)}
+
+
+def _dtype_layout(dtype):
+    return [[name, dtype.fields[name][0].str] for name in dtype.names]
+
+
+class FlightRecorder:
+    """
+    Records one flight into 'directory' (created on the first write).
+
+    Args:
+        directory: e.g. 'flights/20250101-120000'
+        flush_interval: Seconds between chunk writes; at most this much is lost on a crash
+        chunk_records: Write early once this many samples are waiting
+        max_pending: Samples held while the disk is slow before the oldest are dropped
+    """
+
+    def __init__(self, directory, flush_interval=1.0, chunk_records=4096, max_pending=100000):
+        self.directory = directory
+        self.flight = os.path.basename(os.path.normpath(directory))
+        self.flush_interval = flush_interval
+        self.chunk_records = chunk_records
+        self.max_pending = max_pending
+        self._pending = self._new_pending()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+        self._files = None
+        self._counts = {"telemetry": 0, "events": 0}
+        self._strings = {}
+        self.dropped = 0
+        self.write_seconds = 0.0
+
+    # --- Recording (any thread; cheap) ---
+
+    def record_telemetry(self, data, t=None):
+        """ Queues a telemetry dict (see telemetry.ATTRIBUTE_FIELDS), sampled at wall-clock 't' (default now). """
+        self._append("telemetry", (time.time() if t is None else t, data))
+
+    def record_event(self, kind, text=None, detail=None, mission=-1, value=float('nan'), t=None):
+        """ Queues an event, e.g. record_event('mission', 'running', 'Goto ...', mission=3, value=2). """
+        self._append("events", (time.time() if t is None else t, kind, text, detail, mission, value))
+
+    def _append(self, stream, item):
+        with self._lock:
+            pending = self._pending[stream]
+            if len(pending) == pending.maxlen: # append() drops the oldest
+                self.dropped += 1
+            pending.append(item)
+            full = len(pending) >= self.chunk_records
+        if full:
+            self._wake.set()
+
+    def _new_pending(self):
+        return {stream: deque(maxlen=self.max_pending) for stream in ("telemetry", "events")}
+
+    # --- Writer thread ---
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="flight-recorder", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        """ Writes everything still queued and closes the files. """
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(5.0)
+            self._thread = None
+        self.flush()
+        if self._files:
+            for f in self._files.values():
+                f.close()
+            self._files = None
+
+    def _run(self):
+        while self._running:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Flight recorder: write failed: {e}")
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        meta_path = os.path.join(self.directory, "meta.json")
+        if not os.path.exists(meta_path):
+            with open(meta_path, "w") as f:
+                json.dump({"flight": self.flight, "started_at": time.time(), "version": 1,
+                           "telemetry": _dtype_layout(TELEMETRY_DTYPE), "events": _dtype_layout(EVENT_DTYPE),
+                           "chunks": _dtype_layout(CHUNK_DTYPE)}, f, indent=1)
+        else: # Appending to an existing flight: continue its string table and record counts
+            log = FlightLog(self.directory)
+            self._strings = {s: i for i, s in enumerate(log.strings)}
+            self._counts = {stream: len(getattr(log, stream)) for stream in STREAMS}
+            log.close()
+            for stream, (_, dtype) in STREAMS.items(): # Drop any unindexed tail
+                path = os.path.join(self.directory, f"{stream}.rec")
+                if os.path.exists(path):
+                    os.truncate(path, self._counts[stream] * dtype.itemsize)
+            os.truncate(os.path.join(self.directory, "chunks.rec"), log.chunks.nbytes)
+            strings_path = os.path.join(self.directory, "strings.txt")
+            if os.path.exists(strings_path):
+                with open(strings_path, "rb") as f:
+                    text = f.read()
+                os.truncate(strings_path, text.rfind(b"\n") + 1) # Whole lines only
+        self._files = {name: open(os.path.join(self.directory, name), "ab")
+                       for name in ("telemetry.rec", "events.rec", "chunks.rec", "strings.txt")}
+
+    def _code(self, value, new_strings):
+        if value is None:
+            return -1
+        code = self._strings.get(value)
+        if code is None:
+            code = self._strings[value] = len(self._strings)
+            new_strings.append(value)
+        return code
+
+    def _pack_telemetry(self, items, new_strings):
+        records = np.empty(len(items), dtype=TELEMETRY_DTYPE)
+        records["t"] = [t for t, _ in items]
+        for name in TELEMETRY_FLOATS:
+            values = [data.get(name) for _, data in items]
+            records[name] = [float('nan') if v is None else v for v in values]
+        for name in TELEMETRY_INTS:
+            values = [data.get(name) for _, data in items]
+            records[name] = [-1 if v is None else int(v) for v in values]
+        for name in TELEMETRY_STRINGS:
+            records[name] = [self._code(data.get(name), new_strings) for _, data in items]
+        return records
+
+    def _pack_events(self, items, new_strings):
+        records = np.empty(len(items), dtype=EVENT_DTYPE)
+        for i, (t, kind, text, detail, mission, value) in enumerate(items):
+            records[i] = (t, self._code(kind, new_strings), -1 if mission is None else mission,
+                          self._code(text, new_strings), self._code(detail, new_strings),
+                          float('nan') if value is None else value)
+        return records
+
+    def flush(self):
+        """ Writes the queued samples as one chunk per stream. """
+        with self._lock:
+            pending = self._pending
+            self._pending = self._new_pending()
+        if not any(pending.values()):
+            return
+        start = time.perf_counter()
+        if self._files is None:
+            self._open()
+        new_strings = []
+        chunks = []
+        for stream, items in pending.items():
+            if not items:
+                continue
+            records = (self._pack_telemetry if stream == "telemetry" else self._pack_events)(items, new_strings)
+            self._files[f"{stream}.rec"].write(records.tobytes())
+            chunks.append((STREAMS[stream][0], self._counts[stream], len(records),
+                           records["t"].min(), records["t"].max()))
+            self._counts[stream] += len(records)
+        if new_strings:
+            self._files["strings.txt"].write("".join(json.dumps(s) + "\n" for s in new_strings).encode())
+        for name in ("telemetry.rec", "events.rec", "strings.txt"):
+            self._files[name].flush()
+        # The index goes last: a chunk is only replayed once its records are on disk
+        self._files["chunks.rec"].write(np.array(chunks, dtype=CHUNK_DTYPE).tobytes())
+        self._files["chunks.rec"].flush()
+        self.write_seconds += time.perf_counter() - start
+
+    def to_dict(self):
+        return {"flight": self.flight, "directory": self.directory, **self._counts,
+                "dropped": self.dropped, "write_ms": round(self.write_seconds * 1000, 1)}
+
+
+class FlightLog:
+    """
+    Read-only view of a recorded flight. 'telemetry' and 'events' are
+    structured arrays memory-mapped from the log (fields are zero-copy views).
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.flight = self.meta["flight"]
+        chunks_path = os.path.join(directory, "chunks.rec")
+        data = b""
+        if os.path.exists(chunks_path):
+            with open(chunks_path, "rb") as f:
+                data = f.read()
+        self.chunks = np.frombuffer(data[:len(data) // CHUNK_DTYPE.itemsize * CHUNK_DTYPE.itemsize], dtype=CHUNK_DTYPE)
+        strings_path = os.path.join(directory, "strings.txt")
+        self.strings = []
+        if os.path.exists(strings_path):
+            with open(strings_path, encoding="utf-8") as f:
+                self.strings = [json.loads(line) for line in f if line.endswith("\n")]
+        for stream, (number, dtype) in STREAMS.items():
+            setattr(self, stream, self._map(stream, number, dtype))
+
+    def _map(self, stream, number, dtype):
+        chunks = self.chunks[self.chunks["stream"] == number]
+        count = int(chunks["first"][-1] + chunks["count"][-1]) if len(chunks) else 0
+        path = os.path.join(self.directory, f"{stream}.rec")
+        count = min(count, os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0)
+        if not count:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+    def close(self):
+        # Dropping the references unmaps the files (views taken from them keep them mapped)
+        self.telemetry = self.events = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def duration(self):
+        t = self.telemetry["t"]
+        return float(t[-1] - t[0]) if len(t) else 0.0
+
+    def between(self, t0, t1, stream="telemetry"):
+        """ Records with t0 <= t < t1, as a view (records are in time order). """
+        records = getattr(self, stream)
+        t = records["t"]
+        return records[np.searchsorted(t, t0):np.searchsorted(t, t1)]
+
+    def decode(self, codes):
+        """ String table lookup for a code array (e.g. telemetry['mode']); -1 decodes to None. """
+        table = np.array(self.strings + [None], dtype=object)
+        return table[np.asarray(codes)] # -1 indexes the trailing None
+
+    def event_list(self, kind=None):
+        """ Events as dicts, optionally only those of one 'kind'. """
+        events = self.events
+        if kind is not None:
+            code = self.strings.index(kind) if kind in self.strings else -2
+            events = events[events["kind"] == code]
+        kinds, texts, details = self.decode(events["kind"]), self.decode(events["text"]), self.decode(events["detail"])
+        return [{"t": float(e["t"]), "kind": kinds[i], "text": texts[i], "detail": details[i],
+                 "mission": int(e["mission"]), "value": None if np.isnan(e["value"]) else float(e["value"])}
+                for i, e in enumerate(events)]
+
+    def to_dict(self):
+        return {"flight": self.flight, "started_at": self.meta.get("started_at"), "telemetry": len(self.telemetry),
+                "events": len(self.events), "chunks": len(self.chunks), "duration": round(self.duration, 1)}
+
+
+def list_flights(root="flights"):
+    """ Recorded flight IDs under 'root', oldest first. """
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root) if os.path.exists(os.path.join(root, name, "meta.json")))
@@ -0,0 +1,151 @@
+# Geodesy helpers shared by the dashboard, mission code and planners.
+#
+# The functions in the "Batched" section take NumPy arrays (or scalars, which
+# broadcast) of latitudes/longitudes in degrees and work on all points at once,
+# so mission compilation, coverage planning and detection geotagging can convert
+# thousands of points per call. get_location_metres / get_distance_metres keep
+# the original one-location-at-a-time API as thin wrappers around them.
+
+import numpy as np
+
+EARTH_RADIUS = 6371008.8 # Mean earth radius (m), best spherical fit for haversine
+WGS84_A = 6378137.0 # Semi-major axis (m)
+WGS84_F = 1 / 298.257223563 # Flattening
+WGS84_B = WGS84_A * (1 - WGS84_F)
+
+# --- Batched ---
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """ Great-circle distance in metres between arrays of points (spherical earth). """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def vincenty_distance(lat1, lon1, lat2, lon2, tolerance=1e-12, max_iterations=200):
+    """
+    Ellipsoidal (WGS-84) distance in metres using Vincenty's inverse formula.
+    Accurate to well under a millimetre; nearly antipodal points that fail to
+    converge fall back to the haversine distance.
+    """
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(*(np.asarray(a, dtype=np.float64)
+                                                   for a in (lat1, lon1, lat2, lon2)))
+    u1 = np.arctan((1 - WGS84_F) * np.tan(np.radians(lat1)))
+    u2 = np.arctan((1 - WGS84_F) * np.tan(np.radians(lat2)))
+    big_l = np.radians(lon2 - lon1)
+    sin_u1, cos_u1, sin_u2, cos_u2 = np.sin(u1), np.cos(u1), np.sin(u2), np.cos(u2)
+
+    lam = big_l.copy()
+    active = np.ones(lam.shape, dtype=bool)
+    for _ in range(max_iterations):
+        sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+        sin_sigma = np.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+        cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+        sigma = np.arctan2(sin_sigma, cos_sigma)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            cos_2sm = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha)
+        c = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+        lam_next = big_l + (1 - c) * WGS84_F * sin_alpha * (
+            sigma + c * sin_sigma * (cos_2sm + c * cos_sigma * (-1 + 2 * cos_2sm ** 2)))
+        converged = np.abs(lam_next - lam) <= tolerance
+        lam = np.where(active, lam_next, lam)
+        active &= ~converged
+        if not active.any():
+            break
+
+    u_sq = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+    big_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    delta_sigma = big_b * sin_sigma * (cos_2sm + big_b / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sm ** 2) - big_b / 6 * cos_2sm * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sm ** 2)))
+    distance = WGS84_B * big_a * (sigma - delta_sigma)
+    if active.any():
+        distance = np.where(active, haversine_distance(lat1, lon1, lat2, lon2), distance)
+    return distance
+
+
+def bearing(lat1, lon1, lat2, lon2):
+    """ Initial great-circle bearing in degrees [0, 360) from point 1 to point 2. """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    d_lon = lon2 - lon1
+    y = np.sin(d_lon) * np.cos(lat2)
+    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(d_lon)
+    return np.degrees(np.arctan2(y, x)) % 360.0
+
+
+def offset_to_latlon(lat, lon, d_north, d_east):
+    """
+    Returns (lat, lon) arrays of the points 'd_north' / 'd_east' metres from
+    (lat, lon), following the great circle along the offset's bearing.
+    """
+    lat1, lon1 = np.radians(np.asarray(lat, dtype=np.float64)), np.radians(np.asarray(lon, dtype=np.float64))
+    d_north, d_east = np.asarray(d_north, dtype=np.float64), np.asarray(d_east, dtype=np.float64)
+    delta = np.hypot(d_north, d_east) / EARTH_RADIUS # Angular distance
+    theta = np.arctan2(d_east, d_north)
+    sin_lat2 = np.sin(lat1) * np.cos(delta) + np.cos(lat1) * np.sin(delta) * np.cos(theta)
+    lat2 = np.arcsin(np.clip(sin_lat2, -1.0, 1.0))
+    lon2 = lon1 + np.arctan2(np.sin(theta) * np.sin(delta) * np.cos(lat1),
+                             np.cos(delta) - np.sin(lat1) * sin_lat2)
+    return np.degrees(lat2), (np.degrees(lon2) + 540.0) % 360.0 - 180.0
+
+
+def ned_offsets(lat0, lon0, lat, lon):
+    """ Inverse of offset_to_latlon: (d_north, d_east) metres from (lat0, lon0) to each point. """
+    distance = haversine_distance(lat0, lon0, lat, lon)
+    theta = np.radians(bearing(lat0, lon0, lat, lon))
+    return distance * np.cos(theta), distance * np.sin(theta)
+
+
+def cross_track_distance(lat, lon, start_lat, start_lon, end_lat, end_lon):
+    """
+    Signed distance in metres from each point to the great circle through
+    start -> end. Positive when the point is to the right of the track.
+    """
+    delta13 = haversine_distance(start_lat, start_lon, lat, lon) / EARTH_RADIUS
+    theta13 = np.radians(bearing(start_lat, start_lon, lat, lon))
+    theta12 = np.radians(bearing(start_lat, start_lon, end_lat, end_lon))
+    return np.arcsin(np.clip(np.sin(delta13) * np.sin(theta13 - theta12), -1.0, 1.0)) * EARTH_RADIUS
+
+# --- Scalar API ---
+
+def get_location_metres(original_location, dNorth, dEast):
+    """
+    Returns a LocationGlobalRelative object containing the latitude/longitude
+    'dNorth' and 'dEast' metres from the specified 'original_location'.
+    The returned LocationGlobalRelative has the same altitude as the original location.
+
+    Args:
+        original_location: LocationGlobalRelative object
+        dNorth: Distance north in meters
+        dEast: Distance east in meters
+
+    Returns:
+        LocationGlobalRelative object
+    """
+    # Imported here: geotag uses this module on the detector side, which has no other need for DroneKit
+    from dronekit import LocationGlobalRelative
+    newlat, newlon = offset_to_latlon(original_location.lat, original_location.lon, dNorth, dEast)
+    return LocationGlobalRelative(float(newlat), float(newlon), original_location.alt)
+
+def get_distance_metres(aLocation1, aLocation2):
+    """
+    Returns the ground (great-circle) distance in metres between two LocationGlobal objects.
+
+    Args:
+        aLocation1: LocationGlobal or LocationGlobalRelative object
+        aLocation2: LocationGlobal or LocationGlobalRelative object
+
+    Returns:
+        Ground distance in meters
+    """
+    return float(haversine_distance(aLocation1.lat, aLocation1.lon, aLocation2.lat, aLocation2.lon))
+
+def heading_difference(heading1, heading2):
+    """
+    Returns the smallest signed angle in degrees (-180, 180] that turns
+    'heading1' onto 'heading2'.
+    """
+    diff = (heading2 - heading1) % 360.0
+    return diff - 360.0 if diff > 180.0 else diff
@@ -0,0 +1,260 @@
+# Geotagging fruit detections.
+#
+# Frames are timestamped (wall-clock seconds) when captured. app.py keeps a
+# rolling TelemetryHistory of the vehicle's position and attitude; each
+# frame is matched to the nearest telemetry sample, and the centres of its
+# detection boxes are projected to the ground through a pinhole camera model
+# rotated by the vehicle's roll/pitch/yaw, intersecting the ground plane
+# 'altitude' metres below (relative altitude, flat ground). Everything is
+# batched: one call projects every box of every frame in a request.
+#
+# Testing.py sends its detections to app.py's /detections endpoint with a
+# DetectionUploader, which batches frames on a background thread so the
+# detector loop never waits for the network.
+
+import json
+import math
+import threading
+import time
+from collections import deque
+import numpy as np
+from geodesy import offset_to_latlon
+
+# Telemetry columns kept per sample
+HISTORY_FIELDS = ("latitude", "longitude", "altitude", "roll", "pitch", "yaw")
+
+
+class TelemetryHistory:
+    """
+    Time-ordered telemetry samples for matching frames to the vehicle pose.
+
+    Args:
+        max_samples: Samples kept (oldest dropped); 36000 is 30 minutes at 20 Hz
+    """
+
+    def __init__(self, max_samples=36000):
+        self.max_samples = max_samples
+        self._times = np.empty(2 * max_samples)
+        self._values = np.empty((2 * max_samples, len(HISTORY_FIELDS)))
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def record(self, t, telemetry):
+        """ Adds the telemetry dict sampled at wall-clock time 't'; samples without a position are ignored. """
+        try:
+            row = [float(telemetry[field]) for field in HISTORY_FIELDS]
+        except (KeyError, TypeError, ValueError):
+            return
+        with self._lock:
+            if self._count and t < self._times[self._count - 1]:
+                return # Out of order
+            if self._count == len(self._times):
+                # Drop the oldest half in one copy (amortised O(1) per sample)
+                keep = self.max_samples
+                self._times[:keep] = self._times[self._count - keep:self._count]
+                self._values[:keep] = self._values[self._count - keep:self._count]
+                self._count = keep
+            self._times[self._count] = t
+            self._values[self._count] = row
+            self._count += 1
+
+    def lookup(self, times, max_gap=0.25):
+        """
+        Nearest sample to each of 'times'.
+
+        Returns:
+            ((N, len(HISTORY_FIELDS)) array of samples, bool array: a sample within max_gap seconds existed)
+        """
+        times = np.asarray(times, dtype=np.float64).reshape(-1)
+        with self._lock:
+            stamps = self._times[:self._count].copy()
+            values = self._values[:self._count].copy()
+        if not len(stamps):
+            return np.full((len(times), len(HISTORY_FIELDS)), np.nan), np.zeros(len(times), dtype=bool)
+        if len(stamps) == 1:
+            nearest = np.zeros(len(times), dtype=int)
+        else:
+            right = np.clip(np.searchsorted(stamps, times), 1, len(stamps) - 1)
+            left = right - 1
+            nearest = np.where(np.abs(stamps[left] - times) <= np.abs(stamps[right] - times), left, right)
+        return values[nearest], np.abs(stamps[nearest] - times) <= max_gap
+
+
+class CameraModel:
+    """
+    Pinhole camera fixed to the airframe.
+
+    Args:
+        hfov: Horizontal field of view (degrees)
+        tilt: Optical axis tilt from straight down toward the nose (degrees); 0 is a nadir camera
+        max_range: Ignore projections further than this many altitudes away (near the horizon)
+    """
+
+    def __init__(self, hfov=62.2, tilt=0.0, max_range=10.0):
+        self.hfov = hfov
+        self.tilt = tilt
+        self.max_range = max_range
+
+    def rays(self, u, v, width, height):
+        """ Body-frame (forward, right, down) ray directions through pixels (u, v). """
+        f = (width / 2) / math.tan(math.radians(self.hfov) / 2)
+        t = math.radians(self.tilt)
+        up = -(np.asarray(v, dtype=np.float64) - height / 2) / f # Image up, in focal lengths
+        right = (np.asarray(u, dtype=np.float64) - width / 2) / f
+        return np.stack([up * math.cos(t) + math.sin(t), right, -up * math.sin(t) + math.cos(t)], axis=-1)
+
+
+def body_to_ned(rays, roll, pitch, yaw):
+    """ Rotates (N, 3) body-frame vectors by per-row roll/pitch/yaw (radians, ZYX order) into NED. """
+    cr, sr = np.cos(roll), np.sin(roll)
+    cp, sp = np.cos(pitch), np.sin(pitch)
+    cy, sy = np.cos(yaw), np.sin(yaw)
+    x, y, z = rays[:, 0], rays[:, 1], rays[:, 2]
+    north = cy * cp * x + (cy * sp * sr - sy * cr) * y + (cy * sp * cr + sy * sr) * z
+    east = sy * cp * x + (sy * sp * sr + cy * cr) * y + (sy * sp * cr - cy * sr) * z
+    down = -sp * x + cp * sr * y + cp * cr * z
+    return np.stack([north, east, down], axis=-1)
+
+
+def project_boxes(boxes, width, height, poses, camera):
+    """
+    Ground position of each box centre.
+
+    Args:
+        boxes: (N, 4) x1, y1, x2, y2 pixels
+        width, height: Image size in pixels
+        poses: (N, len(HISTORY_FIELDS)) telemetry sample per box (see TelemetryHistory.lookup)
+        camera: CameraModel
+
+    Returns:
+        (lat, lon, valid) arrays; boxes looking above the horizon or beyond max_range are not valid
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    poses = np.asarray(poses, dtype=np.float64).reshape(-1, len(HISTORY_FIELDS))
+    lat, lon, alt, roll, pitch, yaw = (poses[:, i] for i in range(len(HISTORY_FIELDS)))
+    rays = camera.rays((boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2, width, height)
+    ned = body_to_ned(rays, np.radians(roll), np.radians(pitch), np.radians(yaw))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = alt / ned[:, 2]
+        north, east = scale * ned[:, 0], scale * ned[:, 1]
+        valid = (ned[:, 2] > 1e-6) & (alt > 0) & (np.hypot(north, east) <= camera.max_range * alt)
+    north, east = np.where(valid, north, 0.0), np.where(valid, east, 0.0)
+    out_lat, out_lon = offset_to_latlon(np.nan_to_num(lat), np.nan_to_num(lon), north, east)
+    return out_lat, out_lon, valid & np.isfinite(lat) & np.isfinite(lon)
+
+
+def geotag_frames(frames, history, camera, max_gap=0.25):
+    """
+    Matches each frame to telemetry and projects its boxes.
+
+    Args:
+        frames: List of dicts with 'captured_at' (unix seconds), 'width', 'height', 'boxes' and
+                optionally 'confidences', 'ripeness' and 'track_ids' (one per box)
+
+    Returns:
+        Dict of per-detection arrays: t, lat, lon, confidence, ripeness, track_id; plus 'dropped', the
+        number of boxes with no telemetry within max_gap or no ground intersection
+    """
+    counts = [len(frame.get("boxes") or []) for frame in frames]
+    total = sum(counts)
+    if not total:
+        return {"t": np.empty(0), "lat": np.empty(0), "lon": np.empty(0), "confidence": np.empty(0),
+                "ripeness": [], "track_id": [], "dropped": 0}
+    times = np.array([float(frame["captured_at"]) for frame in frames])
+    poses, matched = history.lookup(times, max_gap)
+
+    lats, lons, keep = [], [], []
+    for frame, pose, ok in zip(frames, poses, matched):
+        boxes = np.asarray(frame.get("boxes") or [], dtype=np.float64).reshape(-1, 4)
+        lat, lon, valid = project_boxes(boxes, frame["width"], frame["height"],
+                                        np.broadcast_to(pose, (len(boxes), len(pose))), camera)
+        lats.append(lat)
+        lons.append(lon)
+        keep.append(valid & ok)
+    keep = np.concatenate(keep)
+
+    def column(name, default):
+        values = []
+        for frame, count in zip(frames, counts):
+            given = frame.get(name)
+            values.extend(given if given is not None and len(given) == count else [default] * count)
+        return [value for value, k in zip(values, keep) if k]
+
+    return {"t": np.repeat(times, counts)[keep], "lat": np.concatenate(lats)[keep],
+            "lon": np.concatenate(lons)[keep],
+            "confidence": np.array(column("confidences", 0.0), dtype=np.float64),
+            "ripeness": column("ripeness", None), "track_id": column("track_ids", None),
+            "dropped": int(total - keep.sum())}
+
+
+class DetectionUploader:
+    """
+    Posts detections to app.py's /detections endpoint from a background
+    thread, batching frames so the caller never blocks on the network.
+    Frames that cannot be sent are dropped (oldest first when the backlog is full).
+
+    Args:
+        url: e.g. 'http://127.0.0.1:5000/detections'
+        interval: Seconds between posts
+        max_frames: Backlog limit
+    """
+
+    def __init__(self, url, interval=0.5, max_frames=600, timeout=2.0):
+        self.url = url
+        self.interval = interval
+        self.timeout = timeout
+        self._frames = deque(maxlen=max_frames)
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+        self.sent = 0
+        self.failed = 0
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="detection-uploader", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(self.timeout + self.interval)
+        self._flush()
+
+    def add(self, captured_at, width, height, fruits):
+        """ Queues one frame's Fruit list (see ripeness.Fruit), captured at wall-clock 'captured_at'. """
+        if not fruits:
+            return
+        frame = {"captured_at": captured_at, "width": width, "height": height,
+                 "boxes": [list(fruit.box) for fruit in fruits],
+                 "confidences": [round(float(fruit.confidence), 3) for fruit in fruits],
+                 "ripeness": [fruit.ripeness for fruit in fruits],
+                 "track_ids": [fruit.track_id for fruit in fruits]}
+        with self._lock:
+            self._frames.append(frame)
+
+    def _flush(self):
+        with self._lock:
+            frames = list(self._frames)
+            self._frames.clear()
+        if not frames:
+            return
+        import urllib.request # First needed on the uploader thread, not while the detector starts
+        request = urllib.request.Request(self.url, data=json.dumps({"frames": frames}).encode(),
+                                         headers={"Content-Type": "application/json"}, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+            self.sent += len(frames)
+        except OSError as e:
+            self.failed += len(frames)
+            print(f"Detection upload failed ({len(frames)} frames dropped): {e}")
+
+    def _run(self):
+        while self._running:
+            time.sleep(self.interval)
+            self._flush()
@@ -0,0 +1,255 @@
+# Batched multi-source inference server for the mango detector.
+#
+# Frames from any number of sources (cameras, video files, image folders) are
+# submitted to one InferenceServer, which groups them into dynamic
+# micro-batches: a batch is dispatched as soon as it holds 'max_batch_size'
+# frames or 'max_wait' seconds after its first frame arrived, whichever comes
+# first. Each batch is one predict call; every frame's result is handed back
+# through the concurrent.futures.Future returned by submit().
+#
+# Live cameras keep one frame in flight and always submit their newest frame;
+# recorded videos and image folders keep several in flight so that even a
+# single file fills whole batches.
+#
+# Usage: python inference_server.py --model best.pt --source 0 --source flight.mp4 --source frames/
+
+import argparse
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from detection_pipeline import StageStats
+from metrics import gauge, histogram
+from model_cache import MODELS
+
+# --- Requires Installation for camera/video/folder sources: pip install opencv-python ---
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# --- Metrics ---
+batch_size = histogram("inference_batch_size", "Frames per predict call", buckets=(1, 2, 4, 8, 16, 32, 64))
+pending_frames = gauge("inference_pending_frames", "Frames waiting for the next batch")
+
+
+class InferenceServer:
+    """
+    Collects submitted frames into micro-batches for 'predict_batch'.
+
+    Args:
+        predict_batch: Callable(list of frames) returning a list of results, one per frame
+        max_batch_size: Upper bound on frames per predict call
+        max_wait: Seconds a batch may wait for more frames after its first one
+    """
+
+    def __init__(self, predict_batch, max_batch_size=8, max_wait=0.01):
+        self._predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._pending = deque() # (frame, future, submitted_at)
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self.batches = 0
+        self.images = 0
+        self.stats = StageStats("batch")
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, name="inference-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(self, frame):
+        """ Queues 'frame' for the next batch; returns a Future resolving to its result. """
+        future = Future()
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("Inference server is not running")
+            self._pending.append((frame, future, time.monotonic()))
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch_size:
+                self._cond.notify()
+        return future
+
+    def _next_batch(self):
+        """ Blocks for the first frame, then waits up to max_wait for the batch to fill. """
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending or not self._running)
+            if not self._pending:
+                return None
+            deadline = self._pending[0][2] + self.max_wait
+            while len(self._pending) < self.max_batch_size and self._running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            count = min(len(self._pending), self.max_batch_size)
+            return [self._pending.popleft() for _ in range(count)]
+
+    def _serve(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            frames = [frame for frame, _, _ in batch]
+            started = time.monotonic()
+            try:
+                results = self._predict_batch(frames)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            finished = time.monotonic()
+            self.batches += 1
+            self.images += len(batch)
+            batch_size.observe(len(batch))
+            pending_frames.set(len(self._pending))
+            for (_, future, submitted_at), result in zip(batch, results):
+                self.stats.record(started, finished, submitted_at)
+                future.set_result(result)
+
+    def to_dict(self):
+        data = self.stats.to_dict()
+        data.update(batches=self.batches, images=self.images,
+                    mean_batch=round(self.images / self.batches, 2) if self.batches else 0.0)
+        return data
+
+
+# --- Sources ---
+# Each source is an iterator of frames plus how many frames it may keep in flight.
+
+def camera_frames(index):
+    """ Newest frame from a live camera on every iteration. """
+    cap = cv2.VideoCapture(index)
+    if not cap.isOpened():
+        raise IOError(f"Could not open camera {index}")
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                return
+            yield frame
+    finally:
+        cap.release()
+
+
+def video_frames(path):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video {path}")
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                return
+            yield frame
+    finally:
+        cap.release()
+
+
+def folder_frames(path):
+    for name in sorted(os.listdir(path)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            frame = cv2.imread(os.path.join(path, name))
+            if frame is not None:
+                yield frame
+
+
+def open_source(spec, max_in_flight=16):
+    """ (frames iterator, frames in flight) for a camera index, video file or image folder. """
+    if cv2 is None:
+        raise ImportError("Reading sources needs OpenCV (pip install opencv-python)")
+    if spec.isdigit():
+        return camera_frames(int(spec)), 1
+    if os.path.isdir(spec):
+        return folder_frames(spec), max_in_flight
+    return video_frames(spec), max_in_flight
+
+
+def feed(server, name, frames, on_result, in_flight=1):
+    """
+    Submits 'frames' to 'server', keeping up to 'in_flight' outstanding, and
+    calls on_result(name, index, frame, result) in frame order.
+    """
+    outstanding = deque()
+    for index, frame in enumerate(frames):
+        outstanding.append((index, frame, server.submit(frame)))
+        while len(outstanding) >= in_flight:
+            done_index, done_frame, future = outstanding.popleft()
+            on_result(name, done_index, done_frame, future.result())
+    while outstanding:
+        done_index, done_frame, future = outstanding.popleft()
+        on_result(name, done_index, done_frame, future.result())
+
+
+def serve_sources(server, sources, on_result):
+    """ Runs one feeder thread per (name, frames, in_flight) source until all are exhausted. """
+    threads = [threading.Thread(target=feed, args=(server, name, frames, on_result, in_flight),
+                                name=f"source-{name}", daemon=True)
+               for name, frames, in_flight in sources]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def yolo_predict_batch(model, conf=0.6, imgsz=640):
+    """ predict_batch for an Ultralytics model: one predict call over the list of frames. """
+    def predict_batch(frames):
+        return model.predict(source=frames, conf=conf, imgsz=imgsz, verbose=False)
+    return predict_batch
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Batched YOLOv8 inference over several sources")
+    parser.add_argument('--model', required=True, help="path to best.pt")
+    parser.add_argument('--source', action='append', required=True,
+                        help="camera index, video file or image folder (repeatable)")
+    parser.add_argument('--max-batch', type=int, default=8)
+    parser.add_argument('--max-wait-ms', type=float, default=10.0)
+    parser.add_argument('--conf', type=float, default=0.6)
+    parser.add_argument('--backend', default="auto", help="model_backends backend, 'auto' picks the fastest")
+    args = parser.parse_args()
+
+    model, backend = MODELS.detector(args.model, backend=args.backend) # Warmed up before the first batch
+    print(f"Loaded {args.model} ({backend} backend)")
+    server = InferenceServer(yolo_predict_batch(model, args.conf), args.max_batch, args.max_wait_ms / 1000).start()
+
+    counts = {}
+    lock = threading.Lock()
+
+    def on_result(name, index, frame, result):
+        with lock:
+            frames, fruits = counts.get(name, (0, 0))
+            counts[name] = (frames + 1, fruits + len(result.boxes))
+
+    sources = []
+    for spec in args.source:
+        frames, in_flight = open_source(spec, max_in_flight=2 * args.max_batch)
+        sources.append((spec, frames, in_flight))
+    start_time = time.monotonic()
+    try:
+        serve_sources(server, sources, on_result)
+    except KeyboardInterrupt:
+        print("Stopping...")
+    finally:
+        server.stop()
+    elapsed = time.monotonic() - start_time
+    for name, (frames, fruits) in counts.items():
+        print(f"{name}: {frames} frames, {fruits} detections")
+    stats = server.to_dict()
+    print(f"{stats['images']} images in {stats['batches']} batches (mean {stats['mean_batch']}), "
+          f"{stats['images'] / elapsed:.1f} images/s, latency p50 {stats['latency_p50_ms']} ms "
+          f"p95 {stats['latency_p95_ms']} ms")
@@ -1,19 +1,31 @@
 import time
 import math
 import threading
-from pymavlink import mavutil # For MAVLink commands
-from dronekit import connect, VehicleMode, LocationGlobalRelative, APIException
+from dronekit import LocationGlobalRelative, APIException
+from setpoint_streamer import SetpointStreamer
+from commands import CommandSender, CommandError
+from connection import Backoff, open_vehicle
 
 # --- Requires Installation: pip install keyboard ---
 import keyboard
 
 # --- Global Variables ---
 vehicle = None
+streamer = None # Sends the current velocity / yaw-rate setpoint at setpoint_rate
+commands = CommandSender() # Arm / mode commands, confirmed by the autopilot's COMMAND_ACK
 running = True # Flag to control background threads
 takeoff_altitude = 15.0
 default_speed = 2.0 # m/s for horizontal movement
 altitude_change_speed = 0.5 # m/s for vertical movement
 yaw_rate_deg_s = 30 # degrees per second for yaw
+setpoint_rate = 20.0 # Hz; velocity setpoints streamed while a movement key is held
+key_check_interval = 0.2 # Seconds between checks that held movement keys are still down
+tap_duration = 0.25 # Seconds a short tap of a movement key moves the vehicle for
+
+# Takeoff and land run on a worker thread so keyboard input stays live; 'x' aborts them
+action_thread = None
+action_abort = threading.Event()
+quit_requested = threading.Event()
 
 # --- DroneKit Connection ---
 def connect_vehicle():
@@ -24,12 +36,16 @@ def connect_vehicle():
     connection_string = 'tcp:127.0.0.1:5762' # Example for Serial connection (Windows) - CHANGE TO YOUR PORT # Example for Serial connection (Linux) - CHANGE AS NEEDED
     # connection_string = 'com3' # Example for Serial connection (Windows) - CHANGE AS NEEDED
     print(f"Attempting to connect to vehicle on: {connection_string}")
+    backoff = Backoff()
 
     while running and vehicle is None:
         try:
             print(f"Connecting to vehicle on: {connection_string}")
-            vehicle = connect(connection_string, wait_ready=True, timeout=60, heartbeat_timeout=30)
+            # Only what keyboard control needs; parameters keep downloading in the background
+            vehicle = open_vehicle(connection_string,
+                                   wait_for=("mode", "armed", "attitude", "location.global_relative_frame"))
             print("Vehicle connected successfully.")
+            commands.attach(vehicle)
             # Display basic vehicle info
             print(f" Firmware: {vehicle.version}")
             print(f" Global Location: {vehicle.location.global_relative_frame}")
@@ -54,8 +70,9 @@ def connect_vehicle():
             vehicle = None
 
         if vehicle is None and running:
-            print("Connection failed, retrying in 5 seconds...")
-            time.sleep(5)
+            delay = backoff.next()
+            print(f"Connection failed, retrying in {delay:.1f} seconds...")
+            time.sleep(delay)
 
     if not running:
         print("Connection attempt aborted.")
@@ -63,7 +80,7 @@ def connect_vehicle():
 # --- Drone Control Functions ---
 
 def arm_and_takeoff(target_altitude):
-    """ Arms vehicle and fly to target_altitude. """
+    """ Arms vehicle and fly to target_altitude. Returns early if action_abort is set. """
     if not vehicle:
         print("Vehicle not connected.")
         return
@@ -78,16 +95,22 @@ def arm_and_takeoff(target_altitude):
     print("Basic pre-arm checks")
     while not vehicle.is_armable:
         print(" Waiting for vehicle to initialise...")
-        time.sleep(1)
+        if action_abort.wait(1):
+            print("Takeoff aborted before arming.")
+            return
 
     print("Arming motors")
     # Copter should arm in GUIDED mode
-    vehicle.mode = VehicleMode("GUIDED")
-    vehicle.armed = True
-
-    while not vehicle.armed:
-        print(" Waiting for arming...")
-        time.sleep(1)
+    try:
+        commands.set_mode("GUIDED").result()
+        commands.arm().result()
+    except CommandError as e:
+        print(f"Arming failed: {e}")
+        return
+    if action_abort.is_set():
+        print("Takeoff aborted, disarming.")
+        commands.arm(False)
+        return
 
     print(f"Taking off to {target_altitude}m!")
     vehicle.simple_takeoff(target_altitude)
@@ -99,15 +122,24 @@ def arm_and_takeoff(target_altitude):
         if alt >= target_altitude * 0.90:
             print("Reached target altitude")
             break
-        time.sleep(1)
+        if action_abort.wait(1):
+            # A zero velocity setpoint replaces the takeoff target: hover where we are
+            print(f"Takeoff aborted, holding at {vehicle.location.global_relative_frame.alt:.2f}m")
+            if streamer:
+                streamer.brake()
+            return
 
 def land_vehicle():
-    """ Sets vehicle mode to LAND. """
+    """ Sets vehicle mode to LAND and waits for disarm. Aborting switches to GUIDED, which hovers. """
     if not vehicle:
         print("Vehicle not connected.")
         return
     print("Setting LAND mode...")
-    vehicle.mode = VehicleMode("LAND")
+    try:
+        commands.set_mode("LAND").result()
+    except CommandError as e:
+        print(f"Failed to set LAND mode: {e}")
+        return
     # Wait for disarm? Monitor altitude?
     while vehicle.armed:
         alt = vehicle.location.global_relative_frame.alt
@@ -115,190 +147,196 @@ def land_vehicle():
         if alt < 0.3: # Check if close to ground
              # Arducopter might take a moment to disarm after touching down
              print("Landed (or close to ground), waiting for disarm...")
-        time.sleep(1)
+        if action_abort.wait(1):
+            print("Landing aborted, hovering in GUIDED mode.")
+            commands.set_mode("GUIDED")
+            return
     print("Vehicle landed and disarmed.")
 
 
-def send_ned_velocity(velocity_x, velocity_y, velocity_z, duration):
+def move(velocity_x, velocity_y, velocity_z, yaw_rate=0.0):
     """
-    Move vehicle in direction based on specified velocity vectors.
+    Sets the velocity (m/s) and yaw rate (deg/s, clockwise) streamed to the
+    vehicle; takes effect on the streamer's next tick. Call it again while
+    the key is held, or the streamer's watchdog stops the vehicle.
     Positive X is North, Positive Y is East, Positive Z is Down.
     """
-    if not vehicle:
+    if not streamer:
         print("Vehicle not connected.")
         return
-    if vehicle.mode.name != "GUIDED":
-        print("Vehicle must be in GUIDED mode to accept velocity commands.")
-        # Optionally try to set GUIDED mode here
-        # vehicle.mode = VehicleMode("GUIDED")
-        # time.sleep(0.5)
-        # if vehicle.mode.name != "GUIDED":
-        #    print("Failed to set GUIDED mode.")
-        #    return
+    if (velocity_x, velocity_y, velocity_z, yaw_rate) != tuple(streamer.target) and \
+            any((velocity_x, velocity_y, velocity_z, yaw_rate)):
+        if vehicle.mode.name != "GUIDED":
+            print("Vehicle must be in GUIDED mode to accept velocity commands.")
+        else:
+            print(f"Velocity setpoint: N:{velocity_x:.1f}, E:{velocity_y:.1f}, D:{velocity_z:.1f}, Yaw:{yaw_rate:.0f} deg/s")
+    streamer.set(velocity_x, velocity_y, velocity_z, yaw_rate)
+
+
+# --- Keyboard Control ---
+def run_action(name, function, *args):
+    """ Runs a long action (takeoff, land) on the worker thread; one at a time. """
+    global action_thread
+    if action_thread and action_thread.is_alive():
+        print(f"Busy with {action_thread.name}; press x to abort it first.")
         return
+    action_abort.clear()
+    action_thread = threading.Thread(target=function, args=args, name=name, daemon=True)
+    action_thread.start()
+
+def abort_action():
+    if action_thread and action_thread.is_alive():
+        print(f"Aborting {action_thread.name}...")
+        action_abort.set()
+    else:
+        print("Nothing to abort.")
+
+def set_guided():
+    if vehicle and vehicle.mode.name != "GUIDED":
+         print("Setting GUIDED mode")
+         # Called from the keyboard hook: report the outcome without waiting for it
+         commands.set_mode("GUIDED").add_done_callback(
+             lambda f: f.exception() and print(f"Failed to set GUIDED mode: {f.exception()}"))
+    elif vehicle:
+         print("Already in GUIDED mode")
+    else:
+         print("Vehicle not connected")
 
-    msg = vehicle.message_factory.set_position_target_local_ned_encode(
-        0,       # time_boot_ms (not used)
-        0, 0,    # target system, target component
-        mavutil.mavlink.MAV_FRAME_LOCAL_NED, # frame
-        0b0000111111000111, # type_mask (only speeds enabled)
-        0, 0, 0, # x, y, z positions (not used)
-        velocity_x, velocity_y, velocity_z, # x, y, z velocity in m/s
-        0, 0, 0, # x, y, z acceleration (not supported yet, ignored in GCS_Mavlink)
-        0, 0)    # yaw, yaw_rate (not supported yet, ignored in GCS_Mavlink)
-
-    # Send command to vehicle for duration
-    for _ in range(0, int(duration)): # Send for a few seconds
-        vehicle.send_mavlink(msg)
-        time.sleep(1)
-    # Send a zero velocity message to stop
-    stop_msg = vehicle.message_factory.set_position_target_local_ned_encode(
-        0, 0, 0, mavutil.mavlink.MAV_FRAME_LOCAL_NED,
-        0b0000111111000111, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
-    vehicle.send_mavlink(stop_msg)
-    print(f"Sent velocity command: N:{velocity_x:.1f}, E:{velocity_y:.1f}, D:{velocity_z:.1f} for {duration}s, then stopped.")
-
-
-def condition_yaw(heading_deg, relative=False, direction=1, rate_deg_s=None):
+def request_quit():
+    global running
+    print("Quitting")
+    running = False # Signal threads and loop to stop
+    action_abort.set()
+    quit_requested.set()
+
+# Movement keys: (north, east, down, yaw) directions; held keys add up, so w+d flies
+# north-east and w+right turns while moving. Needs GUIDED mode.
+MOTION_KEYS = {
+    'w': ("Move Forward", (1, 0, 0, 0)),   # North
+    's': ("Move Backward", (-1, 0, 0, 0)), # South
+    'a': ("Move Left", (0, -1, 0, 0)),     # West
+    'd': ("Move Right", (0, 1, 0, 0)),     # East
+    'up': ("Move Up", (0, 0, -1, 0)),      # Z is down
+    'down': ("Move Down", (0, 0, 1, 0)),
+    'left': ("Yaw Left", (0, 0, 0, -1)),   # Counter-clockwise
+    'right': ("Yaw Right", (0, 0, 0, 1)),  # Clockwise
+}
+
+# Action keys: run once per press (key repeat is ignored)
+ACTION_KEYS = {
+    't': ("Takeoff to {:.1f}m".format(takeoff_altitude), lambda: run_action("takeoff", arm_and_takeoff, takeoff_altitude)),
+    'l': ("Land", lambda: run_action("landing", land_vehicle)),
+    'x': ("Abort takeoff / landing", abort_action),
+    'g': ("Set GUIDED mode (needed for movement)", set_guided),
+    'q': ("Quit", request_quit),
+}
+
+held_keys = {} # Movement keys currently down -> monotonic time pressed
+pressed_actions = set() # Action keys currently down, to ignore key repeat
+held_lock = threading.Lock()
+keys_held = threading.Event() # Set while movement keys are down; wakes the key checker
+
+def motion_setpoint(keys):
+    """ Sum of the held keys' directions, scaled by the configured speeds. """
+    north = sum(MOTION_KEYS[k][1][0] for k in keys)
+    east = sum(MOTION_KEYS[k][1][1] for k in keys)
+    down = sum(MOTION_KEYS[k][1][2] for k in keys)
+    yaw = sum(MOTION_KEYS[k][1][3] for k in keys)
+    horizontal = math.hypot(north, east)
+    scale = default_speed / horizontal if horizontal else 0.0 # Diagonals fly at default_speed too
+    return north * scale, east * scale, down * altitude_change_speed, yaw * yaw_rate_deg_s
+
+def update_motion():
+    with held_lock:
+        keys = set(held_keys)
+    if keys:
+        keys_held.set()
+    move(*motion_setpoint(keys))
+
+def release_key(name, pressed_at):
+    with held_lock:
+        if held_keys.get(name) != pressed_at:
+            return # Pressed again since
+        del held_keys[name]
+    update_motion()
+
+def on_key(event):
+    """ keyboard.hook callback, on the keyboard library's listener thread: keep it short. """
+    try:
+        name = (event.name or "").lower()
+        down = event.event_type == keyboard.KEY_DOWN
+        if name in MOTION_KEYS:
+            with held_lock:
+                pressed_at = held_keys.get(name)
+                if down and pressed_at is None:
+                    held_keys[name] = time.monotonic()
+                elif down or pressed_at is None:
+                    return # Key repeat, or a release already handled
+            if down:
+                update_motion()
+            else:
+                # Short taps still nudge the vehicle: the release takes effect after tap_duration
+                remaining = pressed_at + tap_duration - time.monotonic()
+                if remaining > 0:
+                    threading.Timer(remaining, release_key, args=(name, pressed_at)).start()
+                else:
+                    release_key(name, pressed_at)
+        elif name in ACTION_KEYS and down:
+            with held_lock:
+                repeat = name in pressed_actions
+                pressed_actions.add(name)
+            if not repeat:
+                print(f"[{name.upper()}] {ACTION_KEYS[name][0]}")
+                ACTION_KEYS[name][1]()
+        elif name in ACTION_KEYS:
+            with held_lock:
+                pressed_actions.discard(name)
+    except Exception as e:
+        print(f"Error handling key {event.name}: {e}")
+
+def check_held_keys():
     """
-    Send MAV_CMD_CONDITION_YAW message to control yaw.
-    heading_deg: target angle in degrees (0-360 absolute, or +/- relative)
-    relative: True for relative angle change, False for absolute heading
-    direction: -1 for CCW (Left), 1 for CW (Right) - only matters for relative turns
-    rate_deg_s: speed of turn in degrees/second (None to use default/max)
+    While movement keys are held, re-checks them every key_check_interval: drops
+    keys whose release event was lost and keeps the streamer's watchdog fed.
+    Sleeps on keys_held otherwise.
     """
-    if not vehicle:
-        print("Vehicle not connected.")
-        return
-    if vehicle.mode.name != "GUIDED":
-        print("Vehicle must be in GUIDED mode to accept yaw commands.")
-        return
-
-    is_relative = 1 if relative else 0
-    yaw_speed = rate_deg_s if rate_deg_s is not None else 0 # 0 lets autopilot control speed
-
-    print(f"Sending YAW command: Angle={heading_deg}, Relative={relative}, Dir={direction}, Rate={yaw_speed}")
-
-    msg = vehicle.message_factory.command_long_encode(
-        0, 0,       # target system, target component
-        mavutil.mavlink.MAV_CMD_CONDITION_YAW, # command
-        0,          # confirmation
-        heading_deg, # param 1: target angle (absolute or relative)
-        yaw_speed,  # param 2: yaw speed deg/s (0 for AP default)
-        direction,  # param 3: direction (-1 CCW, 1 CW)
-        is_relative,# param 4: 1 for relative, 0 for absolute
-        0, 0, 0)    # param 5 ~ 7 not used
-
-    vehicle.send_mavlink(msg)
-
+    while running:
+        keys_held.wait(1.0)
+        if not keys_held.is_set():
+            continue
+        time.sleep(key_check_interval)
+        try:
+            with held_lock:
+                now = time.monotonic()
+                for key in [k for k, at in held_keys.items()
+                            if now - at > tap_duration and not keyboard.is_pressed(k)]:
+                    del held_keys[key]
+                if not held_keys:
+                    keys_held.clear()
+            update_motion()
+        except Exception as e:
+            print(f"Error checking held keys: {e}")
 
-# --- Keyboard Control Loop ---
 def keyboard_control_loop():
-    """ Listens for keyboard input and controls the drone. """
-    global running
+    """ Dispatches key down/up events from keyboard hooks until 'q' is pressed. """
     print("\n--- Keyboard Control Enabled ---")
-    print(" t: Takeoff to {:.1f}m".format(takeoff_altitude))
-    print(" l: Land")
-    print(" w: Move Forward")
-    print(" s: Move Backward")
-    print(" a: Move Left")
-    print(" d: Move Right")
-    print(" UP_ARROW: Move Up")
-    print(" DOWN_ARROW: Move Down")
-    print(" LEFT_ARROW: Yaw Left")
-    print(" RIGHT_ARROW: Yaw Right")
-    print(" g: Set GUIDED mode (needed for movement)")
-    print(" q: Quit")
+    for key, (description, _) in list(ACTION_KEYS.items()) + list(MOTION_KEYS.items()):
+        print(f" {key.upper() + '_ARROW' if key in ('up', 'down', 'left', 'right') else key}: {description}")
+    print(" Hold several movement keys to combine them")
     print("---------------------------------")
 
-    move_duration = 1 # How long to apply velocity for each key press (seconds)
-
-    while running:
-        try:
-            # Use keyboard.read_key() for blocking read or setup hooks for non-blocking
-            # Using is_pressed for a polling approach here for simplicity
-            # Note: This will consume CPU. Hooks are better for non-blocking.
-
-            if keyboard.is_pressed('t'):
-                print("[T] Key pressed - Takeoff Initiated")
-                arm_and_takeoff(takeoff_altitude)
-                time.sleep(0.5) # Debounce
-
-            elif keyboard.is_pressed('l'):
-                print("[L] Key pressed - Land Initiated")
-                land_vehicle()
-                time.sleep(0.5) # Debounce
-
-            elif keyboard.is_pressed('g'):
-                if vehicle and vehicle.mode.name != "GUIDED":
-                     print("[G] Key pressed - Setting GUIDED mode")
-                     vehicle.mode = VehicleMode("GUIDED")
-                elif vehicle:
-                     print("[G] Key pressed - Already in GUIDED mode")
-                else:
-                     print("[G] Key pressed - Vehicle not connected")
-                time.sleep(0.5) # Debounce
-
-            # --- Movement --- Needs GUIDED mode
-            elif keyboard.is_pressed('w'): # Forward (North)
-                print("[W] Key pressed - Move Forward")
-                send_ned_velocity(default_speed, 0, 0, move_duration)
-                time.sleep(0.1) # Shorter debounce during movement likely needed
-
-            elif keyboard.is_pressed('s'): # Backward (South)
-                print("[S] Key pressed - Move Backward")
-                send_ned_velocity(-default_speed, 0, 0, move_duration)
-                time.sleep(0.1)
-
-            elif keyboard.is_pressed('a'): # Left (West)
-                print("[A] Key pressed - Move Left")
-                send_ned_velocity(0, -default_speed, 0, move_duration)
-                time.sleep(0.1)
-
-            elif keyboard.is_pressed('d'): # Right (East)
-                print("[D] Key pressed - Move Right")
-                send_ned_velocity(0, default_speed, 0, move_duration)
-                time.sleep(0.1)
-
-            elif keyboard.is_pressed('up'): # Up (Decrease Z velocity - remember Z is down)
-                print("[Up Arrow] Key pressed - Move Up")
-                send_ned_velocity(0, 0, -altitude_change_speed, move_duration)
-                time.sleep(0.1)
-
-            elif keyboard.is_pressed('down'): # Down (Increase Z velocity)
-                print("[Down Arrow] Key pressed - Move Down")
-                send_ned_velocity(0, 0, altitude_change_speed, move_duration)
-                time.sleep(0.1)
-
-            # --- Yaw --- Needs GUIDED mode
-            elif keyboard.is_pressed('left'): # Yaw Left (Counter-Clockwise)
-                print("[Left Arrow] Key pressed - Yaw Left")
-                condition_yaw(yaw_rate_deg_s * move_duration, relative=True, direction=-1)
-                # Yaw is often rate controlled, so sending once might be enough, or send continuously while pressed
-                time.sleep(0.2) # Debounce for yaw
-
-            elif keyboard.is_pressed('right'): # Yaw Right (Clockwise)
-                print("[Right Arrow] Key pressed - Yaw Right")
-                condition_yaw(yaw_rate_deg_s * move_duration, relative=True, direction=1)
-                time.sleep(0.2) # Debounce for yaw
-
-
-            elif keyboard.is_pressed('q'):
-                print("[Q] Key pressed - Quitting")
-                running = False # Signal threads and loop to stop
-                break
-
-            # Prevent busy-waiting - sleep briefly if no key relevant key is pressed
-            time.sleep(0.05)
-
-        except Exception as e:
-            print(f"Error in keyboard loop: {e}")
-            # Consider adding a flag to break if too many errors occur rapidly
-            time.sleep(1) # Pause longer after an error
+    checker = threading.Thread(target=check_held_keys, name='KeyCheckThread', daemon=True)
+    checker.start()
+    keyboard.hook(on_key)
+    try:
+        quit_requested.wait()
+    finally:
+        keyboard.unhook_all()
 
 
 # --- Main Execution ---
 if __name__ == '__main__':
+    keyboard_thread = None
     connect_thread = threading.Thread(target=connect_vehicle, name='DroneConnectThread', daemon=True)
     connect_thread.start()
 
@@ -306,6 +344,7 @@ if __name__ == '__main__':
     connect_thread.join(timeout=10.0) # Give it time to try connecting
 
     if vehicle:
+        streamer = SetpointStreamer(vehicle, rate=setpoint_rate).start()
         # Start keyboard listener only if connection was successful
         keyboard_thread = threading.Thread(target=keyboard_control_loop, name='KeyboardThread', daemon=True)
         keyboard_thread.start()
@@ -319,7 +358,7 @@ if __name__ == '__main__':
                 time.sleep(1)
         except KeyboardInterrupt:
             print("Ctrl+C detected. Shutting down...")
-            running = False # Signal threads to stop
+            request_quit() # Signal threads to stop
     else:
         print("Failed to connect to vehicle after initial attempt. Exiting.")
         running = False # Ensure connect_thread exits if it's still retrying
@@ -329,6 +368,10 @@ if __name__ == '__main__':
     print("Initiating shutdown sequence...")
     # running = False # Ensure flag is set
 
+    if action_thread and action_thread.is_alive():
+         print(f"Waiting for {action_thread.name} to stop...")
+         action_thread.join(timeout=2.0)
+
     if keyboard_thread and keyboard_thread.is_alive():
          print("Waiting for keyboard thread to stop...")
          keyboard_thread.join(timeout=2.0)
@@ -338,6 +381,9 @@ if __name__ == '__main__':
          print("Waiting for connection thread to stop...")
          connect_thread.join(timeout=3.0) # Allow some time to exit cleanly
 
+    if streamer:
+        streamer.close()
+
     if vehicle:
         print("Closing vehicle connection...")
         try:
@@ -345,6 +391,7 @@ if __name__ == '__main__':
             # if vehicle.armed and vehicle.location.global_relative_frame.alt > 2:
             #     print("Attempting to land vehicle before closing...")
             #     land_vehicle() # This might block, consider timeout
+            commands.detach()
             vehicle.close()
             print("Vehicle connection closed.")
         except Exception as e:
@@ -0,0 +1,312 @@
+# Low-overhead metrics for the hot paths, in Prometheus text format.
+#
+# Counters, gauges and fixed-bucket histograms are created once, at import
+# time, by the modules they instrument and then updated in place: observe() is
+# a bisect into the bucket bounds and two additions. Nothing is allocated per
+# sample and nothing is locked, because a lock on every telemetry update would
+# cost more than the measurement; under contention an update can very rarely be
+# lost, which a rate or a percentile does not notice. Gauges can instead be
+# read from a callback at scrape time (client counts, queue depths).
+#
+# render() produces the Prometheus text exposition format for app.py's
+# /metrics route; serve() runs a minimal HTTP endpoint for processes without
+# Flask (Testing.py).
+#
+# SamplingProfiler is the opt-in view one level down: a real OS thread walks
+# every thread's stack every few milliseconds and counts folded stacks
+# ("file:function;file:function count"), ready for flamegraph.pl or speedscope.
+#
+#     frames_sent = counter("frames_sent_total", "Frames sent to clients")
+#     stage_seconds = histogram("stage_seconds", "Time per stage", ("stage",))
+#     inference_seconds = stage_seconds.labels("inference") # Look the child up once
+#     start = time.perf_counter()
+#     ...
+#     inference_seconds.observe(time.perf_counter() - start)
+
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally
+
+# Seconds; 0.5 ms to 10 s covers a telemetry callback up to a slow mission step
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Gauge:
+    __slots__ = ("value", "function")
+
+    def __init__(self, function=None):
+        self.value = 0
+        self.function = function # Read at scrape time instead of 'value'
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def read(self):
+        return self.function() if self.function is not None else self.value
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1) # Per bucket (not cumulative); the last is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """ Upper bound of the bucket holding quantile 'q' (None if empty); for quick reports, not dashboards. """
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Family:
+    """ One metric name: a child Counter / Gauge / Histogram per combination of label values. """
+
+    def __init__(self, kind, name, help, labelnames, make):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._make = make
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._make())
+        return child
+
+    def samples(self):
+        """ (suffix, labels dict, value) for rendering. """
+        for values, child in sorted(self._children.items(), key=lambda item: tuple(map(str, item[0]))):
+            labels = dict(zip(self.labelnames, values))
+            if self.kind == "histogram":
+                cumulative = 0
+                for bound, count in zip(child.bounds + (float("inf"),), child.counts):
+                    cumulative += count
+                    yield "_bucket", dict(labels, le=_format(bound)), cumulative
+                yield "_sum", labels, child.sum
+                yield "_count", labels, child.count
+            elif self.kind == "gauge":
+                try:
+                    yield "", labels, child.read()
+                except Exception as e:
+                    print(f"Metrics: gauge {self.name} failed: {e}")
+            else:
+                yield "", labels, child.value
+
+
+def _format(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class Registry:
+    """ Metric families by name. Registering a name again returns the existing metric. """
+
+    def __init__(self):
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def _register(self, kind, name, help, labelnames, make):
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = Family(kind, name, help, labelnames, make)
+            elif family.kind != kind or family.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered as a {family.kind} {family.labelnames}")
+        return family if labelnames else family.labels()
+
+    def counter(self, name, help, labelnames=()):
+        return self._register("counter", name, help, labelnames, Counter)
+
+    def gauge(self, name, help, labelnames=(), function=None):
+        """ A Gauge (a Family if 'labelnames'); 'function' makes an unlabelled gauge read it when scraped. """
+        gauge = self._register("gauge", name, help, labelnames, Gauge)
+        if function is not None:
+            gauge.function = function
+        return gauge
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register("histogram", name, help, labelnames, lambda: Histogram(buckets))
+
+    def get(self, name, *labels):
+        """ The child metric for 'name' and label values (KeyError if unknown). """
+        return self._families[name].labels(*labels)
+
+    def render(self):
+        """ Every metric in the Prometheus text exposition format. """
+        lines = []
+        with self._lock:
+            families = sorted(self._families.values(), key=lambda f: f.name)
+        for family in families:
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for suffix, labels, value in family.samples():
+                text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                lines.append(f"{family.name}{suffix}{{{text}}} {_format(value)}" if text
+                             else f"{family.name}{suffix} {_format(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+render = REGISTRY.render
+
+
+def serve(port, registry=REGISTRY, host="0.0.0.0"):
+    """ Serves 'registry' at http://host:port/metrics from a daemon thread; returns the server. """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+# --- Sampling Profiler ---
+
+def _os_threading():
+    """
+    The real threading and time modules. Under eventlet's monkey patching a
+    sampler green thread would only run when the code it samples yields, so
+    it would see nothing but idle waits.
+    """
+    if "eventlet" in sys.modules:
+        from eventlet.patcher import original
+        return original("threading"), original("time")
+    return threading, time
+
+
+class SamplingProfiler:
+    """
+    Counts where every thread is executing, 'interval' seconds apart.
+
+    Args:
+        interval: Seconds between samples (5 ms costs well under 1% of a core)
+        max_depth: Innermost frames kept per stack
+    """
+
+    def __init__(self, interval=0.005, max_depth=48):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = _Tally() # Folded stack -> samples
+        self.samples = 0
+        self.started_at = None
+        self._names = {} # Code object -> "file:function"
+        self._running = False
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        if self._running:
+            return self
+        threading_module, time_module = _os_threading()
+        self._sleep, self._get_ident = time_module.sleep, threading_module.get_ident
+        self._running = True
+        self.started_at = time.time()
+        self._thread = threading_module.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(1.0)
+            self._thread = None
+
+    def reset(self):
+        self.stacks = _Tally()
+        self.samples = 0
+
+    def _name(self, code):
+        name = self._names.get(code)
+        if name is None:
+            name = self._names[code] = f"{os.path.basename(code.co_filename)}:{code.co_name}"
+        return name
+
+    def _run(self):
+        own = self._get_ident()
+        while self._running:
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                names = []
+                while frame is not None and len(names) < self.max_depth:
+                    names.append(self._name(frame.f_code))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+            self._sleep(self.interval)
+
+    def folded(self, limit=None):
+        """ 'stack count' lines, most sampled first. """
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common(limit)) + "\n"
+
+    def to_dict(self, top=10):
+        return {"running": self._running, "samples": self.samples, "interval_ms": self.interval * 1000,
+                "started_at": self.started_at,
+                "top": [{"stack": stack.rsplit(";", 3)[-3:], "samples": count}
+                        for stack, count in self.stacks.most_common(top)]}
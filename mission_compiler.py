@@ -0,0 +1,257 @@
+# Mission compiler.
+#
+# Turns a leg description such as
+#
+#     [{"type": "takeoff", "altitude": 10},
+#      {"type": "forward", "distance": 30},
+#      {"type": "turn", "angle": 30, "direction": -1},
+#      {"type": "forward", "distance": 20, "altitude": 15},
+#      {"type": "waypoint", "lat": 17.3853, "lon": 78.4868, "altitude": 15}]
+#
+# into a MAV_CMD_NAV_WAYPOINT / MAV_CMD_CONDITION_YAW mission, uploads it to the
+# autopilot in one transfer through vehicle.commands and flies it in AUTO mode.
+# The autopilot then sequences the legs itself, so a slow or dropped ground
+# link no longer stalls the flight between legs.
+
+import math
+import time
+from collections import namedtuple
+import numpy as np
+from dronekit import Command, LocationGlobalRelative
+from pymavlink import mavutil
+from geodesy import get_distance_metres, offset_to_latlon, ned_offsets
+from mission_executor import MissionStep, TakeoffStep, ForwardLegStep, TurnStep, GotoStep, HeadingStep
+
+FRAME = mavutil.mavlink.MAV_FRAME_GLOBAL_RELATIVE_ALT
+NAV_COMMANDS = (mavutil.mavlink.MAV_CMD_NAV_TAKEOFF, mavutil.mavlink.MAV_CMD_NAV_WAYPOINT)
+
+# One compiled mission item; lat/lon/alt are 0 for non-NAV commands
+MissionItem = namedtuple('MissionItem', 'command lat lon alt param1 param2 param3 param4')
+
+
+class MissionCompileError(ValueError):
+    """ Raised when a leg description is invalid. """
+
+
+def _leg_value(leg, key, index, default=None):
+    value = leg.get(key, default)
+    if value is None:
+        raise MissionCompileError(f"Leg {index} ('{leg.get('type')}') is missing '{key}'")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise MissionCompileError(f"Leg {index} has a non-numeric '{key}': {value!r}")
+
+
+def compile_legs(legs, home, heading, groundspeed=None):
+    """
+    Converts relative legs into absolute mission items.
+
+    Args:
+        legs: List of leg dicts ('takeoff', 'forward', 'turn' or 'waypoint', see module comment)
+        home: LocationGlobalRelative the mission starts from
+        heading: Vehicle heading in degrees at the start of the mission
+        groundspeed: Optional cruise speed in m/s (adds a DO_CHANGE_SPEED item)
+
+    Returns:
+        List of MissionItem
+    """
+    # Walk the legs in a local north/east frame around home, then convert every
+    # NAV point to lat/lon in one batched call
+    waypoint_legs = [(index, leg) for index, leg in enumerate(legs) if leg.get("type") == "waypoint"]
+    if waypoint_legs:
+        norths, easts = ned_offsets(home.lat, home.lon,
+                                    [_leg_value(leg, "lat", index) for index, leg in waypoint_legs],
+                                    [_leg_value(leg, "lon", index) for index, leg in waypoint_legs])
+        waypoint_offsets = iter(zip(np.atleast_1d(norths).tolist(), np.atleast_1d(easts).tolist()))
+
+    entries = [] # (command, north, east, alt, param1, param2, param3, param4); None offsets for non-NAV
+    if groundspeed is not None:
+        entries.append((mavutil.mavlink.MAV_CMD_DO_CHANGE_SPEED, None, None, 0,
+                        1, float(groundspeed), -1, 0)) # ground speed, no throttle change
+
+    north, east, alt = 0.0, 0.0, home.alt
+    for index, leg in enumerate(legs):
+        leg_type = leg.get("type")
+        if leg_type == "takeoff":
+            alt = _leg_value(leg, "altitude", index)
+            entries.append((mavutil.mavlink.MAV_CMD_NAV_TAKEOFF, north, east, alt, 0, 0, 0, 0))
+        elif leg_type == "forward":
+            distance = _leg_value(leg, "distance", index)
+            alt = _leg_value(leg, "altitude", index, alt)
+            heading_rad = math.radians(heading)
+            north += math.cos(heading_rad) * distance
+            east += math.sin(heading_rad) * distance
+            entries.append((mavutil.mavlink.MAV_CMD_NAV_WAYPOINT, north, east, alt, 0, 0, 0, 0))
+        elif leg_type == "turn":
+            angle = _leg_value(leg, "angle", index)
+            direction = -1 if _leg_value(leg, "direction", index, 1) < 0 else 1
+            heading = (heading + direction * angle) % 360
+            entries.append((mavutil.mavlink.MAV_CMD_CONDITION_YAW, None, None, 0,
+                            heading, 0, direction, 0)) # absolute heading
+        elif leg_type == "waypoint":
+            target_north, target_east = next(waypoint_offsets)
+            alt = _leg_value(leg, "altitude", index, alt)
+            # Later 'forward' legs continue along the track to this waypoint
+            if target_north != north or target_east != east:
+                heading = math.degrees(math.atan2(target_east - east, target_north - north)) % 360
+            north, east = target_north, target_east
+            entries.append((mavutil.mavlink.MAV_CMD_NAV_WAYPOINT, north, east, alt, 0, 0, 0, 0))
+        else:
+            raise MissionCompileError(f"Leg {index} has unknown type {leg_type!r}")
+
+    nav = [entry for entry in entries if entry[1] is not None]
+    lats, lons = offset_to_latlon(home.lat, home.lon, [e[1] for e in nav], [e[2] for e in nav])
+    positions = iter(zip(np.atleast_1d(lats).tolist(), np.atleast_1d(lons).tolist()))
+    items = []
+    for command, d_north, d_east, alt, p1, p2, p3, p4 in entries:
+        lat, lon = next(positions) if d_north is not None else (0, 0)
+        items.append(MissionItem(command, lat, lon, alt, p1, p2, p3, p4))
+    return items
+
+
+def to_commands(items):
+    """ Wraps mission items in DroneKit Command objects ready for vehicle.commands. """
+    return [Command(0, 0, 0, FRAME, item.command, 0, 0,
+                    item.param1, item.param2, item.param3, item.param4,
+                    item.lat, item.lon, item.alt)
+            for item in items]
+
+
+def upload_mission(vehicle, commands, timeout=30):
+    """
+    Replaces the mission on the vehicle with 'commands' in one bulk transfer.
+
+    Returns:
+        Upload time in seconds
+    """
+    start_time = time.monotonic()
+    cmds = vehicle.commands
+    cmds.download()
+    cmds.wait_ready()
+    cmds.clear()
+    for cmd in commands:
+        cmds.add(cmd)
+    cmds.upload(timeout=timeout)
+    return time.monotonic() - start_time
+
+
+def legs_to_guided_steps(legs, groundspeed=None):
+    """ Builds the equivalent goto-by-goto executor steps for GUIDED mode. """
+    steps = []
+    altitude = None
+    for index, leg in enumerate(legs):
+        leg_type = leg.get("type")
+        if leg_type == "takeoff":
+            altitude = _leg_value(leg, "altitude", index)
+            steps.append(TakeoffStep(altitude))
+        elif leg_type == "forward":
+            if leg.get("altitude") is not None:
+                altitude = _leg_value(leg, "altitude", index)
+            steps.append(ForwardLegStep(_leg_value(leg, "distance", index), altitude=altitude,
+                                        groundspeed=groundspeed))
+        elif leg_type == "turn":
+            direction = -1 if _leg_value(leg, "direction", index, 1) < 0 else 1
+            steps.append(TurnStep(_leg_value(leg, "angle", index), direction=direction))
+        elif leg_type == "waypoint":
+            if leg.get("altitude") is not None:
+                altitude = _leg_value(leg, "altitude", index)
+            if altitude is None:
+                raise MissionCompileError(f"Leg {index} ('waypoint') is missing 'altitude'")
+            target = LocationGlobalRelative(_leg_value(leg, "lat", index), _leg_value(leg, "lon", index), altitude)
+            steps.append(GotoStep(target, groundspeed=groundspeed))
+        else:
+            raise MissionCompileError(f"Leg {index} has unknown type {leg_type!r}")
+    return steps
+
+
+def items_to_guided_steps(items, groundspeed=None):
+    """ Builds goto-by-goto executor steps that fly already compiled mission items. """
+    steps = []
+    for item in items:
+        if item.command == mavutil.mavlink.MAV_CMD_NAV_TAKEOFF:
+            steps.append(TakeoffStep(item.alt))
+        elif item.command == mavutil.mavlink.MAV_CMD_NAV_WAYPOINT:
+            steps.append(GotoStep(LocationGlobalRelative(item.lat, item.lon, item.alt), groundspeed=groundspeed))
+        elif item.command == mavutil.mavlink.MAV_CMD_CONDITION_YAW:
+            steps.append(HeadingStep(item.param1, direction=int(item.param3) or 1))
+    return steps
+
+
+class AutoMissionStep(MissionStep):
+    """
+    Compiles 'legs' from the vehicle's current position and heading (or takes
+    already compiled 'items'), uploads them and flies them in AUTO mode.
+    Progress comes from vehicle.commands.next; the step completes when the
+    autopilot reports the last NAV item reached.
+    """
+    timeout = 600.0
+    required_mode = "AUTO"
+
+    def __init__(self, legs=None, groundspeed=None, tolerance=2.0, items=None):
+        self.legs = legs
+        self.groundspeed = groundspeed
+        self.tolerance = tolerance
+        self.items = list(items or [])
+        self.upload_time = None
+        self._last_nav_seq = 0
+        self._last_nav_target = None
+        self._reached_seq = 0
+
+    def _on_item_reached(self, vehicle, name, message):
+        self._reached_seq = max(self._reached_seq, message.seq)
+
+    def start(self, vehicle):
+        if self.legs is not None:
+            self.items = compile_legs(self.legs, vehicle.location.global_relative_frame,
+                                      vehicle.heading, self.groundspeed)
+        # Mission sequence numbers start at 1; item 0 is the home location
+        for seq, item in enumerate(self.items, start=1):
+            if item.command in NAV_COMMANDS:
+                self._last_nav_seq = seq
+                self._last_nav_target = LocationGlobalRelative(item.lat, item.lon, item.alt)
+        self.upload_time = upload_mission(vehicle, to_commands(self.items))
+        print(f"Uploaded {len(self.items)} mission items in {self.upload_time * 1000:.0f} ms")
+
+        vehicle.add_message_listener('MISSION_ITEM_REACHED', self._on_item_reached)
+        vehicle.commands.next = 1
+        self._set_auto(vehicle)
+
+    def _set_auto(self, vehicle):
+        self.set_mode(vehicle, "AUTO")
+        # Copter only starts an AUTO mission from the ground on MISSION_START
+        if self.commands is not None:
+            self.track(self.commands.send(mavutil.mavlink.MAV_CMD_MISSION_START))
+            return
+        msg = vehicle.message_factory.command_long_encode(
+            0, 0, mavutil.mavlink.MAV_CMD_MISSION_START, 0,
+            0, 0, 0, 0, 0, 0, 0)
+        vehicle.send_mavlink(msg)
+
+    def hold(self, vehicle):
+        self.set_mode(vehicle, "LOITER")
+
+    def resume(self, vehicle):
+        # AUTO picks up again from vehicle.commands.next
+        self.set_mode(vehicle, "AUTO")
+
+    def finish(self, vehicle):
+        try: vehicle.remove_message_listener('MISSION_ITEM_REACHED', self._on_item_reached)
+        except Exception: pass
+
+    def done(self, vehicle):
+        if self._reached_seq >= self._last_nav_seq:
+            return True
+        # MISSION_ITEM_REACHED can be lost on a lossy link; fall back to position
+        return vehicle.commands.next >= self._last_nav_seq and self._last_nav_target is not None and \
+            get_distance_metres(vehicle.location.global_relative_frame, self._last_nav_target) <= self.tolerance and \
+            abs(vehicle.location.global_relative_frame.alt - self._last_nav_target.alt) <= 1.0
+
+    def progress(self, vehicle):
+        return {"waypoint": vehicle.commands.next, "waypoint_count": len(self.items),
+                "upload_ms": round(self.upload_time * 1000, 1) if self.upload_time else None}
+
+    def describe(self):
+        if self.legs is not None:
+            return f"Fly {len(self.legs)} legs in AUTO"
+        return f"Fly {len(self.items)} mission items in AUTO"
@@ -0,0 +1,469 @@
+# Non-blocking mission executor.
+#
+# A mission is a list of steps run as a state machine on a background thread
+# (a green thread once eventlet has monkey patched 'threading'). Each step
+# issues its command once and then advances when a DroneKit attribute update
+# shows its condition is met (altitude reached, distance under tolerance,
+# heading within tolerance) instead of sleeping for a fixed time.
+
+import itertools
+import math
+import threading
+import time
+from dronekit import VehicleMode, LocationGlobalRelative
+from pymavlink import mavutil
+from geodesy import get_location_metres, get_distance_metres, heading_difference
+from metrics import counter, histogram
+
+# --- Mission States ---
+PENDING = "pending"
+RUNNING = "running"
+PAUSED = "paused"
+COMPLETED = "completed"
+ABORTED = "aborted"
+FAILED = "failed"
+FINISHED_STATES = (COMPLETED, ABORTED, FAILED)
+
+# Attributes whose updates can complete a step
+WATCHED_ATTRIBUTES = ("location.global_relative_frame", "heading", "mode", "armed")
+WATCHED_MESSAGES = ("MISSION_CURRENT", "MISSION_ITEM_REACHED")
+
+# --- Metrics ---
+step_seconds = histogram("mission_step_seconds", "Start to completion of each completed mission step", ("step",))
+mission_results = counter("missions_total", "Finished missions by final state", ("state",))
+
+
+class MissionError(Exception):
+    """ Raised for invalid mission requests (unknown ID, wrong state, ...). """
+
+
+# --- Mission Steps ---
+
+class MissionStep:
+    """
+    One stage of a mission. 'start' sends the command, 'done' is evaluated on
+    every relevant telemetry update, 'hold' and 'resume' stop and re-send the
+    command around a pause, and 'finish' cleans up when the step ends.
+    """
+    timeout = 120.0 # Seconds before the step is considered failed
+    required_mode = "GUIDED" # Leaving this mode mid-step aborts the mission
+    commands = None # The vehicle's commands.CommandSender, set by MissionExecutor before start()
+    sent = () # Futures of the commands sent for this step; a failed one fails the step
+
+    def start(self, vehicle):
+        pass
+
+    def track(self, future):
+        """ Watches a command sent for this step: a rejection or timeout fails the mission. """
+        self.sent += (future,) # A new tuple on the instance; the class default stays empty
+        future.add_done_callback(lambda f: self.wake())
+
+    def wake(self):
+        """ Called when a command sent for this step is answered (MissionExecutor re-evaluates the step). """
+        pass
+
+    def set_mode(self, vehicle, name):
+        """ Switches flight mode through 'commands' (acknowledged, retried), or assigns vehicle.mode without one. """
+        if self.commands is None:
+            vehicle.mode = VehicleMode(name)
+        else:
+            self.track(self.commands.set_mode(name))
+
+    def confirmed(self):
+        """ True once a command has been sent for this step and every one has been acknowledged. """
+        return bool(self.sent) and all(f.done() and f.exception() is None for f in self.sent)
+
+    def hold(self, vehicle):
+        vehicle.simple_goto(vehicle.location.global_relative_frame)
+
+    def resume(self, vehicle):
+        self.start(vehicle)
+
+    def finish(self, vehicle):
+        pass
+
+    def done(self, vehicle):
+        return True
+
+    def progress(self, vehicle):
+        """ Returns a small dict describing how far along the step is. """
+        return {}
+
+    def describe(self):
+        return self.__class__.__name__
+
+
+class SetModeStep(MissionStep):
+    """ Switches flight mode and waits for the vehicle to report it. """
+    timeout = 10.0
+    required_mode = None
+
+    def __init__(self, mode):
+        self.mode = mode
+
+    def start(self, vehicle):
+        if vehicle.mode.name != self.mode:
+            self.set_mode(vehicle, self.mode)
+
+    def done(self, vehicle):
+        # The acknowledgement usually arrives before the HEARTBEAT that updates vehicle.mode
+        return vehicle.mode.name == self.mode or self.confirmed()
+
+    def describe(self):
+        return f"Set mode {self.mode}"
+
+
+class TakeoffStep(MissionStep):
+    """ Takes off and waits until 95% of the target altitude is reached. """
+    timeout = 60.0
+
+    def __init__(self, altitude, threshold=0.95):
+        self.altitude = altitude
+        self.threshold = threshold
+
+    def start(self, vehicle):
+        vehicle.simple_takeoff(self.altitude)
+
+    def resume(self, vehicle):
+        # simple_takeoff is ignored once airborne; climb with a goto instead
+        loc = vehicle.location.global_relative_frame
+        vehicle.simple_goto(LocationGlobalRelative(loc.lat, loc.lon, self.altitude))
+
+    def done(self, vehicle):
+        return vehicle.location.global_relative_frame.alt >= self.altitude * self.threshold
+
+    def progress(self, vehicle):
+        return {"altitude": vehicle.location.global_relative_frame.alt, "target_altitude": self.altitude}
+
+    def describe(self):
+        return f"Take off to {self.altitude}m"
+
+
+class GotoStep(MissionStep):
+    """
+    Flies to a fixed target and waits until within 'tolerance' metres
+    horizontally (and 'alt_tolerance' metres vertically).
+    """
+
+    def __init__(self, target, groundspeed=None, tolerance=2.0, alt_tolerance=1.0):
+        self.target = target
+        self.groundspeed = groundspeed
+        self.tolerance = tolerance
+        self.alt_tolerance = alt_tolerance
+
+    def start(self, vehicle):
+        vehicle.simple_goto(self.target, groundspeed=self.groundspeed)
+
+    def done(self, vehicle):
+        loc = vehicle.location.global_relative_frame
+        return get_distance_metres(loc, self.target) <= self.tolerance and \
+            abs(loc.alt - self.target.alt) <= self.alt_tolerance
+
+    def progress(self, vehicle):
+        loc = vehicle.location.global_relative_frame
+        return {"distance": get_distance_metres(loc, self.target), "altitude": loc.alt}
+
+    def describe(self):
+        return f"Go to {self.target.lat:.6f}, {self.target.lon:.6f} at {self.target.alt}m"
+
+
+class ForwardLegStep(GotoStep):
+    """
+    Flies 'distance' metres along the current heading. The target is fixed when
+    the step starts, so resuming after a pause continues to the same point.
+    """
+
+    def __init__(self, distance, altitude=None, groundspeed=None, tolerance=2.0, alt_tolerance=1.0):
+        super().__init__(None, groundspeed, tolerance, alt_tolerance)
+        self.distance = distance
+        self.altitude = altitude
+
+    def start(self, vehicle):
+        start_location = vehicle.location.global_relative_frame
+        heading_rad = math.radians(vehicle.heading)
+        target = get_location_metres(start_location, math.cos(heading_rad) * self.distance,
+                                     math.sin(heading_rad) * self.distance)
+        alt = self.altitude if self.altitude is not None else start_location.alt
+        self.target = LocationGlobalRelative(target.lat, target.lon, alt)
+        super().start(vehicle)
+
+    def resume(self, vehicle):
+        GotoStep.start(self, vehicle)
+
+    def describe(self):
+        alt = f" to {self.altitude}m" if self.altitude is not None else ""
+        return f"Fly forward {self.distance}m{alt}"
+
+
+class TurnStep(MissionStep):
+    """ Yaws by a relative angle and waits until the heading is within tolerance. """
+    timeout = 30.0
+
+    def __init__(self, angle_deg, direction=1, tolerance_deg=5.0):
+        self.angle_deg = angle_deg
+        self.direction = direction # -1: counter-clockwise (left), 1: clockwise (right)
+        self.tolerance_deg = tolerance_deg
+        self.target_heading = None
+
+    def _send_yaw(self, vehicle, heading):
+        msg = vehicle.message_factory.command_long_encode(
+            0, 0,       # target system, target component
+            mavutil.mavlink.MAV_CMD_CONDITION_YAW, #command
+            0,          #confirmation
+            heading,    # param 1: target heading in degrees (absolute)
+            0,          # param 2: yaw speed (ignored by ArduPilot, use 0)
+            self.direction, # param 3: direction (-1: ccw, 1: cw)
+            0,          # param 4: 0 for absolute heading
+            0, 0, 0)    # param 5 ~ 7 not used
+        vehicle.send_mavlink(msg)
+
+    def start(self, vehicle):
+        self.target_heading = (vehicle.heading + self.direction * self.angle_deg) % 360
+        self._send_yaw(vehicle, self.target_heading)
+
+    def resume(self, vehicle):
+        self._send_yaw(vehicle, self.target_heading)
+
+    def done(self, vehicle):
+        return abs(heading_difference(vehicle.heading, self.target_heading)) <= self.tolerance_deg
+
+    def progress(self, vehicle):
+        return {"heading": vehicle.heading, "target_heading": self.target_heading}
+
+    def describe(self):
+        return f"Turn {'left' if self.direction < 0 else 'right'} {self.angle_deg} degrees"
+
+
+class HeadingStep(TurnStep):
+    """ Yaws to an absolute heading and waits until it is within tolerance. """
+
+    def __init__(self, heading, direction=1, tolerance_deg=5.0):
+        super().__init__(0, direction, tolerance_deg)
+        self.target_heading = heading % 360
+
+    def start(self, vehicle):
+        self._send_yaw(vehicle, self.target_heading)
+
+    def describe(self):
+        return f"Turn to heading {self.target_heading:.0f} degrees"
+
+
+# --- Missions ---
+
+class Mission:
+    """ State of one mission run; 'to_dict' is what clients see. """
+
+    def __init__(self, mission_id, steps, name=""):
+        self.id = mission_id
+        self.name = name
+        self.steps = steps
+        self.state = PENDING
+        self.step_index = 0
+        self.message = ""
+        self.progress = {}
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def to_dict(self):
+        step = self.steps[self.step_index] if self.step_index < len(self.steps) else None
+        return {
+            "mission_id": self.id, "name": self.name, "state": self.state,
+            "step": self.step_index, "step_count": len(self.steps),
+            "step_description": step.describe() if step else None,
+            "progress": self.progress, "message": self.message,
+            "created_at": self.created_at, "finished_at": self.finished_at,
+        }
+
+
+class MissionExecutor:
+    """
+    Runs one mission at a time on a background thread and reports progress.
+
+    Args:
+        get_vehicle: Callable returning the current DroneKit vehicle (or None)
+        emit: Callable receiving the mission dict whenever its progress changes
+        progress_interval: Minimum seconds between in-step progress reports
+        get_commands: Optional callable returning the vehicle's commands.CommandSender,
+            through which steps send their mode changes
+    """
+
+    def __init__(self, get_vehicle, emit, progress_interval=0.5, get_commands=None):
+        self._get_vehicle = get_vehicle
+        self._get_commands = get_commands
+        self._emit = emit
+        self._progress_interval = progress_interval
+        self._missions = {}
+        self._active = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._changed = threading.Event()
+        self._control = None # Pending 'pause' / 'resume' / 'abort' request
+
+    def get(self, mission_id):
+        mission = self._missions.get(mission_id)
+        if mission is None:
+            raise MissionError(f"Unknown mission {mission_id}")
+        return mission
+
+    def active(self):
+        return self._active
+
+    def start(self, steps, name=""):
+        """ Starts a mission in the background and returns it immediately. """
+        with self._lock:
+            if self._active is not None:
+                raise MissionError(f"Mission {self._active.id} is already {self._active.state}")
+            mission = Mission(next(self._ids), steps, name)
+            self._missions[mission.id] = mission
+            self._active = mission
+            self._control = None
+        thread = threading.Thread(target=self._run, args=(mission,),
+                                  name=f'MissionThread-{mission.id}', daemon=True)
+        thread.start()
+        return mission
+
+    def pause(self, mission_id):
+        self._request(mission_id, "pause", (RUNNING,))
+
+    def resume(self, mission_id):
+        self._request(mission_id, "resume", (PAUSED,))
+
+    def abort(self, mission_id):
+        self._request(mission_id, "abort", (PENDING, RUNNING, PAUSED))
+
+    def _request(self, mission_id, action, allowed_states):
+        mission = self.get(mission_id)
+        with self._lock:
+            if mission.state not in allowed_states:
+                raise MissionError(f"Cannot {action} mission {mission_id} while {mission.state}")
+            self._control = action
+        self._changed.set()
+
+    def _on_attribute(self, vehicle, attr_name, value):
+        self._changed.set()
+
+    def _on_message(self, vehicle, name, message):
+        self._changed.set()
+
+    def _report(self, mission):
+        try:
+            self._emit(mission.to_dict())
+        except Exception as e:
+            print(f"Error emitting mission progress: {e}")
+
+    def _finish(self, mission, state, message):
+        mission.state = state
+        mission.message = message
+        mission.finished_at = time.time()
+        mission_results.labels(state).inc()
+        with self._lock:
+            if self._active is mission:
+                self._active = None
+        print(f"Mission {mission.id} {state}: {message}")
+        self._report(mission)
+
+    def _run(self, mission):
+        vehicle = self._get_vehicle()
+        if vehicle is None:
+            self._finish(mission, FAILED, "Vehicle not connected")
+            return
+        for attr_name in WATCHED_ATTRIBUTES:
+            vehicle.add_attribute_listener(attr_name, self._on_attribute)
+        for msg_name in WATCHED_MESSAGES:
+            vehicle.add_message_listener(msg_name, self._on_message)
+        try:
+            self._execute(mission, vehicle)
+        except Exception as e:
+            self._finish(mission, FAILED, f"Mission failed: {e}")
+        finally:
+            for attr_name in WATCHED_ATTRIBUTES:
+                try: vehicle.remove_attribute_listener(attr_name, self._on_attribute)
+                except Exception: pass
+            for msg_name in WATCHED_MESSAGES:
+                try: vehicle.remove_message_listener(msg_name, self._on_message)
+                except Exception: pass
+
+    def _execute(self, mission, vehicle):
+        mission.state = RUNNING
+        for index, step in enumerate(mission.steps):
+            mission.step_index = index
+            mission.progress = {}
+            with self._lock:
+                aborted = self._control == "abort"
+                if aborted:
+                    self._control = None
+            if aborted: # Requested before this step sent anything (e.g. while the mission was pending)
+                self._finish(mission, ABORTED, "Aborted by user")
+                return
+            print(f"Mission {mission.id} step {index + 1}/{len(mission.steps)}: {step.describe()}")
+            step.commands = self._get_commands() if self._get_commands is not None else None
+            step.sent = ()
+            step.wake = self._changed.set
+            try:
+                started = time.monotonic()
+                step.start(vehicle)
+                self._report(mission)
+                if not self._run_step(mission, step, vehicle):
+                    return
+                step_seconds.labels(step.__class__.__name__).observe(time.monotonic() - started)
+            finally:
+                step.finish(vehicle)
+
+        mission.step_index = len(mission.steps)
+        mission.progress = {}
+        self._finish(mission, COMPLETED, "Mission completed successfully")
+
+    def _run_step(self, mission, step, vehicle):
+        """ Waits for 'step' to complete. Returns False if the mission ended early. """
+        deadline = time.monotonic() + step.timeout
+        last_report = 0.0
+        mode_seen = False
+
+        while True:
+            self._changed.wait(0.5) # Re-evaluated on every telemetry update
+            self._changed.clear()
+
+            with self._lock:
+                action, self._control = self._control, None
+            if action == "abort":
+                step.hold(vehicle)
+                self._finish(mission, ABORTED, "Aborted by user; holding position")
+                return False
+            if action == "pause":
+                step.hold(vehicle)
+                mission.state = PAUSED
+                paused_at = time.monotonic()
+                self._report(mission)
+                continue
+            if action == "resume":
+                deadline += time.monotonic() - paused_at
+                mission.state = RUNNING
+                mode_seen = False # 'hold' may have switched mode
+                step.resume(vehicle)
+                self._report(mission)
+            if mission.state == PAUSED:
+                continue
+
+            # A rejected or unacknowledged command fails the step at once
+            failed = next((f for f in step.sent if f.done() and f.exception() is not None), None)
+            if failed is not None:
+                step.hold(vehicle)
+                raise MissionError(f"Step '{step.describe()}': {failed.exception()}")
+            # Only enforced once the step has seen its mode, so mode switches
+            # issued by the step itself have time to take effect
+            if vehicle.mode.name == step.required_mode:
+                mode_seen = True
+            elif step.required_mode and mode_seen:
+                self._finish(mission, ABORTED, f"Mode changed to {vehicle.mode.name}")
+                return False
+            if step.done(vehicle):
+                return True
+            if time.monotonic() > deadline:
+                step.hold(vehicle) # Not left flying to its target / climbing once the mission has failed
+                raise MissionError(f"Step '{step.describe()}' timed out after {step.timeout:.0f}s")
+
+            now = time.monotonic()
+            if now - last_report >= self._progress_interval:
+                mission.progress = step.progress(vehicle)
+                self._report(mission)
+                last_report = now
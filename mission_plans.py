@@ -0,0 +1,171 @@
+# Declarative mission plans.
+#
+# A plan is a JSON or YAML document:
+#
+#     name: orchard-row-3
+#     groundspeed: 5          # m/s, optional
+#     execution: auto         # 'auto' (upload, fly in AUTO) or 'guided'
+#     legs:
+#       - {type: takeoff, altitude: 10}
+#       - {type: forward, distance: 30}
+#       - {type: turn, angle: 30, direction: -1}
+#       - {type: waypoint, lat: 17.3853, lon: 78.4868, altitude: 15}
+#
+# Plans are validated and compiled once into absolute waypoint arrays. The
+# result is cached under a hash of the plan plus its home position, so
+# re-flying the same row from the same pad skips validation and geometry.
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from mission_compiler import MissionCompileError, compile_legs, NAV_COMMANDS
+
+# --- Requires Installation for YAML plans: pip install pyyaml ---
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+LEG_FIELDS = {
+    "takeoff": {"altitude": True},
+    "forward": {"distance": True, "altitude": False},
+    "turn": {"angle": True, "direction": False},
+    "waypoint": {"lat": True, "lon": True, "altitude": False},
+}
+MAX_ALTITUDE = 120.0 # m above home
+MAX_GROUNDSPEED = 20.0 # m/s
+EXECUTION_MODES = ("auto", "guided")
+
+# Home positions within ~1 m / 1 degree of heading share a cache entry
+HOME_DECIMALS = 5
+HEADING_DECIMALS = 0
+
+
+def parse_plan(text, content_type=""):
+    """ Parses a plan document; YAML if the content type says so, JSON otherwise. """
+    if "yaml" in (content_type or ""):
+        if yaml is None:
+            raise MissionCompileError("YAML plans need PyYAML (pip install pyyaml)")
+        try:
+            return yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise MissionCompileError(f"Invalid YAML plan: {e}")
+    try:
+        return json.loads(text)
+    except ValueError as e:
+        raise MissionCompileError(f"Invalid JSON plan: {e}")
+
+
+def validate_plan(plan):
+    """ Checks plan structure and ranges; raises MissionCompileError on the first problem. """
+    if not isinstance(plan, dict):
+        raise MissionCompileError("Plan must be an object")
+    legs = plan.get("legs")
+    if not isinstance(legs, list) or not legs:
+        raise MissionCompileError("Plan needs a non-empty 'legs' list")
+    if plan.get("execution", "auto") not in EXECUTION_MODES:
+        raise MissionCompileError(f"'execution' must be one of {', '.join(EXECUTION_MODES)}")
+    groundspeed = plan.get("groundspeed")
+    if groundspeed is not None and (not isinstance(groundspeed, (int, float)) or
+                                    not 0 < groundspeed <= MAX_GROUNDSPEED):
+        raise MissionCompileError(f"'groundspeed' must be between 0 and {MAX_GROUNDSPEED} m/s")
+
+    for index, leg in enumerate(legs):
+        if not isinstance(leg, dict):
+            raise MissionCompileError(f"Leg {index} must be an object")
+        fields = LEG_FIELDS.get(leg.get("type"))
+        if fields is None:
+            raise MissionCompileError(f"Leg {index} has unknown type {leg.get('type')!r}")
+        for key, required in fields.items():
+            value = leg.get(key)
+            if value is None:
+                if required:
+                    raise MissionCompileError(f"Leg {index} ('{leg['type']}') is missing '{key}'")
+                continue
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise MissionCompileError(f"Leg {index} has a non-numeric '{key}': {value!r}")
+        if leg.get("altitude") is not None and not 0 <= leg["altitude"] <= MAX_ALTITUDE:
+            raise MissionCompileError(f"Leg {index} altitude must be between 0 and {MAX_ALTITUDE} m")
+        if leg["type"] == "forward" and leg["distance"] < 0:
+            raise MissionCompileError(f"Leg {index} distance must not be negative")
+        if leg["type"] == "waypoint" and not (-90 <= leg["lat"] <= 90 and -180 <= leg["lon"] <= 180):
+            raise MissionCompileError(f"Leg {index} has an invalid lat/lon")
+
+
+def plan_hash(plan, home, heading):
+    """ Hash of the canonical plan JSON plus the (rounded) home position and heading. """
+    key = {
+        "plan": plan,
+        "home": [round(home.lat, HOME_DECIMALS), round(home.lon, HOME_DECIMALS), round(home.alt, 1)],
+        "heading": round(heading, HEADING_DECIMALS),
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True, separators=(',', ':'), default=str).encode()).hexdigest()
+
+
+class CompiledPlan:
+    """ A plan compiled against one home position: mission items plus waypoint arrays. """
+
+    def __init__(self, plan, plan_hash, items, compile_time):
+        self.name = plan.get("name", "")
+        self.hash = plan_hash
+        self.execution = plan.get("execution", "auto")
+        self.groundspeed = plan.get("groundspeed")
+        self.items = items
+        self.compile_time = compile_time
+        nav = [item for item in items if item.command in NAV_COMMANDS]
+        self.lats = tuple(item.lat for item in nav)
+        self.lons = tuple(item.lon for item in nav)
+        self.alts = tuple(item.alt for item in nav)
+
+    def to_dict(self, include_waypoints=False):
+        data = {"name": self.name, "plan_hash": self.hash, "execution": self.execution,
+                "item_count": len(self.items), "waypoint_count": len(self.lats),
+                "compile_ms": round(self.compile_time * 1000, 3)}
+        if include_waypoints:
+            data["waypoints"] = [list(point) for point in zip(self.lats, self.lons, self.alts)]
+        return data
+
+
+class PlanCompiler:
+    """
+    Validates and compiles plans, keeping the last 'max_entries' results in an
+    LRU cache keyed by plan_hash.
+    """
+
+    def __init__(self, max_entries=128):
+        self._cache = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, plan, home, heading):
+        """
+        Returns (CompiledPlan, cached) for 'plan' flown from 'home' (a
+        LocationGlobalRelative) starting at 'heading' degrees.
+        """
+        key = plan_hash(plan, home, heading)
+        with self._lock:
+            compiled = self._cache.get(key)
+            if compiled is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return compiled, True
+
+        start_time = time.perf_counter()
+        validate_plan(plan)
+        items = compile_legs(plan["legs"], home, heading, plan.get("groundspeed"))
+        compiled = CompiledPlan(plan, key, items, time.perf_counter() - start_time)
+
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = compiled
+            while len(self._cache) > self._max_entries:
+                self._cache.popitem(last=False)
+        return compiled, False
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
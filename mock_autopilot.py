@@ -0,0 +1,536 @@
+# Offline stand-in autopilot for testing app.py / main.py without SITL.
+#
+# Speaks enough ArduCopter MAVLink (via pymavlink) for DroneKit to connect with
+# wait_ready=True: heartbeats, parameters, arming, mode changes, takeoff,
+# guided gotos, velocity setpoints, CONDITION_YAW and the mission upload /
+# download protocol. The vehicle itself is simple kinematics: it flies straight
+# at the configured speed, climbs and descends at fixed rates and yaws at a
+# fixed rate. Good enough for reproducible timings, not for flight dynamics.
+# Test hooks (command_log, mark_attitude, reset) let benchmarks/e2e_latency.py
+# time commands and telemetry end to end.
+#
+# Usage: python mock_autopilot.py [--port 5762] [--lat 17.385] [--lon 78.4867]
+
+import argparse
+import math
+import threading
+import time
+from collections import deque
+from pymavlink import mavutil
+
+mavlink = mavutil.mavlink
+
+# ArduCopter custom mode numbers
+MODES = {"STABILIZE": 0, "ALT_HOLD": 2, "AUTO": 3, "GUIDED": 4, "LOITER": 5,
+         "RTL": 6, "LAND": 9, "BRAKE": 17}
+MODE_NAMES = {number: name for name, number in MODES.items()}
+ARMABLE_MODES = ("STABILIZE", "ALT_HOLD", "GUIDED", "LOITER")
+
+# EKF flags DroneKit checks for is_armable (everything healthy, not in const-pos mode)
+EKF_FLAGS = 1 | 2 | 4 | 8 | 16 | 32 | 64 | 256 | 512
+
+DEFAULT_PARAMS = {
+    "SYSID_THISMAV": 1, "WPNAV_SPEED": 500, "WPNAV_SPEED_UP": 250, "WPNAV_SPEED_DN": 150,
+    "WPNAV_RADIUS": 200, "RTL_ALT": 1500, "LAND_SPEED": 50, "ANGLE_MAX": 3000,
+    "ARMING_CHECK": 1, "FS_THR_ENABLE": 1, "BATT_CAPACITY": 5000, "WP_YAW_BEHAVIOR": 1,
+}
+
+EARTH_RADIUS = 6378137.0
+
+
+def _offset(lat, lon, d_north, d_east):
+    return (lat + math.degrees(d_north / EARTH_RADIUS),
+            lon + math.degrees(d_east / (EARTH_RADIUS * math.cos(math.radians(lat)))))
+
+
+def _ned_delta(lat1, lon1, lat2, lon2):
+    d_north = math.radians(lat2 - lat1) * EARTH_RADIUS
+    d_east = math.radians(lon2 - lon1) * EARTH_RADIUS * math.cos(math.radians(lat1))
+    return d_north, d_east
+
+
+class MockAutopilot:
+    """
+    Simulated ArduCopter listening for one MAVLink client on TCP.
+
+    Args:
+        port: TCP port to listen on (DroneKit connects to 'tcp:127.0.0.1:<port>')
+        lat, lon: Home position
+        sysid: MAVLink system ID
+        rate_hz: Attitude / position stream rate
+        speedup: Simulation time multiplier (1.0 is real time)
+        param_rate: PARAM_VALUEs per second when sending the parameter list, like a
+            telemetry radio (None sends them all at once)
+    """
+
+    def __init__(self, port=5762, lat=17.385, lon=78.4867, sysid=1, rate_hz=10.0, speedup=1.0,
+                 host='127.0.0.1', param_rate=None):
+        self.port = port
+        self.host = host
+        self.sysid = sysid
+        self.rate_hz = rate_hz
+        self.speedup = speedup
+        self.param_rate = param_rate
+        self._param_queue = deque() # Parameter indices still to send
+        self._param_budget = 0.0
+        self.muted = False # See mute()
+        self.params = dict(DEFAULT_PARAMS, SYSID_THISMAV=sysid)
+        self.home = (lat, lon)
+        self.lat, self.lon, self.alt = lat, lon, 0.0
+        self.heading = 0.0
+        self.roll = 0.0 # Radians; only changed by mark_attitude()
+        self.vn = self.ve = self.vd = 0.0
+        self.mode = "STABILIZE"
+        self.armed = False
+        self.speed = self.params["WPNAV_SPEED"] / 100.0
+        self.target = None          # (lat, lon, alt) position target
+        self.velocity_cmd = None    # (vn, ve, vd, yaw_rate or None, expires_at)
+        self.yaw_target = None      # Absolute heading from CONDITION_YAW
+        self.mission = []           # Uploaded items; index 0 is home
+        self.mission_current = 0
+        self.mission_running = False
+        self.battery_voltage = 12.6
+        self._upload_count = None
+        # (monotonic time, 'ARM' / 'DISARM' / 'MODE RTL' / 'TAKEOFF' / 'GOTO' ...) as commands arrive
+        self.command_log = deque(maxlen=10000)
+        self._marker = None
+        self.markers_sent = {} # mark_attitude roll -> monotonic time its ATTITUDE message was sent
+        self._send_now = False
+        self._started = time.monotonic()
+        self._running = False
+        self._thread = None
+        self._lock = threading.Lock()
+        self.conn = None
+
+    # --- Lifecycle ---
+
+    def start(self):
+        """ Starts listening and simulating on a background thread. """
+        self.conn = mavutil.mavlink_connection(f'tcpin:{self.host}:{self.port}',
+                                               source_system=self.sysid, source_component=1)
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name=f'MockAutopilot-{self.port}', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=2.0)
+        if self.conn:
+            self.conn.close()
+
+    def _loop(self):
+        tick = 0.02
+        last = time.monotonic()
+        next_fast = next_slow = next_hud = last
+        while self._running:
+            if self.muted:
+                time.sleep(tick)
+                continue
+            self._receive()
+            now = time.monotonic()
+            with self._lock:
+                self._step((now - last) * self.speedup)
+                send_now, self._send_now = self._send_now, False
+            last = now
+            if now >= next_fast or send_now:
+                self._send_fast()
+                next_fast = now + 1.0 / self.rate_hz
+            if now >= next_hud:
+                self._send_hud()
+                next_hud = now + 0.25
+            if now >= next_slow or send_now:
+                self._send_slow()
+                next_slow = now + 1.0
+            if self._param_queue:
+                self._send_params(tick)
+            time.sleep(tick)
+
+    # --- Test Hooks (benchmarks/e2e_latency.py) ---
+
+    def mark_attitude(self, roll):
+        """ Sends an ATTITUDE with this roll (radians) on the next tick and notes when in markers_sent. """
+        with self._lock:
+            self.roll = self._marker = roll
+            self._send_now = True
+
+    def mute(self, muted=True):
+        """ Stops sending and receiving anything, like a radio dropout, until mute(False). """
+        self.muted = muted
+
+    def reset(self):
+        """ Puts the vehicle back on the ground at home, disarmed in STABILIZE, for repeated runs. """
+        with self._lock:
+            self.lat, self.lon = self.home
+            self.alt = self.heading = self.roll = 0.0
+            self.vn = self.ve = self.vd = 0.0
+            self.target = self.velocity_cmd = self.yaw_target = None
+            self.mission_running = False
+            self.mission_current = 0
+            self.armed = False
+            self.mode = "STABILIZE"
+            self._send_now = True
+
+    def _log_command(self, name):
+        self.command_log.append((time.monotonic(), name))
+
+    def _time_boot_ms(self):
+        return int((time.monotonic() - self._started) * 1000) & 0xFFFFFFFF
+
+    # --- Outgoing Telemetry ---
+
+    def _send_fast(self):
+        mav = self.conn.mav
+        pitch = -math.atan2(math.hypot(self.vn, self.ve), 30.0)
+        mav.attitude_send(self._time_boot_ms(), self.roll, pitch, math.radians(self._wrapped_heading()),
+                          0.0, 0.0, 0.0)
+        if self._marker is not None:
+            self.markers_sent[self._marker] = time.monotonic()
+            self._marker = None
+        mav.global_position_int_send(self._time_boot_ms(), int(self.lat * 1e7), int(self.lon * 1e7),
+                                     int((self.alt + 500.0) * 1000), int(self.alt * 1000),
+                                     int(self.vn * 100), int(self.ve * 100), int(self.vd * 100),
+                                     int(self.heading * 100) % 36000)
+
+    def _send_hud(self):
+        groundspeed = math.hypot(self.vn, self.ve)
+        self.conn.mav.vfr_hud_send(groundspeed, groundspeed, int(round(self.heading)) % 360,
+                                   50 if self.armed else 0, self.alt + 500.0, -self.vd)
+
+    def _send_slow(self):
+        mav = self.conn.mav
+        self.send_heartbeat()
+        mav.sys_status_send(0, 0, 0, 100, int(self.battery_voltage * 1000), 1000 if self.armed else 50,
+                            max(0, min(100, int((self.battery_voltage - 10.5) / 2.1 * 100))),
+                            0, 0, 0, 0, 0, 0)
+        mav.gps_raw_int_send(int(time.time() * 1e6), 3, int(self.lat * 1e7), int(self.lon * 1e7),
+                             int((self.alt + 500.0) * 1000), 80, 120, int(math.hypot(self.vn, self.ve) * 100),
+                             int(self.heading * 100) % 36000, 12)
+        mav.ekf_status_report_send(EKF_FLAGS, 0.1, 0.1, 0.1, 0.1, 0.0)
+        mav.mission_current_send(self.mission_current)
+
+    def send_heartbeat(self):
+        base_mode = mavlink.MAV_MODE_FLAG_CUSTOM_MODE_ENABLED
+        if self.armed:
+            base_mode |= mavlink.MAV_MODE_FLAG_SAFETY_ARMED
+        state = mavlink.MAV_STATE_ACTIVE if self.armed else mavlink.MAV_STATE_STANDBY
+        self.conn.mav.heartbeat_send(mavlink.MAV_TYPE_QUADROTOR, mavlink.MAV_AUTOPILOT_ARDUPILOTMEGA,
+                                     base_mode, MODES[self.mode], state)
+
+    def _wrapped_heading(self):
+        return self.heading if self.heading <= 180 else self.heading - 360
+
+    # --- Incoming Messages ---
+
+    def _receive(self):
+        while True:
+            try:
+                msg = self.conn.recv_match(blocking=False)
+            except Exception:
+                return
+            if msg is None:
+                return
+            handler = getattr(self, '_handle_' + msg.get_type(), None)
+            if handler:
+                with self._lock:
+                    handler(msg)
+
+    def _handle_PARAM_REQUEST_LIST(self, msg):
+        if self.param_rate:
+            self._param_queue = deque(range(len(self.params))) # Start over, as ArduPilot does
+            return
+        names = sorted(self.params)
+        for index in range(len(names)):
+            self._send_param(names, index)
+
+    def _send_param(self, names, index):
+        name = names[index]
+        self.conn.mav.param_value_send(name.encode(), float(self.params[name]),
+                                       mavlink.MAV_PARAM_TYPE_REAL32, len(names), index)
+
+    def _send_params(self, dt):
+        self._param_budget = min(self._param_budget + self.param_rate * dt, len(self._param_queue))
+        names = sorted(self.params)
+        while self._param_budget >= 1 and self._param_queue:
+            self._send_param(names, self._param_queue.popleft())
+            self._param_budget -= 1
+
+    def _handle_PARAM_REQUEST_READ(self, msg):
+        names = sorted(self.params)
+        name = msg.param_id if msg.param_index < 0 else names[msg.param_index]
+        if name in self.params:
+            self.conn.mav.param_value_send(name.encode(), float(self.params[name]),
+                                           mavlink.MAV_PARAM_TYPE_REAL32, len(names), names.index(name))
+
+    def _handle_PARAM_SET(self, msg):
+        self.params[msg.param_id] = msg.param_value
+        names = sorted(self.params)
+        self.conn.mav.param_value_send(msg.param_id.encode(), float(msg.param_value),
+                                       mavlink.MAV_PARAM_TYPE_REAL32, len(names), names.index(msg.param_id))
+
+    def _handle_SET_MODE(self, msg):
+        self._set_mode(MODE_NAMES.get(msg.custom_mode))
+
+    def _handle_COMMAND_LONG(self, msg):
+        result = self._command(msg)
+        self.conn.mav.command_ack_send(msg.command, result)
+
+    def _command(self, msg):
+        cmd = msg.command
+        if cmd == mavlink.MAV_CMD_COMPONENT_ARM_DISARM:
+            self._log_command("ARM" if msg.param1 == 1 else "DISARM")
+            if msg.param1 == 1:
+                if self.mode not in ARMABLE_MODES:
+                    return mavlink.MAV_RESULT_FAILED
+                self.armed = True
+            else:
+                self.armed = False
+            self.send_heartbeat()
+            return mavlink.MAV_RESULT_ACCEPTED
+        if cmd == mavlink.MAV_CMD_DO_SET_MODE:
+            return mavlink.MAV_RESULT_ACCEPTED if self._set_mode(MODE_NAMES.get(int(msg.param2))) \
+                else mavlink.MAV_RESULT_FAILED
+        if cmd == mavlink.MAV_CMD_NAV_TAKEOFF:
+            self._log_command("TAKEOFF")
+            if not self.armed or self.mode != "GUIDED":
+                return mavlink.MAV_RESULT_FAILED
+            self.target = (self.lat, self.lon, msg.param7)
+            return mavlink.MAV_RESULT_ACCEPTED
+        if cmd == mavlink.MAV_CMD_CONDITION_YAW:
+            if msg.param4: # Relative
+                self.yaw_target = (self.heading + (msg.param1 if msg.param3 >= 0 else -msg.param1)) % 360
+            else:
+                self.yaw_target = msg.param1 % 360
+            return mavlink.MAV_RESULT_ACCEPTED
+        if cmd == mavlink.MAV_CMD_DO_CHANGE_SPEED:
+            if msg.param2 > 0:
+                self.speed = msg.param2
+            return mavlink.MAV_RESULT_ACCEPTED
+        if cmd == mavlink.MAV_CMD_MISSION_START:
+            self._log_command("MISSION_START")
+            if not self.armed or len(self.mission) < 2:
+                return mavlink.MAV_RESULT_FAILED
+            self._set_mode("AUTO")
+            self.mission_running = True
+            self._start_mission_item(max(1, self.mission_current))
+            return mavlink.MAV_RESULT_ACCEPTED
+        if cmd == mavlink.MAV_CMD_NAV_RETURN_TO_LAUNCH:
+            return mavlink.MAV_RESULT_ACCEPTED if self._set_mode("RTL") else mavlink.MAV_RESULT_FAILED
+        if cmd == mavlink.MAV_CMD_NAV_LAND:
+            return mavlink.MAV_RESULT_ACCEPTED if self._set_mode("LAND") else mavlink.MAV_RESULT_FAILED
+        if cmd == mavlink.MAV_CMD_REQUEST_AUTOPILOT_CAPABILITIES:
+            self.conn.mav.autopilot_version_send(
+                mavlink.MAV_PROTOCOL_CAPABILITY_MISSION_FLOAT | mavlink.MAV_PROTOCOL_CAPABILITY_PARAM_FLOAT |
+                mavlink.MAV_PROTOCOL_CAPABILITY_SET_POSITION_TARGET_GLOBAL_INT,
+                (4 << 24) | (0 << 16) | (0 << 8) | 255, 0, 0, 0, [0] * 8, [0] * 8, [0] * 8, 0, 0, 0)
+            return mavlink.MAV_RESULT_ACCEPTED
+        if cmd == mavlink.MAV_CMD_SET_MESSAGE_INTERVAL:
+            return mavlink.MAV_RESULT_ACCEPTED
+        return mavlink.MAV_RESULT_UNSUPPORTED
+
+    def _set_mode(self, name):
+        self._log_command(f"MODE {name}")
+        if name not in MODES:
+            return False
+        if name == "AUTO" and self.mode != "AUTO":
+            # Already airborne: carry on from the current item, on the ground wait for MISSION_START
+            self.mission_running = self.alt > 0.5 and len(self.mission) > 1
+            if self.mission_running:
+                self._start_mission_item(max(1, self.mission_current))
+        if name in ("LOITER", "BRAKE", "GUIDED"):
+            self.target = (self.lat, self.lon, self.alt) if self.alt > 0.5 else None
+        self.velocity_cmd = None
+        self.mode = name
+        self.send_heartbeat()
+        return True
+
+    def _handle_MISSION_ITEM(self, msg):
+        if msg.current == 2 and self.mode == "GUIDED":
+            # DroneKit simple_goto: a single guided-mode waypoint
+            self._goto(msg.x, msg.y, msg.z)
+            return
+        self._store_mission_item(msg.seq, (msg.command, msg.param1, msg.param2, msg.param3, msg.param4,
+                                           msg.x, msg.y, msg.z))
+
+    def _handle_MISSION_ITEM_INT(self, msg):
+        self._store_mission_item(msg.seq, (msg.command, msg.param1, msg.param2, msg.param3, msg.param4,
+                                           msg.x / 1e7, msg.y / 1e7, msg.z))
+
+    def _handle_SET_POSITION_TARGET_GLOBAL_INT(self, msg):
+        if self.mode == "GUIDED":
+            self._goto(msg.lat_int / 1e7, msg.lon_int / 1e7, msg.alt)
+
+    def _handle_SET_POSITION_TARGET_LOCAL_NED(self, msg):
+        if self.mode != "GUIDED" or not self.armed:
+            return
+        yaw_rate = None if msg.type_mask & 0b0000100000000000 else math.degrees(msg.yaw_rate)
+        # ArduCopter stops if velocity setpoints stop arriving for 3 s
+        self.velocity_cmd = (msg.vx, msg.vy, msg.vz, yaw_rate, time.monotonic() + 3.0 / self.speedup)
+        self.target = None
+
+    def _goto(self, lat, lon, alt):
+        self._log_command("GOTO")
+        self.target = (lat, lon, alt)
+        self.velocity_cmd = None
+        self.yaw_target = None
+
+    # --- Mission Protocol ---
+
+    def _handle_MISSION_REQUEST_LIST(self, msg):
+        self.conn.mav.mission_count_send(msg.get_srcSystem(), msg.get_srcComponent(), max(1, len(self.mission)))
+
+    def _mission_item(self, seq):
+        if seq == 0 or seq >= len(self.mission):
+            return (mavlink.MAV_CMD_NAV_WAYPOINT, 0, 0, 0, 0, self.home[0], self.home[1], 0)
+        return self.mission[seq]
+
+    def _handle_MISSION_REQUEST(self, msg):
+        command, p1, p2, p3, p4, x, y, z = self._mission_item(msg.seq)
+        self.conn.mav.mission_item_send(msg.get_srcSystem(), msg.get_srcComponent(), msg.seq,
+                                        mavlink.MAV_FRAME_GLOBAL_RELATIVE_ALT, command,
+                                        int(msg.seq == self.mission_current), 1, p1, p2, p3, p4, x, y, z)
+
+    def _handle_MISSION_REQUEST_INT(self, msg):
+        self._handle_MISSION_REQUEST(msg)
+
+    def _handle_MISSION_COUNT(self, msg):
+        self._upload_count = msg.count
+        self._upload_items = [None] * msg.count
+        self._upload_peer = (msg.get_srcSystem(), msg.get_srcComponent())
+        self.conn.mav.mission_request_send(self._upload_peer[0], self._upload_peer[1], 0)
+
+    def _store_mission_item(self, seq, item):
+        if self._upload_count is None or seq >= self._upload_count:
+            return
+        self._upload_items[seq] = item
+        if seq + 1 < self._upload_count:
+            self.conn.mav.mission_request_send(self._upload_peer[0], self._upload_peer[1], seq + 1)
+            return
+        self.mission = self._upload_items
+        self.mission_current = min(self.mission_current, len(self.mission) - 1)
+        self._upload_count = None
+        self.conn.mav.mission_ack_send(self._upload_peer[0], self._upload_peer[1], mavlink.MAV_MISSION_ACCEPTED)
+
+    def _handle_MISSION_CLEAR_ALL(self, msg):
+        self.mission = []
+        self.mission_current = 0
+        self.conn.mav.mission_ack_send(msg.get_srcSystem(), msg.get_srcComponent(), mavlink.MAV_MISSION_ACCEPTED)
+
+    def _handle_MISSION_SET_CURRENT(self, msg):
+        self.mission_current = msg.seq
+        if self.mode == "AUTO" and self.mission_running:
+            self._start_mission_item(msg.seq)
+        self.conn.mav.mission_current_send(self.mission_current)
+
+    def _start_mission_item(self, seq):
+        """ Executes non-NAV items immediately and targets the next NAV item. """
+        while seq < len(self.mission):
+            command, p1, p2, p3, p4, x, y, z = self.mission[seq]
+            self.mission_current = seq
+            if command == mavlink.MAV_CMD_NAV_TAKEOFF:
+                self.target = (self.lat, self.lon, z)
+                break
+            if command == mavlink.MAV_CMD_NAV_WAYPOINT:
+                self.target = (x, y, z)
+                self.yaw_target = None
+                break
+            if command == mavlink.MAV_CMD_CONDITION_YAW:
+                self.yaw_target = (self.heading + (p1 if p3 >= 0 else -p1)) % 360 if p4 else p1 % 360
+            elif command == mavlink.MAV_CMD_DO_CHANGE_SPEED and p2 > 0:
+                self.speed = p2
+            seq += 1
+        else:
+            self.mission_running = False # Mission complete: hold position
+        self.conn.mav.mission_current_send(self.mission_current)
+
+    # --- Simulation ---
+
+    def _step(self, dt):
+        if dt <= 0:
+            return
+        flying = self.armed and (self.alt > 0.05 or self.target is not None or self.velocity_cmd is not None)
+        self.vn = self.ve = self.vd = 0.0
+        if self.armed:
+            self.battery_voltage = max(10.5, self.battery_voltage - 0.0005 * dt)
+
+        if not flying:
+            return
+        if self.mode == "LAND":
+            self._descend(dt)
+        elif self.mode == "RTL":
+            rtl_alt = self.params["RTL_ALT"] / 100.0
+            d_north, d_east = _ned_delta(self.lat, self.lon, *self.home)
+            if math.hypot(d_north, d_east) > 0.5:
+                self._fly_towards(self.home[0], self.home[1], max(self.alt, rtl_alt), dt)
+            else:
+                self._descend(dt)
+        elif self.mode == "GUIDED" and self.velocity_cmd is not None:
+            vn, ve, vd, yaw_rate, expires_at = self.velocity_cmd
+            if time.monotonic() > expires_at:
+                self.velocity_cmd = None
+            else:
+                self.vn, self.ve, self.vd = vn, ve, vd
+                self.lat, self.lon = _offset(self.lat, self.lon, vn * dt, ve * dt)
+                self.alt = max(0.0, self.alt - vd * dt)
+                if yaw_rate is not None:
+                    self.heading = (self.heading + yaw_rate * dt) % 360
+        elif self.mode in ("GUIDED", "AUTO") and self.target is not None:
+            arrived = self._fly_towards(*self.target, dt)
+            if arrived and self.mode == "AUTO" and self.mission_running:
+                self.conn.mav.mission_item_reached_send(self.mission_current)
+                self._start_mission_item(self.mission_current + 1)
+
+        if self.yaw_target is not None:
+            self._yaw_towards(self.yaw_target, dt)
+
+    def _descend(self, dt):
+        self.vd = self.params["LAND_SPEED"] / 100.0
+        self.alt = max(0.0, self.alt - self.vd * dt)
+        if self.alt <= 0.0:
+            self.armed = False
+            self.target = None
+            self.send_heartbeat()
+
+    def _yaw_towards(self, heading, dt, rate=90.0):
+        diff = (heading - self.heading + 180.0) % 360.0 - 180.0
+        turn = max(-rate * dt, min(rate * dt, diff))
+        self.heading = (self.heading + turn) % 360
+
+    def _fly_towards(self, lat, lon, alt, dt):
+        """ Moves towards the target; returns True once within WPNAV_RADIUS / 0.5 m. """
+        d_north, d_east = _ned_delta(self.lat, self.lon, lat, lon)
+        distance = math.hypot(d_north, d_east)
+        if distance > 0.01:
+            step = min(distance, self.speed * dt)
+            self.vn, self.ve = d_north / distance * self.speed, d_east / distance * self.speed
+            self.lat, self.lon = _offset(self.lat, self.lon, d_north / distance * step,
+                                         d_east / distance * step)
+            if self.yaw_target is None and distance > 2.0:
+                self._yaw_towards(math.degrees(math.atan2(d_east, d_north)) % 360, dt)
+        climb = self.params["WPNAV_SPEED_UP"] / 100.0 if alt > self.alt else self.params["WPNAV_SPEED_DN"] / 100.0
+        d_alt = max(-climb * dt, min(climb * dt, alt - self.alt))
+        self.alt += d_alt
+        self.vd = -d_alt / dt
+        radius = self.params["WPNAV_RADIUS"] / 100.0
+        return distance - min(distance, self.speed * dt) <= radius and abs(alt - self.alt) <= 0.5
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mock ArduCopter for offline testing")
+    parser.add_argument('--port', type=int, default=5762)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--lat', type=float, default=17.385)
+    parser.add_argument('--lon', type=float, default=78.4867)
+    parser.add_argument('--sysid', type=int, default=1)
+    parser.add_argument('--speedup', type=float, default=1.0)
+    args = parser.parse_args()
+
+    autopilot = MockAutopilot(args.port, args.lat, args.lon, args.sysid, speedup=args.speedup,
+                              host=args.host).start()
+    print(f"Mock autopilot listening on tcp:{args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        autopilot.stop()
@@ -0,0 +1,240 @@
+# Exported detector backends.
+#
+# best.pt can be exported once to ONNX (run by ONNX Runtime) or OpenVINO, each
+# optionally INT8-quantised with a calibration set drawn from the dataset.
+# Every format loads back through ultralytics.YOLO, which wraps it in the same
+# predict() interface Testing.py and inference_server.py use, so callers only
+# swap YOLO(model_path) for load_detector(model_path).
+#
+# load_detector() picks the fastest backend that is both exported and
+# importable on this machine. It times a few predictions per backend once and
+# caches the winner in <model>_backend.json next to the weights.
+#
+#     python model_backends.py export best.pt --int8 --calibration dataset1/
+#     python model_backends.py select best.pt
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import re
+import time
+import numpy as np
+
+# --- Requires Installation for calibration images: pip install opencv-python ---
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+# Fastest-first guess, used to break timing ties and when no sample is timed
+BACKENDS = ("openvino-int8", "openvino", "onnx-int8", "onnx", "pytorch")
+# Python package each backend needs at runtime
+RUNTIMES = {"pytorch": "torch", "onnx": "onnxruntime", "onnx-int8": "onnxruntime",
+            "openvino": "openvino", "openvino-int8": "openvino"}
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+DEFAULT_IMGSZ = 640
+
+
+def artifact_path(pt_path, backend):
+    """ Where 'backend' lives for 'pt_path' (Ultralytics' own export naming). """
+    stem = os.path.splitext(pt_path)[0]
+    return {"pytorch": pt_path,
+            "onnx": stem + ".onnx",
+            "onnx-int8": stem + "_int8.onnx",
+            "openvino": stem + "_openvino_model",
+            "openvino-int8": stem + "_int8_openvino_model"}[backend]
+
+
+def available_backends(pt_path):
+    """ Backends whose artifact exists and whose runtime can be imported, fastest-first. """
+    return [backend for backend in BACKENDS
+            if os.path.exists(artifact_path(pt_path, backend)) and importlib.util.find_spec(RUNTIMES[backend])]
+
+
+def calibration_images(folder, count=200, seed=0):
+    """ Up to 'count' image paths sampled (reproducibly) from 'folder' and its subfolders, e.g. dataset1/<class>/. """
+    paths = [os.path.join(root, name) for root, _, names in os.walk(folder)
+             for name in names if name.lower().endswith(IMAGE_EXTENSIONS)]
+    paths.sort()
+    random.Random(seed).shuffle(paths)
+    return paths[:count]
+
+
+def letterbox(image, imgsz=DEFAULT_IMGSZ):
+    """ BGR uint8 image -> (1, 3, imgsz, imgsz) float32 RGB tensor, padded like Ultralytics' preprocessing. """
+    h, w = image.shape[:2]
+    scale = min(imgsz / h, imgsz / w)
+    nh, nw = round(h * scale), round(w * scale)
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - nh) // 2, (imgsz - nw) // 2
+    canvas[top:top + nh, left:left + nw] = cv2.resize(image, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    return np.ascontiguousarray(canvas[:, :, ::-1].transpose(2, 0, 1)[None], dtype=np.float32) / 255.0
+
+
+def _write_calibration_yaml(pt_path, images, names):
+    """ Minimal data.yaml listing the calibration images, for Ultralytics' OpenVINO INT8 export. """
+    stem = os.path.splitext(pt_path)[0]
+    list_path, yaml_path = stem + "_calibration.txt", stem + "_calibration.yaml"
+    with open(list_path, 'w') as f:
+        f.write("\n".join(os.path.abspath(path) for path in images) + "\n")
+    with open(yaml_path, 'w') as f:
+        json.dump({"path": "", "train": os.path.abspath(list_path), "val": os.path.abspath(list_path),
+                   "names": {int(k): v for k, v in names.items()}}, f) # JSON is valid YAML
+    return yaml_path
+
+
+def _quantize_onnx(onnx_path, output_path, images, imgsz):
+    """
+    Static INT8 (QDQ) quantisation with ONNX Runtime. The box-decoding part of
+    the final Detect layer stays in float: quantising its concat/DFL arithmetic
+    costs far more accuracy than it saves time.
+    """
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self._images = iter(images)
+
+        def get_next(self):
+            for path in self._images:
+                image = cv2.imread(path)
+                if image is not None:
+                    return {input_name: letterbox(image, imgsz)}
+            return None
+
+    graph = onnx.load(onnx_path).graph
+    input_name = graph.input[0].name
+    layers = [int(m.group(1)) for node in graph.node for m in [re.match(r"/model\.(\d+)/", node.name)] if m]
+    head = f"/model.{max(layers)}/" if layers else None
+    exclude = [node.name for node in graph.node
+               if head and node.name.startswith(head) and node.op_type != "Conv"]
+    quantize_static(onnx_path, output_path, Reader(), quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                    per_channel=True, nodes_to_exclude=exclude)
+    return output_path
+
+
+def export(pt_path, backends=("onnx",), calibration=None, imgsz=DEFAULT_IMGSZ, calibration_count=200):
+    """
+    Exports 'pt_path' to each of 'backends'. INT8 backends need 'calibration',
+    a folder of representative images (e.g. the dataset).
+
+    Returns:
+        Dict of backend -> artifact path
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(pt_path)
+    images = calibration_images(calibration, calibration_count) if calibration else []
+    exported = {}
+    for backend in backends:
+        if backend.endswith("-int8") and not images:
+            raise ValueError(f"{backend} export needs a calibration image folder")
+        if backend in ("onnx", "onnx-int8") and "onnx" not in exported:
+            exported["onnx"] = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+        if backend == "onnx-int8":
+            exported[backend] = _quantize_onnx(exported["onnx"], artifact_path(pt_path, backend), images, imgsz)
+        elif backend == "openvino":
+            exported[backend] = model.export(format="openvino", imgsz=imgsz)
+        elif backend == "openvino-int8":
+            data = _write_calibration_yaml(pt_path, images, model.names)
+            exported[backend] = model.export(format="openvino", imgsz=imgsz, int8=True, data=data)
+        elif backend == "pytorch":
+            exported[backend] = pt_path
+        print(f"Exported {backend}: {exported[backend]}")
+    return exported
+
+
+def time_backend(model, sample, runs=10):
+    """ Median seconds per predict() of 'sample' after one warm-up call. """
+    model.predict(source=sample, verbose=False)
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        model.predict(source=sample, verbose=False)
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2]
+
+
+def _cache_key(pt_path, backends):
+    stamps = {b: os.path.getmtime(artifact_path(pt_path, b)) for b in backends}
+    return {"machine": platform.machine(), "processor": platform.processor(), "node": platform.node(),
+            "artifacts": stamps}
+
+
+def select_backend(pt_path, sample=None, runs=10, use_cache=True):
+    """
+    Times every available backend on 'sample' (a frame; a blank 640x640 image
+    by default) and returns the fastest. The choice is cached per machine
+    until any artifact changes.
+    """
+    candidates = available_backends(pt_path)
+    if not candidates:
+        raise RuntimeError(f"No usable backend for {pt_path}")
+    if len(candidates) == 1:
+        return candidates[0]
+
+    cache_path = os.path.splitext(pt_path)[0] + "_backend.json"
+    key = _cache_key(pt_path, candidates)
+    if use_cache and os.path.exists(cache_path):
+        with open(cache_path) as f:
+            cached = json.load(f)
+        if cached.get("key") == key and cached.get("backend") in candidates:
+            return cached["backend"]
+
+    from ultralytics import YOLO
+    if sample is None:
+        sample = np.zeros((DEFAULT_IMGSZ, DEFAULT_IMGSZ, 3), dtype=np.uint8)
+    timings = {}
+    for backend in candidates:
+        try:
+            timings[backend] = time_backend(YOLO(artifact_path(pt_path, backend), task="detect"), sample, runs)
+        except Exception as e: # A broken export shouldn't stop detection
+            print(f"Backend {backend} failed: {e}")
+    if not timings:
+        raise RuntimeError(f"No backend for {pt_path} could run")
+    best = min(timings, key=lambda b: (timings[b], BACKENDS.index(b)))
+    with open(cache_path, 'w') as f:
+        json.dump({"key": key, "backend": best, "ms": {b: round(t * 1000, 2) for b, t in timings.items()}}, f)
+    return best
+
+
+def load_detector(pt_path, backend="auto", sample=None):
+    """
+    Loads the detector for 'pt_path' with 'backend' ('auto' picks the fastest
+    available one). Returns (model, backend); 'model' has the usual YOLO predict().
+    """
+    from ultralytics import YOLO
+    if backend == "auto":
+        backend = select_backend(pt_path, sample)
+    path = artifact_path(pt_path, backend)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{backend} model not found at {path}; run model_backends.py export first")
+    return YOLO(path, task="detect"), backend
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export best.pt to faster CPU backends and pick the fastest")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_cmd = sub.add_parser("export")
+    export_cmd.add_argument("model", help="path to best.pt")
+    export_cmd.add_argument("--openvino", action="store_true", help="also export OpenVINO")
+    export_cmd.add_argument("--int8", action="store_true", help="also export INT8 variants (needs --calibration)")
+    export_cmd.add_argument("--calibration", help="folder of representative images, e.g. dataset1/")
+    export_cmd.add_argument("--imgsz", type=int, default=DEFAULT_IMGSZ)
+    select_cmd = sub.add_parser("select")
+    select_cmd.add_argument("model", help="path to best.pt")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        backends = ["onnx"] + (["onnx-int8"] if args.int8 else [])
+        if args.openvino:
+            backends += ["openvino"] + (["openvino-int8"] if args.int8 else [])
+        export(args.model, backends, calibration=args.calibration, imgsz=args.imgsz)
+    else:
+        print(f"Available: {', '.join(available_backends(args.model)) or 'none'}")
+        print(f"Fastest: {select_backend(args.model, use_cache=False)}")
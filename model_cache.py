@@ -0,0 +1,111 @@
+# Loaded, warmed-up models shared across pipelines.
+#
+# Loading best.pt or the Keras ripeness classifier takes seconds, most of it
+# importing ultralytics / torch / tensorflow, and the first inference after
+# loading is much slower again (graph compilation, memory allocation, backend
+# initialisation). ModelCache loads each model once per process, runs one
+# dummy inference on it, and hands that same instance to every caller, so a
+# second pipeline or inference server on the same weights starts instantly.
+#
+# Loading with wait=False happens on a background thread: a program can open
+# its camera or connect to the drone in the meantime and only waits, when it
+# first needs the model, for whatever is left. The heavy libraries are still
+# imported only inside the loaders (model_backends.load_detector,
+# ripeness.load_classifier), never at module import.
+#
+#     MODELS.detector("best.pt", wait=False)               # Starts loading; returns a Future
+#     cap = cv2.VideoCapture(0)                            # Meanwhile
+#     model, backend = MODELS.detector("best.pt")          # Loaded and warmed up
+#     classifier = MODELS.classifier("best_mango_classifier.keras")
+
+import os
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from model_backends import DEFAULT_IMGSZ, load_detector
+from ripeness import CLASSIFIER_SIZE, load_classifier
+
+
+def warm_up_detector(loaded, imgsz=DEFAULT_IMGSZ):
+    """ One prediction on a blank frame; 'loaded' is load_detector's (model, backend). """
+    loaded[0].predict(source=np.zeros((imgsz, imgsz, 3), dtype=np.uint8), verbose=False)
+
+
+def warm_up_classifier(model, size=CLASSIFIER_SIZE):
+    """ One batch of a single blank crop, as RipenessClassifier sends them. """
+    model.predict_on_batch(np.zeros((1, size, size, 3), dtype=np.float32))
+
+
+class ModelCache:
+    """
+    Models by key, each loaded and warmed up once per process; concurrent
+    requests for a model that is still loading wait for that same load.
+    A load that fails is forgotten, so the next request retries it.
+    """
+
+    def __init__(self):
+        self._models = {} # Key -> Future of the model
+        self._timings = {} # Key -> (load seconds, warm-up seconds)
+        self._lock = threading.Lock()
+
+    def get(self, key, load, warm_up=None, wait=True):
+        """
+        The model cached under 'key', first loading it with load() and warming
+        it with warm_up(model). With wait=False the load runs on a background
+        thread and a Future of the model is returned instead.
+        """
+        with self._lock:
+            future = self._models.get(key)
+            started = future is None
+            if started:
+                future = self._models[key] = Future()
+        if started:
+            if wait:
+                self._load(key, future, load, warm_up)
+            else:
+                threading.Thread(target=self._load, args=(key, future, load, warm_up),
+                                 name=f"model-cache-{key[0]}", daemon=True).start()
+        return future.result() if wait else future
+
+    def _load(self, key, future, load, warm_up):
+        try:
+            start = time.perf_counter()
+            model = load()
+            loaded = time.perf_counter()
+            if warm_up is not None:
+                warm_up(model)
+            self._timings[key] = (loaded - start, time.perf_counter() - loaded)
+        except BaseException as e:
+            with self._lock:
+                self._models.pop(key, None)
+            future.set_exception(e)
+        else:
+            future.set_result(model)
+
+    def detector(self, pt_path, backend="auto", wait=True):
+        """ (model, backend) for best.pt via model_backends.load_detector, warmed up. """
+        return self.get(("detector", os.path.abspath(pt_path), backend),
+                        lambda: load_detector(pt_path, backend), warm_up_detector, wait)
+
+    def classifier(self, path, wait=True):
+        """ The Keras ripeness classifier via ripeness.load_classifier, warmed up. """
+        return self.get(("classifier", os.path.abspath(path)), lambda: load_classifier(path),
+                        warm_up_classifier, wait)
+
+    def evict(self, key):
+        with self._lock:
+            self._models.pop(key, None)
+            self._timings.pop(key, None)
+
+    def to_dict(self):
+        with self._lock:
+            models = list(self._models.items())
+        return {":".join(key): {"state": "ready" if future.done() else "loading",
+                                "load_s": round(self._timings[key][0], 3) if key in self._timings else None,
+                                "warmup_s": round(self._timings[key][1], 3) if key in self._timings else None}
+                for key, future in models}
+
+
+# Shared by every pipeline in the process
+MODELS = ModelCache()
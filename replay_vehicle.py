@@ -0,0 +1,338 @@
+# Replay vehicle: a stand-in for the DroneKit vehicle that plays back a
+# recorded flight log (flight_recorder.py) or a synthetic survey flight, so
+# app.py, the telemetry engine, the dashboard and detection geotagging can be
+# exercised offline with reproducible timings.
+#
+# It exposes the attributes TelemetryEngine reads (telemetry.ATTRIBUTE_FIELDS:
+# location.global_relative_frame, attitude, battery, gps_0, mode, armed, ...),
+# built from the same DroneKit classes, and calls attribute listeners the way
+# DroneKit does: position and attitude on every sample, the rest when they
+# change. Playback runs on its own thread at 1x, 10x, ... or as fast as
+# possible (speed=None).
+#
+# Mode and arming changes are accepted and reported to listeners, and
+# simple_takeoff / simple_goto / send_mavlink are logged in 'commands_received',
+# but they do not steer the replayed trajectory. COMMAND_LONGs for arming, mode
+# changes and RTL are applied the same way and answered with a COMMAND_ACK, so
+# commands.CommandSender works against a replay. Missions that upload to the
+# autopilot (vehicle.commands) need mock_autopilot.py instead.
+#
+#     vehicle = ReplayVehicle(synthetic_flight(), speed=10).start()
+#     vehicle = ReplayVehicle.from_log('flights/20250101-120000', speed=None).start()
+
+import math
+import threading
+import time
+import numpy as np
+from dronekit import Attitude, Battery, GPSInfo, LocationGlobal, LocationGlobalRelative, SystemStatus, VehicleMode
+from pymavlink import mavutil
+from flight_recorder import TELEMETRY_DTYPE, FlightLog
+from geodesy import offset_to_latlon
+
+# Listeners called on every sample; the others only when their value changes
+ALWAYS_NOTIFIED = ("attitude", "heading", "location.global_relative_frame", "location.global_frame",
+                   "groundspeed", "airspeed")
+
+
+class _Locations:
+    def __init__(self):
+        self.global_frame = None
+        self.global_relative_frame = None
+        self.local_frame = None
+
+
+def synthetic_flight(lat=17.385, lon=78.4867, altitude=15.0, speed=5.0, rows=6, row_length=80.0,
+                     row_spacing=10.0, rate=20.0, seed=0):
+    """
+    Telemetry of a lawnmower survey: arm and climb in GUIDED, fly 'rows' rows
+    in AUTO, return in RTL and land. Deterministic for a given seed.
+
+    Returns:
+        (records, strings): TELEMETRY_DTYPE array and its string table, as FlightLog provides
+    """
+    strings = ["GUIDED", "AUTO", "RTL", "LAND", "STANDBY", "ACTIVE"]
+    # Knots: (seconds, north, east, altitude, mode index)
+    knots = [(0.0, 0.0, 0.0, 0.0, 0), (3.0, 0.0, 0.0, 0.0, 0)]
+    def leg(north, east, alt, mode, rate_m_s):
+        t, n0, e0, a0, _ = knots[-1]
+        distance = max(math.hypot(north - n0, east - e0), abs(alt - a0))
+        knots.append((t + max(distance / rate_m_s, 0.5), north, east, alt, mode))
+    leg(0.0, 0.0, altitude, 0, 2.5) # Takeoff
+    for row in range(rows):
+        east = row * row_spacing
+        leg(row_length if row % 2 == 0 else 0.0, east, altitude, 1, speed)
+        if row < rows - 1:
+            leg(row_length if row % 2 == 0 else 0.0, east + row_spacing, altitude, 1, speed)
+    leg(0.0, 0.0, altitude, 2, speed) # RTL
+    leg(0.0, 0.0, 0.0, 3, 1.0) # Land
+    knots = np.array(knots)
+
+    t = np.arange(0.0, knots[-1, 0] + 3.0, 1.0 / rate)
+    north, east, alt = (np.interp(t, knots[:, 0], knots[:, i]) for i in (1, 2, 3))
+    leg_index = np.clip(np.searchsorted(knots[:, 0], t, side="right"), 1, len(knots) - 1)
+    rng = np.random.default_rng(seed)
+    d_north, d_east = np.gradient(north, t), np.gradient(east, t)
+    ground = np.hypot(d_north, d_east)
+    # Heading of travel, held from the last moving sample while hovering
+    last = np.maximum.accumulate(np.where(ground > 0.1, np.arange(len(t)), 0))
+    heading = np.where(last > 0, (np.degrees(np.arctan2(d_east, d_north)) % 360)[last], 0.0)
+    flying = alt > 0.05
+    airborne_or_armed = (t >= 1.0) & (t <= knots[-1, 0] + 1.0)
+
+    records = np.zeros(len(t), dtype=TELEMETRY_DTYPE)
+    records["t"] = t
+    records["latitude"], records["longitude"] = offset_to_latlon(lat, lon, north, east)
+    records["altitude"] = alt
+    records["groundspeed"] = ground
+    records["airspeed"] = ground + rng.normal(0, 0.2, len(t)) * flying
+    records["heading"] = np.rint(heading)
+    accel = np.gradient(ground, t)
+    records["pitch"] = np.clip(-2.0 * accel, -15, 15) + rng.normal(0, 0.3, len(t)) * flying
+    records["roll"] = rng.normal(0, 0.5, len(t)) * flying
+    records["yaw"] = np.where(heading > 180, heading - 360, heading)
+    records["battery_voltage"] = 12.6 - 1.2 * t / t[-1] - 0.3 * flying
+    records["battery_current"] = np.where(flying, 14.0 + 2.0 * ground / max(speed, 1e-6), 0.5)
+    records["battery_level"] = np.rint(100 - 30 * t / t[-1])
+    records["gps_fix"] = 3
+    records["gps_satellites"] = 12
+    records["armed"] = airborne_or_armed
+    records["is_armable"] = 1
+    records["mode"] = knots[leg_index, 4].astype(int)
+    records["mode"][t < knots[1, 0]] = 0
+    records["system_status"] = np.where(airborne_or_armed, 5, 4)
+    return records, strings
+
+
+class ReplayVehicle:
+    """
+    Plays telemetry records through DroneKit-style attributes and listeners.
+
+    Args:
+        source: (records, strings) from synthetic_flight() or a FlightLog's telemetry and strings
+        speed: Playback speed multiplier (1.0 real time, 10.0, ...); None plays as fast as possible
+        loop: Start over at the end instead of stopping
+    """
+
+    def __init__(self, source, speed=1.0, loop=False):
+        records, strings = source
+        if not len(records):
+            raise ValueError("Nothing to replay: the log has no telemetry")
+        self._records = records
+        self._strings = list(strings)
+        self.speed = speed
+        self.loop = loop
+        self._listeners = {}
+        self._message_listeners = {}
+        self.message_factory = mavutil.mavlink.MAVLink(None) # Encodes only; nothing is written
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+        self.finished = threading.Event()
+        self.samples = 0 # Records played so far
+        self.replay_time = None # Log time of the current record
+        self.commands_received = []
+        self.parameters = {}
+
+        self.location = _Locations()
+        self.attitude = self.battery = self.gps_0 = None
+        self.system_status = SystemStatus("STANDBY")
+        self.heading = self.groundspeed = self.airspeed = None
+        self._mode = VehicleMode("STABILIZE")
+        self._armed = False
+        self.is_armable = False
+        self.home_location = None
+        self._apply(0, notify=False)
+
+    @classmethod
+    def from_log(cls, directory, speed=1.0, loop=False):
+        log = FlightLog(directory)
+        return cls((log.telemetry, log.strings), speed=speed, loop=loop)
+
+    # --- DroneKit vehicle API used by app.py / telemetry.py ---
+
+    def add_attribute_listener(self, attr_name, observer):
+        with self._lock:
+            self._listeners.setdefault(attr_name, []).append(observer)
+
+    def remove_attribute_listener(self, attr_name, observer):
+        with self._lock:
+            observers = self._listeners.get(attr_name, [])
+            if observer in observers:
+                observers.remove(observer)
+
+    def on_attribute(self, attr_name):
+        def decorator(fn):
+            self.add_attribute_listener(attr_name, fn)
+            return fn
+        return decorator
+
+    def notify_attribute_listeners(self, attr_name, value):
+        with self._lock:
+            observers = list(self._listeners.get(attr_name, ()))
+        for observer in observers:
+            try:
+                observer(self, attr_name, value)
+            except Exception as e:
+                print(f"Replay vehicle: error in '{attr_name}' listener: {e}")
+
+    def add_message_listener(self, name, fn):
+        with self._lock:
+            self._message_listeners.setdefault(name, []).append(fn)
+
+    def remove_message_listener(self, name, fn):
+        with self._lock:
+            listeners = self._message_listeners.get(name, [])
+            if fn in listeners:
+                listeners.remove(fn)
+
+    def notify_message_listeners(self, name, message):
+        with self._lock:
+            listeners = list(self._message_listeners.get(name, ()))
+        for fn in listeners:
+            try:
+                fn(self, name, message)
+            except Exception as e:
+                print(f"Replay vehicle: error in '{name}' message listener: {e}")
+
+    # Assigning mode or armed is a command: accepted and reported, as if the autopilot obeyed
+    @property
+    def mode(self):
+        return self._mode
+
+    @mode.setter
+    def mode(self, value):
+        self.commands_received.append(("mode", value.name))
+        self._set("mode", VehicleMode(value.name))
+
+    @property
+    def armed(self):
+        return self._armed
+
+    @armed.setter
+    def armed(self, value):
+        self.commands_received.append(("armed", bool(value)))
+        self._set("armed", bool(value))
+
+    def simple_takeoff(self, altitude):
+        self.commands_received.append(("simple_takeoff", altitude))
+
+    def simple_goto(self, location, airspeed=None, groundspeed=None):
+        self.commands_received.append(("simple_goto", location))
+
+    def send_mavlink(self, message):
+        self.commands_received.append(("send_mavlink", message))
+        if message.get_type() == "COMMAND_LONG":
+            ack = self.message_factory.command_ack_encode(message.command, self._command(message))
+            self.notify_message_listeners("COMMAND_ACK", ack)
+
+    def _command(self, msg):
+        """ Applies an arm / mode / RTL COMMAND_LONG; returns its MAV_RESULT. """
+        mavlink = mavutil.mavlink
+        if msg.command == mavlink.MAV_CMD_COMPONENT_ARM_DISARM:
+            self.armed = msg.param1 == 1
+        elif msg.command == mavlink.MAV_CMD_DO_SET_MODE and int(msg.param2) in mavutil.mode_mapping_acm:
+            self.mode = VehicleMode(mavutil.mode_mapping_acm[int(msg.param2)])
+        elif msg.command == mavlink.MAV_CMD_NAV_RETURN_TO_LAUNCH:
+            self.mode = VehicleMode("RTL")
+        else:
+            return mavlink.MAV_RESULT_UNSUPPORTED
+        return mavlink.MAV_RESULT_ACCEPTED
+
+    def close(self):
+        self.stop()
+
+    # --- Playback ---
+
+    def _set(self, attr_name, value, always=False):
+        slot = "_" + attr_name if attr_name in ("mode", "armed") else attr_name
+        current = getattr(self, slot)
+        if hasattr(value, "__dict__"): # DroneKit value classes have no __eq__
+            same = current is not None and vars(current) == vars(value)
+        else:
+            same = current == value
+        setattr(self, slot, value)
+        if always or not same:
+            self.notify_attribute_listeners(attr_name, value)
+
+    def _decode(self, code):
+        return self._strings[code] if 0 <= code < len(self._strings) else None
+
+    def _apply(self, i, notify=True):
+        r = self._records[i]
+        lat, lon, alt = float(r["latitude"]), float(r["longitude"]), float(r["altitude"])
+        self.replay_time = float(r["t"])
+        if self.home_location is None:
+            self.home_location = LocationGlobal(lat, lon, alt)
+        level = float(r["battery_level"])
+        values = {
+            "location.global_relative_frame": LocationGlobalRelative(lat, lon, alt),
+            "location.global_frame": LocationGlobal(lat, lon, alt),
+            "attitude": Attitude(math.radians(r["pitch"]), math.radians(r["yaw"]), math.radians(r["roll"])),
+            "heading": None if math.isnan(r["heading"]) else int(r["heading"]),
+            "groundspeed": float(r["groundspeed"]), "airspeed": float(r["airspeed"]),
+            "battery": Battery(float(r["battery_voltage"]) * 1000, float(r["battery_current"]) * 100,
+                               -1 if math.isnan(level) else int(level)),
+            "gps_0": GPSInfo(0, 0, int(r["gps_fix"]), int(r["gps_satellites"])),
+        }
+        mode, status = self._decode(int(r["mode"])), self._decode(int(r["system_status"]))
+        if mode is not None:
+            values["mode"] = VehicleMode(mode)
+        if status is not None:
+            values["system_status"] = SystemStatus(status)
+        for name in ("armed", "is_armable"): # -1: not recorded
+            if r[name] >= 0:
+                values[name] = bool(r[name])
+
+        for name, value in values.items():
+            if name.startswith("location."):
+                setattr(self.location, name.split(".")[1], value)
+                if notify:
+                    self.notify_attribute_listeners(name, value)
+            elif notify:
+                self._set(name, value, always=name in ALWAYS_NOTIFIED)
+            else:
+                setattr(self, "_" + name if name in ("mode", "armed") else name, value)
+
+    def start(self):
+        self._running = True
+        self.finished.clear()
+        self._thread = threading.Thread(target=self._run, name="replay-vehicle", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(2.0)
+        self._thread = None
+
+    def _run(self):
+        times = self._records["t"]
+        while self._running:
+            start, t0 = time.monotonic(), float(times[0])
+            for i in range(len(self._records)):
+                if not self._running:
+                    break
+                if self.speed:
+                    delay = start + (float(times[i]) - t0) / self.speed - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                elif i % 100 == 0:
+                    time.sleep(0) # Yield, so a maximum-speed replay cannot starve eventlet's other green threads
+                self._apply(i)
+                self.samples += 1
+            if not self.loop:
+                break
+        self._running = False
+        self.finished.set()
+
+    def to_dict(self):
+        return {"samples": self.samples, "records": len(self._records), "speed": self.speed,
+                "replay_time": self.replay_time, "commands_received": len(self.commands_received)}
+
+
+def open_replay(source, speed=1.0, loop=False):
+    """ ReplayVehicle for 'synthetic' or a flight log directory, started. """
+    if source == "synthetic":
+        return ReplayVehicle(synthetic_flight(), speed=speed, loop=loop).start()
+    return ReplayVehicle.from_log(source, speed=speed, loop=loop).start()
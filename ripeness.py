@@ -0,0 +1,140 @@
+# Two-stage mango ripeness: the YOLOv8 detector finds the fruit, the
+# MobileNetV2 classifier (classification/, 224x224) grades each box as
+# OverRipe, Ripe or UnRipe.
+#
+# A dense tree can show 50+ fruit in one frame, so crops are never classified
+# one call at a time. Each box is a view into the frame (no copy) that
+# cv2.resize writes straight into its slot of a preallocated
+# (max_batch, 224, 224, 3) uint8 batch; the batch is then converted to the
+# classifier's float input in one vectorised pass and classified with a
+# single predict call per max_batch crops.
+#
+#     classifier = RipenessClassifier(load_classifier('best_mango_classifier.keras'))
+#     fruits = detect_fruits(detector, classifier, frame)
+
+from collections import namedtuple
+import numpy as np
+
+# --- Requires Installation: pip install opencv-python ---
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+RIPENESS_CLASSES = ("OverRipe", "Ripe", "UnRipe") # Classifier output order
+CLASSIFIER_SIZE = 224
+# BGR box colours for drawing
+RIPENESS_COLORS = {"OverRipe": (0, 0, 200), "Ripe": (0, 200, 0), "UnRipe": (0, 200, 200), None: (160, 160, 160)}
+
+# One detected fruit: box is (x1, y1, x2, y2) in frame pixels; ripeness is None when not classified;
+# track_id is set by tracker.FruitTracker
+Fruit = namedtuple('Fruit', 'box confidence ripeness ripeness_confidence track_id', defaults=(None,))
+
+
+def load_classifier(path):
+    """ Loads the Keras ripeness classifier (best_mango_classifier.keras). """
+    from tensorflow.keras.models import load_model
+    return load_model(path)
+
+
+class RipenessClassifier:
+    """
+    Batched crop classifier around a Keras model.
+
+    Args:
+        model: Keras model taking (N, size, size, 3) RGB float input
+        max_batch: Crops per predict call; the buffers are allocated once at this size
+        size: Classifier input side in pixels
+        preprocess: 'mobilenet' scales to [-1, 1] (MobileNetV2's preprocess_input),
+                    'unit' to [0, 1], 'none' passes 0-255 (model has its own Rescaling layer)
+        classes: Label for each output column
+    """
+
+    def __init__(self, model, max_batch=64, size=CLASSIFIER_SIZE, preprocess="mobilenet", classes=RIPENESS_CLASSES):
+        if preprocess not in ("mobilenet", "unit", "none"):
+            raise ValueError(f"Unknown preprocess {preprocess!r}")
+        self.model = model
+        self.max_batch = max_batch
+        self.size = size
+        self.preprocess = preprocess
+        self.classes = classes
+        self._crops = np.empty((max_batch, size, size, 3), dtype=np.uint8)
+        self._input = np.empty((max_batch, size, size, 3), dtype=np.float32)
+        self.calls = 0
+        self.crops = 0
+
+    def _fill(self, frame, boxes):
+        """ Resizes each box of 'frame' into the crop batch; returns how many were written. """
+        for i, (x1, y1, x2, y2) in enumerate(boxes):
+            cv2.resize(frame[y1:y2, x1:x2], (self.size, self.size), dst=self._crops[i],
+                       interpolation=cv2.INTER_LINEAR)
+        return len(boxes)
+
+    def _predict(self, count):
+        """ Classifier probabilities for the first 'count' crops, in one call. """
+        batch = self._input[:count]
+        np.copyto(batch, self._crops[:count, :, :, ::-1], casting='unsafe') # BGR -> RGB, uint8 -> float32
+        if self.preprocess == "mobilenet":
+            batch /= 127.5
+            batch -= 1.0
+        elif self.preprocess == "unit":
+            batch /= 255.0
+        self.calls += 1
+        self.crops += count
+        return np.asarray(self.model.predict_on_batch(batch))
+
+    def classify(self, frame, boxes):
+        """
+        Classifies the (x1, y1, x2, y2) 'boxes' of a BGR 'frame'.
+
+        Returns:
+            List of (label, probability) per box, (None, 0.0) for boxes with no area inside the frame
+        """
+        h, w = frame.shape[:2]
+        clipped = np.rint(np.asarray(boxes, dtype=np.float64).reshape(-1, 4)).astype(np.int64)
+        clipped[:, [0, 2]] = np.clip(clipped[:, [0, 2]], 0, w)
+        clipped[:, [1, 3]] = np.clip(clipped[:, [1, 3]], 0, h)
+        valid = np.flatnonzero((clipped[:, 2] > clipped[:, 0]) & (clipped[:, 3] > clipped[:, 1]))
+
+        labels = [(None, 0.0)] * len(clipped)
+        for start in range(0, len(valid), self.max_batch):
+            chunk = valid[start:start + self.max_batch]
+            probs = self._predict(self._fill(frame, clipped[chunk].tolist()))
+            best = probs.argmax(axis=1)
+            for index, column, row in zip(chunk.tolist(), best.tolist(), probs):
+                labels[index] = (self.classes[column], float(row[column]))
+        return labels
+
+
+def detect_fruits(detector, classifier, frame, conf=0.6):
+    """ Runs the YOLO 'detector' on 'frame' and grades every box with 'classifier'; returns a list of Fruit. """
+    results = detector.predict(source=frame, conf=conf, verbose=False)
+    if not results or not len(results[0].boxes):
+        return []
+    boxes = results[0].boxes
+    xyxy = boxes.xyxy.cpu().numpy()
+    confidences = boxes.conf.cpu().numpy()
+    labels = classifier.classify(frame, xyxy) if classifier is not None else [(None, 0.0)] * len(xyxy)
+    return [Fruit(tuple(int(v) for v in box), float(c), label, p)
+            for box, c, (label, p) in zip(xyxy, confidences, labels)]
+
+
+def draw_fruits(frame, fruits):
+    """ Draws each Fruit's box coloured by ripeness, with its label, onto 'frame' in place. """
+    for fruit in fruits:
+        x1, y1, x2, y2 = fruit.box
+        color = RIPENESS_COLORS.get(fruit.ripeness, RIPENESS_COLORS[None])
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        text = f"{fruit.ripeness} {fruit.ripeness_confidence:.2f}" if fruit.ripeness else f"mango {fruit.confidence:.2f}"
+        if fruit.track_id is not None:
+            text = f"#{fruit.track_id} {text}"
+        cv2.putText(frame, text, (x1, max(y1 - 5, 12)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+    return frame
+
+
+def ripeness_counts(fruits):
+    """ Number of fruit per ripeness label (unclassified ones under None). """
+    counts = {}
+    for fruit in fruits:
+        counts[fruit.ripeness] = counts.get(fruit.ripeness, 0) + 1
+    return counts
@@ -0,0 +1,171 @@
+# Continuous velocity / yaw-rate setpoints for manual control (main.py).
+#
+# ArduCopter's GUIDED velocity control expects SET_POSITION_TARGET_LOCAL_NED
+# repeated at a steady rate, and stops on its own when they stop arriving
+# (after 3 s). SetpointStreamer sends the current setpoint from its own thread
+# at a fixed 10-20 Hz, so input handlers never block on the link: they only
+# replace the target with set(), which takes effect on the next tick.
+#
+# Each tick moves the commanded setpoint towards the target by at most
+# max_accel (m/s^2) and max_yaw_accel (deg/s^2), so starting, stopping and
+# reversing are ramped rather than stepped. A watchdog zeroes the target when
+# no set() arrives for 'input_timeout' seconds (input thread stalled, key
+# event lost), bringing the vehicle to a stop.
+#
+# Nothing is sent while the vehicle is not in GUIDED mode or once the setpoint
+# has ramped down to zero (after a few stop frames), so takeoff, goto and land
+# commands are not overridden by a stream of zero velocities.
+#
+#     streamer = SetpointStreamer(vehicle, rate=20.0).start()
+#     streamer.set(2.0, 0.0, 0.0)           # North at 2 m/s while the key is held
+#     streamer.set(0.0, 0.0, 0.0, 30.0)     # Yaw right at 30 deg/s
+#     streamer.close()
+
+import math
+import threading
+import time
+from collections import deque, namedtuple
+from pymavlink import mavutil
+
+# Velocity and yaw rate used; position, acceleration and yaw ignored
+VELOCITY_YAW_RATE_MASK = 0b0000010111000111
+STOP_FRAMES = 3 # Zero setpoints sent after ramping down, in case one is lost
+
+Setpoint = namedtuple("Setpoint", "vn ve vd yaw_rate") # m/s NED, deg/s clockwise
+ZERO = Setpoint(0.0, 0.0, 0.0, 0.0)
+
+
+def _step(current, target, max_delta):
+    return current + max(-max_delta, min(max_delta, target - current))
+
+
+class SetpointStreamer:
+    """
+    Args:
+        vehicle: Connected DroneKit vehicle
+        rate: Setpoints sent per second while moving (10-20 Hz suits ArduCopter)
+        max_accel: Velocity change per second allowed on each axis (m/s^2)
+        max_yaw_accel: Yaw rate change per second allowed (deg/s^2)
+        input_timeout: Seconds without set() before the watchdog stops the vehicle
+        frame: MAV_FRAME_* the velocities are in
+    """
+
+    def __init__(self, vehicle, rate=20.0, max_accel=4.0, max_yaw_accel=120.0, input_timeout=0.5,
+                 frame=mavutil.mavlink.MAV_FRAME_LOCAL_NED):
+        self.vehicle = vehicle
+        self.interval = 1.0 / rate
+        self.max_accel = max_accel
+        self.max_yaw_accel = max_yaw_accel
+        self.input_timeout = input_timeout
+        self.frame = frame
+        # (Setpoint, monotonic time of the last set(), time it last changed), replaced as a whole
+        self._input = (ZERO, time.monotonic(), None)
+        self._lock = threading.Lock()
+        self.commanded = ZERO # Last setpoint sent
+        self._stop_frames = 0
+        self._running = False
+        self._thread = None
+        self.sent = 0
+        self.watchdog_stops = 0
+        self.latencies = deque(maxlen=1000) # Seconds from a changed set() to the first setpoint sent for it
+
+    # --- Input (any thread) ---
+
+    def set(self, vn, ve, vd, yaw_rate=0.0):
+        """ Sets the target velocity (m/s, NED) and yaw rate (deg/s); call again to keep it alive. """
+        target = Setpoint(float(vn), float(ve), float(vd), float(yaw_rate))
+        now = time.monotonic()
+        with self._lock:
+            current, _, changed_at = self._input
+            self._input = (target, now, now if target != current else changed_at)
+
+    def stop(self):
+        """ Ramps down to a hover. """
+        self.set(0.0, 0.0, 0.0, 0.0)
+
+    def brake(self):
+        """ Ramps down to a hover, sending stop frames even if already idle (e.g. to end a takeoff climb). """
+        self.stop()
+        self._stop_frames = STOP_FRAMES
+
+    @property
+    def target(self):
+        return self._input[0]
+
+    # --- Streaming thread ---
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='SetpointStreamer', daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(2.0)
+            self._thread = None
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while self._running:
+            try:
+                self.tick(time.monotonic())
+            except Exception as e:
+                print(f"Setpoint streamer: {e}")
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic() # Fell behind: do not burst to catch up
+
+    def tick(self, now):
+        """ Advances the ramp by one interval and sends the setpoint if there is one to send. """
+        with self._lock:
+            target, updated_at, changed_at = self._input
+            if target != ZERO and now - updated_at > self.input_timeout:
+                target = ZERO
+                self._input = (ZERO, updated_at, now)
+                self.watchdog_stops += 1
+                print("Setpoint streamer: no input, stopping")
+            elif changed_at is not None:
+                self._input = (target, updated_at, None)
+
+        if self.vehicle.mode.name != "GUIDED":
+            self.commanded = ZERO
+            self._stop_frames = 0
+            return
+
+        dv, dyaw = self.max_accel * self.interval, self.max_yaw_accel * self.interval
+        c = self.commanded
+        self.commanded = Setpoint(_step(c.vn, target.vn, dv), _step(c.ve, target.ve, dv),
+                                  _step(c.vd, target.vd, dv), _step(c.yaw_rate, target.yaw_rate, dyaw))
+        if self.commanded == ZERO:
+            if self._stop_frames <= 0:
+                return # Idle: leave the autopilot's own position hold alone
+            self._stop_frames -= 1
+        else:
+            self._stop_frames = STOP_FRAMES
+        self._send(self.commanded)
+        if changed_at is not None:
+            self.latencies.append(time.monotonic() - changed_at)
+
+    def _send(self, setpoint):
+        msg = self.vehicle.message_factory.set_position_target_local_ned_encode(
+            0,       # time_boot_ms (not used)
+            0, 0,    # target system, target component
+            self.frame,
+            VELOCITY_YAW_RATE_MASK,
+            0, 0, 0, # x, y, z positions (ignored)
+            setpoint.vn, setpoint.ve, setpoint.vd,
+            0, 0, 0, # x, y, z acceleration (ignored)
+            0, math.radians(setpoint.yaw_rate)) # yaw (ignored), yaw_rate in rad/s
+        self.vehicle.send_mavlink(msg)
+        self.sent += 1
+
+    def to_dict(self):
+        latencies = sorted(self.latencies)
+        return {"target": self.target._asdict(), "commanded": self.commanded._asdict(), "sent": self.sent,
+                "watchdog_stops": self.watchdog_stops,
+                "latency_p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else None}
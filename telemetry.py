@@ -0,0 +1,258 @@
+# Event-driven telemetry engine for the web dashboard.
+#
+# DroneKit notifies attribute listeners as soon as a MAVLink message updates
+# a vehicle attribute (the same mechanism main.py uses for 'mode' and 'armed').
+# The engine merges those updates into one shared state dict and flushes it to
+# the dashboard, rate limited per field group so fast attitude updates do not
+# drag slow battery/status fields along with them.
+
+import math
+import threading
+import time
+from metrics import histogram
+
+# --- Field Groups ---
+# Maximum flush rate (Hz) for each group of telemetry fields.
+DEFAULT_GROUP_RATES = {
+    "attitude": 20.0,
+    "position": 5.0,
+    "battery": 1.0,
+    "status": 1.0,
+}
+
+def _attitude_fields(att):
+    return {"roll": math.degrees(att.roll), "pitch": math.degrees(att.pitch),
+            "yaw": math.degrees(att.yaw)}
+
+def _location_fields(loc):
+    return {"latitude": loc.lat, "longitude": loc.lon, "altitude": loc.alt}
+
+def _battery_fields(bat):
+    return {"battery_voltage": bat.voltage, "battery_current": bat.current,
+            "battery_level": bat.level}
+
+def _gps_fields(gps):
+    return {"gps_fix": gps.fix_type, "gps_satellites": gps.satellites_visible}
+
+# --- Metrics ---
+# Attribute updates arrive thousands of times a second on a fast link or a
+# replay, so only every UPDATE_SAMPLE_EVERY-th one is timed (a power of two)
+UPDATE_SAMPLE_EVERY = 16
+update_seconds = histogram("telemetry_update_seconds",
+                           f"DroneKit attribute callback, convert and merge (1 in {UPDATE_SAMPLE_EVERY} timed)")
+emit_seconds = histogram("telemetry_emit_seconds", "One telemetry flush through 'emit' (broadcast, record, history)")
+
+# DroneKit attribute name -> (field group, converter to telemetry fields)
+ATTRIBUTE_FIELDS = {
+    "attitude": ("attitude", _attitude_fields),
+    "heading": ("attitude", lambda v: {"heading": v}),
+    "location.global_relative_frame": ("position", _location_fields),
+    "groundspeed": ("position", lambda v: {"groundspeed": v}),
+    "airspeed": ("position", lambda v: {"airspeed": v}),
+    "battery": ("battery", _battery_fields),
+    "mode": ("status", lambda v: {"mode": v.name}),
+    "armed": ("status", lambda v: {"armed": v}),
+    "is_armable": ("status", lambda v: {"is_armable": v}),
+    "system_status": ("status", lambda v: {"system_status": v.state}),
+    "gps_0": ("status", _gps_fields),
+}
+# DroneKit computes 'is_armable' from these and never notifies it, so it is re-read when one changes
+ARMABLE_INPUTS = ("mode", "gps_0", "system_status", "ekf_ok")
+LISTENED_ATTRIBUTES = tuple(ATTRIBUTE_FIELDS) + tuple(a for a in ARMABLE_INPUTS if a not in ATTRIBUTE_FIELDS)
+
+def _read_attribute(vehicle, attr_name):
+    """ Resolves dotted DroneKit attribute names such as 'location.global_relative_frame'. """
+    value = vehicle
+    for part in attr_name.split('.'):
+        value = getattr(value, part)
+    return value
+
+
+class TelemetryEngine:
+    """
+    Merges DroneKit attribute callbacks into a shared telemetry state and
+    flushes it through 'emit' no faster than each group's configured rate.
+
+    Args:
+        emit: Callable receiving the full telemetry dict on every flush; groups
+            not due yet keep the values they were last flushed with
+        group_rates: Optional dict overriding DEFAULT_GROUP_RATES (Hz)
+    """
+
+    def __init__(self, emit, group_rates=None):
+        rates = dict(DEFAULT_GROUP_RATES)
+        rates.update(group_rates or {})
+        self._emit = emit
+        self._periods = {group: 1.0 / hz for group, hz in rates.items()}
+        self._state = {} # Latest value of every field
+        self._pending = {} # Group -> fields changed since the group was last flushed
+        self._flushed = {} # Every field as last emitted
+        self._last_flush = dict.fromkeys(self._periods, 0.0)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._vehicle = None
+        self.updates = 0 # Attribute updates received
+
+    def attach(self, vehicle):
+        """ Seeds the state from 'vehicle' and registers attribute listeners on it. """
+        self.detach()
+        for attr_name, (group, convert) in ATTRIBUTE_FIELDS.items():
+            try:
+                value = _read_attribute(vehicle, attr_name)
+                if value is not None:
+                    self._merge(group, convert(value))
+            except Exception as e:
+                print(f"Telemetry: could not read initial '{attr_name}': {e}")
+        for attr_name in LISTENED_ATTRIBUTES:
+            vehicle.add_attribute_listener(attr_name, self._on_attribute)
+        self._vehicle = vehicle
+        self._wake.set()
+
+    def detach(self):
+        """ Removes the listeners from the currently attached vehicle, if any. """
+        if self._vehicle is None:
+            return
+        for attr_name in LISTENED_ATTRIBUTES:
+            try:
+                self._vehicle.remove_attribute_listener(attr_name, self._on_attribute)
+            except Exception:
+                pass # Listener already gone (e.g. vehicle closed)
+        self._vehicle = None
+
+    def snapshot(self):
+        """ Returns a copy of the latest merged telemetry state. """
+        with self._lock:
+            return dict(self._state)
+
+    def _merge(self, group, fields):
+        with self._lock:
+            self._state.update(fields)
+            self._pending.setdefault(group, {}).update(fields)
+
+    def _on_attribute(self, vehicle, attr_name, value):
+        """ DroneKit attribute callback; runs on the MAVLink receive thread. """
+        if value is None:
+            return
+        self.updates += 1
+        started = time.perf_counter() if not self.updates & (UPDATE_SAMPLE_EVERY - 1) else None
+        entry = ATTRIBUTE_FIELDS.get(attr_name)
+        try:
+            if entry is not None:
+                self._merge(entry[0], entry[1](value))
+            if attr_name in ARMABLE_INPUTS:
+                self._merge("status", {"is_armable": bool(vehicle.is_armable)})
+        except Exception as e:
+            print(f"Telemetry: error converting '{attr_name}': {e}")
+            return
+        self._wake.set()
+        if started is not None:
+            update_seconds.observe(time.perf_counter() - started)
+
+    def flush_due(self, now=None):
+        """
+        Emits the state if any changed group has reached its flush period.
+        Only the due groups' fields are updated; the others are sent with
+        their previously flushed values until their own period comes round.
+
+        Returns:
+            Seconds until the next dirty group becomes due, or None when idle.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            due = [g for g in self._pending if now - self._last_flush[g] >= self._periods[g]]
+            for group in due:
+                self._flushed.update(self._pending.pop(group))
+                self._last_flush[group] = now
+            waits = [self._periods[g] - (now - self._last_flush[g]) for g in self._pending]
+            data = dict(self._flushed) if due else None
+        if data:
+            started = time.perf_counter()
+            self._emit(data)
+            emit_seconds.observe(time.perf_counter() - started)
+        return min(waits) if waits else None
+
+    def run(self, keep_running):
+        """
+        Flush loop. Sleeps until a listener reports a change (or a rate-limited
+        group becomes due) instead of polling, so an idle vehicle costs nothing.
+
+        Args:
+            keep_running: Callable returning False when the loop should exit
+        """
+        timeout = None
+        while keep_running():
+            # Wake at least once a second so 'keep_running' is re-checked
+            self._wake.wait(1.0 if timeout is None else min(timeout, 1.0))
+            self._wake.clear()
+            try:
+                timeout = self.flush_due()
+            except Exception as e:
+                print(f"Error emitting telemetry: {e}")
+                timeout = None
+
+
+# --- Delta Encoding ---
+# Minimum change before a numeric field is re-sent in a delta frame. Fields not
+# listed here are re-sent whenever their value differs at all.
+DEFAULT_THRESHOLDS = {
+    "latitude": 1e-7, "longitude": 1e-7, "altitude": 0.05,   # ~1 cm, 5 cm
+    "groundspeed": 0.05, "airspeed": 0.05,
+    "heading": 1, "roll": 0.1, "pitch": 0.1, "yaw": 0.1,
+    "battery_voltage": 0.01, "battery_current": 0.01, "battery_level": 1,
+}
+
+def _field_changed(old, new, threshold):
+    if isinstance(new, bool) or not isinstance(new, (int, float)) or not isinstance(old, (int, float)):
+        return old != new
+    return abs(new - old) >= threshold if threshold else new != old
+
+
+class DeltaEncoder:
+    """
+    Turns full telemetry dicts into sequence-numbered frames for the
+    'telemetry_update' event:
+
+        {"seq": 42, "key": false, "fields": {"roll": 1.5, "yaw": 90.2}}
+
+    Delta frames carry only fields that moved past their threshold since they
+    were last sent. Keyframes ("key": true) carry every field and are sent every
+    'keyframe_interval' seconds so clients can resync.
+    """
+
+    def __init__(self, thresholds=None, keyframe_interval=10.0):
+        self._thresholds = dict(DEFAULT_THRESHOLDS)
+        self._thresholds.update(thresholds or {})
+        self._keyframe_interval = keyframe_interval
+        self._sent = {} # Last value sent for each field; what every client holds
+        self._seq = 0
+        self._last_keyframe = None
+        self._lock = threading.Lock()
+
+    def encode(self, state, now=None):
+        """ Returns the next frame for 'state', or None if nothing changed enough. """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._last_keyframe is None or now - self._last_keyframe >= self._keyframe_interval:
+                self._last_keyframe = now
+                self._sent = dict(state)
+                self._seq += 1
+                return {"seq": self._seq, "key": True, "fields": dict(state)}
+
+            changed = {}
+            for key, value in state.items():
+                if key not in self._sent or \
+                   _field_changed(self._sent[key], value, self._thresholds.get(key, 0)):
+                    changed[key] = value
+            if not changed:
+                return None
+            self._sent.update(changed)
+            self._seq += 1
+            return {"seq": self._seq, "key": False, "fields": changed}
+
+    def keyframe(self):
+        """
+        Returns a keyframe of the state clients currently hold, for a newly
+        connected client. Does not advance the sequence number.
+        """
+        with self._lock:
+            return {"seq": self._seq, "key": True, "fields": dict(self._sent)}
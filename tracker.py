@@ -0,0 +1,281 @@
+# Multi-object tracker for the mango detector (SORT / ByteTrack style).
+#
+# Every detection is matched to a track by IoU against the track's Kalman
+# prediction (constant velocity in box centre and size), so each fruit keeps
+# one ID while it stays in view. As in ByteTrack, high-confidence detections
+# are matched first and low-confidence ones are then used only to keep
+# existing tracks alive through blur and partial occlusion; only
+# high-confidence detections start new tracks.
+#
+# Tracks carry a cache (ripeness label, best detection confidence and the
+# crop it came from), so the classifier only runs for tracks that are newly
+# confirmed or whose detection confidence has dropped since they were last
+# classified, instead of for every box of every frame. Confirmed track IDs
+# double as unique fruit counts per tree.
+#
+#     tracker = FruitTracker(detector, classifier)
+#     fruits = tracker(frame)
+
+import itertools
+import numpy as np
+from ripeness import Fruit
+
+# --- Optional: pip install scipy for optimal assignment (greedy matching otherwise) ---
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+# Kalman noise, relative to box height (as in ByteTrack)
+STD_POSITION = 1.0 / 20
+STD_VELOCITY = 1.0 / 160
+
+_F = np.eye(8)
+_F[:4, 4:] = np.eye(4) # x' = x + v (one frame)
+_H = np.eye(4, 8)
+
+
+def iou_matrix(a, b):
+    """ IoU of every (x1, y1, x2, y2) box in 'a' against every box in 'b'. """
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    w = np.clip(np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0]), 0, None)
+    h = np.clip(np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1]), 0, None)
+    inter = w * h
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def match(iou, threshold):
+    """
+    Pairs rows and columns of 'iou' with IoU >= threshold, maximising total IoU
+    (scipy) or greedily by best IoU first.
+
+    Returns:
+        (matches as [(row, col)], unmatched rows, unmatched cols)
+    """
+    rows, cols = iou.shape
+    if not rows or not cols:
+        return [], list(range(rows)), list(range(cols))
+    if linear_sum_assignment is not None:
+        pairs = [(r, c) for r, c in zip(*linear_sum_assignment(-iou)) if iou[r, c] >= threshold]
+    else:
+        pairs = []
+        used_rows, used_cols = set(), set()
+        for flat in np.argsort(-iou, axis=None):
+            r, c = divmod(int(flat), cols)
+            if iou[r, c] < threshold:
+                break
+            if r not in used_rows and c not in used_cols:
+                pairs.append((r, c))
+                used_rows.add(r)
+                used_cols.add(c)
+    matched_rows = {r for r, _ in pairs}
+    matched_cols = {c for _, c in pairs}
+    return ([(int(r), int(c)) for r, c in pairs],
+            [r for r in range(rows) if r not in matched_rows],
+            [c for c in range(cols) if c not in matched_cols])
+
+
+def _to_xywh(box):
+    x1, y1, x2, y2 = box
+    return np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1])
+
+
+class Track:
+    """
+    One fruit: Kalman state [cx, cy, w, h, vx, vy, vw, vh] plus the cached
+    per-fruit results.
+    """
+
+    def __init__(self, track_id, box, confidence):
+        self.id = track_id
+        z = _to_xywh(box)
+        self.x = np.concatenate([z, np.zeros(4)])
+        std = np.array([STD_POSITION, STD_POSITION, STD_POSITION, STD_POSITION,
+                        10 * STD_VELOCITY, 10 * STD_VELOCITY, 10 * STD_VELOCITY, 10 * STD_VELOCITY]) * 2 * z[3]
+        self.P = np.diag(np.square(std))
+        self.hits = 1
+        self.age = 0
+        self.misses = 0 # Frames since last matched
+        self.confidence = confidence
+        # Cache
+        self.ripeness = None
+        self.ripeness_confidence = 0.0
+        self.classified_confidence = 0.0 # Detection confidence when last classified
+        self.best_confidence = confidence
+        self.best_crop = None
+
+    @property
+    def box(self):
+        cx, cy, w, h = self.x[:4]
+        return (cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2)
+
+    def predict(self):
+        if self.x[2] + self.x[6] <= 0:
+            self.x[6] = 0.0
+        if self.x[3] + self.x[7] <= 0:
+            self.x[7] = 0.0
+        h = self.x[3]
+        q = np.square([STD_POSITION * h, STD_POSITION * h, STD_POSITION * h, STD_POSITION * h,
+                       STD_VELOCITY * h, STD_VELOCITY * h, STD_VELOCITY * h, STD_VELOCITY * h])
+        self.x = _F @ self.x
+        self.P = _F @ self.P @ _F.T + np.diag(q)
+        self.age += 1
+        self.misses += 1
+
+    def update(self, box, confidence):
+        z = _to_xywh(box)
+        r = np.square(STD_POSITION * self.x[3]) * np.ones(4)
+        S = _H @ self.P @ _H.T + np.diag(r)
+        K = np.linalg.solve(S, _H @ self.P).T
+        self.x = self.x + K @ (z - _H @ self.x)
+        self.P = self.P - K @ S @ K.T
+        self.hits += 1
+        self.misses = 0
+        self.confidence = confidence
+
+
+class Tracker:
+    """
+    Args:
+        high_conf: Detections at or above this start and update tracks
+        low_conf: Detections between low_conf and high_conf only update existing tracks
+        iou_threshold: Minimum IoU between a prediction and a detection to match
+        max_age: Frames a track survives unmatched
+        min_hits: Matches before a track counts as a fruit
+    """
+
+    def __init__(self, high_conf=0.6, low_conf=0.1, iou_threshold=0.3, max_age=30, min_hits=3):
+        self.high_conf = high_conf
+        self.low_conf = low_conf
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.tracks = []
+        self.confirmed = {} # track id -> Track, every track that ever reached min_hits
+        self._ids = itertools.count(1)
+
+    def update(self, boxes, confidences):
+        """
+        Advances all tracks one frame with this frame's detections.
+
+        Returns:
+            List of (Track, detection box) for tracks matched this frame
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        confidences = np.asarray(confidences, dtype=np.float64).reshape(-1)
+        for track in self.tracks:
+            track.predict()
+
+        high = np.flatnonzero(confidences >= self.high_conf)
+        low = np.flatnonzero((confidences >= self.low_conf) & (confidences < self.high_conf))
+        predicted = [track.box for track in self.tracks]
+
+        # 1. High-confidence detections against every track
+        matches, free_tracks, free_high = match(iou_matrix(predicted, boxes[high]), self.iou_threshold)
+        matched = [(self.tracks[t], high[d]) for t, d in matches]
+        # 2. Low-confidence detections keep the remaining tracks alive
+        remaining = [self.tracks[t] for t in free_tracks]
+        low_matches, _, _ = match(iou_matrix([track.box for track in remaining], boxes[low]), self.iou_threshold)
+        matched += [(remaining[t], low[d]) for t, d in low_matches]
+
+        for track, d in matched:
+            track.update(boxes[d], float(confidences[d]))
+            if track.hits >= self.min_hits:
+                self.confirmed[track.id] = track
+        # 3. Unmatched high-confidence detections start new tracks
+        for d in high[free_high]:
+            track = Track(next(self._ids), boxes[d], float(confidences[d]))
+            self.tracks.append(track)
+            matched.append((track, d))
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_age]
+        return [(track, tuple(boxes[d])) for track, d in matched]
+
+    def counts(self):
+        """ Unique fruit seen so far per ripeness label (unclassified under None). """
+        counts = {}
+        for track in list(self.confirmed.values()): # Snapshot: the render thread reads while inference updates
+            counts[track.ripeness] = counts.get(track.ripeness, 0) + 1
+        return counts
+
+    def reset_counts(self):
+        """ Starts counting afresh (e.g. at the next tree); live tracks are counted again once re-matched. """
+        self.confirmed = {}
+
+
+class FruitTracker:
+    """
+    Detector + tracker + cached ripeness classification: call it with a frame
+    to get that frame's Fruit list, each with a stable track_id.
+
+    Args:
+        detector: Ultralytics YOLO model
+        classifier: ripeness.RipenessClassifier, or None for detection only
+        tracker: Tracker (default settings if None)
+        reclassify_drop: Re-classify a track once its detection confidence falls
+                         this far below its confidence when last classified
+        keep_crops: Keep a copy of each track's best-confidence crop
+    """
+
+    def __init__(self, detector, classifier=None, tracker=None, reclassify_drop=0.15, keep_crops=True):
+        self.detector = detector
+        self.classifier = classifier
+        self.tracker = tracker or Tracker()
+        self.reclassify_drop = reclassify_drop
+        self.keep_crops = keep_crops
+        self.frames = 0
+        self.detections = 0
+        self.classified = 0
+
+    def needs_classification(self, track):
+        """ Confirmed tracks never classified, or whose detection confidence has degraded since. """
+        if track.hits < self.tracker.min_hits:
+            return False
+        return (track.ripeness is None
+                or track.confidence < track.classified_confidence - self.reclassify_drop)
+
+    def update(self, frame, boxes, confidences):
+        """ Tracks one frame's detections and classifies the tracks that need it; returns the Fruit list. """
+        matched = self.tracker.update(boxes, confidences)
+        self.frames += 1
+        self.detections += len(matched)
+
+        h, w = frame.shape[:2]
+        for track, box in matched:
+            if self.keep_crops and (track.best_crop is None or track.confidence > track.best_confidence):
+                x1, y1, x2, y2 = (int(v) for v in np.clip(np.rint(box), 0, [w, h, w, h]))
+                if x2 > x1 and y2 > y1:
+                    track.best_confidence = max(track.confidence, track.best_confidence)
+                    track.best_crop = frame[y1:y2, x1:x2].copy()
+
+        if self.classifier is not None:
+            pending = [(track, box) for track, box in matched if self.needs_classification(track)]
+            if pending:
+                labels = self.classifier.classify(frame, [box for _, box in pending]) # One batched call
+                for (track, _), (label, probability) in zip(pending, labels):
+                    if label is not None:
+                        track.ripeness, track.ripeness_confidence = label, probability
+                        track.classified_confidence = track.confidence
+                self.classified += len(pending)
+
+        return [Fruit(tuple(int(v) for v in box), track.confidence, track.ripeness,
+                      track.ripeness_confidence, track.id)
+                for track, box in matched]
+
+    def __call__(self, frame):
+        results = self.detector.predict(source=frame, conf=self.tracker.low_conf, verbose=False)
+        if not results or not len(results[0].boxes):
+            return self.update(frame, np.empty((0, 4)), np.empty(0))
+        boxes = results[0].boxes
+        return self.update(frame, boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy())
+
+    def counts(self):
+        return self.tracker.counts()
+
+    def to_dict(self):
+        return {"frames": self.frames, "detections": self.detections, "classified": self.classified,
+                "tracks": len(self.tracker.tracks), "unique_fruit": len(self.tracker.confirmed),
+                "classified_fraction": round(self.classified / self.detections, 3) if self.detections else 0.0}